@@ -265,9 +265,7 @@ async function deleteFlightEnquiry(id) {
 
 async function exportFlightEnquiries() {
     try {
-        // We'll fetch the export URL instead of JSON data
-        const token = getAuthToken();
-        window.open(`/api/admin/flight-enquiries/export?token=${token}`, '_blank');
+        await downloadExport('flight-enquiries');
     } catch (error) {
         showNotification('Error exporting data', 'error');
     }
@@ -610,7 +608,13 @@ function restoreSidebarScroll() {
 // Notifications System
 // ========================================
 let notificationsData = [];
+let notificationCursor = null;   // next_cursor of the last feed we applied
 let notificationDropdownOpen = false;
+const NOTIFICATION_LIMIT = 20;
+const NOTIFICATION_POLL_MS = 30000;
+// Live (SSE) notifications hold a server thread per tab, so they are opt-in:
+// localStorage.setItem('c2c_admin_live_notifications', '1')
+const NOTIFICATION_STREAM_KEY = 'c2c_admin_live_notifications';
 
 // Initialize notification bell on all admin pages
 document.addEventListener('DOMContentLoaded', function() {
@@ -679,8 +683,8 @@ function initNotificationBell() {
         }
     });
 
-    // Load notifications
-    loadNotifications();
+    // Load notifications, then keep them current
+    loadNotifications().then(watchNotifications);
 }
 
 function toggleNotificationDropdown() {
@@ -709,23 +713,91 @@ async function loadNotifications() {
     if (!list) return;
 
     try {
-        const result = await apiRequest('/notifications?limit=20');
+        // After the first load only ask for what's new or changed since
+        const query = notificationCursor
+            ? `since=${encodeURIComponent(notificationCursor)}`
+            : `limit=${NOTIFICATION_LIMIT}`;
+        const result = await apiRequest(`/notifications?${query}`);
 
         if (!result || !result.success) {
-            renderNotifEmpty(list, 'Failed to load notifications');
+            if (!notificationsData.length) renderNotifEmpty(list, 'Failed to load notifications');
             return;
         }
 
-        notificationsData = result.data || [];
-        renderNotifications(notificationsData);
-        updateNotificationBadge(notificationsData);
+        applyNotifications(result.data || [], result.incremental, result.next_cursor);
 
     } catch (error) {
         console.error('Error loading notifications:', error);
-        renderNotifEmpty(list, 'Could not load notifications');
+        if (!notificationsData.length) renderNotifEmpty(list, 'Could not load notifications');
     }
 }
 
+function applyNotifications(items, incremental, cursor) {
+    if (incremental) {
+        const byId = new Map(notificationsData.map(n => [n.id, n]));
+        items.forEach(n => byId.set(n.id, n));
+        items = [...byId.values()];
+    }
+    notificationsData = items
+        .sort((a, b) => String(b.time || '').localeCompare(String(a.time || '')))
+        .slice(0, NOTIFICATION_LIMIT);
+    notificationCursor = cursor || notificationCursor;
+
+    renderNotifications(notificationsData);
+    updateNotificationBadge(notificationsData);
+}
+
+// Server-sent events from /notifications/stream, read with fetch() because
+// EventSource can't send the Authorization header
+async function streamNotifications() {
+    const query = notificationCursor ? `?since=${encodeURIComponent(notificationCursor)}` : '';
+    const response = await fetch(`${API_BASE}/notifications/stream${query}`, {
+        headers: { 'Authorization': `Bearer ${getAuthToken()}` }
+    });
+    if (!response.ok || !response.body) {
+        throw new Error(`Notification stream failed (${response.status})`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) return;
+        buffer += decoder.decode(value, { stream: true });
+
+        let end;
+        while ((end = buffer.indexOf('\n\n')) >= 0) {
+            const block = buffer.slice(0, end);
+            buffer = buffer.slice(end + 2);
+            const event = (block.match(/^event: (.*)$/m) || [])[1];
+            const data = (block.match(/^data: (.*)$/m) || [])[1];
+            if (event === 'notifications' && data) {
+                const feed = JSON.parse(data);
+                applyNotifications(feed.data || [], notificationCursor !== null, feed.next_cursor);
+            }
+        }
+    }
+}
+
+async function watchNotifications() {
+    // Cursor polling by default. With live notifications switched on, the stream
+    // closes every minute or so and is reopened from the cursor; if streaming
+    // isn't available (or the server is at its stream limit), poll instead
+    const liveEnabled = localStorage.getItem(NOTIFICATION_STREAM_KEY) === '1';
+    if (liveEnabled && typeof ReadableStream !== 'undefined' && typeof TextDecoder !== 'undefined') {
+        try {
+            while (true) {
+                await streamNotifications();
+                await new Promise(resolve => setTimeout(resolve, 3000));
+            }
+        } catch (error) {
+            console.warn('Notification stream unavailable, polling instead:', error);
+        }
+    }
+    setInterval(loadNotifications, NOTIFICATION_POLL_MS);
+}
+
 function renderNotifications(notifications) {
     const list = document.getElementById('notifList');
     if (!list) return;
@@ -910,6 +982,30 @@ async function apiRequest(endpoint, method = 'GET', data = null) {
     }
 }
 
+// Remembers the next_cursor of each page a listing has loaded, so paging
+// forward uses the server's keyset cursor instead of a deep offset.
+// Cursors are dropped whenever the filters (key) change.
+class KeysetPager {
+    constructor() {
+        this.key = null;
+        this.cursors = {};
+    }
+
+    // Paging params for a 0-based page index
+    params(page, limit, key = '') {
+        if (key !== this.key) {
+            this.key = key;
+            this.cursors = {};
+        }
+        const cursor = this.cursors[page];
+        return cursor ? { limit, cursor } : { limit, offset: page * limit };
+    }
+
+    remember(page, res) {
+        if (res && res.next_cursor) this.cursors[page + 1] = res.next_cursor;
+    }
+}
+
 // ========================================
 // Authentication
 // ========================================
@@ -1193,6 +1289,28 @@ function exportToCSV(data, filename) {
     URL.revokeObjectURL(url);
 }
 
+// Streamed server-side export of a whole listing (GET /api/admin/export/<listing>),
+// with the same filters the listing endpoint takes
+async function downloadExport(listing, params = {}) {
+    const query = new URLSearchParams(params).toString();
+    const response = await fetch(`${API_BASE}/export/${listing}${query ? '?' + query : ''}`, {
+        headers: { 'Authorization': `Bearer ${getAuthToken()}` }
+    });
+    if (!response.ok) {
+        throw new Error(`Export failed (${response.status})`);
+    }
+
+    const disposition = response.headers.get('Content-Disposition') || '';
+    const match = disposition.match(/filename=([^;]+)/);
+    const blob = await response.blob();
+    const url = URL.createObjectURL(blob);
+    const a = document.createElement('a');
+    a.href = url;
+    a.download = match ? match[1] : `${listing}.csv`;
+    a.click();
+    URL.revokeObjectURL(url);
+}
+
 // ========================================
 // Initialize
 // ========================================
@@ -50,7 +50,8 @@ def create_app():
         r"/api/*": {
             "origins": "*",
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization", "Idempotency-Key"],
+            "expose_headers": ["Idempotent-Replayed"]
         }
     })
     
@@ -113,7 +114,21 @@ def create_app():
     from services.email_service import email_service
     email_service.init_app(app)
     print(f"🔑 Resend API Key loaded: {bool(app.config.get('RESEND_API_KEY'))}")
-    
+
+    # Durable background jobs (post-payment booking side effects) and email outbox
+    from services.booking_jobs import job_queue
+    from services.email_outbox import email_outbox
+    import services.newsletter_service  # registers the newsletter_campaign job handler
+    from services.currency_rates import currency_rates  # registers the currency_refresh job handler
+
+    @app.before_request
+    def start_job_workers():
+        # Workers start per gunicorn process (threads don't survive --preload's fork)
+        # and pick up any jobs / queued emails left over from before a restart
+        job_queue.start()
+        email_outbox.start()
+        currency_rates.schedule()
+
     # Define directories
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     templates_dir = os.path.join(base_dir, 'templates')
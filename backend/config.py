@@ -31,11 +31,88 @@ class Config:
     AIR_IQ_LOGIN_ID = os.getenv('AIR_IQ_LOGIN_ID')
     AIR_IQ_PASSWORD = os.getenv('AIR_IQ_PASSWORD')
     AIR_IQ_API_KEY = os.getenv('AIR_IQ_API_KEY')
+    AIR_IQ_TOKEN_TTL = int(os.getenv('AIR_IQ_TOKEN_TTL', 3600))  # when the login response doesn't say
+
+    # AIR iQ search result cache (services/flight_search_cache.py)
+    FLIGHT_CACHE_TTL = int(os.getenv('FLIGHT_CACHE_TTL', 300))
+    FLIGHT_CACHE_STALE_SECONDS = int(os.getenv('FLIGHT_CACHE_STALE_SECONDS', 600))
+    FLIGHT_CACHE_MAX_BYTES = int(os.getenv('FLIGHT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
     
     # Supabase Configuration
     SUPABASE_URL = os.getenv('SUPABASE_URL')
     SUPABASE_ANON_KEY = os.getenv('SUPABASE_ANON_KEY')
     SUPABASE_SERVICE_ROLE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+    # JWT secret (Project Settings -> API) - lets us verify user tokens locally
+    SUPABASE_JWT_SECRET = os.getenv('SUPABASE_JWT_SECRET')
+    
+    # Search analytics writer (hotel_search_logs batching)
+    SEARCH_LOG_BATCH_SIZE = int(os.getenv('SEARCH_LOG_BATCH_SIZE', 50))
+    SEARCH_LOG_FLUSH_MS = int(os.getenv('SEARCH_LOG_FLUSH_MS', 2000))
+    SEARCH_LOG_QUEUE_SIZE = int(os.getenv('SEARCH_LOG_QUEUE_SIZE', 5000))
+
+    # Admin audit trail (activity_logs) - batched background writer
+    ACTIVITY_LOG_BATCH_SIZE = int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', 50))
+    ACTIVITY_LOG_FLUSH_MS = int(os.getenv('ACTIVITY_LOG_FLUSH_MS', 1000))
+    ACTIVITY_LOG_QUEUE_SIZE = int(os.getenv('ACTIVITY_LOG_QUEUE_SIZE', 2000))
+
+    # Booking status poller (background /finish/status/ polling)
+    BOOKING_POLL_WORKERS = int(os.getenv('BOOKING_POLL_WORKERS', 4))
+    # /book/events streams held open per process (each pins a request thread
+    # for up to 30 seconds); past that clients fall back to /book/poll
+    BOOK_EVENTS_STREAM_MAX = int(os.getenv('BOOK_EVENTS_STREAM_MAX', 2))
+
+    # Hotel search snapshots (/search/<search_id>/results and /rates), shared by
+    # the workers through a local SQLite file; sizes in bytes
+    SEARCH_SNAPSHOT_DB_PATH = os.getenv('SEARCH_SNAPSHOT_DB_PATH')  # defaults to backend/data/search_snapshots.sqlite3
+    SEARCH_SNAPSHOT_MAX_BYTES = int(os.getenv('SEARCH_SNAPSHOT_MAX_BYTES', 256 * 1024 * 1024))
+    SEARCH_SNAPSHOT_MEMORY_BYTES = int(os.getenv('SEARCH_SNAPSHOT_MEMORY_BYTES', 64 * 1024 * 1024))
+
+    # Prebook result cache lifetime (seconds) - one /hotel/prebook/ per checkout
+    PREBOOK_CACHE_TTL = int(os.getenv('PREBOOK_CACHE_TTL', 180))
+
+    # PDF rendering (pooled headless Chromium)
+    PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', 1))
+    PDF_BROWSER_MAX_RENDERS = int(os.getenv('PDF_BROWSER_MAX_RENDERS', 200))
+    PDF_RENDER_TIMEOUT = int(os.getenv('PDF_RENDER_TIMEOUT', 60))
+    PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR')  # defaults to backend/data/pdf_cache
+
+    # Durable job queue (post-payment side effects) - SQLite file on local disk
+    JOB_QUEUE_DB_PATH = os.getenv('JOB_QUEUE_DB_PATH')
+    JOB_QUEUE_WORKERS = int(os.getenv('JOB_QUEUE_WORKERS', 2))
+
+    # Email outbox (background delivery) and per-provider send limits
+    EMAIL_OUTBOX_DB_PATH = os.getenv('EMAIL_OUTBOX_DB_PATH')
+    EMAIL_OUTBOX_WORKERS = int(os.getenv('EMAIL_OUTBOX_WORKERS', 4))
+    EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', 6))
+    EMAIL_SMTP_CONCURRENCY = int(os.getenv('EMAIL_SMTP_CONCURRENCY', 2))
+    EMAIL_SMTP_RATE = float(os.getenv('EMAIL_SMTP_RATE', 5))        # messages/second
+    EMAIL_BREVO_CONCURRENCY = int(os.getenv('EMAIL_BREVO_CONCURRENCY', 4))
+    EMAIL_BREVO_RATE = float(os.getenv('EMAIL_BREVO_RATE', 10))
+    EMAIL_RESEND_CONCURRENCY = int(os.getenv('EMAIL_RESEND_CONCURRENCY', 2))
+    EMAIL_RESEND_RATE = float(os.getenv('EMAIL_RESEND_RATE', 2))
+
+    # Newsletter campaigns (bulk sends to newsletter_subscribers)
+    NEWSLETTER_DB_PATH = os.getenv('NEWSLETTER_DB_PATH')
+    NEWSLETTER_PAGE_SIZE = int(os.getenv('NEWSLETTER_PAGE_SIZE', 200))
+    NEWSLETTER_CONCURRENCY = int(os.getenv('NEWSLETTER_CONCURRENCY', 4))
+
+    # Admin CSV exports (rows read per keyset page while streaming)
+    EXPORT_PAGE_SIZE = int(os.getenv('EXPORT_PAGE_SIZE', 500))
+
+    # Admin notification SSE streams held open per process (each pins a request
+    # thread for up to a minute); 0 turns /notifications/stream off
+    NOTIFICATION_STREAM_MAX = int(os.getenv('NOTIFICATION_STREAM_MAX', 1))
+
+    # Exchange rates (currencies table refresh job and pricing)
+    CURRENCY_REFRESH_SECONDS = int(os.getenv('CURRENCY_REFRESH_SECONDS', 3600))
+    CURRENCY_CACHE_SECONDS = int(os.getenv('CURRENCY_CACHE_SECONDS', 300))
+    CURRENCY_API_TIMEOUT = float(os.getenv('CURRENCY_API_TIMEOUT', 10))
+    CURRENCY_SNAPSHOT_PATH = os.getenv('CURRENCY_SNAPSHOT_PATH')  # defaults to backend/data/currency_rates.json
+
+    # Idempotency-Key replay for booking/payment POSTs
+    IDEMPOTENCY_DB_PATH = os.getenv('IDEMPOTENCY_DB_PATH')
+    IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', 86400))
+    IDEMPOTENCY_WAIT_SECONDS = int(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 30))
     
     # Google Maps Configuration
     GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
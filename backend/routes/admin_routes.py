@@ -2,11 +2,22 @@
 Admin Routes
 API endpoints for admin panel operations
 """
+import threading
+
 from flask import Blueprint, request, jsonify
+from config import Config
 from services.admin_service import require_auth
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
+# /notifications/stream (server-sent events)
+NOTIFICATION_STREAM_SECONDS = 60
+NOTIFICATION_HEARTBEAT_SECONDS = 15
+NOTIFICATION_RETRY_MS = 3000
+# Open streams in this process, capped at Config.NOTIFICATION_STREAM_MAX
+_notification_streams = threading.BoundedSemaphore(max(1, Config.NOTIFICATION_STREAM_MAX))
+
+
 @admin_bp.route('/login', methods=['POST'])
 def login():
     """
@@ -66,19 +77,14 @@ def get_dashboard():
 def get_bookings():
     """
     Get all bookings with filters
-    GET /api/admin/bookings?status=confirmed&limit=50&offset=0
+    GET /api/admin/bookings?status=confirmed&customer_id=&search=&from_date=&to_date=&limit=50&cursor=
     """
     try:
         from flask import current_app
+        from services.admin_listings import list_page
+        from services.pagination import page_params
         supabase = current_app.config.get('SUPABASE')
         
-        # Get query params
-        status = request.args.get('status')
-        customer_id = request.args.get('customer_id')
-        limit = int(request.args.get('limit', 50))
-        offset = int(request.args.get('offset', 0))
-        
-        # Build query
         if not supabase:
             return jsonify({
                 'success': True,
@@ -87,24 +93,12 @@ def get_bookings():
                 'message': 'Database not initialized'
             }), 200
 
-        query = supabase.table('hotel_bookings').select('*')
-        
-        if status:
-            query = query.eq('status', status)
-        
-        if customer_id:
-            query = query.eq('customer_id', customer_id)
-        
-        query = query.order('created_at', desc=True).limit(limit).offset(offset)
-        
-        result = query.execute()
+        page = list_page(supabase, 'bookings', request.args, **page_params(request.args))
         
-        return jsonify({
-            'success': True,
-            'data': result.data,
-            'count': len(result.data)
-        }), 200
+        return jsonify({'success': True, **page, 'count': len(page['data'])}), 200
         
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -504,26 +498,16 @@ def get_booking_details(booking_id):
 @admin_bp.route('/bookings/stats', methods=['GET'])
 @require_auth()
 def get_hotel_booking_stats():
-    """Get aggregate stats for hotel bookings"""
+    """Get aggregate stats for hotel bookings (from the analytics rollups)"""
     try:
         from flask import current_app
+        from services.analytics_rollups import analytics_rollups
         supabase = current_app.config.get('SUPABASE')
         
         if not supabase:
             return jsonify({'success': True, 'data': {'total': 0, 'confirmed': 0, 'pending': 0, 'cancelled': 0}}), 200
-            
-        # Overall counts
-        res = supabase.table('hotel_bookings').select('status').execute()
-        bookings = res.data or []
-        
-        stats = {
-            'total': len(bookings),
-            'confirmed': len([b for b in bookings if b['status'] == 'confirmed']),
-            'pending': len([b for b in bookings if b['status'] == 'pending']),
-            'cancelled': len([b for b in bookings if b['status'] == 'cancelled'])
-        }
         
-        return jsonify({'success': True, 'data': stats}), 200
+        return jsonify({'success': True, 'data': analytics_rollups.hotel_booking_stats(supabase)}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -648,25 +632,26 @@ def get_frontend_users():
 @admin_bp.route('/customers', methods=['GET'])
 @require_auth()
 def get_customers():
-    """Get all customers"""
+    """
+    Get all customers
+    GET /api/admin/customers?search=&status=active|inactive&limit=50&cursor=&count=estimated
+    """
     try:
         from flask import current_app
+        from services.admin_listings import list_page
+        from services.pagination import page_params
         supabase = current_app.config.get('SUPABASE')
         
-        limit = int(request.args.get('limit', 50))
-        offset = int(request.args.get('offset', 0))
-        
         if not supabase:
             return jsonify({'success': True, 'data': [], 'count': 0}), 200
 
-        result = supabase.table('customers').select('*').order('created_at', desc=True).limit(limit).offset(offset).execute()
+        page = list_page(supabase, 'customers', request.args,
+                         **page_params(request.args, default_count='estimated'))
         
-        return jsonify({
-            'success': True,
-            'data': result.data,
-            'count': len(result.data)
-        }), 200
+        return jsonify({'success': True, **page, 'count': page.get('total', len(page['data']))}), 200
         
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -918,56 +903,27 @@ def add_currency():
 @admin_bp.route('/markup/currencies/live', methods=['GET'])
 @require_auth()
 def get_live_rates():
+    """Upstream rates (1 INR = x), cached - see services/currency_rates.py"""
     try:
-        import requests
-        # Using a public API for live rates (ExchangeRate-API)
-        # Note: In production you'd use a private key
-        url = "https://api.exchangerate-api.com/v4/latest/INR"
-        response = requests.get(url)
-        rates = response.json().get('rates', {})
-        return jsonify({"success": True, "rates": rates})
+        from services.currency_rates import currency_rates
+        live = currency_rates.get_live_rates()
+        return jsonify({"success": True, "rates": live['rates'], "source": live['source'], "fetched_at": live.get('fetched_at')})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
 @admin_bp.route('/markup/currencies/update-all', methods=['POST'])
 @require_auth()
 def update_all_currencies():
+    """Write live rates into every currency now (the currency_refresh job does this hourly)"""
     try:
         from flask import current_app
-        import requests
+        from services.currency_rates import currency_rates
         supabase = current_app.config.get('SUPABASE')
-        
-        # Get live rates
-        url = "https://api.exchangerate-api.com/v4/latest/INR"
-        res = requests.get(url)
-        live_rates = res.json().get('rates', {})
-
-        # Get existing currencies
-        curr_res = supabase.table('currencies').select('id, currency_code').execute()
-        
-        updates = []
-        for c in curr_res.data:
-            code = c['currency_code']
-            if code in live_rates:
-                new_rate = 1 / live_rates[code] if live_rates[code] != 0 else 0
-                # Wait, the UI shows INR to Conversion Rate.
-                # If 1 INR = 0.012 USD, then "INR to USD" rate is 0.012.
-                # If the UI label is "INR to Conversion Rate", and for USD it shows 95.67? 
-                # Wait, screenshot 1 shows USD conversion rate as 95.67? 
-                # No, look at screenshot 1: United States | USD | 95.67? That's weird. 1 USD = 83 INR.
-                # Ah, maybe it's "Conversion Rate to INR"? 
-                # Let's check Dubai: AED | 25.97. 1 AED is ~22-23 INR. 
-                # So the rate is indeed "[Currency] to INR".
-                
-                new_rate = 1 / live_rates[code] # This gives INR per [Code] if API is "INR based"?
-                # Actually v4/latest/INR returns "1 INR = X [Code]"
-                # So if 1 INR = 0.044 AED, then 1 AED = 1/0.044 = 22.7 INR.
-                # So rate = 1 / live_rates[code]
-                
-                supabase.table('currencies').update({"conversion_rate": new_rate}).eq('id', c['id']).execute()
-                updates.append(code)
+        if not supabase:
+            return jsonify({"success": False, "message": "Database not initialized"}), 500
 
-        return jsonify({"success": True, "updated": updates})
+        result = currency_rates.refresh_currencies(supabase, force=request.args.get('force') == 'true')
+        return jsonify({"success": True, **result})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
@@ -1093,24 +1049,130 @@ def handle_markup_rule(rule_id):
 @admin_bp.route('/activity-logs', methods=['GET'])
 @require_auth(required_role=['super_admin', 'staff'])
 def get_activity_logs():
-    """Get admin activity logs"""
+    """
+    Get admin activity logs, newest first (keyset paged - pass next_cursor back as cursor)
+    GET /api/admin/activity-logs?limit=100&cursor=&admin_id=&action=a,b&target_type=&target_id=&from_date=&to_date=&search=
+    """
     try:
         from flask import current_app
+        from services.admin_listings import list_page
+        from services.pagination import page_params
         supabase = current_app.config.get('SUPABASE')
         
-        limit = int(request.args.get('limit', 100))
+        page = list_page(supabase, 'activity-logs', request.args,
+                         **page_params(request.args, default_limit=100))
         
-        result = supabase.table('activity_logs').select('*, admin_users(email, full_name)').order('created_at', desc=True).limit(limit).execute()
+        return jsonify({'success': True, **page}), 200
         
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@admin_bp.route('/email-outbox', methods=['GET'])
+@require_auth(required_role=['super_admin', 'staff'])
+def get_email_outbox():
+    """Outbox counts, provider health and recent messages (?status=queued|sending|sent|failed)"""
+    try:
+        from services.email_outbox import email_outbox
+
+        limit = min(int(request.args.get('limit', 50)), 500)
         return jsonify({
             'success': True,
-            'data': result.data
+            'stats': email_outbox.get_stats(),
+            'data': email_outbox.list_messages(status=request.args.get('status'), limit=limit)
         }), 200
-        
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@admin_bp.route('/email-outbox/<message_id>', methods=['GET'])
+@require_auth(required_role=['super_admin', 'staff'])
+def get_email_outbox_message(message_id):
+    """Delivery status of one queued email"""
+    from services.email_outbox import email_outbox
+
+    message = email_outbox.get_message(message_id)
+    if not message:
+        return jsonify({'success': False, 'error': 'Message not found'}), 404
+    return jsonify({'success': True, 'data': message}), 200
+
+
+@admin_bp.route('/email-outbox/<message_id>/retry', methods=['POST'])
+@require_auth(required_role=['super_admin', 'staff'])
+def retry_email_outbox_message(message_id):
+    """Re-queue a failed email"""
+    from services.email_outbox import email_outbox
+
+    if not email_outbox.retry(message_id):
+        return jsonify({'success': False, 'error': 'Only failed messages can be retried'}), 400
+    return jsonify({'success': True, 'data': email_outbox.get_message(message_id)}), 200
+
+
+@admin_bp.route('/newsletter/campaigns', methods=['GET'])
+@require_auth(required_role=['super_admin', 'staff'])
+def list_newsletter_campaigns():
+    """Newsletter campaigns with progress and throughput"""
+    try:
+        from services.newsletter_service import newsletter_service
+
+        limit = min(int(request.args.get('limit', 50)), 200)
+        return jsonify({'success': True, 'data': newsletter_service.list_campaigns(limit)}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@admin_bp.route('/newsletter/campaigns', methods=['POST'])
+@require_auth(required_role=['super_admin'])
+def create_newsletter_campaign():
+    """
+    Queue a newsletter to all active subscribers.
+    Body: {subject, html_body, text_body?} - Jinja templates, {{ email }} available per recipient
+    """
+    try:
+        from services.newsletter_service import newsletter_service
+
+        data = request.get_json() or {}
+        campaign = newsletter_service.create_campaign(
+            subject=data.get('subject'),
+            html_body=data.get('html_body'),
+            text_body=data.get('text_body'),
+            created_by=request.admin_user.get('admin_id')
+        )
+        return jsonify({'success': True, 'data': campaign}), 201
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@admin_bp.route('/newsletter/campaigns/<campaign_id>', methods=['GET'])
+@require_auth(required_role=['super_admin', 'staff'])
+def get_newsletter_campaign(campaign_id):
+    """Campaign progress plus the most recent failed recipients"""
+    from services.newsletter_service import newsletter_service
+
+    campaign = newsletter_service.get_campaign(campaign_id)
+    if not campaign:
+        return jsonify({'success': False, 'error': 'Campaign not found'}), 404
+    return jsonify({
+        'success': True,
+        'data': campaign,
+        'failures': newsletter_service.list_failures(campaign_id)
+    }), 200
+
+
+@admin_bp.route('/newsletter/campaigns/<campaign_id>/cancel', methods=['POST'])
+@require_auth(required_role=['super_admin'])
+def cancel_newsletter_campaign(campaign_id):
+    from services.newsletter_service import newsletter_service
+
+    if not newsletter_service.cancel_campaign(campaign_id):
+        return jsonify({'success': False, 'error': 'Campaign is not running'}), 400
+    return jsonify({'success': True, 'data': newsletter_service.get_campaign(campaign_id)}), 200
+
+
 @admin_bp.route('/reports/hotel-searches', methods=['GET'])
 @require_auth(required_role=['super_admin', 'staff', 'admin'])
 def get_hotel_search_reports():
@@ -1125,75 +1187,59 @@ def get_hotel_search_reports():
         if not supabase:
             return jsonify({'success': True, 'data': [], 'dashboard': {}, 'message': 'Database not initialized'}), 200
 
-        # Base query for table data
-        query = supabase.table('hotel_search_logs').select('*')
+        from services.admin_listings import list_page
+        from services.pagination import page_params
         
-        # Filters
         from_date = request.args.get('from_date')
-        if from_date: query = query.gte('created_at', f"{from_date}T00:00:00")
-        
         to_date = request.args.get('to_date')
-        if to_date: query = query.lte('created_at', f"{to_date}T23:59:59")
-            
-        device = request.args.get('device')
-        if device: query = query.eq('device_type', device)
-            
-        user_type = request.args.get('user_type')
-        if user_type: query = query.eq('user_type', user_type)
-            
-        destination = request.args.get('destination')
-        if destination: query = query.ilike('destination', f"%{destination}%")
-            
-        # Pagination
-        limit = int(request.args.get('limit', 100))
-        offset = int(request.args.get('offset', 0))
-        query = query.order('created_at', desc=True).limit(limit).offset(offset)
-        
-        # Execute query for data
-        result = query.execute()
-        logs = result.data or []
-        
-        # Build Dashboard Statistics
-        # We need to query overall stats. For a small dataset, we can fetch all or a large chunk, 
-        # but optimally we do a separate query or aggregation. 
-        # Since Supabase python client doesn't support complex count aggregations well, 
-        # we will fetch the last 1000 logs for dashboard generation.
-        dash_query = supabase.table('hotel_search_logs').select('*').order('created_at', desc=True).limit(1000).execute()
-        all_logs = dash_query.data or []
-        
-        from datetime import datetime
-        today_str = datetime.utcnow().strftime('%Y-%m-%d')
-        month_str = datetime.utcnow().strftime('%Y-%m')
         
-        total_today = sum(1 for log in all_logs if str(log.get('created_at', '')).startswith(today_str))
-        total_month = sum(1 for log in all_logs if str(log.get('created_at', '')).startswith(month_str))
-        mobile_count = sum(1 for log in all_logs if log.get('device_type') == 'Mobile')
-        desktop_count = sum(1 for log in all_logs if log.get('device_type') == 'Desktop')
+        # Table data, one keyset page at a time
+        page = list_page(supabase, 'search-logs', request.args,
+                         **page_params(request.args, default_limit=100))
+        logs = page['data']
         
-        # Top Cities
-        cities = {}
-        for log in all_logs:
-            city = log.get('destination', 'Unknown')
-            cities[city] = cities.get(city, 0) + 1
-        top_cities = sorted(cities.items(), key=lambda x: x[1], reverse=True)[:10]
+        # Dashboard statistics from the per-day search counters (any range, no log scan)
+        from datetime import date, datetime
+        from services.search_analytics_service import search_analytics_service
+        today = datetime.utcnow().date()
+        month_start = today.replace(day=1)
+        try:
+            range_from = date.fromisoformat(from_date) if from_date else month_start
+            range_to = date.fromisoformat(to_date) if to_date else today
+        except ValueError:
+            return jsonify({'success': False, 'error': 'from_date and to_date must be YYYY-MM-DD dates'}), 400
+        if range_from > range_to:
+            return jsonify({'success': False, 'error': 'from_date must not be after to_date'}), 400
+        
+        report = search_analytics_service.get_report(supabase, range_from, range_to)
+        if (range_from, range_to) != (month_start, today):
+            month_report = search_analytics_service.get_report(supabase, month_start, today, top=0)
+        else:
+            month_report = report
+        month_daily = month_report['daily']
         
-        # Conversion (Mock for now until checkout integration)
-        booked_count = sum(1 for log in all_logs if log.get('booking_status') == 'Booked')
-        conversion_rate = round((booked_count / len(all_logs)) * 100, 1) if all_logs else 0
+        breakdowns = report.get('breakdowns') or {}
+        devices = {item['value']: item['count'] for item in breakdowns.get('device', [])}
+        total = report.get('total') or 0
         
         dashboard = {
-            'total_today': total_today,
-            'total_month': total_month,
-            'mobile_count': mobile_count,
-            'desktop_count': desktop_count,
-            'top_cities': [{'city': k, 'count': v} for k, v in top_cities],
-            'conversion_rate': conversion_rate,
-            'total_scanned': len(all_logs)
+            'total_today': sum(d['count'] for d in month_daily if str(d['day']) == today.isoformat()),
+            'total_month': sum(d['count'] for d in month_daily),
+            'mobile_count': devices.get('Mobile', 0),
+            'desktop_count': devices.get('Desktop', 0),
+            'top_cities': [{'city': item['value'], 'count': item['count']} for item in breakdowns.get('destination', [])],
+            'total_scanned': total,
+            # Only set when the counters are missing and the log scan hit its row cap
+            'approximate': bool(report.get('approximate') or month_report.get('approximate')),
+            'from_date': range_from.isoformat(),
+            'to_date': range_to.isoformat(),
+            'breakdowns': breakdowns,
+            'daily': report.get('daily') or []
         }
         
         return jsonify({
             'success': True,
-            'data': logs,
+            **page,
             'dashboard': dashboard,
             'count': len(logs)
         }), 200
@@ -1222,50 +1268,20 @@ def get_flight_enquiries():
         if not supabase:
             return jsonify({'success': True, 'data': [], 'count': 0}), 200
         
-        query = supabase.table('flight_enquiries').select('*')
-        
-        status = request.args.get('status')
-        if status:
-            query = query.eq('status', status)
-        
-        travel_class = request.args.get('travel_class')
-        if travel_class:
-            query = query.eq('travel_class', travel_class)
+        from services.admin_listings import list_page
+        from services.pagination import page_params
         
-        trip_type = request.args.get('trip_type')
-        if trip_type:
-            query = query.eq('trip_type', trip_type)
-        
-        from_date = request.args.get('from_date')
-        if from_date:
-            query = query.gte('created_at', f"{from_date}T00:00:00")
-        
-        to_date = request.args.get('to_date')
-        if to_date:
-            query = query.lte('created_at', f"{to_date}T23:59:59")
-        
-        search = request.args.get('search')
-        if search:
-            query = query.or_(f"full_name.ilike.%{search}%,email.ilike.%{search}%,phone.ilike.%{search}%")
-        
-        limit = int(request.args.get('limit', 50))
-        offset = int(request.args.get('offset', 0))
-        
-        query = query.order('created_at', desc=True).limit(limit).offset(offset)
-        result = query.execute()
-        
-        # Get total count
-        count_query = supabase.table('flight_enquiries').select('id', count='exact')
-        if status:
-            count_query = count_query.eq('status', status)
-        count_result = count_query.execute()
+        page = list_page(supabase, 'flight-enquiries', request.args,
+                         **page_params(request.args, default_count='estimated'))
         
         return jsonify({
             'success': True,
-            'data': result.data,
-            'count': count_result.count if hasattr(count_result, 'count') else len(result.data)
+            **page,
+            'count': page.get('total', len(page['data']))
         }), 200
         
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1274,42 +1290,19 @@ def get_flight_enquiries():
 @require_auth()
 def get_flight_enquiries_stats():
     """
-    Get flight enquiry statistics
+    Get flight enquiry statistics (from the analytics rollups)
     GET /api/admin/flight-enquiries/stats
     """
     try:
         from flask import current_app
+        from services.analytics_rollups import analytics_rollups
         supabase = current_app.config.get('SUPABASE')
         
-        stats = {
-            'total': 0,
-            'today': 0,
-            'new': 0,
-            'contacted': 0,
-            'quotation_sent': 0,
-            'booked': 0,
-            'cancelled': 0
-        }
-        
         if not supabase:
+            stats = {'total': 0, 'today': 0, 'new': 0, 'contacted': 0, 'quotation_sent': 0, 'booked': 0, 'cancelled': 0}
             return jsonify({'success': True, 'data': stats}), 200
         
-        # Total
-        total_result = supabase.table('flight_enquiries').select('id', count='exact').execute()
-        stats['total'] = total_result.count if hasattr(total_result, 'count') else 0
-        
-        # Today
-        from datetime import datetime, timedelta
-        today_str = datetime.utcnow().strftime('%Y-%m-%d')
-        today_result = supabase.table('flight_enquiries').select('id', count='exact').gte('created_at', f"{today_str}T00:00:00").execute()
-        stats['today'] = today_result.count if hasattr(today_result, 'count') else 0
-        
-        # By status
-        for status_key, status_val in [('new', 'New Lead'), ('contacted', 'Contacted'), ('quotation_sent', 'Quotation Sent'), ('booked', 'Booked'), ('cancelled', 'Cancelled')]:
-            s_result = supabase.table('flight_enquiries').select('id', count='exact').eq('status', status_val).execute()
-            stats[status_key] = s_result.count if hasattr(s_result, 'count') else 0
-        
-        return jsonify({'success': True, 'data': stats}), 200
+        return jsonify({'success': True, 'data': analytics_rollups.flight_enquiry_stats(supabase)}), 200
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1382,6 +1375,66 @@ def delete_flight_enquiry(enquiry_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def stream_export(listing):
+    """Stream every filtered row of an admin listing as CSV, page by page"""
+    from datetime import datetime
+    from flask import current_app, stream_with_context
+    from config import Config
+    from services.admin_listings import LISTINGS, csv_chunks, export_columns, iter_rows
+
+    if listing not in LISTINGS:
+        return jsonify({'success': False, 'error': f'Unknown export: {listing}'}), 404
+
+    roles = LISTINGS[listing].get('roles')
+    if roles and request.admin_user.get('role') not in roles:
+        return jsonify({'success': False, 'error': 'Insufficient permissions'}), 403
+
+    supabase = current_app.config.get('SUPABASE')
+    if not supabase:
+        return jsonify({'success': False, 'error': 'Database not available'}), 500
+
+    args = request.args.to_dict()
+    columns = export_columns(listing, args.get('columns'))
+
+    def counted(pages):
+        total = 0
+        for page in pages:
+            total += len(page)
+            yield page
+        print(f"📤 Exported {total} {listing} rows")
+
+    def generate():
+        try:
+            yield from csv_chunks(counted(iter_rows(supabase, listing, args, Config.EXPORT_PAGE_SIZE)), columns)
+        except Exception as e:
+            # Headers are already sent: end the file with a row saying it is incomplete,
+            # then re-raise so the server aborts the transfer instead of finishing it cleanly
+            print(f"❌ {listing} export failed mid-stream: {e}")
+            yield f"# EXPORT INCOMPLETE - failed after a partial download: {type(e).__name__}\r\n"
+            raise
+
+    filename = f"{listing.replace('-', '_')}_{datetime.now().strftime('%Y%m%d')}.csv"
+    response = current_app.response_class(stream_with_context(generate()), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let proxies buffer the stream
+    return response
+
+
+@admin_bp.route('/export/<listing>', methods=['GET'])
+@require_auth()
+def export_listing(listing):
+    """
+    Export any admin listing as CSV, streamed
+    GET /api/admin/export/<listing>?columns=email,status&status=confirmed&from_date=2026-01-01
+
+    listing: bookings, payments, refunds, customers, activity-logs, search-logs,
+    flight-enquiries, flight-bookings, refund-management. Takes the same
+    filters as the listing endpoint.
+    """
+    return stream_export(listing)
+
+
 @admin_bp.route('/flight-enquiries/export', methods=['GET'])
 @require_auth()
 def export_flight_enquiries():
@@ -1389,68 +1442,15 @@ def export_flight_enquiries():
     Export flight enquiries as CSV
     GET /api/admin/flight-enquiries/export?format=csv
     """
-    try:
-        from flask import current_app, Response
-        import csv
-        import io
-        
-        supabase = current_app.config.get('SUPABASE')
-        if not supabase:
-            return jsonify({'success': False, 'error': 'Database not available'}), 500
-        
-        result = supabase.table('flight_enquiries').select('*').order('created_at', desc=True).execute()
-        data = result.data or []
-        
-        export_format = request.args.get('format', 'csv').lower()
-        
-        if export_format == 'csv':
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # Header
-            writer.writerow([
-                'Lead ID', 'Full Name', 'Email', 'Phone', 'Country Code',
-                'Travel Class', 'Trip Type', 'From Airport', 'From Code', 'From City',
-                'To Airport', 'To Code', 'To City', 'Departure Date', 'Return Date',
-                'Adults', 'Children', 'Infants', 'Status', 'Created At'
-            ])
-            
-            for row in data:
-                writer.writerow([
-                    row.get('id', ''),
-                    row.get('full_name', ''),
-                    row.get('email', ''),
-                    row.get('phone', ''),
-                    row.get('country_code', ''),
-                    row.get('travel_class', ''),
-                    row.get('trip_type', ''),
-                    row.get('from_airport', ''),
-                    row.get('from_airport_code', ''),
-                    row.get('from_city', ''),
-                    row.get('to_airport', ''),
-                    row.get('to_airport_code', ''),
-                    row.get('to_city', ''),
-                    row.get('departure_date', ''),
-                    row.get('return_date', ''),
-                    row.get('adults', 0),
-                    row.get('children', 0),
-                    row.get('infants', 0),
-                    row.get('status', ''),
-                    row.get('created_at', '')
-                ])
-            
-            output.seek(0)
-            return Response(
-                output.getvalue(),
-                mimetype='text/csv',
-                headers={'Content-Disposition': 'attachment; filename=flight_enquiries.csv'}
-            )
-        
-        # JSON fallback
-        return jsonify({'success': True, 'data': data}), 200
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return stream_export('flight-enquiries')
+
+
+@admin_bp.route('/flights/supplier-stats', methods=['GET'])
+@require_auth(required_role=['super_admin', 'staff'])
+def get_flight_supplier_stats():
+    """AIR iQ auth/search counters and token state (mock_fallbacks = searches served mock data)"""
+    from services.flight_service import flight_service
+    return jsonify({'success': True, 'data': flight_service.get_stats()}), 200
 
 
 # ─── Flight Bookings Admin Endpoints ─────────────────────────────────────────
@@ -1469,47 +1469,21 @@ def get_flight_bookings():
         if not supabase:
             return jsonify({'success': True, 'data': [], 'count': 0, 'message': 'Database not initialized'}), 200
 
-        status = request.args.get('status')
-        airline = request.args.get('airline')
-        trip_type = request.args.get('trip_type')
-        from_date = request.args.get('from_date')
-        to_date = request.args.get('to_date')
-        search = request.args.get('search', '').strip()
-        limit = int(request.args.get('limit', 50))
-        offset = int(request.args.get('offset', 0))
-
-        query = supabase.table('flight_bookings').select('*', count='exact')
-
-        if status:
-            query = query.eq('status', status)
-        if airline:
-            query = query.eq('airline_code', airline)
-        if trip_type and trip_type != 'all':
-            if trip_type == 'roundtrip':
-                query = query.not_.is_('return_flight_number', 'null')
-            elif trip_type in ('domestic', 'international'):
-                query = query.eq('trip_type', trip_type)
-        if from_date:
-            query = query.gte('departure_datetime', from_date)
-        if to_date:
-            query = query.lte('departure_datetime', to_date + 'T23:59:59')
-        if search:
-            # Search by booking_id, pnr, or passenger name via ilike on booking_id
-            query = query.or_(
-                f"booking_id.ilike.%{search}%,pnr.ilike.%{search}%,airline_name.ilike.%{search}%,flight_number.ilike.%{search}%"
-            )
+        from services.admin_listings import list_page
+        from services.pagination import page_params
 
-        query = query.order('created_at', desc=True).limit(limit).offset(offset)
-        result = query.execute()
+        params = page_params(request.args, default_count='estimated')
+        page = list_page(supabase, 'flight-bookings', request.args, **params)
 
         return jsonify({
             'success': True,
-            'data': result.data,
-            'count': result.count or len(result.data),
-            'limit': limit,
-            'offset': offset
+            **page,
+            'count': page.get('total', len(page['data'])),
+            'offset': params['offset']
         }), 200
 
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1517,9 +1491,10 @@ def get_flight_bookings():
 @admin_bp.route('/flight-bookings/stats', methods=['GET'])
 @require_auth()
 def get_flight_booking_stats():
-    """Get aggregate stats for flight bookings"""
+    """Get aggregate stats for flight bookings (from the analytics rollups)"""
     try:
         from flask import current_app
+        from services.analytics_rollups import analytics_rollups
         supabase = current_app.config.get('SUPABASE')
 
         if not supabase:
@@ -1531,69 +1506,7 @@ def get_flight_booking_stats():
                 }
             }), 200
 
-        # Total
-        total = 0
-        try:
-            total_res = supabase.table('flight_bookings').select('id', count='exact').execute()
-            total = total_res.count or 0
-        except Exception: pass
-
-        # Confirmed
-        confirmed = 0
-        try:
-            confirmed_res = supabase.table('flight_bookings').select('id', count='exact').eq('status', 'confirmed').execute()
-            confirmed = confirmed_res.count or 0
-        except Exception: pass
-
-        # Pending
-        pending = 0
-        try:
-            pending_res = supabase.table('flight_bookings').select('id', count='exact').eq('status', 'pending').execute()
-            pending = pending_res.count or 0
-        except Exception: pass
-
-        # Cancelled
-        cancelled = 0
-        try:
-            cancelled_res = supabase.table('flight_bookings').select('id', count='exact').eq('status', 'cancelled').execute()
-            cancelled = cancelled_res.count or 0
-        except Exception: pass
-
-        # Revenue from confirmed bookings
-        revenue = 0
-        try:
-            revenue_res = supabase.table('flight_bookings').select('total_amount').eq('status', 'confirmed').execute()
-            revenue = sum(float(b.get('total_amount', 0) or 0) for b in revenue_res.data)
-        except Exception: pass
-
-        # Domestic vs International counts
-        domestic = 0
-        try:
-            domestic_res = supabase.table('flight_bookings').select('id', count='exact').eq('trip_type', 'domestic').execute()
-            domestic = domestic_res.count or 0
-        except Exception: pass
-        international = max(0, total - domestic)
-
-        # Round trip count
-        roundtrip = 0
-        try:
-            roundtrip_res = supabase.table('flight_bookings').select('id', count='exact').not_.is_('return_flight_number', 'null').execute()
-            roundtrip = roundtrip_res.count or 0
-        except Exception: pass
-
-        return jsonify({
-            'success': True,
-            'data': {
-                'total': total,
-                'confirmed': confirmed,
-                'pending': pending,
-                'cancelled': cancelled,
-                'revenue': round(revenue, 2),
-                'domestic': domestic,
-                'international': international,
-                'roundtrip': roundtrip
-            }
-        }), 200
+        return jsonify({'success': True, 'data': analytics_rollups.flight_booking_stats(supabase)}), 200
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1895,37 +1808,26 @@ def delete_admin_user(user_id):
 @admin_bp.route('/payments', methods=['GET'])
 @require_auth()
 def get_payments():
-    """Get payment transactions from bookings"""
+    """
+    Get payment transactions from bookings
+    GET /api/admin/payments?status=&method=&limit=50&page=1 (or &cursor=)
+    """
     try:
         from flask import current_app
+        from services.admin_listings import list_page
+        from services.pagination import page_params
         supabase = current_app.config.get('SUPABASE')
         
-        status = request.args.get('status', '')
-        method = request.args.get('method', '')
-        limit = int(request.args.get('limit', 50))
-        page = int(request.args.get('page', 1))
-        offset = (page - 1) * limit
-        
-        query = supabase.table('hotel_bookings').select(
-            '*',
-            count='exact'
-        ).order('created_at', desc=True)
-        
-        if status:
-            query = query.eq('payment_status', status)
-        
-        if method:
-            query = query.eq('payment_method', method.lower())
-            
-        result = query.range(offset, offset + limit - 1).execute()
+        params = page_params(request.args, default_count='estimated')
+        page = list_page(supabase, 'payments', request.args, **params)
         
         return jsonify({
             'success': True,
-            'data': result.data,
-            'total': result.count or 0,
-            'page': page,
-            'limit': limit
+            **page,
+            'page': params['offset'] // params['limit'] + 1
         }), 200
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1933,27 +1835,26 @@ def get_payments():
 @admin_bp.route('/refunds', methods=['GET'])
 @require_auth()
 def get_refunds():
-    """Get refund records from bookings"""
+    """
+    Get refund records from bookings
+    GET /api/admin/refunds?limit=50&page=1 (or &cursor=)
+    """
     try:
         from flask import current_app
+        from services.admin_listings import list_page
+        from services.pagination import page_params
         supabase = current_app.config.get('SUPABASE')
         
-        limit = int(request.args.get('limit', 50))
-        page = int(request.args.get('page', 1))
-        offset = (page - 1) * limit
-        
-        result = supabase.table('hotel_bookings').select(
-            '*',
-            count='exact'
-        ).in_('status', ['cancelled', 'refunded']).order('created_at', desc=True).range(offset, offset + limit - 1).execute()
+        params = page_params(request.args, default_count='estimated')
+        page = list_page(supabase, 'refunds', request.args, **params)
         
         return jsonify({
             'success': True,
-            'data': result.data,
-            'total': result.count or 0,
-            'page': page,
-            'limit': limit
+            **page,
+            'page': params['offset'] // params['limit'] + 1
         }), 200
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1987,14 +1888,14 @@ def process_refund(booking_id):
             }).eq('partner_order_id', booking_id).execute()
             
         # Log activity
-        try:
-            supabase.table('activity_logs').insert({
-                'action': 'process_refund',
-                'details': f"Processed refund of {refund_amount} for booking {booking_id}",
-                'ip_address': request.remote_addr
-            }).execute()
-        except:
-            pass
+        current_app.config.get('ADMIN_SERVICE').log_activity(
+            admin_id=request.admin_user.get('admin_id'),
+            action='process_refund',
+            target_type='hotel_booking',
+            target_id=booking_id,
+            details=f"Processed refund of {refund_amount} for booking {booking_id}",
+            ip_address=request.remote_addr
+        )
             
         return jsonify({'success': True, 'data': result.data[0] if result.data else None}), 200
     except Exception as e:
@@ -2044,40 +1945,33 @@ def create_supplier():
 @admin_bp.route('/stats', methods=['GET'])
 @require_auth()
 def get_detailed_stats():
-    """Get detailed statistics for reports"""
+    """Get detailed statistics for reports (from the analytics rollups)"""
     try:
         from flask import current_app
+        from services.analytics_rollups import analytics_rollups
         supabase = current_app.config.get('SUPABASE')
         
-        # Hotel stats
-        hotels_total = supabase.table('hotel_bookings').select('id', count='exact').execute().count or 0
-        hotels_revenue = 0
-        try:
-            res = supabase.table('hotel_bookings').select('total_amount').eq('status', 'confirmed').execute()
-            hotels_revenue = sum(float(b.get('total_amount', 0) or 0) for b in res.data)
-        except: pass
-        
-        # Flight stats
-        flights_total = supabase.table('flight_bookings').select('id', count='exact').execute().count or 0
-        flights_revenue = 0
-        try:
-            res = supabase.table('flight_bookings').select('total_amount').eq('status', 'confirmed').execute()
-            flights_revenue = sum(float(b.get('total_amount', 0) or 0) for b in res.data)
-        except: pass
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'hotels': {
-                    'total': hotels_total,
-                    'revenue': round(hotels_revenue, 2)
-                },
-                'flights': {
-                    'total': flights_total,
-                    'revenue': round(flights_revenue, 2)
-                }
-            }
-        }), 200
+        return jsonify({'success': True, 'data': analytics_rollups.overview_stats(supabase)}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@admin_bp.route('/analytics/rollups/rebuild', methods=['POST'])
+@require_auth(required_role=['super_admin'])
+def rebuild_analytics_rollups():
+    """
+    Recompute the analytics rollups from the booking tables (backfill / repair)
+    POST /api/admin/analytics/rollups/rebuild
+    """
+    try:
+        from flask import current_app
+        from services.analytics_rollups import analytics_rollups
+        supabase = current_app.config.get('SUPABASE')
+
+        if not supabase:
+            return jsonify({'success': False, 'error': 'Database not initialized'}), 500
+
+        return jsonify({'success': True, 'data': analytics_rollups.rebuild(supabase)}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -2086,244 +1980,161 @@ def get_detailed_stats():
 @require_auth()
 def get_notifications():
     """
-    Get admin notifications (aggregated from recent bookings, enquiries, etc.)
+    Get admin notifications (recent bookings, contact and hotel enquiries)
     GET /api/admin/notifications?limit=20
+    GET /api/admin/notifications?since=<next_cursor>   only what's new or changed since
+
+    Served from the shared notification feed (services/notification_feed.py),
+    so polling tabs don't each re-run the source queries.
     """
     try:
         from flask import current_app
-        from datetime import datetime, timedelta
+        from services.notification_feed import notification_feed
         supabase = current_app.config.get('SUPABASE')
 
         if not supabase:
             return jsonify({'success': True, 'data': [], 'unread_count': 0}), 200
 
-        notifications = []
-        now = datetime.utcnow()
-        seven_days_ago = (now - timedelta(days=7)).isoformat()
-
-        # 1. Recent hotel bookings (last 7 days)
-        try:
-            bookings = supabase.table('hotel_bookings').select(
-                'id, partner_order_id, hotel_name, status, total_amount, currency, customer_email, created_at'
-            ).gte('created_at', seven_days_ago).order('created_at', desc=True).limit(10).execute()
-
-            for b in bookings.data:
-                status = b.get('status', 'unknown')
-                icon = 'fa-check-circle'
-                ntype = 'success'
-                if status == 'failed':
-                    icon = 'fa-times-circle'
-                    ntype = 'error'
-                elif status == 'created':
-                    icon = 'fa-clock'
-                    ntype = 'warning'
-                elif status == 'unknown':
-                    icon = 'fa-question-circle'
-                    ntype = 'warning'
-
-                amount = f"{b.get('currency', 'USD')} {float(b.get('total_amount', 0)):,.0f}"
-                notifications.append({
-                    'id': f"booking_{b['id'][:8]}",
-                    'type': ntype,
-                    'icon': icon,
-                    'category': 'booking',
-                    'title': f"Hotel Booking {status.capitalize()}",
-                    'message': f"{b.get('hotel_name', 'Hotel')} — {amount}",
-                    'link': f"booking-details.html?id={b['id']}",
-                    'time': b['created_at'],
-                    'read': False
-                })
-        except Exception as e:
-            print(f"Notification: bookings fetch error: {e}")
-
-        # 2. Recent contact enquiries (last 7 days)
-        try:
-            contacts = supabase.table('contact_messages').select(
-                'id, name, email, message, created_at'
-            ).gte('created_at', seven_days_ago).order('created_at', desc=True).limit(5).execute()
-
-            for c in contacts.data:
-                notifications.append({
-                    'id': f"contact_{c['id']}",
-                    'type': 'info',
-                    'icon': 'fa-envelope',
-                    'category': 'enquiry',
-                    'title': 'New Contact Enquiry',
-                    'message': f"From {c.get('name', 'Unknown')} — {(c.get('message', '')[:60] + '...') if len(c.get('message', '')) > 60 else c.get('message', '')}",
-                    'link': 'contact-enquiry.html',
-                    'time': c['created_at'],
-                    'read': False
-                })
-        except Exception as e:
-            print(f"Notification: contacts fetch error: {e}")
-
-        # 3. Recent hotel enquiries (last 7 days)
+        since = request.args.get('since')
         try:
-            enquiries = supabase.table('quote_requests').select(
-                'id, name, destination, travel_date, created_at'
-            ).eq('travel_type', 'hotel').gte('created_at', seven_days_ago).order('created_at', desc=True).limit(5).execute()
-
-            for q in enquiries.data:
-                notifications.append({
-                    'id': f"enquiry_{q['id']}",
-                    'type': 'info',
-                    'icon': 'fa-bed',
-                    'category': 'enquiry',
-                    'title': 'New Hotel Enquiry',
-                    'message': f"From {q.get('name', 'Unknown')} for {q.get('destination', 'N/A')}",
-                    'link': 'hotel-enquiry.html',
-                    'time': q['created_at'],
-                    'read': False
-                })
-        except Exception as e:
-            print(f"Notification: enquiries fetch error: {e}")
-
-        # Sort all notifications by time (newest first)
-        notifications.sort(key=lambda x: x.get('time', ''), reverse=True)
-
-        # Check read status from localStorage on client side — mark unread count
-        limit = int(request.args.get('limit', 20))
-        notifications = notifications[:limit]
+            feed = notification_feed.get_feed(supabase, since=since, limit=request.args.get('limit', 20, type=int))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
 
         return jsonify({
             'success': True,
-            'data': notifications,
-            'unread_count': len(notifications)
+            'data': feed['data'],
+            'next_cursor': feed['next_cursor'],
+            'incremental': bool(since),
+            'unread_count': len(feed['data'])
         }), 200
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@admin_bp.route('/notifications/stream', methods=['GET'])
+@require_auth()
+def stream_notifications():
+    """
+    Notifications pushed as server-sent events
+    GET /api/admin/notifications/stream?since=<next_cursor>
+
+        notifications  {"data": [...], "next_cursor": "..."} whenever something is new or changed
+        heartbeat      every NOTIFICATION_HEARTBEAT_SECONDS while nothing changes
+
+    The event id is the cursor, so a reconnect resumes from Last-Event-ID.
+    Streams close after NOTIFICATION_STREAM_SECONDS so they don't pin a worker
+    thread; clients reconnect. Each open stream holds a request thread, so
+    only NOTIFICATION_STREAM_MAX run per process - past that (or with it set
+    to 0) this returns 503 and the admin panel polls /notifications instead.
+    Auth is the Authorization header, as for every
+    admin endpoint, so browsers read this with fetch() rather than EventSource.
+    """
+    import json
+    import time
+    from flask import current_app, stream_with_context
+    from services.notification_feed import notification_feed
+
+    supabase = current_app.config.get('SUPABASE')
+    if not supabase:
+        return jsonify({'success': False, 'error': 'Database not available'}), 500
+
+    if Config.NOTIFICATION_STREAM_MAX <= 0 or not _notification_streams.acquire(blocking=False):
+        response = jsonify({
+            'success': False,
+            'error': 'Live notifications are busy, poll /notifications instead',
+            'error_code': 'STREAMS_BUSY'
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+
+    released = threading.Event()
+
+    def release_stream():
+        if not released.is_set():
+            released.set()
+            _notification_streams.release()
+
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        first = notification_feed.get_feed(supabase, since=since)
+    except ValueError as e:
+        release_stream()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception:
+        release_stream()
+        raise
+
+    def sse(event, payload, event_id=None):
+        id_line = f"id: {event_id}\n" if event_id else ""
+        return f"{id_line}event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+    def generate():
+        yield f"retry: {NOTIFICATION_RETRY_MS}\n\n"
+        feed = first
+        deadline = time.monotonic() + NOTIFICATION_STREAM_SECONDS
+        last_sent = time.monotonic()
+        while True:
+            # Without a cursor the first event is the current list (and its cursor), even if empty
+            if feed['data'] or (feed is first and not since):
+                yield sse('notifications', feed, feed['next_cursor'])
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= NOTIFICATION_HEARTBEAT_SECONDS:
+                yield sse('heartbeat', {})
+                last_sent = time.monotonic()
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            notification_feed.wait_for_change(min(notification_feed.cache_seconds, remaining))
+            try:
+                feed = notification_feed.get_feed(supabase, since=feed['next_cursor'])
+            except Exception as e:
+                print(f"⚠️ Notification stream stopped: {e}")
+                return
+
+    response = current_app.response_class(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let proxies buffer the stream
+    response.call_on_close(release_stream)
+    return response
+
+
 # ── Refund Management System Endpoints ──
 
 @admin_bp.route('/refund-management/bookings', methods=['GET'])
 @require_auth()
 def get_refund_management_bookings():
-    """Get all bookings (hotel and flight) for refund management"""
+    """
+    Bookings (hotel and flight) for refund management, newest first, one page at a time
+    GET /api/admin/refund-management/bookings?status=&payment_method=&search=&type=hotel|flight&from_date=&to_date=&limit=50&cursor=
+    """
     try:
         from flask import current_app
+        from services.refund_listing import refund_listing
         supabase = current_app.config.get('SUPABASE')
         
         if not supabase:
             return jsonify({'success': False, 'error': 'Database not initialized'}), 500
-            
-        status_filter = request.args.get('status')
-        payment_filter = request.args.get('payment_method')
-        search_keyword = request.args.get('search')
-        
-        # 1. Fetch hotel bookings
-        hotel_res = supabase.table('hotel_bookings').select('*').execute()
-        hotels = hotel_res.data or []
-        
-        # 2. Fetch flight bookings
-        flight_res = supabase.table('flight_bookings').select('*').execute()
-        flights = flight_res.data or []
-        
-        merged_bookings = []
         
-        # Parse Hotels
-        for h in hotels:
-            r_status = h.get('refund_status') or 'Not Requested'
-            
-            # Map guest name
-            guest_name = '—'
-            if h.get('guests') and isinstance(h['guests'], list) and len(h['guests']) > 0:
-                g = h['guests'][0]
-                if isinstance(g, dict):
-                    guest_name = f"{g.get('first_name', '')} {g.get('last_name', '')}".strip() or '—'
-            elif h.get('customer_name'):
-                guest_name = h['customer_name']
-                
-            check_in_str = h.get('check_in') or ''
-            details = f"{h.get('hotel_name', 'Hotel')} ({check_in_str})"
-            
-            merged_bookings.append({
-                'id': h['id'],
-                'booking_id': h.get('partner_order_id') or h.get('booking_id') or h['id'],
-                'booking_type': 'hotel',
-                'customer_name': guest_name,
-                'email': h.get('customer_email') or '—',
-                'phone': h.get('customer_phone') or '—',
-                'details': details,
-                'amount': float(h.get('total_amount') or 0),
-                'refund_amount': float(h.get('refund_amount') or 0) if h.get('refund_amount') else None,
-                'payment_method': h.get('payment_method') or '—',
-                'booking_date': h.get('created_at'),
-                'refund_status': r_status,
-                'refund_method': h.get('refund_method') or '—',
-                'status': h.get('status', 'unknown')
-            })
-            
-        # Parse Flights
-        for f in flights:
-            r_status = f.get('refund_status') or 'Not Requested'
-            
-            guest_name = '—'
-            import json
-            passengers = f.get('passengers')
-            if passengers:
-                try:
-                    if isinstance(passengers, str):
-                        passengers = json.loads(passengers)
-                    if isinstance(passengers, list) and len(passengers) > 0:
-                        g = passengers[0]
-                        if isinstance(g, dict):
-                            guest_name = f"{g.get('first_name', '')} {g.get('last_name', '')}".strip() or g.get('name') or '—'
-                except:
-                    pass
-            if guest_name == '—' and f.get('passenger_name'):
-                guest_name = f['passenger_name']
-                
-            dep_date = f.get('departure_datetime') or ''
-            if dep_date:
-                dep_date = dep_date.split('T')[0]
-            details = f"{f.get('airline_name', 'Airline')} {f.get('origin_code', '')}-{f.get('destination_code', '')} ({dep_date})"
-            
-            merged_bookings.append({
-                'id': f['id'],
-                'booking_id': f.get('booking_id') or f['id'],
-                'booking_type': 'flight',
-                'customer_name': guest_name,
-                'email': f.get('passenger_email') or f.get('customer_email') or '—',
-                'phone': f.get('passenger_phone') or f.get('customer_phone') or '—',
-                'details': details,
-                'amount': float(f.get('total_amount') or 0),
-                'refund_amount': float(f.get('refund_amount') or 0) if f.get('refund_amount') else None,
-                'payment_method': f.get('payment_method') or '—',
-                'booking_date': f.get('created_at'),
-                'refund_status': r_status,
-                'refund_method': f.get('refund_method') or '—',
-                'status': f.get('status', 'unknown')
-            })
-            
-        # Filters
-        if status_filter:
-            sf = status_filter.lower().replace('_', ' ')
-            if sf == 'not requested':
-                merged_bookings = [b for b in merged_bookings if b['refund_status'].lower() in ['not requested', 'null', '—', '']]
-            else:
-                merged_bookings = [b for b in merged_bookings if b['refund_status'].lower() == sf]
-                
-        if payment_filter:
-            pf = payment_filter.lower()
-            merged_bookings = [b for b in merged_bookings if pf in b['payment_method'].lower()]
-            
-        if search_keyword:
-            sk = search_keyword.lower()
-            merged_bookings = [b for b in merged_bookings if (
-                sk in b['booking_id'].lower() or
-                sk in b['customer_name'].lower() or
-                sk in b['email'].lower()
-            )]
-            
-        merged_bookings.sort(key=lambda x: x['booking_date'] or '', reverse=True)
+        try:
+            result = refund_listing.list_bookings(
+                supabase,
+                status=request.args.get('status'),
+                payment_method=request.args.get('payment_method'),
+                search=request.args.get('search'),
+                booking_type=request.args.get('type'),
+                from_date=request.args.get('from_date'),
+                to_date=request.args.get('to_date'),
+                limit=request.args.get('limit', 50, type=int),
+                cursor=request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        return jsonify({
-            'success': True,
-            'data': merged_bookings,
-            'total': len(merged_bookings)
-        }), 200
+        return jsonify({'success': True, **result}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
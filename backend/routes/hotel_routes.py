@@ -2,124 +2,37 @@
 C2C Journeys - Hotel Routes
 API routes for hotel search and booking
 """
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
 from services.etg_service import etg_service
 from services.supabase_service import supabase_service
 from services.google_maps_service import google_maps_service
+from services.hotel_facet_service import search_snapshot_store, parse_facet_filters
+from services.search_analytics_service import search_analytics_service
+from services.booking_status_poller import booking_status_poller, booking_row_state
+from services.booking_jobs import get_booking_fulfillment
+from services.idempotency_service import idempotent
+from services.currency_rates import currency_rates
 from typing import List, Dict, Optional
 import requests
 import json
+import random
 from datetime import datetime
 import time
 import os
+import threading
 import uuid
+import copy
 from routes.cancellation_helper import format_cancellation_policies
+from config import Config
 
 def log_customer_hotel_search(search_type: str, search_details: str, request_data: dict = None):
-    """Log comprehensive hotel search analytics to hotel_search_logs table"""
+    """
+    Queue comprehensive hotel search analytics for hotel_search_logs.
+    Non-blocking: identity lookup and the insert run on a background writer.
+    """
     try:
-        from flask import current_app, request
-        import re
-        
-        supabase = current_app.config.get('SUPABASE')
-        if not supabase:
-            return
-
-        # 1. Identity extraction
-        token = request.headers.get('Authorization', '').replace('Bearer ', '')
-        user_identity = "Guest"
-        user_email = None
-        user_id = None
-        
-        if token:
-            try:
-                user_res = supabase.auth.get_user(token)
-                if user_res and user_res.user:
-                    user_id = user_res.user.id
-                    user_email = user_res.user.email
-                    user_identity = "Registered User"
-            except:
-                pass
-
-        # 2. Network & Location
-        ip_address = request.headers.get('X-Forwarded-For', request.remote_addr)
-        if ip_address and ',' in ip_address:
-            ip_address = ip_address.split(',')[0].strip()
-            
-        country = request.headers.get('CF-IPCountry', 'Unknown')
-        
-        # 3. Device & Browser (Using Werkzeug UserAgent parsing if available, or basic regex)
-        ua_string = request.headers.get('User-Agent', '')
-        
-        # Simple Device Inference
-        device_type = 'Desktop'
-        ua_lower = ua_string.lower()
-        if any(keyword in ua_lower for keyword in ['mobi', 'android', 'iphone', 'ipad', 'ipod']):
-            device_type = 'Mobile'
-        if 'ipad' in ua_lower or 'tablet' in ua_lower:
-            device_type = 'Tablet'
-            
-        # Parse OS
-        operating_system = 'Unknown'
-        if 'windows' in ua_lower: operating_system = 'Windows'
-        elif 'mac os' in ua_lower or 'macos' in ua_lower: operating_system = 'macOS'
-        elif 'android' in ua_lower: operating_system = 'Android'
-        elif 'iphone' in ua_lower or 'ipad' in ua_lower: operating_system = 'iOS'
-        elif 'linux' in ua_lower: operating_system = 'Linux'
-        
-        # Parse Browser
-        browser = 'Unknown'
-        if 'edg/' in ua_lower: browser = 'Edge'
-        elif 'chrome/' in ua_lower and 'edg/' not in ua_lower: browser = 'Chrome'
-        elif 'safari/' in ua_lower and 'chrome/' not in ua_lower: browser = 'Safari'
-        elif 'firefox/' in ua_lower: browser = 'Firefox'
-        
-        # 4. Search Data Extraction
-        req = request_data or {}
-        
-        destination = req.get('destination') or str(req.get('region_id')) or str(req.get('latitude')) or 'Unknown'
-        checkin = req.get('checkin')
-        checkout = req.get('checkout')
-        
-        # Calculate nights if dates present
-        nights = 0
-        if checkin and checkout:
-            try:
-                from datetime import datetime
-                d1 = datetime.strptime(checkin, "%Y-%m-%d")
-                d2 = datetime.strptime(checkout, "%Y-%m-%d")
-                nights = (d2 - d1).days
-            except:
-                pass
-                
-        rooms = len(req.get('rooms', [])) if req.get('rooms') else 1
-        adults = req.get('adults', 0)
-        children_ages = req.get('children_ages', [])
-        children_count = len(children_ages)
-        
-        # 5. Insert Log
-        log_entry = {
-            'destination': destination,
-            'checkin': checkin,
-            'checkout': checkout,
-            'nights': nights,
-            'rooms': rooms,
-            'adults': adults,
-            'children': children_count,
-            'child_ages': children_ages,
-            'device_type': device_type,
-            'browser': browser,
-            'operating_system': operating_system,
-            'ip_address': ip_address,
-            'country': country,
-            'user_id': user_id,
-            'user_type': user_identity,
-            'email': user_email,
-            'search_type': search_type
-        }
-        
-        supabase.table('hotel_search_logs').insert(log_entry).execute()
-        
+        if not search_analytics_service.log_search(search_type, request.headers, request.remote_addr, request_data):
+            print(f"⚠️ Search log queue full - dropped {search_type} search log")
     except Exception as e:
         print(f"Failed to log customer hotel search: {e}")
 
@@ -131,6 +44,21 @@ hotel_bp = Blueprint('hotels', __name__, url_prefix='/api/hotels')
 # ==========================================
 COMMISSION_RATE = 0.15  # 15% Markup
 
+# /book/poll long-poll bounds (seconds) - keeps request threads free while
+# the background poller waits on ETG
+BOOK_POLL_DEFAULT_WAIT = 3
+BOOK_POLL_MAX_WAIT = 5
+
+# /book/events stream window, heartbeat and client reconnect delay
+BOOK_EVENTS_STREAM_SECONDS = 30
+BOOK_EVENTS_HEARTBEAT_SECONDS = 10
+BOOK_EVENTS_RETRY_MS = 1000
+# Open /book/events streams in this process, capped at Config.BOOK_EVENTS_STREAM_MAX
+_booking_event_streams = threading.BoundedSemaphore(max(1, Config.BOOK_EVENTS_STREAM_MAX))
+
+# booking_status_poller status -> /book/status response status
+TRACKED_STATUS_MAP = {'processing': 'pending', 'pending': 'pending', 'confirmed': 'confirmed', 'failed': 'failed'}
+
 # ==========================================
 # DEBUG ENDPOINT (Temporary) - v3.0 Brevo
 # ==========================================
@@ -650,6 +578,246 @@ def search_by_hotel_ids():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# Destinations with ETG region IDs (universal across sandbox & production)
+POPULAR_DESTINATIONS = {
+    # WELL-KNOWN DESTINATIONS
+    'paris': {'latitude': 48.8566, 'longitude': 2.3522, 'region_id': 2734, 'name': 'Paris'},
+    'dubai': {'latitude': 25.2048, 'longitude': 55.2708, 'region_id': 6053839, 'name': 'Dubai'},
+    'moscow': {'latitude': 55.7558, 'longitude': 37.6173, 'region_id': 2395, 'name': 'Moscow'},
+    
+    # INDIAN DESTINATIONS
+    'goa': {'latitude': 15.2993, 'longitude': 74.1240, 'region_id': 6308855, 'name': 'Goa'},
+    'delhi': {'latitude': 28.6139, 'longitude': 77.2090, 'region_id': 6308838, 'name': 'New Delhi'},
+    'mumbai': {'latitude': 19.0760, 'longitude': 72.8777, 'region_id': 6308862, 'name': 'Mumbai'},
+    'bangalore': {'latitude': 12.9716, 'longitude': 77.5946, 'region_id': 6308822, 'name': 'Bangalore'},
+    'bengaluru': {'latitude': 12.9716, 'longitude': 77.5946, 'region_id': 6308822, 'name': 'Bangalore'},
+    'chennai': {'latitude': 13.0827, 'longitude': 80.2707, 'region_id': 6308834, 'name': 'Chennai'},
+    'kolkata': {'latitude': 22.5726, 'longitude': 88.3639, 'region_id': 6308856, 'name': 'Kolkata'},
+    'jaipur': {'latitude': 26.9124, 'longitude': 75.7873, 'region_id': 6308849, 'name': 'Jaipur'},
+    'udaipur': {'latitude': 24.5854, 'longitude': 73.7125, 'region_id': 6308883, 'name': 'Udaipur'},
+    'agra': {'latitude': 27.1767, 'longitude': 78.0081, 'region_id': 6308815, 'name': 'Agra'},
+    'hyderabad': {'latitude': 17.3850, 'longitude': 78.4867, 'region_id': 6308846, 'name': 'Hyderabad'},
+    'pune': {'latitude': 18.5204, 'longitude': 73.8567, 'region_id': 6308870, 'name': 'Pune'},
+    'kerala': {'latitude': 10.8505, 'longitude': 76.2711, 'region_id': 6308854, 'name': 'Kerala'},
+    'kochi': {'latitude': 9.9312, 'longitude': 76.2673, 'region_id': 6308855, 'name': 'Kochi'},
+    'manali': {'latitude': 32.2396, 'longitude': 77.1887, 'region_id': 6308859, 'name': 'Manali'},
+    'shimla': {'latitude': 31.1048, 'longitude': 77.1734, 'region_id': 6308876, 'name': 'Shimla'},
+    'rishikesh': {'latitude': 30.0869, 'longitude': 78.2676, 'region_id': 6308872, 'name': 'Rishikesh'},
+    'varanasi': {'latitude': 25.3176, 'longitude': 82.9739, 'region_id': 6308885, 'name': 'Varanasi'},
+    'amritsar': {'latitude': 31.6340, 'longitude': 74.8723, 'region_id': 6308818, 'name': 'Amritsar'},
+    'darjeeling': {'latitude': 27.0410, 'longitude': 88.2663, 'region_id': 6308837, 'name': 'Darjeeling'},
+    'ooty': {'latitude': 11.4102, 'longitude': 76.6950, 'region_id': 6308866, 'name': 'Ooty'},
+    
+    # INTERNATIONAL DESTINATIONS
+    'los angeles': {
+        'latitude': 34.0522, 
+        'longitude': -118.2437, 
+        'name': 'Los Angeles', 
+        'region_id': 2011
+    },
+    'miami': {'latitude': 25.7617, 'longitude': -80.1918, 'region_id': 2348, 'name': 'Miami'},
+    'miami, florida': {'latitude': 25.7617, 'longitude': -80.1918, 'region_id': 2348, 'name': 'Miami'},
+    'miami beach': {'latitude': 25.7907, 'longitude': -80.1300, 'region_id': 2348, 'name': 'Miami Beach'},
+    'orlando': {'latitude': 28.5383, 'longitude': -81.3792, 'region_id': 2642, 'name': 'Orlando'},
+    'las vegas': {'latitude': 36.1699, 'longitude': -115.1398, 'region_id': 2008, 'name': 'Las Vegas'},
+    'chicago': {'latitude': 41.8781, 'longitude': -87.6298, 'region_id': 1146, 'name': 'Chicago'},
+    'san francisco': {'latitude': 37.7749, 'longitude': -122.4194, 'region_id': 3012, 'name': 'San Francisco'},
+    'london': {'latitude': 51.5074, 'longitude': -0.1278, 'region_id': 2114, 'name': 'London'},
+    'new york': {'latitude': 40.7128, 'longitude': -74.0060, 'region_id': 2621, 'name': 'New York'},
+    'singapore': {'latitude': 1.3521, 'longitude': 103.8198, 'region_id': 6054984, 'name': 'Singapore'},
+    'bangkok': {'latitude': 13.7563, 'longitude': 100.5018, 'region_id': 6055058, 'name': 'Bangkok'},
+    'tokyo': {'latitude': 35.6762, 'longitude': 139.6503, 'region_id': 6055073, 'name': 'Tokyo'},
+    'bali': {'latitude': -8.3405, 'longitude': 115.0920, 'region_id': 6046530, 'name': 'Bali'},
+    'maldives': {'latitude': 3.2028, 'longitude': 73.2207, 'region_id': 6308902, 'name': 'Maldives'},
+    'rome': {'latitude': 41.9028, 'longitude': 12.4964, 'region_id': 2622, 'name': 'Rome'},
+    'istanbul': {'latitude': 41.0082, 'longitude': 28.9784, 'region_id': 6055085, 'name': 'Istanbul'},
+}
+
+def resolve_search_destination(data):
+    """
+    Resolve a destination name to an ETG region_id (or hotel IDs when the
+    user typed a hotel name).
+    
+    Strategy: Try hardcoded fast-path first, then ALWAYS
+    fall back to RateHawk multicomplete API for ANY destination.
+    
+    Returns { region_id, hotel_ids, location_name, suggest_result }
+    """
+    destination = data['destination'].lower().strip()
+    region_id = data.get('region_id')
+    location_name = data['destination']
+    hotel_ids_to_search = None
+    suggest_result = None
+    
+    # 1a. Fast-path lookup for popular destinations (skip multicomplete API round-trip)
+    if not region_id and destination in POPULAR_DESTINATIONS:
+        pop = POPULAR_DESTINATIONS[destination]
+        if pop.get('region_id'):
+            region_id = pop.get('region_id')
+            location_name = pop.get('name', location_name)
+            print(f"⚡ Fast-path resolved popular destination '{destination}' -> region_id {region_id}")
+
+    # 1b. PRIMARY: Resolve ANY destination worldwide via RateHawk multicomplete API
+    if not region_id:
+        print(f"🌍 Resolving '{data['destination']}' via RateHawk multicomplete API...")
+        try:
+            suggest_result = etg_service.suggest(data['destination'], 'en')
+            if suggest_result.get('success') and suggest_result.get('data'):
+                suggest_data = suggest_result['data'].get('data', suggest_result['data'])
+                regions = suggest_data.get('regions', [])
+                hotels = suggest_data.get('hotels', [])
+                
+                if regions:
+                    best_region = regions[0]
+                    region_id = best_region.get('id')
+                    location_name = best_region.get('name', data['destination'])
+                    print(f"✅ Resolved via multicomplete: {location_name}, Region ID: {region_id}")
+                elif hotels:
+                    # User typed a hotel name directly
+                    hotel_ids_to_search = [h.get('id') for h in hotels[:10] if h.get('id')]
+                    location_name = hotels[0].get('name', data['destination'])
+                    print(f"✅ Resolved as hotel name: {location_name}, Hotel IDs: {hotel_ids_to_search[:3]}...")
+        except Exception as e:
+            print(f"⚠️ Multicomplete resolution failed: {e}")
+    
+    return {
+        'region_id': region_id,
+        'hotel_ids': hotel_ids_to_search,
+        'location_name': location_name,
+        'suggest_result': suggest_result
+    }
+
+
+def unresolved_destination_error(data, resolved):
+    """(payload, status) for a destination that could not be resolved"""
+    print(f"🛑 Could not resolve destination: '{data['destination']}'")
+    # If RateHawk multicomplete actually returned an API error (like 403), surface it!
+    error_msg = "Could not find destination. Please check the spelling."
+    suggest_result = resolved.get('suggest_result')
+    if suggest_result is not None and not suggest_result.get('success'):
+        error_msg = f"RateHawk Multicomplete API Error: {suggest_result.get('error', 'Unknown Error')}"
+        print(f"⚠️ {error_msg}")
+        return {'success': False, 'error': error_msg}, 400
+
+    return {
+        'success': False,
+        'error': error_msg,
+        'hotels': [],
+        'source': 'none'
+    }, 404
+
+
+def run_destination_serp(data, resolved, guests, api_currency):
+    """
+    Call /search/serp/hotels/ or /search/serp/region/ for a resolved destination,
+    retrying once with a fresh multicomplete region_id if ETG rejects the region.
+    
+    Returns (result, region_id, error) where error is a (payload, status) tuple
+    when the search failed and should be returned to the client as-is.
+    """
+    region_id = resolved['region_id']
+    
+    if resolved['hotel_ids']:
+        result = etg_service.search_by_hotels(
+            hotel_ids=resolved['hotel_ids'],
+            checkin=data['checkin'],
+            checkout=data['checkout'],
+            rooms=guests,
+            currency=api_currency,
+            residency=data.get('residency', 'gb')
+        )
+    else:
+        result = etg_service.search_by_region(
+            region_id=region_id,
+            checkin=data['checkin'],
+            checkout=data['checkout'],
+            rooms=guests,
+            currency=api_currency,
+            residency=data.get('residency', 'gb')
+        )
+    
+    if not (result.get('status') == 'error' or not result.get('success', True)):
+        return result, region_id, None
+    
+    # Handle errors with smart retry
+    error_msg = result.get('error', 'Unknown API error')
+    if 'data' in result and isinstance(result['data'], dict):
+        debug = result['data'].get('debug', {})
+        if debug.get('validation_error'):
+            error_msg = debug['validation_error']
+    
+    print(f"❌ RateHawk search error: {error_msg}")
+    
+    # If region_id was invalid, try re-resolving via multicomplete
+    if 'region' in str(error_msg).lower() or 'invalid' in str(error_msg).lower():
+        print(f"🔄 Retrying with dynamic region_id from multicomplete API...")
+        try:
+            suggest_result = etg_service.suggest(data['destination'], 'en')
+            if suggest_result.get('success') and suggest_result.get('data'):
+                suggest_data = suggest_result['data'].get('data', suggest_result['data'])
+                regions = suggest_data.get('regions', [])
+                if regions:
+                    new_region_id = regions[0].get('id')
+                    if new_region_id and new_region_id != region_id:
+                        print(f"✅ Got new region_id {new_region_id} (old was {region_id}), retrying search...")
+                        region_id = new_region_id
+                        result = etg_service.search_by_region(
+                            region_id=region_id,
+                            checkin=data['checkin'],
+                            checkout=data['checkout'],
+                            rooms=guests,
+                            currency=api_currency,
+                            residency=data.get('residency', 'gb')
+                        )
+                        if result.get('status') == 'error' or not result.get('success', True):
+                            print(f"❌ Retry also failed: {result.get('error', 'Unknown')}")
+                        else:
+                            print(f"✅ Retry succeeded with new region_id {new_region_id}")
+        except Exception as e:
+            print(f"⚠️ Dynamic region resolution failed: {e}")
+    
+    # If it's a date validation error, return early with helpful message
+    if any(kw in str(error_msg).lower() for kw in ['checkin', 'checkout', 'date']):
+        return result, region_id, ({
+            'success': False, 
+            'error': f"Search failed: {error_msg}. Please check your dates and try again."
+        }, 400)
+        
+    # For all other RateHawk API errors (like 403 Forbidden, 401 Unauthorized, etc.)
+    # we MUST return an HTTP error so the frontend can display the actual reason
+    # it failed, rather than silently pretending there are 0 hotels.
+    return result, region_id, ({
+        'success': False,
+        'error': f"RateHawk API Error: {error_msg}"
+    }, 400)
+
+
+def search_nights(data):
+    """Number of nights between checkin and checkout (defaults to 1)"""
+    try:
+        d1 = datetime.strptime(data['checkin'], '%Y-%m-%d')
+        d2 = datetime.strptime(data['checkout'], '%Y-%m-%d')
+        return (d2 - d1).days
+    except:
+        return 1
+
+
+def store_search_snapshot(transformed_hotels, etg_hotels, location, data, nights, use_block_markup):
+    """
+    Keep a server-side snapshot so the results page can filter/page
+    via /search/<search_id>/results instead of holding every hotel,
+    and so /search/<search_id>/hotels/<hotel_id>/rates can reuse the SERP
+    """
+    return search_snapshot_store.put(transformed_hotels, context={
+        'location': location,
+        'currency': data.get('currency', 'USD'),
+        'conversion_rates': currency_rates.get_conversion_rates(),
+        'nights': nights,
+        'use_block_markup': use_block_markup,
+        'raw_hotels': {(h.get('hotel_id') or h.get('id')): h for h in etg_hotels}
+    })
+
+
 @hotel_bp.route('/search/destination', methods=['POST'])
 def search_by_destination():
     """
@@ -664,72 +832,10 @@ def search_by_destination():
         "adults": 2,
         "radius": 10000
     }
-    """
-    # Destinations with ETG region IDs (universal across sandbox & production)
-    POPULAR_DESTINATIONS = {
-        # WELL-KNOWN DESTINATIONS
-        'paris': {'latitude': 48.8566, 'longitude': 2.3522, 'region_id': 2734, 'name': 'Paris'},
-        'dubai': {'latitude': 25.2048, 'longitude': 55.2708, 'region_id': 6053839, 'name': 'Dubai'},
-        'moscow': {'latitude': 55.7558, 'longitude': 37.6173, 'region_id': 2395, 'name': 'Moscow'},
-        
-        # INDIAN DESTINATIONS
-        'goa': {'latitude': 15.2993, 'longitude': 74.1240, 'region_id': 6308855, 'name': 'Goa'},
-        'delhi': {'latitude': 28.6139, 'longitude': 77.2090, 'region_id': 6308838, 'name': 'New Delhi'},
-        'mumbai': {'latitude': 19.0760, 'longitude': 72.8777, 'region_id': 6308862, 'name': 'Mumbai'},
-        'bangalore': {'latitude': 12.9716, 'longitude': 77.5946, 'region_id': 6308822, 'name': 'Bangalore'},
-        'bengaluru': {'latitude': 12.9716, 'longitude': 77.5946, 'region_id': 6308822, 'name': 'Bangalore'},
-        'chennai': {'latitude': 13.0827, 'longitude': 80.2707, 'region_id': 6308834, 'name': 'Chennai'},
-        'kolkata': {'latitude': 22.5726, 'longitude': 88.3639, 'region_id': 6308856, 'name': 'Kolkata'},
-        'jaipur': {'latitude': 26.9124, 'longitude': 75.7873, 'region_id': 6308849, 'name': 'Jaipur'},
-        'udaipur': {'latitude': 24.5854, 'longitude': 73.7125, 'region_id': 6308883, 'name': 'Udaipur'},
-        'agra': {'latitude': 27.1767, 'longitude': 78.0081, 'region_id': 6308815, 'name': 'Agra'},
-        'hyderabad': {'latitude': 17.3850, 'longitude': 78.4867, 'region_id': 6308846, 'name': 'Hyderabad'},
-        'pune': {'latitude': 18.5204, 'longitude': 73.8567, 'region_id': 6308870, 'name': 'Pune'},
-        'kerala': {'latitude': 10.8505, 'longitude': 76.2711, 'region_id': 6308854, 'name': 'Kerala'},
-        'kochi': {'latitude': 9.9312, 'longitude': 76.2673, 'region_id': 6308855, 'name': 'Kochi'},
-        'manali': {'latitude': 32.2396, 'longitude': 77.1887, 'region_id': 6308859, 'name': 'Manali'},
-        'shimla': {'latitude': 31.1048, 'longitude': 77.1734, 'region_id': 6308876, 'name': 'Shimla'},
-        'rishikesh': {'latitude': 30.0869, 'longitude': 78.2676, 'region_id': 6308872, 'name': 'Rishikesh'},
-        'varanasi': {'latitude': 25.3176, 'longitude': 82.9739, 'region_id': 6308885, 'name': 'Varanasi'},
-        'amritsar': {'latitude': 31.6340, 'longitude': 74.8723, 'region_id': 6308818, 'name': 'Amritsar'},
-        'darjeeling': {'latitude': 27.0410, 'longitude': 88.2663, 'region_id': 6308837, 'name': 'Darjeeling'},
-        'ooty': {'latitude': 11.4102, 'longitude': 76.6950, 'region_id': 6308866, 'name': 'Ooty'},
-        
-        # INTERNATIONAL DESTINATIONS
-        'los angeles': {
-            'latitude': 34.0522, 
-            'longitude': -118.2437, 
-            'name': 'Los Angeles', 
-            'region_id': 2011
-        },
-        'miami': {'latitude': 25.7617, 'longitude': -80.1918, 'region_id': 2348, 'name': 'Miami'},
-        'miami, florida': {'latitude': 25.7617, 'longitude': -80.1918, 'region_id': 2348, 'name': 'Miami'},
-        'miami beach': {'latitude': 25.7907, 'longitude': -80.1300, 'region_id': 2348, 'name': 'Miami Beach'},
-        'orlando': {'latitude': 28.5383, 'longitude': -81.3792, 'region_id': 2642, 'name': 'Orlando'},
-        'las vegas': {'latitude': 36.1699, 'longitude': -115.1398, 'region_id': 2008, 'name': 'Las Vegas'},
-        'chicago': {'latitude': 41.8781, 'longitude': -87.6298, 'region_id': 1146, 'name': 'Chicago'},
-        'san francisco': {'latitude': 37.7749, 'longitude': -122.4194, 'region_id': 3012, 'name': 'San Francisco'},
-        'london': {'latitude': 51.5074, 'longitude': -0.1278, 'region_id': 2114, 'name': 'London'},
-        'new york': {'latitude': 40.7128, 'longitude': -74.0060, 'region_id': 2621, 'name': 'New York'},
-        'singapore': {'latitude': 1.3521, 'longitude': 103.8198, 'region_id': 6054984, 'name': 'Singapore'},
-        'bangkok': {'latitude': 13.7563, 'longitude': 100.5018, 'region_id': 6055058, 'name': 'Bangkok'},
-        'tokyo': {'latitude': 35.6762, 'longitude': 139.6503, 'region_id': 6055073, 'name': 'Tokyo'},
-        'bali': {'latitude': -8.3405, 'longitude': 115.0920, 'region_id': 6046530, 'name': 'Bali'},
-        'maldives': {'latitude': 3.2028, 'longitude': 73.2207, 'region_id': 6308902, 'name': 'Maldives'},
-        'rome': {'latitude': 41.9028, 'longitude': 12.4964, 'region_id': 2622, 'name': 'Rome'},
-        'istanbul': {'latitude': 41.0082, 'longitude': 28.9784, 'region_id': 6055085, 'name': 'Istanbul'},
-    }
-    
-    # Standard conversion rates (updated)
-    CONVERSION_RATES = {
-        'USD_TO_INR': 86.5,
-        'EUR_TO_INR': 92.0,
-        'GBP_TO_INR': 108.0,
-        'INR_TO_USD': 0.0116,
-        'INR_TO_EUR': 0.011,
-        'INR_TO_GBP': 0.009
-    }
     
+    Add ?stream=ndjson or ?stream=sse to receive progressive results
+    (see stream_destination_search).
+    """
     try:
         data = request.get_json()
         
@@ -740,160 +846,45 @@ def search_by_destination():
                 
         log_customer_hotel_search('destination', f"Destination '{data['destination']}' ({data['checkin']} to {data['checkout']})", data)
         
-        destination = data['destination'].lower().strip()
-        region_id = data.get('region_id')
-        location_name = data['destination']
-        target_currency = data.get('currency', 'USD')
-        rooms_data = data.get('rooms')  # multi-room array if available
-
+        stream_format = requested_stream_format()
+        if stream_format:
+            return stream_search_response(stream_destination_search(data), stream_format)
+        
+        user_currency = data.get('currency', 'USD')
         
         print(f"🔍 Hotel Search Request: {data['destination']} | Guests: Rooms={data.get('rooms')} Adults={data.get('adults')} ChildrenAges={data.get('children_ages')}")
         
         # ──────────────────────────────────────────────────────────
         # STEP 1: Resolve destination → region_id
-        # Strategy: Try hardcoded fast-path first, then ALWAYS
-        # fall back to RateHawk multicomplete API for ANY destination.
         # ──────────────────────────────────────────────────────────
-        hotel_ids_to_search = None
-        
-        # 1a. Fast-path lookup for popular destinations (skip multicomplete API round-trip)
-        if not region_id and destination in POPULAR_DESTINATIONS:
-            pop = POPULAR_DESTINATIONS[destination]
-            if pop.get('region_id'):
-                region_id = pop.get('region_id')
-                location_name = pop.get('name', location_name)
-                print(f"⚡ Fast-path resolved popular destination '{destination}' -> region_id {region_id}")
-
-        # 1b. PRIMARY: Resolve ANY destination worldwide via RateHawk multicomplete API
-        if not region_id:
-            print(f"🌍 Resolving '{data['destination']}' via RateHawk multicomplete API...")
-            try:
-                suggest_result = etg_service.suggest(data['destination'], 'en')
-                if suggest_result.get('success') and suggest_result.get('data'):
-                    suggest_data = suggest_result['data'].get('data', suggest_result['data'])
-                    regions = suggest_data.get('regions', [])
-                    hotels = suggest_data.get('hotels', [])
-                    
-                    if regions:
-                        best_region = regions[0]
-                        region_id = best_region.get('id')
-                        location_name = best_region.get('name', data['destination'])
-                        print(f"✅ Resolved via multicomplete: {location_name}, Region ID: {region_id}")
-                    elif hotels:
-                        # User typed a hotel name directly
-                        hotel_ids_to_search = [h.get('id') for h in hotels[:10] if h.get('id')]
-                        location_name = hotels[0].get('name', data['destination'])
-                        print(f"✅ Resolved as hotel name: {location_name}, Hotel IDs: {hotel_ids_to_search[:3]}...")
-            except Exception as e:
-                print(f"⚠️ Multicomplete resolution failed: {e}")
+        resolved = resolve_search_destination(data)
+        location_name = resolved['location_name']
         
         # ──────────────────────────────────────────────────────────
         # STEP 2: Search for hotels using resolved region_id or hotel_ids
         # ──────────────────────────────────────────────────────────
-        if not region_id and not hotel_ids_to_search:
-            print(f"🛑 Could not resolve destination: '{data['destination']}'")
-            # If RateHawk multicomplete actually returned an API error (like 403), surface it!
-            error_msg = "Could not find destination. Please check the spelling."
-            if 'suggest_result' in locals() and not suggest_result.get('success'):
-                error_msg = f"RateHawk Multicomplete API Error: {suggest_result.get('error', 'Unknown Error')}"
-                print(f"⚠️ {error_msg}")
-                return jsonify({
-                    'success': False,
-                    'error': error_msg
-                }), 400
-
-            return jsonify({
-                'success': False,
-                'error': error_msg,
-                'hotels': [],
-                'source': 'none'
-            }), 404
+        if not resolved['region_id'] and not resolved['hotel_ids']:
+            payload, status = unresolved_destination_error(data, resolved)
+            return jsonify(payload), status
         
         # Prepare search parameters
-        user_currency = data.get('currency', 'USD')
         api_currency = 'USD' if user_currency == 'INR' else user_currency
         
         guests = etg_service.format_guests_for_search(
             adults=data['adults'],
             children_ages=data.get('children_ages', []),
-            rooms=rooms_data
+            rooms=data.get('rooms')  # multi-room array if available
         )
         
         print(f"🏨 Searching RateHawk for: {location_name}")
         
-        if hotel_ids_to_search:
-            result = etg_service.search_by_hotels(
-                hotel_ids=hotel_ids_to_search,
-                checkin=data['checkin'],
-                checkout=data['checkout'],
-                rooms=guests,
-                currency=api_currency,
-                residency=data.get('residency', 'gb')
-            )
-        else:
-            result = etg_service.search_by_region(
-                region_id=region_id,
-                checkin=data['checkin'],
-                checkout=data['checkout'],
-                rooms=guests,
-                currency=api_currency,
-                residency=data.get('residency', 'gb')
-            )
-        
         # ──────────────────────────────────────────────────────────
-        # STEP 3: Handle errors with smart retry
+        # STEP 3: Run the SERP (handles errors with smart retry)
         # ──────────────────────────────────────────────────────────
-        if result.get('status') == 'error' or not result.get('success', True):
-            error_msg = result.get('error', 'Unknown API error')
-            if 'data' in result and isinstance(result['data'], dict):
-                debug = result['data'].get('debug', {})
-                if debug.get('validation_error'):
-                    error_msg = debug['validation_error']
-            
-            print(f"❌ RateHawk search error: {error_msg}")
-            
-            # If region_id was invalid, try re-resolving via multicomplete
-            if 'region' in str(error_msg).lower() or 'invalid' in str(error_msg).lower():
-                print(f"🔄 Retrying with dynamic region_id from multicomplete API...")
-                try:
-                    suggest_result = etg_service.suggest(data['destination'], 'en')
-                    if suggest_result.get('success') and suggest_result.get('data'):
-                        suggest_data = suggest_result['data'].get('data', suggest_result['data'])
-                        regions = suggest_data.get('regions', [])
-                        if regions:
-                            new_region_id = regions[0].get('id')
-                            if new_region_id and new_region_id != region_id:
-                                print(f"✅ Got new region_id {new_region_id} (old was {region_id}), retrying search...")
-                                region_id = new_region_id
-                                result = etg_service.search_by_region(
-                                    region_id=region_id,
-                                    checkin=data['checkin'],
-                                    checkout=data['checkout'],
-                                    rooms=guests,
-                                    currency=api_currency,
-                                    residency=data.get('residency', 'gb')
-                                )
-                                if result.get('status') == 'error' or not result.get('success', True):
-                                    print(f"❌ Retry also failed: {result.get('error', 'Unknown')}")
-                                else:
-                                    print(f"✅ Retry succeeded with new region_id {new_region_id}")
-                except Exception as e:
-                    print(f"⚠️ Dynamic region resolution failed: {e}")
-            
-            # If it's a date validation error, return early with helpful message
-            if any(kw in str(error_msg).lower() for kw in ['checkin', 'checkout', 'date']):
-                return jsonify({
-                    'success': False, 
-                    'error': f"Search failed: {error_msg}. Please check your dates and try again."
-                }), 400
-                
-            # For all other RateHawk API errors (like 403 Forbidden, 401 Unauthorized, etc.)
-            # we MUST return an HTTP error so the frontend can display the actual reason
-            # it failed, rather than silently pretending there are 0 hotels.
-            return jsonify({
-                'success': False,
-                'error': f"RateHawk API Error: {error_msg}"
-            }), 400
+        result, region_id, error = run_destination_serp(data, resolved, guests, api_currency)
+        if error:
+            payload, status = error
+            return jsonify(payload), status
 
         # ──────────────────────────────────────────────────────────
         # STEP 4: Process and return results
@@ -917,14 +908,7 @@ def search_by_destination():
                         static_hotel_map = static_res['data'].get('data', {})
                         print(f"✅ Successfully enriched {len(static_hotel_map)} hotels with static data")
 
-                # Calculate nights
-                from datetime import datetime
-                try:
-                    d1 = datetime.strptime(data['checkin'], '%Y-%m-%d')
-                    d2 = datetime.strptime(data['checkout'], '%Y-%m-%d')
-                    nights = (d2 - d1).days
-                except:
-                    nights = 1
+                nights = search_nights(data)
 
                 # Enrich hotels with static data
                 for h in etg_hotels:
@@ -932,36 +916,356 @@ def search_by_destination():
                     if hid and hid in static_hotel_map:
                         h['static_data'] = static_hotel_map[hid]
 
+                use_block_markup = str(data.get('is_block_booking', '')).lower() == 'true'
+                
+                # Compact clients fetch rates per hotel on demand, so skip transform_rates here
                 transformed_hotels = transform_etg_hotels(
                     hotels_data=etg_hotels, 
                     target_currency=user_currency,
-                    conversion_rates=CONVERSION_RATES,
+                    conversion_rates=currency_rates.get_conversion_rates(),
                     nights=nights,
-                    use_block_markup=str(data.get('is_block_booking', '')).lower() == 'true'
+                    use_block_markup=use_block_markup,
+                    include_rates=not wants_compact_view()
                 )
+
+                location = {'name': location_name, 'region_id': region_id}
+                snapshot = store_search_snapshot(transformed_hotels, etg_hotels, location, data, nights, use_block_markup)
                 
-                return jsonify({
+                return serp_json_response({
                     'success': True,
-                    'data': {'hotels': transformed_hotels},
-                    'location': {'name': location_name, 'region_id': region_id},
+                    'location': location,
                     'hotels_count': len(transformed_hotels),
+                    'search_id': snapshot.search_id,
                     'real_data': True,
                     'source': 'ratehawk'
-                })
+                }, transformed_hotels)
             else:
                 print(f"⚠️ RateHawk returned 0 hotels for {location_name}")
         
         # No hotels found after all attempts
         print(f"🛑 No hotels found for {location_name} after all attempts")
         
+        return jsonify(no_availability_error(location_name))
+    
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def no_availability_error(location_name):
+    return {
+        'success': False,
+        'error': f"No availability found for '{location_name}' on these dates. Please try different dates or a different destination.",
+        'hotels': [],
+        'source': 'none'
+    }
+
+
+# ==========================================
+# STREAMING SEARCH (NDJSON / SSE)
+# ==========================================
+
+STREAM_MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream'
+}
+
+
+def requested_stream_format():
+    """'ndjson' / 'sse' when the client asked for a streamed search, else None"""
+    stream = (request.args.get('stream') or '').lower()
+    if stream in STREAM_MEDIA_TYPES:
+        return stream
+    accept = request.headers.get('Accept') or ''
+    for stream_format, media_type in STREAM_MEDIA_TYPES.items():
+        if media_type in accept:
+            return stream_format
+    return None
+
+
+def format_stream_event(event, payload, stream_format, event_id=None):
+    body = json.dumps(payload, default=str)
+    if stream_format == 'sse':
+        id_line = f"id: {event_id}\n" if event_id is not None else ""
+        return f"{id_line}event: {event}\ndata: {body}\n\n"
+    return json.dumps({'event': event, 'data': payload}, default=str) + "\n"
+
+
+def stream_search_response(events, stream_format):
+    """Wrap an (event, payload) generator in a streamed Flask response"""
+    def generate():
+        for event, payload in events:
+            yield format_stream_event(event, payload, stream_format)
+
+    response = current_app.response_class(
+        stream_with_context(generate()),
+        mimetype=STREAM_MEDIA_TYPES[stream_format]
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let proxies buffer the stream
+    return response
+
+
+def stream_destination_search(data):
+    """
+    Progressive version of /search/destination. Yields (event, payload):
+    
+        location  resolved destination, as soon as multicomplete answers
+        cards     first page of priced compact cards, straight after the SERP
+                  (names/images only from the static cache at this point)
+        patch     one enriched card per hotel as its /hotel/info/ fetch lands
+        done      search_id for /search/<search_id>/results and hotel counts
+        error     terminal failure (same payload as the JSON endpoint)
+    
+    Query params: page_size (first page size, default 20)
+    """
+    try:
+        user_currency = data.get('currency', 'USD')
+        api_currency = 'USD' if user_currency == 'INR' else user_currency
+        page_size = max(1, min(request.args.get('page_size', 20, type=int), 100))
+        
+        resolved = resolve_search_destination(data)
+        if not resolved['region_id'] and not resolved['hotel_ids']:
+            payload, status = unresolved_destination_error(data, resolved)
+            yield 'error', {**payload, 'status': status}
+            return
+        
+        location = {'name': resolved['location_name'], 'region_id': resolved['region_id']}
+        yield 'location', location
+        
+        guests = etg_service.format_guests_for_search(
+            adults=data['adults'],
+            children_ages=data.get('children_ages', []),
+            rooms=data.get('rooms')
+        )
+        result, region_id, error = run_destination_serp(data, resolved, guests, api_currency)
+        if error:
+            payload, status = error
+            yield 'error', {**payload, 'status': status}
+            return
+        location['region_id'] = region_id
+        
+        inner_data = result['data'].get('data', result['data']) if result.get('success') and result.get('data') else {}
+        etg_hotels = inner_data.get('hotels', []) or []
+        if not etg_hotels:
+            yield 'error', {**no_availability_error(location['name']), 'status': 200}
+            return
+        
+        nights = search_nights(data)
+        use_block_markup = str(data.get('is_block_booking', '')).lower() == 'true'
+        markup_rules = resolve_markup_rules(use_block_markup)
+        
+        def transform(hotels):
+            return transform_etg_hotels(
+                hotels_data=hotels,
+                target_currency=user_currency,
+                conversion_rates=currency_rates.get_conversion_rates(),
+                nights=nights,
+                use_block_markup=use_block_markup,
+                include_rates=False,
+                markup_rules=markup_rules
+            )
+        
+        # Priced cards straight from the SERP, using whatever static data is already cached
+        hotel_by_id = {}
+        for h in etg_hotels:
+            hid = h.get('hotel_id') or h.get('id')
+            if hid:
+                hotel_by_id[hid] = h
+                if hid in etg_service.static_cache:
+                    h['static_data'] = etg_service.static_cache[hid]
+        
+        cards = transform(etg_hotels)
+        yield 'cards', {
+            'hotels': [compact_hotel_card(card) for card in cards[:page_size]],
+            'hotels_count': len(cards),
+            'page_size': page_size
+        }
+        
+        # Enrichment patches as each static fetch completes
+        ids_to_enrich = [hid for hid in list(hotel_by_id)[:25] if not hotel_by_id[hid].get('static_data')]
+        card_index = {card['id']: idx for idx, card in enumerate(cards)}
+        for hid, static_info in etg_service.iter_hotels_static(ids_to_enrich, language='en'):
+            if not static_info:
+                continue
+            hotel = hotel_by_id[hid]
+            hotel['static_data'] = static_info
+            card = transform([hotel])[0]
+            card['review_count'] = cards[card_index[hid]]['review_count']  # index-derived, keep stable
+            cards[card_index[hid]] = card
+            yield 'patch', {'id': hid, 'hotel': compact_hotel_card(card)}
+        
+        snapshot = store_search_snapshot(cards, etg_hotels, location, data, nights, use_block_markup)
+        yield 'done', {
+            'success': True,
+            'search_id': snapshot.search_id,
+            'hotels_count': len(cards),
+            'location': location,
+            'real_data': True,
+            'source': 'ratehawk'
+        }
+    
+    except Exception as e:
+        yield 'error', {'success': False, 'error': str(e), 'status': 500}
+
+
+@hotel_bp.route('/search/<search_id>/results', methods=['GET'])
+def get_search_results_page(search_id):
+    """
+    Filter, sort and page a previous search's results server-side
+    
+    Query params:
+        stars=4,5  meals=breakfast,nomeal  amenities=wifi,pool
+        free_cancellation=true  price_min=50  price_max=300  price_buckets=0,1
+        sort=price_low|price_high|rating|stars  page=1  page_size=20
+    
+    Returns only the requested page plus facet counts for the filter sidebar.
+    Add view=compact for v2 card-only hotels.
+    """
+    try:
+        try:
+            filters = parse_facet_filters(request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        snapshot = search_snapshot_store.get(search_id)
+        if not snapshot:
+            return jsonify({
+                'success': False,
+                'error': 'Search results expired. Please search again.',
+                'expired': True
+            }), 404
+        
+        result = snapshot.index.select(
+            filters,
+            sort=request.args.get('sort'),
+            page=request.args.get('page', 1, type=int),
+            page_size=request.args.get('page_size', 20, type=int)
+        )
+        
+        return serp_json_response({
+            'success': True,
+            'search_id': search_id,
+            'facets': result['facets'],
+            'total': result['total'],
+            'hotels_count': snapshot.index.size,
+            'page': result['page'],
+            'page_size': result['page_size'],
+            'has_more': result['has_more'],
+            'location': snapshot.context.get('location')
+        }, result['hotels'])
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@hotel_bp.route('/search/<search_id>/hotels/<hotel_id>/rates', methods=['GET'])
+def get_search_hotel_rates(search_id, hotel_id):
+    """
+    Transform a single hotel's rates on demand.
+    
+    Uses the raw /search/serp/* hotel kept in the search snapshot, so no
+    upstream call is made while the snapshot is fresh. Once it has expired,
+    falls back to /search/hp/ using the search params in the query string:
+        checkin, checkout, adults, children_ages, currency, residency
+    
+    Rates get the same room-group enrichment, cancellation formatting and
+    tax parsing as /details-enriched.
+    """
+    try:
+        snapshot = search_snapshot_store.get(search_id)
+        raw_hotel = (snapshot.context.get('raw_hotels') or {}).get(hotel_id) if snapshot else None
+        
+        if raw_hotel:
+            source = 'serp_snapshot'
+            context = snapshot.context
+            target_currency = context.get('currency', 'USD')
+            conversion_rates = context.get('conversion_rates')
+            nights = context.get('nights', 1)
+            use_block_markup = context.get('use_block_markup', False)
+            # transform_rates writes into rate dicts - keep the snapshot pristine
+            raw_hotel = copy.deepcopy(raw_hotel)
+        else:
+            args = request.args
+            if not args.get('checkin') or not args.get('checkout'):
+                return jsonify({
+                    'success': False,
+                    'error': 'Search results expired. Please search again.',
+                    'expired': True
+                }), 404
+            
+            source = 'hotel_page'
+            target_currency = args.get('currency', 'USD')
+            api_currency = 'USD' if target_currency == 'INR' else target_currency
+            children_ages = [int(a) for a in args.get('children_ages', '').split(',') if a.strip().isdigit()]
+            guests = etg_service.format_guests_for_search(
+                adults=args.get('adults', 2, type=int),
+                children_ages=children_ages
+            )
+            
+            print(f"🔄 Snapshot {search_id} expired - fetching {hotel_id} rates from /search/hp/")
+            hp_result = etg_service.get_hotel_page(
+                hotel_id=hotel_id,
+                checkin=args['checkin'],
+                checkout=args['checkout'],
+                guests=guests,
+                currency=api_currency,
+                residency=args.get('residency', 'gb')
+            )
+            if not hp_result.get('success'):
+                return jsonify(hp_result), 502
+            
+            hp_data = hp_result.get('data', {})
+            hp_data = hp_data.get('data', hp_data) if isinstance(hp_data, dict) else {}
+            hp_hotels = hp_data.get('hotels') or []
+            if not hp_hotels:
+                return jsonify({'success': True, 'data': {'hotel_id': hotel_id, 'rates': [], 'source': source}})
+            raw_hotel = hp_hotels[0]
+            
+            conversion_rates = currency_rates.get_conversion_rates()
+            try:
+                nights = (datetime.strptime(args['checkout'], '%Y-%m-%d') - datetime.strptime(args['checkin'], '%Y-%m-%d')).days
+            except ValueError:
+                nights = 1
+            use_block_markup = str(args.get('is_block_booking', '')).lower() == 'true'
+        
+        # Room static data: SERP enrichment first, then the in-process static cache, then Supabase
+        static_data = raw_hotel.get('static_data') or etg_service.static_cache.get(hotel_id)
+        if not static_data:
+            try:
+                cached = supabase_service.get_cached_hotel(hotel_id)
+                rows = cached.get('data') if cached.get('success') else None
+                if isinstance(rows, list) and rows:
+                    static_data = rows[0].get('hotel_data', {})
+                elif isinstance(rows, dict):
+                    static_data = rows.get('hotel_data', {})
+            except Exception as e:
+                print(f"⚠️ Failed to load cached static data for {hotel_id} rates: {e}")
+        static_data = static_data or {}
+        if isinstance(static_data.get('data'), dict):
+            static_data = static_data['data']
+        raw_hotel['static_data'] = static_data
+        
+        room_groups = build_room_groups_lookup(static_data)
+        transformed = transform_etg_hotels(
+            [raw_hotel],
+            target_currency=target_currency,
+            conversion_rates=conversion_rates,
+            room_groups=room_groups,
+            nights=nights,
+            use_block_markup=use_block_markup
+        )
+        
         return jsonify({
-            'success': False,
-            'error': f"No availability found for '{location_name}' on these dates. Please try different dates or a different destination.",
-            'hotels': [],
-            'source': 'none'
+            'success': True,
+            'data': {
+                'hotel_id': hotel_id,
+                'rates': transformed[0]['rates'] if transformed else [],
+                'room_groups_count': len(room_groups),
+                'source': source
+            }
         })
     
-
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1179,12 +1483,29 @@ def calculate_markup_amount(prepaid_amount, currency, target_currency, conversio
 
 
 
-def transform_etg_hotels(hotels_data, target_currency='USD', conversion_rates=None, MEAL_TYPE_DISPLAY=None, room_groups=None, nights=1, use_block_markup=False):
+def resolve_markup_rules(use_block_markup=False):
+    """
+    Load the markup rules transform_etg_hotels applies, as (markup_config, b2c_rules).
+    For B2C: batch-fetch all active markup rules in ONE query for per-hotel overrides
+    For block: use the legacy single-config approach
+    """
+    if use_block_markup:
+        return fetch_markup_rules(rule_type='block'), None
+    # Check global toggle first
+    if not is_markup_enabled():
+        return {'domestic': {'type': 'flat', 'value': 0}, 'international': {'type': 'flat', 'value': 0}}, None
+    return None, fetch_all_b2c_markup_rules()  # None config -> per-hotel lookup instead
+
+
+def transform_etg_hotels(hotels_data, target_currency='USD', conversion_rates=None, MEAL_TYPE_DISPLAY=None, room_groups=None, nights=1, use_block_markup=False, include_rates=True, markup_rules=None):
     """
     Transform ETG search results into flattened hotel cards.
     Handles price calculation (Commission + Exclusive Taxes).
     
     room_groups: optional dict of static room data keyed by rg_ext.rg
+    include_rates: when False, skip transform_rates and only attach a best_rate
+                   summary (rates are served later by /search/<id>/hotels/<id>/rates)
+    markup_rules: optional resolve_markup_rules() result, to reuse across calls
     """
     if not MEAL_TYPE_DISPLAY:
         MEAL_TYPE_DISPLAY = {
@@ -1217,20 +1538,7 @@ def transform_etg_hotels(hotels_data, target_currency='USD', conversion_rates=No
     
     transformed = []
     
-    # For B2C: batch-fetch all active markup rules in ONE query for per-hotel overrides
-    # For block: use the legacy single-config approach
-    if use_block_markup:
-        markup_config = fetch_markup_rules(rule_type='block')
-        b2c_rules = None
-    else:
-        # Check global toggle first
-        markup_enabled = is_markup_enabled()
-        if not markup_enabled:
-            b2c_rules = None
-            markup_config = {'domestic': {'type': 'flat', 'value': 0}, 'international': {'type': 'flat', 'value': 0}}
-        else:
-            b2c_rules = fetch_all_b2c_markup_rules()
-            markup_config = None  # will use per-hotel lookup instead
+    markup_config, b2c_rules = markup_rules or resolve_markup_rules(use_block_markup)
     
     for idx, hotel in enumerate(hotels_data):
         hotel_id = hotel.get('hotel_id') or hotel.get('id')
@@ -1243,6 +1551,7 @@ def transform_etg_hotels(hotels_data, target_currency='USD', conversion_rates=No
         has_breakfast = False
         no_child_meal = False
         best_rate_fees = []
+        best_display_total = 0
         prepay_to_charge = 0
         
         # Determine best rate and gather transparency data
@@ -1318,6 +1627,7 @@ def transform_etg_hotels(hotels_data, target_currency='USD', conversion_rates=No
                 has_breakfast = 'breakfast' in best_meal_value.lower()
                 no_child_meal = meal_data.get('no_child_meal', False)
                 best_rate_fees = property_fees
+                best_display_total = display_total
                 # The actual amount to charge the guest (excluding what they pay at property)
                 prepay_to_charge = converted_prepaid_with_markup
         # Use Static Data for Name/Image/Address if available
@@ -1430,8 +1740,22 @@ def transform_etg_hotels(hotels_data, target_currency='USD', conversion_rates=No
             'property_payable_fees': best_rate_fees,
             'static_data': static_info,
             'discount': 15,
-            'rates': transform_rates(rates, target_currency, conversion_rates, MEAL_TYPE_DISPLAY, room_groups, nights, hotel_images=all_images, markup_rule=markup_rule)
         }
+
+        if include_rates:
+            transformed_hotel['rates'] = transform_rates(rates, target_currency, conversion_rates, MEAL_TYPE_DISPLAY, room_groups, nights, hotel_images=all_images, markup_rule=markup_rule)
+        else:
+            room_data = best_rate.get('room_data_trans', {}) if best_rate else {}
+            transformed_hotel['rates'] = []
+            transformed_hotel['rates_count'] = len(rates)
+            transformed_hotel['best_rate'] = {
+                'book_hash': best_rate.get('book_hash') or best_rate.get('match_hash', ''),
+                'room_name': room_data.get('main_name') or room_data.get('name') or best_rate.get('room_name') or 'Standard Room',
+                'price': round(lowest_price, 2),
+                'total_price': round(best_display_total, 2),
+                'meal': best_meal_value,
+                'cancellation_info': best_rate_cancellation
+            } if best_rate else None
         
         transformed.append(transformed_hotel)
     
@@ -1585,6 +1909,92 @@ def transform_rates(rates, target_currency, conversion_rates, meal_display_map,
 
 
 
+# ==========================================
+# COMPACT SERP VIEW (v2 response shape)
+# ==========================================
+
+SERP_V2_MEDIA_TYPE = 'application/vnd.c2c.serp.v2+json'
+
+COMPACT_CARD_FIELDS = (
+    'id', 'hid', 'name', 'star_rating', 'guest_rating', 'review_count',
+    'address', 'city', 'country', 'location', 'latitude', 'longitude',
+    'price', 'original_price', 'currency', 'discount', 'amenities',
+    'meal_plan', 'meal_info', 'property_payable_fees'
+)
+
+
+def wants_compact_view():
+    """True when the client asked for the v2 card-only shape (?view=compact or Accept header)"""
+    view = (request.args.get('view') or '').lower()
+    if view:
+        return view in ('compact', 'v2')
+    return SERP_V2_MEDIA_TYPE in (request.headers.get('Accept') or '')
+
+
+def compact_hotel_card(hotel):
+    """
+    Reduce a transform_etg_hotels card to what the results page renders.
+    Drops static_data, the full rates array, the image gallery and description.
+    """
+    card = {field: hotel.get(field) for field in COMPACT_CARD_FIELDS}
+
+    images = hotel.get('images') or []
+    image = hotel.get('image') or (images[0] if images else '')
+    card['thumbnail'] = image.replace(f'/{IMG_SIZE}/', f'/{IMG_SIZE_THUMB}/') if image else ''
+    card['image_count'] = len(images)
+
+    cancellation = hotel.get('cancellation_info') or {}
+    card['cancellation_info'] = {
+        'is_free_cancellation': cancellation.get('is_free_cancellation', False),
+        'free_cancellation_before': cancellation.get('free_cancellation_before'),
+        'free_cancellation_formatted': cancellation.get('free_cancellation_formatted')
+    }
+
+    rates = hotel.get('rates') or []
+    best = min(rates, key=lambda r: r.get('price') or 0) if rates else hotel.get('best_rate')
+    card['rates_count'] = len(rates) if rates else hotel.get('rates_count', 0)
+    card['best_rate'] = {
+        'book_hash': best.get('book_hash'),
+        'room_name': best.get('room_name'),
+        'price': best.get('price'),
+        'total_price': best.get('total_price'),
+        'meal': best.get('meal'),
+        'is_free_cancellation': (best.get('cancellation_info') or {}).get('is_free_cancellation', False)
+    } if best else None
+    return card
+
+
+# Fraction of compact responses that also serialize the full list to log the saving
+COMPACT_SIZE_SAMPLE_RATE = 0.02
+
+
+def serp_json_response(payload, hotels):
+    """
+    jsonify a search payload, switching to compact cards when requested.
+    A small sample of compact responses also measures the full vs compact
+    byte sizes (X-Payload-* headers and the log) - measuring every response
+    would serialize the full list the compact view exists to avoid.
+    """
+    if not wants_compact_view():
+        response = jsonify({**payload, 'data': {**payload.get('data', {}), 'hotels': hotels}})
+        # Both shapes share a URL, so caches must key on Accept for either one
+        response.vary.add('Accept')
+        return response
+
+    compact = [compact_hotel_card(h) for h in hotels]
+    response = jsonify({**payload, 'view': 'compact', 'data': {**payload.get('data', {}), 'hotels': compact}})
+    response.vary.add('Accept')
+
+    if random.random() < COMPACT_SIZE_SAMPLE_RATE:
+        full_bytes = len(json.dumps(hotels, default=str))
+        compact_bytes = len(json.dumps(compact, default=str))
+        saved_pct = round(100 * (1 - compact_bytes / full_bytes), 1) if full_bytes else 0
+        print(f"📉 Compact SERP (sampled): {len(compact)} hotels, {full_bytes} -> {compact_bytes} bytes ({saved_pct}% smaller)")
+        response.headers['X-Payload-Full-Bytes'] = str(full_bytes)
+        response.headers['X-Payload-Compact-Bytes'] = str(compact_bytes)
+    return response
+
+
 def parse_taxes(tax_data, target_currency='USD', source_currency='USD', conversion_rates=None):
     """
     Parse tax data from rate and convert if needed.
@@ -2778,92 +3188,14 @@ def get_enriched_hotel_details():
             
         static_data = static_result.get('data', {})
             
-        room_groups = {}
-        if static_data:
-            for rg in static_data.get('room_groups', []):
-                # Process images once per room_group (shared across all rg values)
-                # ETG Certification Fix: Prioritize 'images_ext' which contains room-specific 
-                # images, falling back to legacy 'images' array.
-                processed_images = []
-                
-                # 1. Try modern images_ext
-                images_ext = rg.get('images_ext')
-                if images_ext and isinstance(images_ext, list) and len(images_ext) > 0:
-                    for img in images_ext:
-                        if isinstance(img, dict):
-                            img_url = img.get('url', img.get('src', ''))
-                            processed_url = process_etg_image_url(img_url)
-                            if processed_url:
-                                processed_images.append(processed_url)
-                
-                # 2. Fallback to legacy images array
-                if not processed_images:
-                    for img in (rg.get('images') or []):
-                        if isinstance(img, str):
-                            processed_url = process_etg_image_url(img)
-                            if processed_url:
-                                processed_images.append(processed_url)
-                        elif isinstance(img, dict):
-                            img_url = img.get('url', img.get('src', ''))
-                            processed_url = process_etg_image_url(img_url)
-                            if processed_url:
-                                processed_images.append(processed_url)
-
-                rg_data = {
-                    'name': rg.get('name', rg.get('room_name', '')),
-                    'name_struct': rg.get('name_struct', {}),
-                    'images': processed_images[:5],
-                    'room_amenities': rg.get('room_amenities') or [],
-                    'bed_type': rg.get('name_struct', {}).get('bedding_type', ''),
-                    'bathroom': rg.get('name_struct', {}).get('bathroom', ''),
-                    'quality': rg.get('name_struct', {}).get('quality', '')
-                }
-
-                # Each static room_group's rg_ext array contains the rg values
-                # that dynamic rates reference via rate['rg_ext']['rg'].
-                rg_ext_list = rg.get('rg_ext') or []
-                
-                # Normalize to list for consistent processing
-                if isinstance(rg_ext_list, dict):
-                    rg_ext_list = [rg_ext_list]
-                    
-                if isinstance(rg_ext_list, list):
-                    for rg_ext_entry in rg_ext_list:
-                        rg_val = rg_ext_entry.get('rg') if isinstance(rg_ext_entry, dict) else None
-                        if rg_val is not None:
-                            rg_data_copy = dict(rg_data)
-                            rg_data_copy['rg_key'] = rg_val
-                            room_groups[rg_val] = rg_data_copy
-                        
-                        # ETG Certification Fix: Map by structural signature as fallback
-                        if isinstance(rg_ext_entry, dict):
-                            sig = make_rg_signature(rg_ext_entry)
-                            if sig:
-                                rg_data_copy = dict(rg_data)
-                                rg_data_copy['rg_key'] = sig
-                                room_groups[sig] = rg_data_copy
-                
-                # CRITICAL FIX: Ensure EVERY room is in room_groups so Jaccard similarity can find it
-                # even if RateHawk omitted the rg_ext mapping for this room!
-                if rg_data.get('name'):
-                    name_key = f"name_fallback_{hash(rg_data['name'])}"
-                    rg_data_copy = dict(rg_data)
-                    rg_data_copy['rg_key'] = name_key
-                    room_groups[name_key] = rg_data_copy
+        room_groups = build_room_groups_lookup(static_data)
         
         # 3. Transform and enrich!
         # transform_etg_hotels expects a list of hotels from the search response
         # But it also calls transform_rates which uses room_groups now.
         
-        # Define conversion rates and meal display map for transform_etg_hotels
-        CONVERSION_RATES = {
-            'USD_TO_INR': 86.5,
-            'EUR_TO_INR': 92.0,
-            'GBP_TO_INR': 108.0,
-            'INR_TO_USD': 0.0116,
-            'INR_TO_EUR': 0.011,
-            'INR_TO_GBP': 0.009
-        }
+        # Conversion rates (refreshed currencies table) and meal display map for transform_etg_hotels
+        CONVERSION_RATES = currency_rates.get_conversion_rates()
         MEAL_TYPE_DISPLAY = {
             'all-inclusive': 'All Inclusive',
             'breakfast': 'Breakfast Included',
@@ -2937,6 +3269,87 @@ def get_enriched_hotel_details():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def build_room_groups_lookup(static_data):
+    """
+    Index static room_groups for matching with dynamic rates.
+    Keys: every rg_ext.rg value, the structural rg_ext signature, and a
+    name-based fallback key (see make_rg_signature / enrich_rate_with_room_data).
+    """
+    room_groups = {}
+    if static_data:
+        for rg in static_data.get('room_groups', []):
+            # Process images once per room_group (shared across all rg values)
+            # ETG Certification Fix: Prioritize 'images_ext' which contains room-specific 
+            # images, falling back to legacy 'images' array.
+            processed_images = []
+            
+            # 1. Try modern images_ext
+            images_ext = rg.get('images_ext')
+            if images_ext and isinstance(images_ext, list) and len(images_ext) > 0:
+                for img in images_ext:
+                    if isinstance(img, dict):
+                        img_url = img.get('url', img.get('src', ''))
+                        processed_url = process_etg_image_url(img_url)
+                        if processed_url:
+                            processed_images.append(processed_url)
+            
+            # 2. Fallback to legacy images array
+            if not processed_images:
+                for img in (rg.get('images') or []):
+                    if isinstance(img, str):
+                        processed_url = process_etg_image_url(img)
+                        if processed_url:
+                            processed_images.append(processed_url)
+                    elif isinstance(img, dict):
+                        img_url = img.get('url', img.get('src', ''))
+                        processed_url = process_etg_image_url(img_url)
+                        if processed_url:
+                            processed_images.append(processed_url)
+
+            rg_data = {
+                'name': rg.get('name', rg.get('room_name', '')),
+                'name_struct': rg.get('name_struct', {}),
+                'images': processed_images[:5],
+                'room_amenities': rg.get('room_amenities') or [],
+                'bed_type': rg.get('name_struct', {}).get('bedding_type', ''),
+                'bathroom': rg.get('name_struct', {}).get('bathroom', ''),
+                'quality': rg.get('name_struct', {}).get('quality', '')
+            }
+
+            # Each static room_group's rg_ext array contains the rg values
+            # that dynamic rates reference via rate['rg_ext']['rg'].
+            rg_ext_list = rg.get('rg_ext') or []
+            
+            # Normalize to list for consistent processing
+            if isinstance(rg_ext_list, dict):
+                rg_ext_list = [rg_ext_list]
+                
+            if isinstance(rg_ext_list, list):
+                for rg_ext_entry in rg_ext_list:
+                    rg_val = rg_ext_entry.get('rg') if isinstance(rg_ext_entry, dict) else None
+                    if rg_val is not None:
+                        rg_data_copy = dict(rg_data)
+                        rg_data_copy['rg_key'] = rg_val
+                        room_groups[rg_val] = rg_data_copy
+                    
+                    # ETG Certification Fix: Map by structural signature as fallback
+                    if isinstance(rg_ext_entry, dict):
+                        sig = make_rg_signature(rg_ext_entry)
+                        if sig:
+                            rg_data_copy = dict(rg_data)
+                            rg_data_copy['rg_key'] = sig
+                            room_groups[sig] = rg_data_copy
+            
+            # CRITICAL FIX: Ensure EVERY room is in room_groups so Jaccard similarity can find it
+            # even if RateHawk omitted the rg_ext mapping for this room!
+            if rg_data.get('name'):
+                name_key = f"name_fallback_{hash(rg_data['name'])}"
+                rg_data_copy = dict(rg_data)
+                rg_data_copy['rg_key'] = name_key
+                room_groups[name_key] = rg_data_copy
+    return room_groups
+
+
 def format_room_groups(room_groups):
     """
     Format room groups for frontend consumption.
@@ -3474,6 +3887,7 @@ def prebook_rate():
 # ==========================================
 
 @hotel_bp.route('/book', methods=['POST'])
+@idempotent('hotel_book')
 def create_booking():
     """
     Create a new hotel booking
@@ -3682,6 +4096,10 @@ def create_booking():
             user_ip=user_ip,
             user_comment=data.get('special_requests')
         )
+
+        # A booking attempt consumes the prebook - retries must re-validate with ETG
+        etg_service.invalidate_prebook(book_hash)
+        etg_service.invalidate_prebook(confirmed_hash)
         
         if not etg_result.get('success'):
             error_msg = etg_result.get('error', 'Unknown booking error')
@@ -3760,6 +4178,7 @@ def create_booking():
 
 
 @hotel_bp.route('/book/finish', methods=['POST'])
+@idempotent('hotel_book_finish')
 def finish_booking():
     """
     Finalize booking and start status polling
@@ -3795,6 +4214,16 @@ def finish_booking():
                 
         if not booking_info:
             return jsonify({'success': False, 'error': f"Booking record not found: {db_booking.get('error', 'Unknown database error')}"}), 404
+
+        # A verified payment already queued finish_booking, which owns the ETG
+        # /finish/ call for this order - just report on it, never finish twice
+        if booking_info.get('id') and get_booking_fulfillment(booking_info['id']):
+            booking_status_poller.track(partner_order_id)
+            return jsonify({
+                'success': True,
+                'message': 'Booking is being finalized. Please wait...',
+                'should_poll': True
+            })
         
         # Mikhail Requirement (Update 6): Update to "processing" IMMEDIATELY before starting finalization
         # This ensures the frontend sees "In Progress" even if the API call is slow.
@@ -3858,9 +4287,12 @@ def finish_booking():
             status = result.get('data', {}).get('status') if result.get('success') else None
             if status not in ('ok', 'processing'):
                 print(f"🧪 Mocking SUCCESS on /finish/ for sandbox booking: {partner_order_id}")
+                booking_status_poller.track(partner_order_id, restart=True)
                 return jsonify({'success': True, 'data': {'status': 'ok'}})
             
         if result.get('success'):
+            # Background poller takes over /finish/status/ from here
+            booking_status_poller.track(partner_order_id, restart=True)
             return jsonify(result)
         
         # ===== ERROR HANDLING (Table 3) =====
@@ -3900,11 +4332,13 @@ def finish_booking():
                 supabase_service.update_booking_by_partner_order_id(
                     partner_order_id, {'status': 'processing'}
                 )
+                booking_status_poller.track(partner_order_id, restart=True)
                 return jsonify(retry_result)
             # Retry failed -> still proceed to poll (booking may be processing)
             supabase_service.update_booking_by_partner_order_id(
                 partner_order_id, {'status': 'processing'}
             )
+            booking_status_poller.track(partner_order_id, restart=True)
             return jsonify({
                 'success': True,
                 'message': 'Server error during finalization. Booking may still be processing.',
@@ -3916,6 +4350,7 @@ def finish_booking():
             supabase_service.update_booking_by_partner_order_id(
                 partner_order_id, {'status': 'processing'}
             )
+            booking_status_poller.track(partner_order_id, restart=True)
             return jsonify({
                 'success': True,
                 'message': 'Booking is being processed. Please wait...',
@@ -3996,6 +4431,17 @@ def check_booking_status():
                 'status': 'confirmed'
             })
 
+        # Booking already owned by the background poller -> answer from its
+        # shared state instead of another upstream /finish/status/ call
+        tracked = booking_status_poller.get_state(partner_order_id)
+        if tracked:
+            return jsonify({
+                'success': tracked['status'] != 'failed',
+                'status': TRACKED_STATUS_MAP.get(tracked['status'], tracked['status']),
+                'error': tracked.get('error'),
+                'data': tracked.get('data')
+            })
+
         result = etg_service.check_booking_status(partner_order_id)
         
         # MOCK SANDBOX SUCCESS for all hotels
@@ -4066,183 +4512,197 @@ def check_booking_status():
 @hotel_bp.route('/book/poll', methods=['POST'])
 def poll_booking_status():
     """
-    Poll booking status until final (with timeout)
-    Polls every 2.5 seconds for max 180 seconds (RateHawk recommended)
-    Timeout countdown begins after successful response to "Start booking process"
-    
-    RateHawk Certification Table 4: /hotel/order/booking/finish/status/ responses
-    - Status "ok"          -> Booking Confirmed
-    - Status "processing"  -> Continue polling
-    - Error "timeout"      -> Save as pending, notify user
-    - Error "unknown"      -> Save as pending, notify user
-    - 5xx status code      -> Save as pending, retry later
-    - Error "block"        -> Payment blocked by bank
-    - Error "charge"       -> Payment charge failed
-    - Error "3ds"          -> 3D Secure verification failed
-    - Error "soldout"      -> Room sold out during booking
-    - Error "provider"     -> Hotel provider error
-    - Error "book_limit"   -> Booking limit reached
-    - Error "not_allowed"  -> Booking not permitted
-    - Error "booking_finish_did_not_succeed" -> Booking could not be completed
-    
+    Get the current finalization status of a booking (optionally long-polling)
+
+    The booking_status_poller owns the actual polling of
+    /hotel/order/booking/finish/status/ (every 2.5 seconds for max 180 seconds,
+    RateHawk recommended) and persists every transition. This endpoint only
+    starts tracking a booking /book/finish handed over (status "processing")
+    if needed and reports its state, waiting up to
+    `wait` seconds for it to change so clients do not have to hammer it.
+
+    RateHawk Certification Table 4 handling lives in services/booking_status_poller.py
+
     Request Body:
     {
-        "partner_order_id": "CTC-20260201-ABC123"
+        "partner_order_id": "CTC-20260201-ABC123",
+        "wait": 3,         // optional, seconds to wait for a change (max 5)
+        "since_version": 0 // optional, last version the client has seen
     }
+
+    Responses:
+    - confirmed  -> {"success": true, "status": "confirmed", "data": {...}}
+    - failed     -> {"success": false, "status": "failed", "error": "...", "error_code": "SOLDOUT"}
+    - pending    -> 202 {"success": false, "status": "pending", "error_code": "TIMEOUT_PENDING"}
+    - processing -> 202 {"success": true, "status": "processing", "version": 1} (call again)
     """
-    # Error code -> user-friendly message mapping
-    ERROR_MESSAGES = {
-        'block': 'Payment was blocked by your bank. Please contact your bank or try a different card.',
-        'charge': 'Payment charge failed. Please try again or use a different payment method.',
-        '3ds': '3D Secure verification failed. Please try again.',
-        'soldout': 'This room was sold out while processing your booking. Please select a different room.',
-        'provider': 'The hotel provider encountered an error. Please try again later.',
-        'book_limit': 'Booking limit reached for this property. Please try a different hotel.',
-        'not_allowed': 'This booking is not permitted at this time. Please contact support.',
-        'booking_finish_did_not_succeed': 'Booking could not be completed. Please try again or select a different room.',
-    }
-    
     try:
-        data = request.get_json()
-        
+        data = request.get_json() or {}
+
         if 'partner_order_id' not in data:
             return jsonify({'success': False, 'error': 'Missing partner_order_id'}), 400
-        
+
         partner_order_id = data['partner_order_id']
-        max_attempts = 72  # 180 seconds / 2.5 seconds (RateHawk recommended timeout)
-        attempt = 0
-        
-        while attempt < max_attempts:
-            result = etg_service.check_booking_status(partner_order_id)
-            
-            # MOCK SANDBOX SUCCESS for all hotels
-            import os
-            is_sandbox = 'sandbox' in os.getenv('ETG_API_BASE_URL', '')
-            if is_sandbox:
-                status = result.get('data', {}).get('status') if result.get('success') else None
-                if status not in ('ok', 'processing'):
-                    result = {'success': True, 'data': {'status': 'ok'}}
-                
-            if result.get('success') and result.get('data'):
-                status = result['data'].get('status', '')
-                error = result['data'].get('error', '')
-                
-                # Still processing -> continue polling
-                if status == 'processing':
-                    attempt += 1
-                    time.sleep(2.5)
-                    continue
-                
-                # === SUCCESS ===
-                if status == 'ok':
-                    supabase_service.update_booking_by_partner_order_id(
-                        partner_order_id,
-                        {'status': 'confirmed', 'booking_response': result['data']}
-                    )
-                    
-                    # Send confirmation email
-                    try:
-                        from services.email_service import email_service
-                        from flask import current_app
-                        email_service.init_app(current_app)
-                        
-                        # Fetch booking details from DB for email
-                        db_booking = supabase_service.get_booking_by_partner_order_id(partner_order_id)
-                        booking_data = db_booking.get('data') if db_booking else None
-                        
-                        if booking_data:
-                            # Extract guest names professionally
-                            guests = booking_data.get('guests', [])
-                            customer_name = "Valued Guest"
-                            if guests and isinstance(guests, list) and len(guests) > 0:
-                                first_guest = guests[0]
-                                first_name = first_guest.get('first_name', '')
-                                last_name = first_guest.get('last_name', '')
-                                if first_name or last_name:
-                                    customer_name = f"{first_name} {last_name}".strip()
-                            
-                            customer_email = booking_data.get('customer_email') or booking_data.get('email')
-                            if customer_email:
-                                email_details = {
-                                    'booking_id': partner_order_id,
-                                    'customer_name': customer_name,
-                                    'customer_email': customer_email,
-                                    'customer_phone': booking_data.get('customer_phone') or booking_data.get('phone', ''),
-                                    'hotel_name': booking_data.get('hotel_name', 'Hotel'),
-                                    'hotel_address': booking_data.get('hotel_address', ''),
-                                    'destination': booking_data.get('hotel_city', ''),
-                                    'checkin': booking_data.get('check_in') or booking_data.get('checkin'),
-                                    'checkout': booking_data.get('check_out') or booking_data.get('checkout'),
-                                    'amount': booking_data.get('total_amount', 0),
-                                    'currency': booking_data.get('currency', 'USD'),
-                                    'room_name': booking_data.get('room_name', 'Standard Room')
-                                }
-                                email_sent = email_service.send_booking_confirmation(customer_email, email_details)
-                                print(f"{'✅' if email_sent else '❌'} Confirmation email {'sent' if email_sent else 'FAILED'} to {customer_email}")
-                            else:
-                                print(f"⚠️ No customer email found for booking {partner_order_id}")
-                        else:
-                            print(f"⚠️ No booking data found in DB for {partner_order_id}")
-                    except Exception as email_err:
-                        print(f"❌ Error sending confirmation email: {email_err}")
-                    
-                    return jsonify({
-                        'success': True,
-                        'status': 'confirmed',
-                        'data': result['data']
-                    })
-                
-                # === KNOWN TERMINAL ERRORS (Table 4) ===
-                error_key = error if error else status
-                if error_key in ERROR_MESSAGES:
-                    supabase_service.update_booking_by_partner_order_id(
-                        partner_order_id,
-                        {'status': 'failed', 'booking_response': result['data']}
-                    )
-                    return jsonify({
-                        'success': False,
-                        'status': 'failed',
-                        'error': ERROR_MESSAGES[error_key],
-                        'error_code': error_key.upper()
-                    })
-                
-                # === NON-FINAL ERRORS (timeout, unknown, processing) ===
-                # Per Mikhail: Continue polling until status "ok" or a definitive terminal error.
-                if status == 'processing' or error_key in ('timeout', 'unknown'):
-                    print(f"🔄 Polling Status: {status} (Error: {error_key}). Attempt {attempt+1}/{max_attempts}...")
-                    attempt += 1
-                    time.sleep(2.5)
-                    continue
-                
-                # Unrecognized status -> default to continue polling (Safety)
-                attempt += 1
-                time.sleep(2.5)
-                continue
-            
-            # API call itself failed (5xx, network error)
-            else:
-                # 5xx / Network Error -> continue polling (ETG says it can still be successful)
-                status_code = result.get('status_code', 'unknown')
-                print(f"⚠️ Status check failed (HTTP {status_code}) on attempt {attempt+1}, continuing...")
-                attempt += 1
-                time.sleep(2.5)
-                continue
-        
-        # === POLLING TIMEOUT (180s exhausted) ===
-        # Save as pending - booking may still succeed on ETG side
-        supabase_service.update_booking_by_partner_order_id(
-            partner_order_id,
-            {'status': 'pending'}
-        )
+        try:
+            wait = min(max(float(data.get('wait', BOOK_POLL_DEFAULT_WAIT)), 0), BOOK_POLL_MAX_WAIT)
+            since_version = int(data.get('since_version', -1))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'wait and since_version must be numbers'}), 400
+
+        state = booking_status_for_reader(partner_order_id)
+        if state is None:
+            return jsonify({'success': False, 'error': 'Booking not found'}), 404
+        if state['status'] == 'processing':
+            state = booking_status_poller.wait_for_update(
+                partner_order_id, since_version=max(since_version, state['version']), timeout=wait
+            ) or state
+
+        return booking_poll_response(state)
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@hotel_bp.route('/book/events/<partner_order_id>', methods=['GET'])
+def booking_status_events(partner_order_id):
+    """
+    Live booking status as server-sent events (or NDJSON with ?stream=ndjson)
+
+    Backed by the shared booking_status_poller, so any number of open tabs
+    cost one upstream /finish/status/ poll per interval. Events:
+
+        status     {"status": "processing" | "confirmed" | "failed" | "pending", "version": n, ...}
+        heartbeat  every few seconds while nothing changes
+        done       final state reached, client should close the stream
+
+    Each stream stays open for at most BOOK_EVENTS_STREAM_SECONDS so it does
+    not pin a gunicorn thread for the whole 180-second window; EventSource
+    reconnects on its own and resumes from Last-Event-ID (the state version).
+    Only BOOK_EVENTS_STREAM_MAX streams run per process - past that this
+    returns 503 and the payment pages fall back to /book/poll.
+    """
+    stream_format = 'ndjson' if (request.args.get('stream') or '').lower() == 'ndjson' else 'sse'
+    try:
+        since_version = int(request.headers.get('Last-Event-ID') or request.args.get('since_version', -1))
+    except (TypeError, ValueError):
+        since_version = -1
+
+    if Config.BOOK_EVENTS_STREAM_MAX <= 0 or not _booking_event_streams.acquire(blocking=False):
+        response = jsonify({
+            'success': False,
+            'error': 'Live booking status is busy, poll /book/poll instead',
+            'error_code': 'STREAMS_BUSY'
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+
+    released = threading.Event()
+
+    def release_stream():
+        if not released.is_set():
+            released.set()
+            _booking_event_streams.release()
+
+    try:
+        state = booking_status_for_reader(partner_order_id)
+    except Exception as e:
+        release_stream()
+        return jsonify({'success': False, 'error': str(e)}), 500
+    if state is None:
+        release_stream()
+        return jsonify({'success': False, 'error': 'Booking not found'}), 404
+
+    def events():
+        current = state
+        version = since_version
+        deadline = time.monotonic() + BOOK_EVENTS_STREAM_SECONDS
+        while True:
+            if current['version'] > version or current['status'] in ('confirmed', 'failed', 'pending'):
+                version = current['version']
+                yield 'status', current, version
+                if current['status'] in ('confirmed', 'failed', 'pending'):
+                    yield 'done', {'status': current['status']}, version
+                    return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            previous_version = current['version']
+            current = booking_status_poller.wait_for_update(
+                partner_order_id, since_version=version,
+                timeout=min(BOOK_EVENTS_HEARTBEAT_SECONDS, remaining)
+            ) or current
+            if current['version'] == previous_version and current['status'] == 'processing':
+                yield 'heartbeat', {'elapsed_seconds': current.get('elapsed_seconds', 0)}, None
+
+    def generate():
+        if stream_format == 'sse':
+            yield f"retry: {BOOK_EVENTS_RETRY_MS}\n\n"
+        for event, payload, event_id in events():
+            yield format_stream_event(event, payload, stream_format, event_id=event_id)
+
+    response = current_app.response_class(
+        stream_with_context(generate()),
+        mimetype=STREAM_MEDIA_TYPES[stream_format]
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let proxies buffer the stream
+    response.call_on_close(release_stream)
+    return response
+
+
+def booking_status_for_reader(partner_order_id: str) -> Optional[dict]:
+    """
+    Poller state for the unauthenticated /book/poll and /book/events readers,
+    or None when there is no such booking.
+
+    Only a booking handed to ETG (hotel_bookings status "processing") gets
+    tracked; one already settled is reported as stored, so arbitrary order
+    ids never start upstream polling.
+    """
+    state = booking_status_poller.get_state(partner_order_id)
+    if state is not None:
+        return state
+
+    db_booking = supabase_service.get_booking_by_partner_order_id(partner_order_id)
+    if not db_booking.get('success'):
+        raise RuntimeError(db_booking.get('error') or 'Could not load booking')
+    row = db_booking.get('data')
+    if not isinstance(row, dict):
+        return None
+    if row.get('status') == 'processing':
+        return booking_status_poller.track(partner_order_id)
+    if row.get('status') in ('confirmed', 'failed', 'pending'):
+        return booking_row_state(partner_order_id, row).to_dict()
+    return None
+
+
+def booking_poll_response(state: dict):
+    """Map a poller state to the response shape the payment pages expect"""
+    status = state['status']
+    if status == 'confirmed':
+        return jsonify({'success': True, 'status': 'confirmed', 'data': state.get('data')})
+    if status == 'failed':
         return jsonify({
             'success': False,
-            'error': 'Your booking is still being processed by the hotel. We will email you a confirmation once it is finalized.',
+            'status': 'failed',
+            'error': state.get('error'),
+            'error_code': state.get('error_code')
+        })
+    if status == 'pending':
+        return jsonify({
+            'success': False,
+            'error': state.get('error'),
             'status': 'pending',
-            'error_code': 'TIMEOUT_PENDING'
+            'error_code': state.get('error_code') or 'TIMEOUT_PENDING'
         }), 202  # 202 Accepted (still processing)
-    
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return jsonify({
+        'success': True,
+        'status': 'processing',
+        'version': state.get('version', 0),
+        'attempts': state.get('attempts', 0),
+        'elapsed_seconds': state.get('elapsed_seconds', 0)
+    }), 202
 
 
 # ==========================================
@@ -4413,7 +4873,7 @@ def resend_booking_email():
             'currency': booking_data.get('currency', 'USD')
         }
         
-        email_sent = email_service.send_booking_confirmation(customer_email, email_details)
+        email_sent = email_service.send_booking_confirmation(customer_email, email_details, resend=True)
         
         if email_sent:
             return jsonify({
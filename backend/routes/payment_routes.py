@@ -7,6 +7,8 @@ from datetime import datetime
 import hmac
 import hashlib
 from services.admin_service import require_auth
+from services.booking_jobs import enqueue_booking_fulfillment
+from services.idempotency_service import idempotent
 
 payment_bp = Blueprint('payment', __name__, url_prefix='/api/payment')
 
@@ -62,6 +64,7 @@ def create_order():
 
 
 @payment_bp.route('/verify', methods=['POST'])
+@idempotent('payment_verify')
 def verify_payment():
     """
     Verify payment signature after checkout
@@ -103,6 +106,7 @@ def verify_payment():
             return jsonify({'success': False, 'error': 'Invalid payment signature'}), 400
 
         # ── Signature is valid — record payment and finalize with ETG ──
+        fulfillment_queued = False
         if 'booking_id' in data and supabase:
             try:
                 # Create payment record immediately (payment is real)
@@ -145,106 +149,10 @@ def verify_payment():
                     print(f"❌ Payment verification failed: Booking ID {data['booking_id']} not found in Supabase.")
                     return jsonify({'success': False, 'error': 'Booking not found'}), 404
 
-                booking = booking_response.data[0]
-                partner_order_id = booking.get('partner_order_id')
-
-                # ── Call finish_booking with the structured room/guest data ──
-                if partner_order_id:
-                    import time
-                    from services.etg_service import etg_service
-
-                    print(f"📋 Calling /booking/finish for {partner_order_id}...")
-                    
-                    # ETG v3 expects at least one guest per room in the rooms array.
-                    # We pass the full structured rooms array to the service.
-                    finish_result = etg_service.finish_booking(
-                        partner_order_id=partner_order_id,
-                        email=booking.get('customer_email'),
-                        phone=booking.get('customer_phone'),
-                        guests=booking.get('guests', []), # Legacy fallback
-                        rooms=booking.get('rooms'),       # Essential structured room guests
-                        amount=booking.get('total_amount', 0),
-                        currency=booking.get('currency', 'USD')
-                    )
-
-                    finish_ok = finish_result.get('success', False)
-                    finish_error = str(finish_result.get('error', '')).lower()
-
-                    # Per ETG Table 3: timeout/unknown errors → start polling anyway
-                    should_poll = finish_ok or 'timeout' in finish_error or 'unknown' in finish_error
-
-                    if not should_poll:
-                        print(f"❌ /booking/finish failed with terminal error: {finish_result.get('error')}")
-                        supabase.table('hotel_bookings').update({
-                            'status': 'payment_received_booking_failed',
-                            'updated_at': datetime.utcnow().isoformat() + 'Z'
-                        }).eq('id', data['booking_id']).execute()
-                    else:
-                        # ── FIX #4 & #5: Poll /finish/status until ETG confirms ──
-                        print(f"🔄 Polling /finish/status for {partner_order_id}...")
-                        etg_confirmed = False
-                        max_polls = 10
-                        poll_interval = 6  # seconds
-
-                        for attempt in range(max_polls):
-                            time.sleep(poll_interval)
-                            status_result = etg_service.check_booking_status(partner_order_id)
-                            status_data = status_result.get('data', {})
-                            etg_status = (
-                                status_data.get('status')
-                                or status_data.get('data', {}).get('status')
-                                or ''
-                            )
-                            print(f"  Poll {attempt+1}/{max_polls}: ETG status = '{etg_status}'")
-
-                            if etg_status == 'ok':
-                                etg_confirmed = True
-                                break
-                            elif etg_status in ('error', 'not_available', 'unknown_error'):
-                                print(f"  ❌ ETG returned terminal error status: {etg_status}")
-                                break
-                            # 'in_progress' / '' → keep polling
-
-                        # ── FIX #4: Only mark 'confirmed' AFTER ETG confirms ──
-                        if etg_confirmed:
-                            print(f"✅ ETG confirmed booking {partner_order_id}")
-                            supabase.table('hotel_bookings').update({
-                                'status': 'confirmed',
-                                'updated_at': datetime.utcnow().isoformat() + 'Z'
-                            }).eq('id', data['booking_id']).execute()
-                        else:
-                            # Payment received but ETG confirmation pending / failed
-                            print(f"⚠️ ETG did not confirm within polling window for {partner_order_id}")
-                            supabase.table('hotel_bookings').update({
-                                'status': 'pending_etg_confirmation',
-                                'updated_at': datetime.utcnow().isoformat() + 'Z'
-                            }).eq('id', data['booking_id']).execute()
-
-                else:
-                    print(f"⚠️ No partner_order_id found for booking {data['booking_id']} — skipping ETG finish")
-                    # Still mark confirmed for payment received (no ETG order to finish)
-                    supabase.table('hotel_bookings').update({
-                        'status': 'confirmed',
-                        'updated_at': datetime.utcnow().isoformat() + 'Z'
-                    }).eq('id', data['booking_id']).execute()
-
-                # ── Send confirmation email (regardless of ETG status — payment captured) ──
-                try:
-                    email_details = {
-                        'booking_id': booking.get('id'),
-                        'hotel_name': booking.get('hotel_name', 'Hotel'),
-                        'customer_name': f"{booking.get('first_name', '')} {booking.get('last_name', '')}",
-                        'customer_email': booking.get('customer_email'),
-                        'checkin': booking.get('check_in'),
-                        'checkout': booking.get('check_out'),
-                        'amount': booking.get('total_amount'),
-                        'currency': booking.get('currency', 'USD')
-                    }
-                    from services.email_service import email_service
-                    email_service.init_app(current_app)
-                    email_service.send_booking_confirmation(booking.get('customer_email'), email_details)
-                except Exception as email_err:
-                    print(f"Email error (non-fatal): {email_err}")
+                # ── Finish with ETG, poll status, render PDFs and email in the background ──
+                job = enqueue_booking_fulfillment(data['booking_id'], 'razorpay')
+                print(f"📬 Queued booking fulfillment for {data['booking_id']} (job {job['id']}, {job['status']})")
+                fulfillment_queued = True
 
             except Exception as db_error:
                 print(f"DB/ETG error in verify_payment: {db_error}")
@@ -253,7 +161,10 @@ def verify_payment():
 
         return jsonify({
             'success': True,
-            'message': 'Payment verified successfully'
+            'message': 'Payment verified successfully',
+            'booking_status': 'processing',
+            # The client must not call /book/finish itself once this is set
+            'fulfillment': 'queued' if fulfillment_queued else None
         }), 200
 
     except Exception as e:
@@ -600,103 +511,9 @@ def capture_paypal_order(order_id):
                         'updated_at': datetime.utcnow().isoformat() + 'Z'
                     }).eq('id', data['booking_id']).execute()
 
-                    # Fetch full booking record to get partner_order_id
-                    booking_response = supabase.table('hotel_bookings').select('*').eq('id', data['booking_id']).execute()
-                    
-                    if booking_response.data:
-                        booking = booking_response.data[0]
-                        partner_order_id = booking.get('partner_order_id')
-                        
-                        # ── FIX #2 & #3: Call finish_booking with proper error handling ──
-                        if partner_order_id:
-                            import time
-                            from services.etg_service import etg_service
-                            
-                            print(f"📋 Calling /booking/finish for PayPal order {partner_order_id}...")
-                            finish_result = etg_service.finish_booking(
-                                partner_order_id=partner_order_id,
-                                email=booking.get('customer_email') or booking.get('email', 'info@coasttocoastjourneys.com'),
-                                phone=booking.get('customer_phone') or booking.get('phone', '0000000000'),
-                                guests=booking.get('guests', []),
-                                rooms=booking.get('rooms'),
-                                amount=booking.get('total_amount', 0),
-                                currency=booking.get('currency', 'USD')
-                            )
-
-                            finish_ok = finish_result.get('success', False)
-                            finish_error = str(finish_result.get('error', '')).lower()
-
-                            # Per ETG Table 3: timeout/unknown errors → start polling anyway
-                            should_poll = finish_ok or 'timeout' in finish_error or 'unknown' in finish_error
-
-                            if not should_poll:
-                                print(f"❌ /booking/finish failed for PayPal order: {finish_result.get('error')}")
-                                supabase.table('hotel_bookings').update({
-                                    'status': 'payment_received_booking_failed',
-                                    'updated_at': datetime.utcnow().isoformat() + 'Z'
-                                }).eq('id', data['booking_id']).execute()
-                            else:
-                                # ── FIX #4 & #5: Poll /finish/status until ETG confirms ──
-                                print(f"🔄 Polling /finish/status for PayPal order {partner_order_id}...")
-                                etg_confirmed = False
-                                max_polls = 10
-                                poll_interval = 6  # seconds
-
-                                for attempt in range(max_polls):
-                                    time.sleep(poll_interval)
-                                    status_result = etg_service.check_booking_status(partner_order_id)
-                                    status_data = status_result.get('data', {})
-                                    etg_status = (
-                                        status_data.get('status')
-                                        or status_data.get('data', {}).get('status')
-                                        or ''
-                                    )
-                                    print(f"  Poll {attempt+1}/{max_polls}: ETG status = '{etg_status}'")
-
-                                    if etg_status == 'ok':
-                                        etg_confirmed = True
-                                        break
-                                    elif etg_status in ('error', 'not_available', 'unknown_error'):
-                                        print(f"  ❌ ETG returned terminal error for PayPal order: {etg_status}")
-                                        break
-
-                                # ── FIX #4: Only mark 'confirmed' AFTER ETG confirms ──
-                                if etg_confirmed:
-                                    print(f"✅ ETG confirmed PayPal booking {partner_order_id}")
-                                    supabase.table('hotel_bookings').update({
-                                        'status': 'confirmed',
-                                        'updated_at': datetime.utcnow().isoformat() + 'Z'
-                                    }).eq('id', data['booking_id']).execute()
-                                else:
-                                    print(f"⚠️ ETG did not confirm PayPal order within polling window for {partner_order_id}")
-                                    supabase.table('hotel_bookings').update({
-                                        'status': 'pending_etg_confirmation',
-                                        'updated_at': datetime.utcnow().isoformat() + 'Z'
-                                    }).eq('id', data['booking_id']).execute()
-                        else:
-                            print(f"⚠️ No partner_order_id found for PayPal booking {data['booking_id']}")
-                            supabase.table('hotel_bookings').update({
-                                'status': 'confirmed',
-                                'updated_at': datetime.utcnow().isoformat() + 'Z'
-                            }).eq('id', data['booking_id']).execute()
-
-                        # ── Send confirmation email ──
-                        try:
-                            email_details = {
-                                'booking_id': booking.get('id'),
-                                'hotel_name': booking.get('hotel_name', 'Hotel'),
-                                'customer_name': f"{booking.get('first_name', '')} {booking.get('last_name', '')}",
-                                'customer_email': booking.get('customer_email') or booking.get('email'),
-                                'checkin': booking.get('check_in') or booking.get('checkin'),
-                                'checkout': booking.get('check_out') or booking.get('checkout'),
-                                'amount': booking.get('total_amount'),
-                                'currency': booking.get('currency', 'USD')
-                            }
-                            from services.email_service import email_service
-                            email_service.init_app(current_app)
-                            email_service.send_booking_confirmation(email_details['customer_email'], email_details)
-                        except Exception as email_error:
-                            print(f"Email error for PayPal order (non-fatal): {email_error}")
+                    # ── Finish with ETG, poll status, render PDFs and email in the background ──
+                    job = enqueue_booking_fulfillment(data['booking_id'], 'paypal')
+                    print(f"📬 Queued booking fulfillment for PayPal booking {data['booking_id']} (job {job['id']}, {job['status']})")
 
                 except Exception as db_error:
                     print(f"DB/ETG error in capture_paypal_order: {db_error}")
@@ -798,88 +615,9 @@ def verify_stripe_payment():
                         'updated_at': datetime.utcnow().isoformat() + 'Z'
                     }).eq('id', booking_id).execute()
 
-                    # Fetch booking
-                    booking_response = supabase.table('hotel_bookings').select('*').eq('id', booking_id).execute()
-                    
-                    if booking_response.data:
-                        booking = booking_response.data[0]
-                        partner_order_id = booking.get('partner_order_id')
-                        
-                        if partner_order_id:
-                            import time
-                            from services.etg_service import etg_service
-                            
-                            print(f"📋 Calling /booking/finish for Stripe order {partner_order_id}...")
-                            # Since we don't pass frontend data here, we just use what's saved in DB
-                            finish_result = etg_service.finish_booking(
-                                partner_order_id=partner_order_id,
-                                email=booking.get('customer_email') or booking.get('email', 'info@coasttocoastjourneys.com'),
-                                phone=booking.get('customer_phone') or booking.get('phone', '0000000000'),
-                                guests=booking.get('guests', []),
-                                rooms=booking.get('rooms'),
-                                amount=booking.get('total_amount', 0),
-                                currency=booking.get('currency', 'USD')
-                            )
-
-                            finish_ok = finish_result.get('success', False)
-                            finish_error = str(finish_result.get('error', '')).lower()
-                            should_poll = finish_ok or 'timeout' in finish_error or 'unknown' in finish_error
-
-                            if not should_poll:
-                                supabase.table('hotel_bookings').update({
-                                    'status': 'payment_received_booking_failed',
-                                    'updated_at': datetime.utcnow().isoformat() + 'Z'
-                                }).eq('id', booking_id).execute()
-                            else:
-                                print(f"🔄 Polling /finish/status for Stripe order {partner_order_id}...")
-                                etg_confirmed = False
-                                max_polls = 10
-                                poll_interval = 6
-                                for attempt in range(max_polls):
-                                    time.sleep(poll_interval)
-                                    status_result = etg_service.check_booking_status(partner_order_id)
-                                    status_data = status_result.get('data', {})
-                                    etg_status = status_data.get('status') or status_data.get('data', {}).get('status') or ''
-                                    
-                                    if etg_status == 'ok':
-                                        etg_confirmed = True
-                                        break
-                                    elif etg_status in ('error', 'not_available', 'unknown_error'):
-                                        break
-
-                                if etg_confirmed:
-                                    supabase.table('hotel_bookings').update({
-                                        'status': 'confirmed',
-                                        'updated_at': datetime.utcnow().isoformat() + 'Z'
-                                    }).eq('id', booking_id).execute()
-                                else:
-                                    supabase.table('hotel_bookings').update({
-                                        'status': 'pending_etg_confirmation',
-                                        'updated_at': datetime.utcnow().isoformat() + 'Z'
-                                    }).eq('id', booking_id).execute()
-                        else:
-                            supabase.table('hotel_bookings').update({
-                                'status': 'confirmed',
-                                'updated_at': datetime.utcnow().isoformat() + 'Z'
-                            }).eq('id', booking_id).execute()
-
-                        # Send confirmation email
-                        try:
-                            email_details = {
-                                'booking_id': booking.get('id'),
-                                'hotel_name': booking.get('hotel_name', 'Hotel'),
-                                'customer_name': f"{booking.get('first_name', '')} {booking.get('last_name', '')}",
-                                'customer_email': booking.get('customer_email') or booking.get('email'),
-                                'checkin': booking.get('check_in') or booking.get('checkin'),
-                                'checkout': booking.get('check_out') or booking.get('checkout'),
-                                'amount': booking.get('total_amount'),
-                                'currency': booking.get('currency', 'USD')
-                            }
-                            from services.email_service import email_service
-                            email_service.init_app(current_app)
-                            email_service.send_booking_confirmation(email_details['customer_email'], email_details)
-                        except Exception as e:
-                            pass
+                    # ── Finish with ETG, poll status, render PDFs and email in the background ──
+                    job = enqueue_booking_fulfillment(booking_id, 'stripe')
+                    print(f"📬 Queued booking fulfillment for Stripe booking {booking_id} (job {job['id']}, {job['status']})")
                 except Exception as e:
                     print(f"DB/ETG error in Stripe verify: {e}")
             
@@ -0,0 +1,353 @@
+"""
+C2C Journeys - Admin Listings
+What each admin list endpoint reads: table, column projection, how request
+args turn into PostgREST filters, and the columns its CSV export writes.
+
+The list endpoints page through these with services.pagination.paginate();
+/api/admin/export/<listing> streams the same filtered rows as CSV, so an
+export always matches what the listing shows.
+"""
+import csv
+import io
+import json
+import os
+import sys
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.pagination import filter_value, paginate
+
+
+HOTEL_BOOKING_LIST_COLUMNS = ('id, booking_id, partner_order_id, etg_order_id, hotel_name, hotel_city, hotel_country, '
+                              'check_in, check_out, rooms, guests, customer_name, customer_email, customer_phone, '
+                              'total_amount, currency, status, payment_status, created_at')
+PAYMENT_LIST_COLUMNS = ('id, booking_id, partner_order_id, customer_name, customer_email, guest_name, guest_email, '
+                        'total_amount, total_price, currency, payment_status, payment_method, payment_id, status, created_at')
+REFUND_LIST_COLUMNS = ('id, booking_id, partner_order_id, hotel_name, customer_name, customer_email, total_amount, currency, '
+                       'status, payment_status, refund_status, refund_amount, cancellation_info, created_at')
+CUSTOMER_LIST_COLUMNS = ('id, full_name, email, phone, city, country, customer_type, is_active, total_bookings, '
+                         'total_spent, last_booking_at, created_at')
+ACTIVITY_LOG_LIST_COLUMNS = ('id, admin_id, user_id, action, entity_type, entity_id, details, ip_address, created_at, '
+                             'admin_users(email, full_name)')
+SEARCH_LOG_LIST_COLUMNS = ('id, created_at, email, user_type, destination, checkin, checkout, nights, rooms, adults, '
+                           'children, device_type, browser, operating_system, ip_address, country, search_type')
+FLIGHT_BOOKING_LIST_COLUMNS = ('id, booking_id, pnr, status, payment_status, payment_method, trip_type, flight_type, '
+                               'origin_code, origin_city, destination_code, destination_city, airline_code, airline_name, '
+                               'flight_number, departure_datetime, arrival_datetime, duration_minutes, stops, cabin_class, '
+                               'return_flight_number, passengers, passenger_name, total_passengers, base_fare, taxes_fees, '
+                               'markup_amount, total_amount, currency, supplier_name, booking_source, created_at')
+
+
+def _date_range(query, args, column: str = 'created_at'):
+    if args.get('from_date'):
+        query = query.gte(column, f"{args['from_date']}T00:00:00")
+    if args.get('to_date'):
+        query = query.lte(column, f"{args['to_date']}T23:59:59")
+    return query
+
+
+def _search(query, args, columns: List[str]):
+    term = filter_value(args.get('search', ''))
+    if term:
+        query = query.or_(','.join(f"{col}.ilike.*{term}*" for col in columns))
+    return query
+
+
+def hotel_booking_filters(args) -> Callable:
+    def apply(query):
+        if args.get('status'):
+            query = query.eq('status', args['status'])
+        if args.get('customer_id'):
+            query = query.eq('customer_id', args['customer_id'])
+        query = _date_range(query, args)
+        return _search(query, args, ['partner_order_id', 'booking_id', 'hotel_name', 'customer_name', 'customer_email'])
+    return apply
+
+
+def payment_filters(args) -> Callable:
+    def apply(query):
+        if args.get('status'):
+            query = query.eq('payment_status', args['status'])
+        if args.get('method'):
+            query = query.eq('payment_method', args['method'].lower())
+        return _date_range(query, args)
+    return apply
+
+
+def refund_filters(args) -> Callable:
+    def apply(query):
+        return _date_range(query.in_('status', ['cancelled', 'refunded']), args)
+    return apply
+
+
+def customer_filters(args) -> Callable:
+    def apply(query):
+        if args.get('status') in ('active', 'inactive'):
+            query = query.eq('is_active', args['status'] == 'active')
+        return _search(query, args, ['full_name', 'email', 'phone'])
+    return apply
+
+
+def activity_log_filters(args) -> Callable:
+    """admin_id, action (comma list), target_type / target_id (entity_type / entity_id), dates, search in details"""
+    def apply(query):
+        if args.get('admin_id'):
+            query = query.eq('admin_id', args['admin_id'])
+        actions = [a for a in (filter_value(a) for a in (args.get('action') or '').split(',')) if a]
+        if len(actions) == 1:
+            query = query.eq('action', actions[0])
+        elif actions:
+            query = query.in_('action', actions)
+        target_type = args.get('target_type') or args.get('entity_type')
+        if target_type:
+            query = query.eq('entity_type', target_type)
+        target_id = args.get('target_id') or args.get('entity_id')
+        if target_id:
+            query = query.eq('entity_id', target_id)
+        query = _date_range(query, args)
+        return _search(query, args, ['details'])
+    return apply
+
+
+def search_log_filters(args) -> Callable:
+    def apply(query):
+        query = _date_range(query, args)
+        if args.get('device'):
+            query = query.eq('device_type', args['device'])
+        if args.get('user_type'):
+            query = query.eq('user_type', args['user_type'])
+        destination = filter_value(args.get('destination', ''))
+        if destination:
+            query = query.ilike('destination', f"%{destination}%")
+        return query
+    return apply
+
+
+def flight_enquiry_filters(args) -> Callable:
+    def apply(query):
+        for column in ('status', 'travel_class', 'trip_type'):
+            if args.get(column):
+                query = query.eq(column, args[column])
+        query = _date_range(query, args)
+        return _search(query, args, ['full_name', 'email', 'phone'])
+    return apply
+
+
+def flight_booking_filters(args) -> Callable:
+    def apply(query):
+        if args.get('status'):
+            query = query.eq('status', args['status'])
+        if args.get('airline'):
+            query = query.eq('airline_code', args['airline'])
+        trip_type = args.get('trip_type')
+        if trip_type == 'roundtrip':
+            query = query.not_.is_('return_flight_number', 'null')
+        elif trip_type in ('domestic', 'international'):
+            query = query.eq('trip_type', trip_type)
+        # Flights filter on travel date, not booking date
+        if args.get('from_date'):
+            query = query.gte('departure_datetime', args['from_date'])
+        if args.get('to_date'):
+            query = query.lte('departure_datetime', args['to_date'] + 'T23:59:59')
+        return _search(query, args, ['booking_id', 'pnr', 'airline_name', 'flight_number'])
+    return apply
+
+
+def refund_management_pages(supabase, args, page_size: int) -> Iterator[List[Dict]]:
+    """The merged hotel + flight refund list (services.refund_listing), page by page"""
+    from services.refund_listing import refund_listing
+    cursor = None
+    while True:
+        page = refund_listing.list_bookings(
+            supabase, status=args.get('status'), payment_method=args.get('payment_method'),
+            search=args.get('search'), booking_type=args.get('type'),
+            from_date=args.get('from_date'), to_date=args.get('to_date'),
+            limit=page_size, cursor=cursor
+        )
+        if page['data']:
+            yield page['data']
+        cursor = page['next_cursor']
+        if not cursor:
+            return
+
+
+# listing -> table, projection, filter builder, export columns [(field, header)]
+# (dotted fields read embedded resources, e.g. admin_users.email). Listings
+# that aren't a single table provide 'pages' instead. 'roles' repeats the
+# listing endpoint's required_role so its export is no more open than the page.
+LISTINGS = {
+    'bookings': {
+        'table': 'hotel_bookings',
+        'columns': HOTEL_BOOKING_LIST_COLUMNS,
+        'filters': hotel_booking_filters,
+        'export': [
+            ('partner_order_id', 'Booking Ref'), ('booking_id', 'Booking ID'), ('hotel_name', 'Hotel'),
+            ('hotel_city', 'City'), ('hotel_country', 'Country'), ('check_in', 'Check In'),
+            ('check_out', 'Check Out'), ('rooms', 'Rooms'), ('customer_name', 'Customer'),
+            ('customer_email', 'Email'), ('customer_phone', 'Phone'), ('total_amount', 'Amount'),
+            ('currency', 'Currency'), ('status', 'Status'), ('payment_status', 'Payment Status'),
+            ('created_at', 'Created At'),
+        ],
+    },
+    'payments': {
+        'table': 'hotel_bookings',
+        'columns': PAYMENT_LIST_COLUMNS,
+        'filters': payment_filters,
+        'export': [
+            ('partner_order_id', 'Booking Ref'), ('payment_id', 'Payment ID'), ('customer_name', 'Customer'),
+            ('customer_email', 'Email'), ('total_amount', 'Amount'), ('currency', 'Currency'),
+            ('payment_method', 'Method'), ('payment_status', 'Payment Status'), ('status', 'Booking Status'),
+            ('created_at', 'Created At'),
+        ],
+    },
+    'refunds': {
+        'table': 'hotel_bookings',
+        'columns': REFUND_LIST_COLUMNS,
+        'filters': refund_filters,
+        'export': [
+            ('partner_order_id', 'Booking Ref'), ('hotel_name', 'Hotel'), ('customer_name', 'Customer'),
+            ('customer_email', 'Email'), ('total_amount', 'Amount'), ('refund_amount', 'Refund Amount'),
+            ('currency', 'Currency'), ('status', 'Status'), ('refund_status', 'Refund Status'),
+            ('created_at', 'Created At'),
+        ],
+    },
+    'customers': {
+        'table': 'customers',
+        'columns': CUSTOMER_LIST_COLUMNS,
+        'filters': customer_filters,
+        'export': [
+            ('full_name', 'Name'), ('email', 'Email'), ('phone', 'Phone'), ('city', 'City'),
+            ('country', 'Country'), ('customer_type', 'Type'), ('is_active', 'Active'),
+            ('total_bookings', 'Bookings'), ('total_spent', 'Total Spent'), ('created_at', 'Created At'),
+        ],
+    },
+    'activity-logs': {
+        'roles': ['super_admin', 'staff'],
+        'table': 'activity_logs',
+        'columns': ACTIVITY_LOG_LIST_COLUMNS,
+        'filters': activity_log_filters,
+        'export': [
+            ('created_at', 'Time'), ('admin_users.email', 'Admin'), ('action', 'Action'),
+            ('entity_type', 'Entity Type'), ('entity_id', 'Entity ID'), ('details', 'Details'),
+            ('ip_address', 'IP Address'),
+        ],
+    },
+    'search-logs': {
+        'roles': ['super_admin', 'staff', 'admin'],
+        'table': 'hotel_search_logs',
+        'columns': SEARCH_LOG_LIST_COLUMNS,
+        'filters': search_log_filters,
+        'export': [
+            ('created_at', 'Time'), ('email', 'Email'), ('user_type', 'User Type'), ('destination', 'Destination'),
+            ('checkin', 'Check In'), ('checkout', 'Check Out'), ('nights', 'Nights'), ('rooms', 'Rooms'),
+            ('adults', 'Adults'), ('children', 'Children'), ('device_type', 'Device'), ('browser', 'Browser'),
+            ('operating_system', 'OS'), ('country', 'Country'), ('ip_address', 'IP Address'),
+        ],
+    },
+    'flight-enquiries': {
+        'table': 'flight_enquiries',
+        'columns': '*',
+        'filters': flight_enquiry_filters,
+        'export': [
+            ('id', 'Lead ID'), ('full_name', 'Full Name'), ('email', 'Email'), ('phone', 'Phone'),
+            ('country_code', 'Country Code'), ('travel_class', 'Travel Class'), ('trip_type', 'Trip Type'),
+            ('from_airport', 'From Airport'), ('from_airport_code', 'From Code'), ('from_city', 'From City'),
+            ('to_airport', 'To Airport'), ('to_airport_code', 'To Code'), ('to_city', 'To City'),
+            ('departure_date', 'Departure Date'), ('return_date', 'Return Date'), ('adults', 'Adults'),
+            ('children', 'Children'), ('infants', 'Infants'), ('status', 'Status'), ('created_at', 'Created At'),
+        ],
+    },
+    'flight-bookings': {
+        'table': 'flight_bookings',
+        'columns': FLIGHT_BOOKING_LIST_COLUMNS,
+        'filters': flight_booking_filters,
+        'export': [
+            ('booking_id', 'Booking ID'), ('pnr', 'PNR'), ('airline_name', 'Airline'), ('flight_number', 'Flight'),
+            ('origin_code', 'From'), ('destination_code', 'To'), ('departure_datetime', 'Departure'),
+            ('passenger_name', 'Passenger'), ('total_passengers', 'Passengers'), ('total_amount', 'Amount'),
+            ('currency', 'Currency'), ('status', 'Status'), ('payment_status', 'Payment Status'),
+            ('created_at', 'Created At'),
+        ],
+    },
+    'refund-management': {
+        'pages': refund_management_pages,
+        'export': [
+            ('booking_id', 'Booking ID'), ('booking_type', 'Type'), ('customer_name', 'Customer'),
+            ('email', 'Email'), ('phone', 'Phone'), ('details', 'Details'), ('amount', 'Amount'),
+            ('refund_amount', 'Refund Amount'), ('payment_method', 'Payment Method'),
+            ('booking_date', 'Booking Date'), ('refund_status', 'Refund Status'),
+            ('refund_method', 'Refund Method'), ('status', 'Status'),
+        ],
+    },
+}
+
+
+def get_filters(listing: str, args) -> Callable:
+    return LISTINGS[listing]['filters'](args)
+
+
+def list_page(supabase, listing: str, args, **params) -> Dict:
+    """One page of a listing with the request's filters applied"""
+    spec = LISTINGS[listing]
+    return paginate(supabase, spec['table'], spec['columns'], get_filters(listing, args), **params)
+
+
+def iter_rows(supabase, listing: str, args, page_size: int = 500) -> Iterator[List[Dict]]:
+    """Every filtered row of a listing, one keyset page at a time"""
+    spec = LISTINGS[listing]
+    if 'pages' in spec:
+        yield from spec['pages'](supabase, args, page_size)
+        return
+    cursor = None
+    while True:
+        page = list_page(supabase, listing, args, limit=page_size, cursor=cursor)
+        if page['data']:
+            yield page['data']
+        cursor = page['next_cursor']
+        if not cursor:
+            return
+
+
+def export_columns(listing: str, requested: Optional[str] = None) -> List:
+    """The listing's export columns, narrowed to ?columns=a,b if given (unknown names ignored)"""
+    columns = LISTINGS[listing]['export']
+    if requested:
+        wanted = [c.strip() for c in requested.split(',') if c.strip()]
+        by_field = dict(columns)
+        columns = [(field, by_field[field]) for field in wanted if field in by_field] or columns
+    return columns
+
+
+# Leading characters that make Excel/Sheets treat a cell as a formula
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _field(row: Dict, field: str):
+    value = row
+    for part in field.split('.'):
+        value = value.get(part) if isinstance(value, dict) else None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        # Customer-supplied text (names, notes) must not run as a spreadsheet formula
+        return "'" + value
+    return '' if value is None else value
+
+
+def csv_chunks(pages: Iterable[List[Dict]], columns: List) -> Iterator[str]:
+    """CSV text for a header plus every row, one chunk per page (nothing buffered beyond a page)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow([header for _, header in columns])
+    yield take()
+    for rows in pages:
+        for row in rows:
+            writer.writerow([_field(row, field) for field, _ in columns])
+        yield take()
@@ -5,14 +5,123 @@ Handles authentication, authorization, and core admin operations
 import bcrypt
 import jwt
 import datetime
+import json
+import os
+import sys
+import uuid
 from functools import wraps
-from flask import request, jsonify
+from flask import has_request_context, request, jsonify
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from services.batch_writer import BatchInsertWriter
+
+# Only the columns the dashboard aggregates need (no guests/booking_response JSONB)
+DASHBOARD_BOOKING_COLUMNS = 'status, total_amount, currency, rooms, check_in, check_out, created_at, hotel_city, hotel_name, hotel_star_rating'
+
+
+def aggregate_hotel_bookings(bookings):
+    """
+    Local equivalent of the admin_dashboard_stats() SQL function, for when the
+    function isn't installed and for checking it against known rows.
+    """
+    status_breakdown = {}
+    monthly = {}
+    destinations = {}
+    stars = {}
+    currencies = {}
+    confirmed_count = 0
+    total_revenue = 0.0
+    total_revenue_all = 0.0
+    nights_total = 0
+    nights_count = 0
+    room_nights = 0
+
+    for b in bookings:
+        status = b.get('status') or 'unknown'
+        amount = float(b.get('total_amount') or 0)
+        status_breakdown[status] = status_breakdown.get(status, 0) + 1
+        total_revenue_all += amount
+        if status == 'confirmed':
+            confirmed_count += 1
+            total_revenue += amount
+
+        try:
+            nights = (datetime.date.fromisoformat(str(b['check_out'])[:10]) -
+                      datetime.date.fromisoformat(str(b['check_in'])[:10])).days
+        except (KeyError, TypeError, ValueError):
+            nights = None
+        if nights is not None:
+            if nights > 0:
+                nights_total += nights
+                nights_count += 1
+            try:
+                rooms = int(b.get('rooms') or 1)
+            except (TypeError, ValueError):
+                rooms = 1
+            room_nights += max(nights, 1) * rooms
+
+        month = (b.get('created_at') or '')[:7]  # YYYY-MM
+        if month:
+            entry = monthly.setdefault(month, {'month': month, 'bookings': 0, 'revenue': 0.0})
+            entry['bookings'] += 1
+            entry['revenue'] += amount
+
+        # By hotel_name when hotel_city is missing (it often is)
+        name = b.get('hotel_city') or b.get('hotel_name') or 'Unknown'
+        entry = destinations.setdefault(name, {'name': name, 'bookings': 0, 'revenue': 0.0})
+        entry['bookings'] += 1
+        entry['revenue'] += amount
+
+        if b.get('hotel_star_rating'):
+            key = f"{b['hotel_star_rating']} Star"
+            stars[key] = stars.get(key, 0) + 1
+
+        currency = b.get('currency') or 'USD'
+        entry = currencies.setdefault(currency, {'count': 0, 'revenue': 0.0})
+        entry['count'] += 1
+        entry['revenue'] += amount
+
+    for entry in list(monthly.values()) + list(destinations.values()) + list(currencies.values()):
+        entry['revenue'] = round(entry['revenue'], 2)
+
+    return {
+        'total_bookings': len(bookings),
+        'confirmed_bookings': confirmed_count,
+        'total_revenue': round(total_revenue, 2),
+        'total_revenue_all': round(total_revenue_all, 2),
+        'avg_booking_value': round(total_revenue / confirmed_count, 2) if confirmed_count else 0,
+        'avg_nights': round(nights_total / nights_count, 1) if nights_count else 0,
+        'total_room_nights': room_nights,
+        'status_breakdown': status_breakdown,
+        'monthly_revenue': [monthly[k] for k in sorted(monthly)],
+        'top_destinations': sorted(destinations.values(), key=lambda d: (-d['bookings'], -d['revenue'], d['name']))[:10],
+        'star_rating_distribution': stars,
+        'currency_breakdown': currencies
+    }
+
+
+def _uuid_or_none(value):
+    try:
+        return str(uuid.UUID(str(value))) if value else None
+    except ValueError:
+        return None
+
 
 class AdminService:
     def __init__(self, supabase_client, secret_key):
         self.supabase = supabase_client
         self.secret_key = secret_key
         self.token_expiry = 24  # hours
+        # Audit trail rows are queued and batch-inserted off the request path
+        self.activity_writer = BatchInsertWriter(
+            'activity_logs',
+            client_getter=lambda: self.supabase,
+            batch_size=Config.ACTIVITY_LOG_BATCH_SIZE,
+            flush_interval_ms=Config.ACTIVITY_LOG_FLUSH_MS,
+            max_queue=Config.ACTIVITY_LOG_QUEUE_SIZE,
+            prepare=self._prepare_activity_row
+        )
     
     def hash_password(self, password):
         """Hash password using bcrypt"""
@@ -207,118 +316,35 @@ class AdminService:
                     }
                 }
 
-            # Fetch all hotel bookings at once for efficient processing
-            all_bookings = []
-            try:
-                query = self.supabase.table('hotel_bookings').select('*')
-                
-                # Apply date filter based on period
-                if period == 'month':
-                    start_date = (datetime.datetime.utcnow().replace(day=1)).isoformat()
-                    query = query.gte('created_at', start_date)
-                elif period == 'week':
-                    start_date = (datetime.datetime.utcnow() - datetime.timedelta(days=7)).isoformat()
-                    query = query.gte('created_at', start_date)
-
-                res = query.order('created_at', desc=True).execute()
-                all_bookings = res.data or []
-            except Exception:
-                pass
-
-            total_bookings_count = len(all_bookings)
-
-            # Status breakdown
-            status_breakdown = {}
-            for b in all_bookings:
-                s = b.get('status', 'unknown')
-                status_breakdown[s] = status_breakdown.get(s, 0) + 1
-
-            confirmed_count = status_breakdown.get('confirmed', 0)
+            since = None
+            if period == 'month':
+                since = (datetime.datetime.utcnow().replace(day=1)).isoformat()
+            elif period == 'week':
+                since = (datetime.datetime.utcnow() - datetime.timedelta(days=7)).isoformat()
 
-            # Revenue calculations
-            confirmed_bookings = [b for b in all_bookings if b.get('status') == 'confirmed']
-            total_revenue = sum(float(b.get('total_amount', 0) or 0) for b in confirmed_bookings)
-            avg_booking_value = round(total_revenue / confirmed_count, 2) if confirmed_count > 0 else 0
-
-            # Total revenue (all statuses for overview)
-            total_revenue_all = sum(float(b.get('total_amount', 0) or 0) for b in all_bookings)
+            # Aggregates are computed in Postgres (admin_dashboard_stats); the
+            # Python path is only used where the function isn't installed yet
+            aggregates = None
+            try:
+                res = self.supabase.rpc('admin_dashboard_stats', {'p_since': since}).execute()
+                aggregates = res.data
+            except Exception as e:
+                print(f"⚠️ RPC admin_dashboard_stats failed, aggregating locally: {e}")
+            if not isinstance(aggregates, dict):
+                rows = []
+                # Older schemas lack hotel_city/hotel_star_rating - fall back to every column
+                for columns in (DASHBOARD_BOOKING_COLUMNS, '*'):
+                    try:
+                        query = self.supabase.table('hotel_bookings').select(columns)
+                        if since:
+                            query = query.gte('created_at', since)
+                        rows = query.execute().data or []
+                        break
+                    except Exception:
+                        continue
+                aggregates = aggregate_hotel_bookings(rows)
 
-            # Average nights stayed
-            total_nights = 0
-            bookings_with_dates = 0
-            for b in all_bookings:
-                try:
-                    from datetime import datetime as dt
-                    ci = dt.strptime(b['check_in'], '%Y-%m-%d')
-                    co = dt.strptime(b['check_out'], '%Y-%m-%d')
-                    nights = (co - ci).days
-                    if nights > 0:
-                        total_nights += nights
-                        bookings_with_dates += 1
-                except Exception:
-                    pass
-            avg_nights = round(total_nights / bookings_with_dates, 1) if bookings_with_dates > 0 else 0
-
-            # Total room-nights
-            total_room_nights = 0
-            for b in all_bookings:
-                try:
-                    from datetime import datetime as dt
-                    ci = dt.strptime(b['check_in'], '%Y-%m-%d')
-                    co = dt.strptime(b['check_out'], '%Y-%m-%d')
-                    nights = max((co - ci).days, 1)
-                    rooms = int(b.get('rooms', 1) or 1)
-                    total_room_nights += nights * rooms
-                except Exception:
-                    pass
-
-            # Monthly revenue and booking count (last 12 months)
-            monthly_data = {}
-            for b in all_bookings:
-                try:
-                    created = b.get('created_at', '')[:7]  # YYYY-MM
-                    if created:
-                        if created not in monthly_data:
-                            monthly_data[created] = {'bookings': 0, 'revenue': 0}
-                        monthly_data[created]['bookings'] += 1
-                        monthly_data[created]['revenue'] += float(b.get('total_amount', 0) or 0)
-                except Exception:
-                    pass
-
-            monthly_revenue = [
-                {'month': k, 'bookings': v['bookings'], 'revenue': round(v['revenue'], 2)}
-                for k, v in sorted(monthly_data.items())
-            ]
-
-            # Top destinations (by hotel_name since hotel_city is often null)
-            destination_counts = {}
-            for b in all_bookings:
-                dest = b.get('hotel_city') or b.get('hotel_name') or 'Unknown'
-                if dest not in destination_counts:
-                    destination_counts[dest] = {'count': 0, 'revenue': 0}
-                destination_counts[dest]['count'] += 1
-                destination_counts[dest]['revenue'] += float(b.get('total_amount', 0) or 0)
-            top_destinations = sorted(
-                [{'name': k, 'bookings': v['count'], 'revenue': round(v['revenue'], 2)} for k, v in destination_counts.items()],
-                key=lambda x: x['bookings'], reverse=True
-            )[:10]
-
-            # Star rating distribution
-            star_distribution = {}
-            for b in all_bookings:
-                stars = b.get('hotel_star_rating')
-                if stars:
-                    key = f"{stars} Star"
-                    star_distribution[key] = star_distribution.get(key, 0) + 1
-
-            # Currency breakdown
-            currency_breakdown = {}
-            for b in all_bookings:
-                curr = b.get('currency', 'USD')
-                if curr not in currency_breakdown:
-                    currency_breakdown[curr] = {'count': 0, 'revenue': 0}
-                currency_breakdown[curr]['count'] += 1
-                currency_breakdown[curr]['revenue'] += float(b.get('total_amount', 0) or 0)
+            status_breakdown = aggregates.get('status_breakdown') or {}
 
             # Pending cancellations
             pending_cancellations_count = 0
@@ -328,8 +354,15 @@ class AdminService:
             except Exception:
                 pending_cancellations_count = status_breakdown.get('cancelled', 0)
 
-            # Recent bookings (already sorted desc)
-            recent_data = all_bookings[:10]
+            # Recent bookings
+            recent_data = []
+            try:
+                query = self.supabase.table('hotel_bookings').select('*')
+                if since:
+                    query = query.gte('created_at', since)
+                recent_data = query.order('created_at', desc=True).limit(10).execute().data or []
+            except Exception:
+                pass
 
             # Guest name extraction for recent bookings
             for b in recent_data:
@@ -356,21 +389,21 @@ class AdminService:
             return {
                 'success': True,
                 'data': {
-                    'total_bookings': total_bookings_count,
-                    'confirmed_bookings': confirmed_count,
-                    'total_revenue': round(total_revenue, 2),
-                    'total_revenue_all': round(total_revenue_all, 2),
-                    'avg_booking_value': avg_booking_value,
+                    'total_bookings': aggregates.get('total_bookings', 0),
+                    'confirmed_bookings': aggregates.get('confirmed_bookings', 0),
+                    'total_revenue': round(float(aggregates.get('total_revenue') or 0), 2),
+                    'total_revenue_all': round(float(aggregates.get('total_revenue_all') or 0), 2),
+                    'avg_booking_value': round(float(aggregates.get('avg_booking_value') or 0), 2),
                     'pending_cancellations': pending_cancellations_count,
                     'recent_bookings': recent_data,
                     'new_customers': new_customers,
-                    'avg_nights': avg_nights,
-                    'total_room_nights': total_room_nights,
+                    'avg_nights': round(float(aggregates.get('avg_nights') or 0), 1),
+                    'total_room_nights': int(aggregates.get('total_room_nights') or 0),
                     'status_breakdown': status_breakdown,
-                    'monthly_revenue': monthly_revenue,
-                    'top_destinations': top_destinations,
-                    'star_rating_distribution': star_distribution,
-                    'currency_breakdown': currency_breakdown,
+                    'monthly_revenue': aggregates.get('monthly_revenue') or [],
+                    'top_destinations': aggregates.get('top_destinations') or [],
+                    'star_rating_distribution': aggregates.get('star_rating_distribution') or {},
+                    'currency_breakdown': aggregates.get('currency_breakdown') or {},
                     'failed_bookings': status_breakdown.get('failed', 0),
                     'created_bookings': status_breakdown.get('created', 0)
                 }
@@ -425,21 +458,48 @@ class AdminService:
             return []
 
     # Log admin activity
-    def log_activity(self, admin_id, action, target_type=None, target_id=None, details=None, ip_address=None):
-        """Log admin activity"""
-        try:
-            if not self.supabase:
-                return
-            self.supabase.table('admin_activity_logs').insert({
-                'admin_id': admin_id,
-                'action': action,
-                'target_type': target_type,
-                'target_id': target_id,
-                'details': details,
-                'ip_address': ip_address
-            }).execute()
-        except:
-            pass  # Don't fail the main operation if logging fails
+    def log_activity(self, admin_id, action, target_type=None, target_id=None, details=None, ip_address=None,
+                     metadata=None, user_agent=None):
+        """
+        Queue an activity_logs row. Never blocks or raises - the row is written
+        by the background batch writer (and dropped if its queue is full).
+        """
+        if not self.supabase:
+            return False
+        if has_request_context():
+            ip_address = ip_address or request.remote_addr
+            user_agent = user_agent or request.headers.get('User-Agent')
+        return self.activity_writer.submit({
+            'admin_id': admin_id,
+            'action': action,
+            'entity_type': target_type,
+            'entity_id': target_id,
+            'details': details,
+            'metadata': metadata,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            # Stamped now so the trail keeps request order whenever the batch lands
+            'created_at': datetime.datetime.utcnow().isoformat()
+        })
+
+    @staticmethod
+    def _prepare_activity_row(row):
+        """Writer-thread hook: fit a queued row to the activity_logs columns"""
+        admin_id = _uuid_or_none(row.get('admin_id'))
+        metadata = row.get('metadata') or None
+        if row.get('admin_id') and not admin_id:
+            # e.g. the built-in fallback admin - its id isn't an admin_users UUID and would fail the whole batch
+            metadata = {**(metadata or {}), 'admin': str(row['admin_id'])}
+        details = row.get('details')
+        if details is not None and not isinstance(details, str):
+            details = json.dumps(details, default=str)
+        return {
+            **row,
+            'admin_id': admin_id,
+            'entity_id': None if row.get('entity_id') is None else str(row['entity_id'])[:100],
+            'details': details,
+            'metadata': metadata,
+        }
 
 
 def require_auth(required_role=None):
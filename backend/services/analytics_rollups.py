@@ -0,0 +1,262 @@
+"""
+C2C Journeys - Analytics Rollups
+Reads the admin stats from the analytics_rollups table instead of rescanning
+hotel_bookings / flight_bookings / flight_enquiries on every request.
+
+The counters are maintained in Postgres by the analytics_rollup_trigger()
+triggers (see database/complete-schema.sql), so every write path - website
+bookings, manual admin bookings, payment jobs, status changes, deletes -
+updates them. When the table isn't installed yet the same rollup rows are
+built here from a scan of the source table, so the endpoints keep working.
+
+Backfill / repair after manual edits:
+    python -m services.analytics_rollups rebuild
+"""
+import os
+import sys
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+ROLLUP_TABLE = 'analytics_rollups'
+ROLLUP_COLUMNS = 'bucket, status, currency, dimension, dimension_value, bookings, revenue, room_nights, roundtrips'
+COUNTERS = ('bookings', 'revenue', 'room_nights', 'roundtrips')
+DIMENSION_VALUE_MAX = 255  # analytics_rollups.dimension_value
+
+SOURCE_TABLES = {
+    'hotel': 'hotel_bookings',
+    'flight': 'flight_bookings',
+    'flight_enquiry': 'flight_enquiries',
+}
+
+# Only what booking_fact() reads, for the scan fallback
+SOURCE_COLUMNS = {
+    'hotel_bookings': 'status, currency, total_amount, rooms, check_in, check_out, created_at, hotel_city, hotel_name, booking_source',
+    'flight_bookings': 'status, currency, total_amount, created_at, destination_city, supplier_name, trip_type, return_flight_number',
+    'flight_enquiries': 'status, created_at',
+}
+
+ENQUIRY_STATUSES = [
+    ('new', 'New Lead'),
+    ('contacted', 'Contacted'),
+    ('quotation_sent', 'Quotation Sent'),
+    ('booked', 'Booked'),
+    ('cancelled', 'Cancelled'),
+]
+
+
+def _to_date(value) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value)[:10]) if value else None
+    except ValueError:
+        return None
+
+
+def booking_fact(table: str, row: Dict) -> Optional[Dict]:
+    """
+    What one source row contributes to the rollups. Mirrors the
+    analytics_rollup_fact() SQL function.
+    """
+    created_at = row.get('created_at') or datetime.utcnow().isoformat()
+    status = row.get('status') or 'unknown'
+
+    if table == 'hotel_bookings':
+        check_in, check_out = _to_date(row.get('check_in')), _to_date(row.get('check_out'))
+        nights = max((check_out - check_in).days, 1) if check_in and check_out else 1
+        supplier = row.get('supplier_name') or row.get('supplier') or (
+            'manual' if row.get('booking_source') == 'admin_manual' else 'ratehawk'
+        )
+        return {
+            'product': 'hotel',
+            'created_at': created_at,
+            'status': status,
+            'currency': row.get('currency') or 'USD',
+            'revenue': float(row.get('total_amount') or 0),
+            'room_nights': nights * (int(row.get('rooms') or 0) or 1),
+            'roundtrips': 0,
+            'dims': {
+                'destination': (row.get('hotel_city') or row.get('hotel_name') or 'Unknown')[:DIMENSION_VALUE_MAX],
+                'supplier': supplier[:DIMENSION_VALUE_MAX],
+            },
+        }
+    if table == 'flight_bookings':
+        return {
+            'product': 'flight',
+            'created_at': created_at,
+            'status': status,
+            'currency': row.get('currency') or 'INR',
+            'revenue': float(row.get('total_amount') or 0),
+            'room_nights': 0,
+            'roundtrips': 1 if row.get('return_flight_number') else 0,
+            'dims': {
+                'destination': (row.get('destination_city') or 'Unknown')[:DIMENSION_VALUE_MAX],
+                'supplier': (row.get('supplier_name') or 'unknown')[:DIMENSION_VALUE_MAX],
+                'trip_type': (row.get('trip_type') or 'domestic')[:DIMENSION_VALUE_MAX],
+            },
+        }
+    if table == 'flight_enquiries':
+        return {
+            'product': 'flight_enquiry',
+            'created_at': created_at,
+            'status': status,
+            'currency': '',
+            'revenue': 0.0,
+            'room_nights': 0,
+            'roundtrips': 0,
+            'dims': {},
+        }
+    return None
+
+
+def build_rollups(facts: Iterable[Dict], period: str = 'month') -> List[Dict]:
+    """Group facts into rollup rows, the way the triggers / rebuild do"""
+    rows = {}
+    for fact in facts:
+        if not fact:
+            continue
+        day = str(fact['created_at'])[:10]
+        bucket = day if period == 'day' else day[:7] + '-01'
+        for dimension, value in [('', '')] + list(fact['dims'].items()):
+            key = (bucket, fact['status'], fact['currency'], dimension, value)
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = {
+                    'bucket': bucket, 'status': fact['status'], 'currency': fact['currency'],
+                    'dimension': dimension, 'dimension_value': value,
+                    'bookings': 0, 'revenue': 0.0, 'room_nights': 0, 'roundtrips': 0,
+                }
+            row['bookings'] += 1
+            for counter in ('revenue', 'room_nights', 'roundtrips'):
+                row[counter] += fact[counter]
+    return list(rows.values())
+
+
+class AnalyticsRollups:
+    """Stats for the admin endpoints, read from the rollup counters"""
+
+    def get_rollups(self, supabase, product: str, period: str = 'month',
+                    dimensions: Iterable[str] = ('',), bucket: Optional[str] = None) -> List[Dict]:
+        dimensions = list(dimensions)
+        try:
+            query = supabase.table(ROLLUP_TABLE).select(ROLLUP_COLUMNS) \
+                .eq('product', product).eq('period', period).in_('dimension', dimensions)
+            if bucket:
+                query = query.eq('bucket', bucket)
+            rows = query.execute().data or []
+        except Exception as e:
+            print(f"⚠️ Rollups unavailable for {product}, scanning {SOURCE_TABLES[product]}: {e}")
+            rows = [
+                row for row in self.scan(supabase, product, period)
+                if row['dimension'] in dimensions and (not bucket or row['bucket'] == bucket)
+            ]
+        # Pairs that netted out to nothing (e.g. every booking moved to another status)
+        return [row for row in rows if row.get('bookings')]
+
+    def scan(self, supabase, product: str, period: str = 'month') -> List[Dict]:
+        table = SOURCE_TABLES[product]
+        res = supabase.table(table).select(SOURCE_COLUMNS[table]).execute()
+        return build_rollups((booking_fact(table, row) for row in res.data or []), period)
+
+    def summarize(self, rows: List[Dict]) -> Dict:
+        """Totals over the overall ('' dimension) rows"""
+        summary = {
+            'total': 0, 'by_status': {}, 'revenue': 0.0, 'revenue_by_currency': {},
+            'room_nights': 0, 'roundtrips': 0,
+        }
+        for row in rows:
+            if row['dimension']:
+                continue
+            bookings = int(row['bookings'])
+            summary['total'] += bookings
+            summary['by_status'][row['status']] = summary['by_status'].get(row['status'], 0) + bookings
+            summary['roundtrips'] += int(row.get('roundtrips') or 0)
+            # Revenue and room-nights only count what's actually sold
+            if row['status'] == 'confirmed':
+                revenue = float(row.get('revenue') or 0)
+                summary['revenue'] += revenue
+                currency = row['currency'] or 'N/A'
+                summary['revenue_by_currency'][currency] = round(
+                    summary['revenue_by_currency'].get(currency, 0) + revenue, 2
+                )
+                summary['room_nights'] += int(row.get('room_nights') or 0)
+        summary['revenue'] = round(summary['revenue'], 2)
+        return summary
+
+    def breakdown(self, rows: List[Dict], dimension: str) -> Dict[str, int]:
+        counts = {}
+        for row in rows:
+            if row['dimension'] == dimension:
+                value = row['dimension_value']
+                counts[value] = counts.get(value, 0) + int(row['bookings'])
+        return counts
+
+    def hotel_booking_stats(self, supabase) -> Dict:
+        summary = self.summarize(self.get_rollups(supabase, 'hotel'))
+        by_status = summary['by_status']
+        return {
+            'total': summary['total'],
+            'confirmed': by_status.get('confirmed', 0),
+            'pending': by_status.get('pending', 0),
+            'cancelled': by_status.get('cancelled', 0),
+            'revenue': summary['revenue'],
+            'revenue_by_currency': summary['revenue_by_currency'],
+            'room_nights': summary['room_nights'],
+        }
+
+    def flight_booking_stats(self, supabase) -> Dict:
+        rows = self.get_rollups(supabase, 'flight', dimensions=('', 'trip_type'))
+        summary = self.summarize(rows)
+        by_status = summary['by_status']
+        domestic = self.breakdown(rows, 'trip_type').get('domestic', 0)
+        return {
+            'total': summary['total'],
+            'confirmed': by_status.get('confirmed', 0),
+            'pending': by_status.get('pending', 0),
+            'cancelled': by_status.get('cancelled', 0),
+            'revenue': summary['revenue'],
+            'revenue_by_currency': summary['revenue_by_currency'],
+            'domestic': domestic,
+            'international': max(0, summary['total'] - domestic),
+            'roundtrip': summary['roundtrips'],
+        }
+
+    def flight_enquiry_stats(self, supabase) -> Dict:
+        by_status = self.summarize(self.get_rollups(supabase, 'flight_enquiry'))['by_status']
+        today = datetime.utcnow().strftime('%Y-%m-%d')
+        stats = {
+            'total': sum(by_status.values()),
+            'today': self.summarize(self.get_rollups(supabase, 'flight_enquiry', period='day', bucket=today))['total'],
+        }
+        for key, status in ENQUIRY_STATUSES:
+            stats[key] = by_status.get(status, 0)
+        return stats
+
+    def overview_stats(self, supabase) -> Dict:
+        hotels = self.summarize(self.get_rollups(supabase, 'hotel'))
+        flights = self.summarize(self.get_rollups(supabase, 'flight'))
+        return {
+            'hotels': {'total': hotels['total'], 'revenue': hotels['revenue']},
+            'flights': {'total': flights['total'], 'revenue': flights['revenue']},
+        }
+
+    def rebuild(self, supabase) -> Dict:
+        """Recompute every rollup from the source tables (rebuild_analytics_rollups())"""
+        result = supabase.rpc('rebuild_analytics_rollups', {}).execute()
+        print(f"📊 Analytics rollups rebuilt: {result.data}")
+        return result.data or {}
+
+
+analytics_rollups = AnalyticsRollups()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ['rebuild']:
+        print("Usage: python -m services.analytics_rollups rebuild")
+        sys.exit(1)
+    from services.supabase_service import supabase_service
+    if not supabase_service.client:
+        print("❌ Supabase is not available")
+        sys.exit(1)
+    analytics_rollups.rebuild(supabase_service.client)
@@ -0,0 +1,171 @@
+"""
+C2C Journeys - Batched Table Writer
+Non-blocking, batched Supabase inserts for write-heavy logging tables.
+
+Request handlers call submit(row), which only appends to a bounded in-process
+queue. A background thread drains the queue and inserts rows in batches of
+batch_size, or every flush_interval_ms, whichever comes first. When the queue
+is full the row is dropped (and counted) instead of blocking the request.
+If a batch insert fails, its rows are retried one at a time so a single bad
+row does not take the rest of the batch with it.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class BatchInsertWriter:
+    """Bounded queue + background thread that batch-inserts rows into one table"""
+
+    def __init__(
+        self,
+        table: str,
+        client_getter: Callable,
+        batch_size: int = 50,
+        flush_interval_ms: int = 2000,
+        max_queue: int = 5000,
+        prepare: Optional[Callable[[Dict], Optional[Dict]]] = None,
+        on_flush: Optional[Callable[[List[Dict]], None]] = None
+    ):
+        """
+        client_getter: returns a Supabase client (or None) - called from the writer thread
+        prepare: optional per-row hook run on the writer thread before insert
+                 (return None to skip the row)
+        on_flush: optional hook called with every successfully inserted batch
+        """
+        self.table = table
+        self.client_getter = client_getter
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(10, flush_interval_ms) / 1000.0
+        self.prepare = prepare
+        self.on_flush = on_flush
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+
+        self.stats = {'submitted': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+        atexit.register(self.stop)
+
+    def submit(self, row: Dict) -> bool:
+        """Queue a row for insert. Never blocks; returns False if the row was dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+            self.stats['submitted'] += 1
+            return True
+        except queue.Full:
+            self.stats['dropped'] += 1
+            return False
+
+    def _ensure_started(self):
+        # gunicorn --preload forks workers after import, and threads do not survive
+        # a fork, so start (or restart) the writer lazily in each process
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name=f"batch-writer-{self.table}", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._drain(block=True)
+            if batch:
+                self._write(batch)
+
+    def _drain(self, block: bool) -> List[Dict]:
+        """Collect up to batch_size rows, waiting at most flush_interval for the batch to fill"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if block and timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict]):
+        rows = []
+        for row in batch:
+            if self.prepare:
+                try:
+                    row = self.prepare(row)
+                except Exception as e:
+                    print(f"⚠️ {self.table} writer: failed to prepare row: {e}")
+                    row = None
+            if row:
+                rows.append(row)
+        if not rows:
+            return
+
+        try:
+            client = self.client_getter()
+            if client is None:
+                raise RuntimeError('Supabase client not initialized')
+        except Exception as e:
+            self.stats['failed'] += len(rows)
+            print(f"⚠️ {self.table} writer: failed to insert {len(rows)} rows: {e}")
+            return
+
+        try:
+            client.table(self.table).insert(rows).execute()
+            self.stats['batches'] += 1
+        except Exception as e:
+            # One bad row fails the whole insert - retry row by row so only it is lost
+            print(f"⚠️ {self.table} writer: batch of {len(rows)} failed, inserting rows one at a time: {e}")
+            rows = self._write_each(client, rows)
+            if not rows:
+                return
+        self.stats['written'] += len(rows)
+
+        if self.on_flush:
+            try:
+                self.on_flush(rows)
+            except Exception as e:
+                print(f"⚠️ {self.table} writer: on_flush hook failed: {e}")
+
+    def _write_each(self, client, rows: List[Dict]) -> List[Dict]:
+        """Insert rows individually; returns the ones that made it"""
+        written = []
+        for row in rows:
+            try:
+                client.table(self.table).insert(row).execute()
+                written.append(row)
+            except Exception as e:
+                self.stats['failed'] += 1
+                print(f"⚠️ {self.table} writer: dropped a row: {e}")
+        return written
+
+    def flush(self):
+        """Synchronously write everything currently queued (used on shutdown)"""
+        while True:
+            batch = self._drain(block=False)
+            if not batch:
+                break
+            self._write(batch)
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the background thread and flush remaining rows"""
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout)
+        self.flush()
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, 'queued': self._queue.qsize(), 'table': self.table}
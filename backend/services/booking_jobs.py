@@ -0,0 +1,254 @@
+"""
+C2C Journeys - Post-Payment Booking Jobs
+Side effects of a verified hotel payment, run on the durable job queue.
+
+Once a payment is recorded the payment routes enqueue finish_booking and
+return. The rest runs as a chain of jobs, each keyed by booking id so a
+retried or duplicated payment verification never runs a stage twice:
+
+    finish_booking -> track_status -> render_documents -> send_email
+
+finish_booking is the only caller of ETG /booking/finish/ for a paid booking
+(/book/finish defers to it when it exists). ETG status polling belongs to
+services/booking_status_poller.py: track_status only hands the order to the
+poller and re-checks it, re-tracking after a restart, until it settles.
+Confirmation email goes out once per booking through the keyed
+render_documents / send_email jobs, whichever of the poller or the job gets
+there first.
+
+Every stage is retried with backoff on unexpected errors and dead-lettered
+after max_attempts (see services/job_queue.py).
+"""
+import os
+import sys
+from datetime import datetime
+from typing import Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.booking_status_poller import booking_status_poller, TERMINAL_STATUSES
+from services.etg_service import etg_service
+from services.job_queue import job_queue, RetryLater
+from services.supabase_service import supabase_service
+
+
+TRACK_CHECK_INTERVAL = 15  # seconds between checks on the poller's state
+TRACK_MAX_CHECKS = 40      # well past the poller's own 180s window
+
+
+def _now_iso() -> str:
+    return datetime.utcnow().isoformat() + 'Z'
+
+
+def _get_booking(booking_id: str) -> Optional[Dict]:
+    client = supabase_service.client
+    if client is None:
+        raise RuntimeError('Supabase client not initialized')
+    response = client.table('hotel_bookings').select('*').eq('id', booking_id).execute()
+    return response.data[0] if response.data else None
+
+
+def _set_booking_status(booking_id: str, status: str):
+    supabase_service.client.table('hotel_bookings').update({
+        'status': status,
+        'updated_at': _now_iso()
+    }).eq('id', booking_id).execute()
+
+
+def fulfillment_key(booking_id: str) -> str:
+    return f"finish_booking:{booking_id}"
+
+
+def enqueue_booking_fulfillment(booking_id: str, source: str) -> Dict:
+    """Start the post-payment chain for a booking (idempotent per booking)"""
+    return job_queue.enqueue(
+        'finish_booking',
+        {'booking_id': booking_id, 'source': source},
+        key=fulfillment_key(booking_id)
+    )
+
+
+def get_booking_fulfillment(booking_id: str) -> Optional[Dict]:
+    """The booking's finish_booking job, if a verified payment queued one"""
+    return job_queue.get_job_by_key(fulfillment_key(booking_id))
+
+
+def enqueue_confirmation(partner_order_id: str):
+    """booking_status_poller side effect for 'confirmed': documents + email, once per booking"""
+    db_booking = supabase_service.get_booking_by_partner_order_id(partner_order_id)
+    booking = db_booking.get('data') if db_booking.get('success') else None
+    if not isinstance(booking, dict) or not booking.get('id'):
+        print(f"⚠️ No booking found for confirmed order {partner_order_id}")
+        return
+    _enqueue_documents(booking['id'], 'poller')
+
+
+def _enqueue_documents(booking_id: str, source: str):
+    job_queue.enqueue(
+        'render_documents',
+        {'booking_id': booking_id, 'source': source},
+        key=f"render_documents:{booking_id}"
+    )
+
+
+@job_queue.handler('finish_booking', max_attempts=3)
+def finish_booking_job(payload: Dict, job):
+    booking_id = payload['booking_id']
+    source = payload.get('source', 'payment')
+
+    booking = _get_booking(booking_id)
+    if not booking:
+        print(f"❌ finish_booking: booking {booking_id} not found")
+        return
+
+    partner_order_id = booking.get('partner_order_id')
+    if not partner_order_id:
+        print(f"⚠️ No partner_order_id found for booking {booking_id} — skipping ETG finish")
+        # Still mark confirmed for payment received (no ETG order to finish)
+        _set_booking_status(booking_id, 'confirmed')
+        _enqueue_documents(booking_id, source)
+        return
+
+    print(f"📋 Calling /booking/finish for {source} order {partner_order_id}...")
+    finish_result = etg_service.finish_booking(
+        partner_order_id=partner_order_id,
+        email=booking.get('customer_email') or booking.get('email', 'info@coasttocoastjourneys.com'),
+        phone=booking.get('customer_phone') or booking.get('phone', '0000000000'),
+        guests=booking.get('guests', []),  # Legacy fallback
+        rooms=booking.get('rooms'),        # Essential structured room guests
+        amount=booking.get('total_amount', 0),
+        currency=booking.get('currency', 'USD')
+    )
+
+    finish_ok = finish_result.get('success', False)
+    finish_error = str(finish_result.get('error', '')).lower()
+
+    # Per ETG Table 3: timeout/unknown errors → start polling anyway
+    should_poll = finish_ok or 'timeout' in finish_error or 'unknown' in finish_error
+
+    if not should_poll:
+        print(f"❌ /booking/finish failed with terminal error: {finish_result.get('error')}")
+        _set_booking_status(booking_id, 'payment_received_booking_failed')
+        _enqueue_documents(booking_id, source)
+        return
+
+    job_queue.enqueue(
+        'track_status',
+        {'booking_id': booking_id, 'partner_order_id': partner_order_id, 'source': source},
+        key=f"track_status:{booking_id}"
+    )
+
+
+@job_queue.handler('track_status', max_attempts=5)
+def track_status_job(payload: Dict, job):
+    """Hand the order to booking_status_poller and wait (durably) for it to settle"""
+    booking_id = payload['booking_id']
+    partner_order_id = payload['partner_order_id']
+
+    # No-op while this process already tracks it; after a restart it resumes polling
+    state = booking_status_poller.track(partner_order_id)
+    if state['status'] not in TERMINAL_STATUSES:
+        if job.runs < TRACK_MAX_CHECKS:
+            raise RetryLater(TRACK_CHECK_INTERVAL, f"booking {state['status']}")
+        print(f"⚠️ Booking {partner_order_id} still '{state['status']}' after {job.runs} checks")
+
+    print(f"📋 Booking {partner_order_id} settled as '{state['status']}'")
+    # Payment was captured, so the customer hears back whatever ETG said.
+    # Keyed, so this is a no-op if the poller already queued the confirmation.
+    _enqueue_documents(booking_id, payload.get('source', 'payment'))
+
+
+# Jobs queued under the old name before the poller hand-off
+job_queue.handler('poll_status', max_attempts=5)(track_status_job)
+
+
+def _documents_dir(booking_id: str) -> str:
+    base = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'booking_documents')
+    return os.path.join(base, str(booking_id))
+
+
+def _issue_date(booking: Dict) -> Optional[str]:
+    # Booking date rather than today, so a re-rendered invoice/voucher is identical (and cached)
+    try:
+        return datetime.strptime(str(booking.get('created_at') or '')[:10], '%Y-%m-%d').strftime('%d %b %Y')
+    except ValueError:
+        return None
+
+
+def build_confirmation_email_details(booking: Dict) -> Dict:
+    customer_name = f"{booking.get('first_name') or ''} {booking.get('last_name') or ''}".strip()
+    guests = booking.get('guests')
+    if not customer_name and isinstance(guests, list) and guests and isinstance(guests[0], dict):
+        customer_name = f"{guests[0].get('first_name', '')} {guests[0].get('last_name', '')}".strip()
+    return {
+        'booking_id': booking.get('id'),
+        'hotel_name': booking.get('hotel_name', 'Hotel'),
+        'hotel_address': booking.get('hotel_address', ''),
+        'destination': booking.get('hotel_city', ''),
+        'room_name': booking.get('room_name') or 'Standard Room',
+        'customer_name': customer_name or 'Valued Guest',
+        'customer_email': booking.get('customer_email') or booking.get('email'),
+        'customer_phone': booking.get('customer_phone') or booking.get('phone', ''),
+        'checkin': booking.get('check_in') or booking.get('checkin'),
+        'checkout': booking.get('check_out') or booking.get('checkout'),
+        'amount': booking.get('total_amount'),
+        'currency': booking.get('currency', 'USD'),
+        'issue_date': _issue_date(booking)
+    }
+
+
+@job_queue.handler('render_documents', max_attempts=3)
+def render_documents_job(payload: Dict, job):
+    """Render invoice + voucher PDFs to disk so a failed send never re-renders them"""
+    from services.email_service import email_service
+
+    booking_id = payload['booking_id']
+    booking = _get_booking(booking_id)
+    if not booking:
+        print(f"❌ render_documents: booking {booking_id} not found")
+        return
+
+    email_details = build_confirmation_email_details(booking)
+    documents = []
+    try:
+        attachments = email_service.generate_booking_attachments(email_details)
+        out_dir = _documents_dir(booking_id)
+        os.makedirs(out_dir, exist_ok=True)
+        for attachment in attachments:
+            path = os.path.join(out_dir, attachment['filename'])
+            with open(path, 'wb') as f:
+                f.write(attachment['content'])
+            documents.append(path)
+    except Exception as e:
+        if job.attempts + 1 < job.max_attempts:
+            raise
+        # Out of retries - still send the confirmation, just without PDFs
+        print(f"⚠️ Giving up on PDFs for booking {booking_id}: {e}")
+        documents = []
+
+    job_queue.enqueue(
+        'send_email',
+        {'booking_id': booking_id, 'email_details': email_details, 'documents': documents},
+        key=f"send_email:{booking_id}"
+    )
+
+
+@job_queue.handler('send_email', max_attempts=5)
+def send_email_job(payload: Dict, job):
+    """Send confirmation email (regardless of ETG status — payment captured)"""
+    from services.email_service import email_service
+
+    email_details = payload['email_details']
+    to_email = email_details.get('customer_email')
+    if not to_email:
+        print(f"⚠️ No customer email found for booking {payload['booking_id']}")
+        return
+
+    attachments = []
+    for path in payload.get('documents') or []:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                attachments.append({'filename': os.path.basename(path), 'content': f.read()})
+
+    if not email_service.send_booking_confirmation(to_email, email_details, attachments=attachments):
+        raise RuntimeError(f"Confirmation email to {to_email} was not accepted")
+    print(f"✅ Confirmation email sent to {to_email}")
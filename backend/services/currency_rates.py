@@ -0,0 +1,260 @@
+"""
+C2C Journeys - Currency Rates
+Live exchange rates for the currencies table and the hotel pricing code.
+
+The upstream feed (ExchangeRate-API, INR based) is fetched at most once per
+CURRENCY_REFRESH_SECONDS, with a timeout. Every good response is also written
+to a local JSON snapshot, so when the feed is down or slow the last known
+rates are used instead of failing.
+
+A recurring 'currency_refresh' job on the durable job queue (one per host,
+whichever worker claims it) writes the fresh rates into the currencies table
+with one set_currency_rates() call. Pricing reads conversion rates from that table
+through a short in-process cache, so new rates apply on every worker without
+a restart.
+
+Rates in the currencies table are INR per unit of the currency
+(conversion_rate = 1 / upstream rate), e.g. USD -> 86.5.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from services.job_queue import RetryLater, job_queue
+
+
+RATES_URL = "https://api.exchangerate-api.com/v4/latest/INR"
+BASE_CURRENCY = 'INR'
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'currency_rates.json')
+
+# Used until the currencies table or a snapshot provides real rates
+DEFAULT_CONVERSION_RATES = {
+    'USD_TO_INR': 86.5,
+    'EUR_TO_INR': 92.0,
+    'GBP_TO_INR': 108.0,
+    'INR_TO_USD': 0.0116,
+    'INR_TO_EUR': 0.011,
+    'INR_TO_GBP': 0.009
+}
+
+REFRESH_JOB = 'currency_refresh'
+REFRESH_RETRY_SECONDS = 300
+
+
+def conversion_rates_from(inr_per_unit: Dict[str, float]) -> Dict[str, float]:
+    """
+    Pricing's X_TO_Y factors from {currency_code: INR per unit}.
+    Starts from DEFAULT_CONVERSION_RATES so every key pricing reads exists.
+    """
+    rates = dict(DEFAULT_CONVERSION_RATES)
+    usd = inr_per_unit.get('USD')
+    for code, inr in inr_per_unit.items():
+        if not inr or inr <= 0 or code == BASE_CURRENCY:
+            continue
+        rates[f'{code}_TO_INR'] = inr
+        rates[f'INR_TO_{code}'] = 1 / inr
+        if usd and code != 'USD':
+            rates[f'USD_TO_{code}'] = usd / inr
+    return rates
+
+
+class CurrencyRates:
+    """Cached upstream rates, the bulk currencies refresh and pricing's conversion rates"""
+
+    def __init__(self, snapshot_path: str = DEFAULT_SNAPSHOT_PATH,
+                 refresh_seconds: int = 3600, cache_seconds: int = 300, timeout: float = 10):
+        self.snapshot_path = snapshot_path
+        self.refresh_seconds = refresh_seconds
+        self.cache_seconds = cache_seconds
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._live = None              # {'rates': {...}, 'fetched_at': iso, 'source': ...}
+        self._live_at = 0.0
+        self._conversion = None
+        self._conversion_at = 0.0
+        self._scheduled = False
+
+    # ------------------------------------------------------------------
+    # Upstream feed
+    # ------------------------------------------------------------------
+
+    def get_live_rates(self, force: bool = False) -> Dict:
+        """
+        Upstream rates (1 INR = x CODE), fetched at most once per
+        refresh_seconds. Falls back to the local snapshot when the feed fails.
+        Returns {'rates', 'fetched_at', 'source': 'live' | 'cache' | 'snapshot'}.
+        """
+        with self._lock:
+            if not force and self._live and time.monotonic() - self._live_at < self.refresh_seconds:
+                return {**self._live, 'source': 'cache'}
+
+            try:
+                response = requests.get(RATES_URL, timeout=self.timeout)
+                response.raise_for_status()
+                rates = response.json().get('rates') or {}
+                if not rates:
+                    raise ValueError('no rates in response')
+                self._live = {'rates': rates, 'fetched_at': datetime.utcnow().isoformat()}
+                self._live_at = time.monotonic()
+                self._save_snapshot(self._live)
+                return {**self._live, 'source': 'live'}
+            except Exception as e:
+                print(f"⚠️ Exchange rate fetch failed: {e}")
+
+            if self._live:
+                # Keep serving what we have; try upstream again after a short pause
+                self._live_at = time.monotonic() - self.refresh_seconds + REFRESH_RETRY_SECONDS
+                return {**self._live, 'source': 'cache'}
+            snapshot = self._load_snapshot()
+            if snapshot:
+                print(f"💾 Using exchange rate snapshot from {snapshot.get('fetched_at')}")
+                return {**snapshot, 'source': 'snapshot'}
+            raise RuntimeError('Exchange rates unavailable (upstream failed and no snapshot)')
+
+    def _save_snapshot(self, live: Dict):
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(live, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"⚠️ Could not write exchange rate snapshot: {e}")
+
+    def _load_snapshot(self) -> Optional[Dict]:
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            return snapshot if snapshot.get('rates') else None
+        except (OSError, ValueError):
+            return None
+
+    # ------------------------------------------------------------------
+    # currencies table
+    # ------------------------------------------------------------------
+
+    def refresh_currencies(self, supabase, force: bool = False) -> Dict:
+        """
+        Write the latest rates into every matching currencies row.
+
+        Only conversion_rate (and updated_at) change: set_currency_rates() runs one
+        UPDATE for the whole set, so admin edits to other columns are never
+        overwritten. Without the function we fall back to one UPDATE per currency.
+        """
+        live = self.get_live_rates(force=force)
+        rates = live['rates']
+
+        rows = supabase.table('currencies').select('id, currency_code, conversion_rate').execute().data or []
+        new_rates, skipped = {}, []
+        for row in rows:
+            code = row.get('currency_code')
+            if rates.get(code):
+                # 1 INR = x CODE, the table stores INR per 1 CODE
+                new_rates[code] = round(1 / float(rates[code]), 6)
+            else:
+                skipped.append(code)
+
+        if new_rates:
+            try:
+                supabase.rpc('set_currency_rates', {'p_rates': new_rates}).execute()
+            except Exception as e:
+                print(f"⚠️ set_currency_rates unavailable, updating currencies one by one: {e}")
+                for row in rows:
+                    if row.get('currency_code') in new_rates:
+                        supabase.table('currencies').update(
+                            {'conversion_rate': new_rates[row['currency_code']]}
+                        ).eq('id', row['id']).execute()
+            current = {r['currency_code']: float(r['conversion_rate']) for r in rows
+                       if r.get('currency_code') and r.get('conversion_rate')}
+            self._set_conversion({**current, **new_rates})
+
+        print(f"💱 Currencies refreshed from {live['source']} rates: {len(new_rates)} updated, {len(skipped)} skipped")
+        return {
+            'updated': list(new_rates),
+            'skipped': skipped,
+            'source': live['source'],
+            'fetched_at': live.get('fetched_at'),
+        }
+
+    # ------------------------------------------------------------------
+    # Pricing
+    # ------------------------------------------------------------------
+
+    def get_conversion_rates(self, supabase=None) -> Dict[str, float]:
+        """
+        X_TO_Y conversion factors for transform_etg_hotels and friends,
+        from the currencies table (cached for cache_seconds).
+        """
+        if self._conversion and time.monotonic() - self._conversion_at < self.cache_seconds:
+            return self._conversion
+
+        if supabase is None:
+            from services.supabase_service import supabase_service
+            supabase = supabase_service.client
+
+        inr_per_unit = None
+        if supabase:
+            try:
+                rows = supabase.table('currencies').select('currency_code, conversion_rate').execute().data or []
+                inr_per_unit = {r['currency_code']: float(r['conversion_rate']) for r in rows
+                                if r.get('currency_code') and r.get('conversion_rate')}
+            except Exception as e:
+                print(f"⚠️ Could not read currencies for pricing: {e}")
+        if not inr_per_unit:
+            snapshot = self._live or self._load_snapshot()
+            if snapshot:
+                inr_per_unit = {code: 1 / float(rate) for code, rate in snapshot['rates'].items() if rate}
+
+        return self._set_conversion(inr_per_unit or {})
+
+    def _set_conversion(self, inr_per_unit: Dict[str, float]) -> Dict[str, float]:
+        self._conversion = conversion_rates_from(inr_per_unit)
+        self._conversion_at = time.monotonic()
+        return self._conversion
+
+    # ------------------------------------------------------------------
+    # Recurring job
+    # ------------------------------------------------------------------
+
+    def schedule(self):
+        """Make sure the recurring refresh job exists (idempotent, keyed)"""
+        if self._scheduled:
+            return
+        self._scheduled = True
+        try:
+            job_queue.enqueue(REFRESH_JOB, {}, key=REFRESH_JOB)
+        except Exception as e:
+            self._scheduled = False
+            print(f"⚠️ Could not schedule currency refresh: {e}")
+
+
+currency_rates = CurrencyRates(
+    snapshot_path=Config.CURRENCY_SNAPSHOT_PATH or DEFAULT_SNAPSHOT_PATH,
+    refresh_seconds=Config.CURRENCY_REFRESH_SECONDS,
+    cache_seconds=Config.CURRENCY_CACHE_SECONDS,
+    timeout=Config.CURRENCY_API_TIMEOUT
+)
+
+
+@job_queue.handler(REFRESH_JOB, max_attempts=5)
+def currency_refresh_job(payload: Dict, job):
+    """Refresh the currencies table, then run again after the refresh interval"""
+    from services.supabase_service import supabase_service
+    delay = currency_rates.refresh_seconds
+    if supabase_service.client:
+        try:
+            currency_rates.refresh_currencies(supabase_service.client, force=True)
+        except Exception as e:
+            print(f"⚠️ Currency refresh failed, retrying in {REFRESH_RETRY_SECONDS}s: {e}")
+            delay = REFRESH_RETRY_SECONDS
+    # Never completes - the same keyed job is rescheduled forever
+    raise RetryLater(delay, 'next currency refresh')
@@ -0,0 +1,58 @@
+"""
+C2C Journeys - Document Templates
+Compiled Jinja templates and inlined assets for booking emails and PDFs.
+
+Templates under backend/templates are parsed once per process and kept
+compiled in the environment's cache (reloaded on change only in DEBUG).
+Assets embedded as data URIs (logo, any bundled fonts) are read and base64-encoded once
+and reused by every document.
+"""
+import base64
+import mimetypes
+import os
+import sys
+from functools import lru_cache
+from typing import Dict
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TEMPLATES_DIR = os.path.join(BACKEND_DIR, 'templates')
+ASSETS_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'assets')
+LOGO_PATH = os.path.join(ASSETS_DIR, 'images', 'logo.jpg')
+
+
+@lru_cache(maxsize=None)
+def get_environment(templates_dir: str = DEFAULT_TEMPLATES_DIR) -> Environment:
+    """One compiled-template environment per templates directory"""
+    return Environment(
+        loader=FileSystemLoader(templates_dir),
+        autoescape=select_autoescape(['html']),
+        auto_reload=Config.DEBUG,
+        cache_size=100
+    )
+
+
+def render_template(name: str, context: Dict, templates_dir: str = DEFAULT_TEMPLATES_DIR) -> str:
+    return get_environment(os.path.abspath(templates_dir)).get_template(name).render(**context)
+
+
+@lru_cache(maxsize=32)
+def inline_asset(path: str) -> str:
+    """File contents as a data URI ('' if the file is missing)"""
+    path = os.path.abspath(path)
+    if not os.path.exists(path):
+        print(f"⚠️ Asset not found: {path}")
+        return ''
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    with open(path, 'rb') as f:
+        return f"data:{mimetype};base64,{base64.b64encode(f.read()).decode()}"
+
+
+def get_logo_data_uri() -> str:
+    return inline_asset(LOGO_PATH)
+
@@ -0,0 +1,325 @@
+"""
+C2C Journeys - Email Outbox
+Persisted queue of outgoing emails, delivered by background sender threads.
+
+EmailService.send_email() writes the message here and returns; request
+handlers never wait on SMTP or provider APIs. Sender threads in each gunicorn
+worker lease due messages, hand them to EmailService.deliver() (which reuses
+connections, enforces per-provider limits and skips unhealthy providers) and
+record the outcome. Failed deliveries are retried with backoff and marked
+'failed' after EMAIL_MAX_ATTEMPTS so they show up in the admin outbox view.
+
+Message status: queued -> sending -> sent | failed
+"""
+import base64
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'email_outbox.sqlite3')
+SENT_RETENTION_SECONDS = 30 * 86400
+PURGE_INTERVAL_SECONDS = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id TEXT PRIMARY KEY,
+    message_key TEXT UNIQUE,
+    to_email TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT,
+    html_body TEXT,
+    attachments TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    provider TEXT,
+    last_error TEXT,
+    run_at REAL NOT NULL,
+    locked_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox(status, run_at);
+CREATE INDEX IF NOT EXISTS idx_email_outbox_created ON email_outbox(created_at);
+"""
+
+# Columns returned by status lookups (bodies and attachments stay in the table)
+SUMMARY_COLUMNS = (
+    "id, message_key, to_email, subject, status, attempts, max_attempts, provider, "
+    "last_error, run_at, created_at, updated_at, sent_at"
+)
+
+
+class EmailOutbox:
+    """SQLite outbox table + sender threads per process"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, workers: int = 4, max_attempts: int = 6,
+                 poll_interval: float = 1.0, lease_seconds: int = 120,
+                 backoff_base: float = 30.0, backoff_max: float = 1800.0):
+        self.db_path = db_path
+        self.worker_count = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._schema_ready = False
+        self._last_purge = 0.0
+
+    # ------------------------------------------------------------------
+    # Enqueue / status
+    # ------------------------------------------------------------------
+
+    def enqueue(self, to_email: str, subject: str, body: str, html_body: Optional[str] = None,
+                attachments: Optional[List[Dict]] = None, key: Optional[str] = None) -> Dict:
+        """
+        Persist a message for delivery. With a key, queueing the same key again
+        is a no-op and returns the existing message.
+        """
+        if not to_email:
+            raise ValueError('Recipient email is required')
+
+        encoded_attachments = json.dumps([
+            {'filename': a['filename'], 'content': base64.b64encode(a['content']).decode()}
+            for a in attachments or []
+        ])
+        now = time.time()
+        message_id = uuid.uuid4().hex
+        with self._transaction() as conn:
+            if key is not None:
+                existing = conn.execute("SELECT id, status FROM email_outbox WHERE message_key = ?", (key,)).fetchone()
+                if existing is not None:
+                    return {'id': existing['id'], 'status': existing['status'], 'created': False}
+            conn.execute(
+                "INSERT INTO email_outbox (id, message_key, to_email, subject, body, html_body, attachments, "
+                "max_attempts, run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (message_id, key, to_email, subject, body, html_body, encoded_attachments,
+                 self.max_attempts, now, now, now)
+            )
+
+        print(f"📬 Queued email to {to_email}: {subject}")
+        self._ensure_started()
+        self._wakeup.set()
+        return {'id': message_id, 'status': 'queued', 'created': True}
+
+    def get_message(self, message_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            f"SELECT {SUMMARY_COLUMNS} FROM email_outbox WHERE id = ?", (message_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def list_messages(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        query = f"SELECT {SUMMARY_COLUMNS} FROM email_outbox"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        return [dict(r) for r in self._conn().execute(query, params).fetchall()]
+
+    def retry(self, message_id: str) -> bool:
+        """Queue a failed message again with a fresh attempt budget (admin retry)"""
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE email_outbox SET status = 'queued', attempts = 0, run_at = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'failed'",
+                (time.time(), time.time(), message_id)
+            )
+        if cur.rowcount:
+            self._ensure_started()
+            self._wakeup.set()
+        return bool(cur.rowcount)
+
+    def get_stats(self) -> Dict:
+        from services.email_service import email_service
+
+        conn = self._conn()
+        by_status = {r['status']: r['n'] for r in conn.execute(
+            "SELECT status, COUNT(*) AS n FROM email_outbox GROUP BY status"
+        )}
+        oldest = conn.execute(
+            "SELECT MIN(created_at) AS t FROM email_outbox WHERE status IN ('queued', 'sending')"
+        ).fetchone()['t']
+        return {
+            'by_status': by_status,
+            'oldest_pending_seconds': round(time.time() - oldest, 1) if oldest else 0,
+            'workers': self.worker_count,
+            'providers': email_service.get_provider_stats()
+        }
+
+    def purge_sent(self, older_than: float = SENT_RETENTION_SECONDS) -> int:
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "DELETE FROM email_outbox WHERE status = 'sent' AND updated_at < ?", (time.time() - older_than,)
+            )
+        return cur.rowcount
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._schema_ready = True
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE takes the write lock up front, serializing writers across processes"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Atomically lease the next due message"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM email_outbox WHERE run_at <= ? AND "
+                "(status = 'queued' OR (status = 'sending' AND locked_until < ?)) "
+                "ORDER BY run_at LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE email_outbox SET status = 'sending', locked_until = ?, updated_at = ? WHERE id = ?",
+                    (now + self.lease_seconds, now, row['id'])
+                )
+        return row
+
+    def _mark_sent(self, message_id: str, provider: str):
+        now = time.time()
+        with self._transaction() as conn:
+            # Attachments aren't needed once delivered - keep the table small
+            conn.execute(
+                "UPDATE email_outbox SET status = 'sent', provider = ?, attempts = attempts + 1, last_error = NULL, "
+                "attachments = NULL, locked_until = NULL, sent_at = ?, updated_at = ? WHERE id = ?",
+                (provider, now, now, message_id)
+            )
+
+    def _mark_failed_attempt(self, row: sqlite3.Row, error: str):
+        attempts = row['attempts'] + 1
+        now = time.time()
+        if attempts >= row['max_attempts']:
+            print(f"❌ Email {row['id']} to {row['to_email']} failed after {attempts} attempts: {error}")
+            status, run_at = 'failed', now
+        else:
+            delay = self.backoff_delay(attempts)
+            print(f"⚠️ Email {row['id']} to {row['to_email']} failed (attempt {attempts}/{row['max_attempts']}), retrying in {delay:.0f}s")
+            status, run_at = 'queued', now + delay
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE email_outbox SET status = ?, attempts = ?, last_error = ?, run_at = ?, "
+                "locked_until = NULL, updated_at = ? WHERE id = ?",
+                (status, attempts, error, run_at, now, row['id'])
+            )
+
+    def backoff_delay(self, attempts: int) -> float:
+        """Exponential backoff with jitter: base * 2^(attempts-1), capped"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** max(0, attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    # ------------------------------------------------------------------
+    # Senders
+    # ------------------------------------------------------------------
+
+    def _ensure_started(self):
+        # gunicorn --preload forks after import; threads must be started per process
+        if self._pid == os.getpid() and any(t.is_alive() for t in self._threads):
+            return
+        with self._lock:
+            if self._pid == os.getpid() and any(t.is_alive() for t in self._threads):
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            for i in range(self.worker_count):
+                thread = threading.Thread(target=self._run, name=f"email-sender-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def start(self):
+        """Start senders now (delivers anything queued before a restart)"""
+        self._ensure_started()
+
+    def _run(self):
+        while True:
+            try:
+                row = self._claim()
+            except sqlite3.OperationalError as e:
+                print(f"⚠️ Email outbox: claim failed ({e}), retrying")
+                row = None
+            if row is None:
+                if time.time() - self._last_purge > PURGE_INTERVAL_SECONDS:
+                    self._last_purge = time.time()
+                    try:
+                        self.purge_sent()
+                    except sqlite3.OperationalError:
+                        pass
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._deliver(row)
+
+    def _deliver(self, row: sqlite3.Row):
+        from services.email_service import email_service
+
+        try:
+            attachments = [
+                {'filename': a['filename'], 'content': base64.b64decode(a['content'])}
+                for a in json.loads(row['attachments'] or '[]')
+            ]
+            result = email_service.deliver(row['to_email'], row['subject'], row['body'], row['html_body'], attachments)
+        except Exception as e:
+            result = {'success': False, 'errors': [f"{type(e).__name__}: {e}"]}
+
+        try:
+            if result['success']:
+                self._mark_sent(row['id'], result['provider'])
+            else:
+                self._mark_failed_attempt(row, '; '.join(result.get('errors') or ['delivery failed']))
+        except sqlite3.OperationalError as e:
+            # Lease expiry will hand the message to a sender again
+            print(f"⚠️ Email outbox: could not record result for {row['id']}: {e}")
+
+
+# Singleton instance (sender threads start on first enqueue or app request)
+email_outbox = EmailOutbox(
+    db_path=Config.EMAIL_OUTBOX_DB_PATH or DEFAULT_DB_PATH,
+    workers=Config.EMAIL_OUTBOX_WORKERS,
+    max_attempts=Config.EMAIL_MAX_ATTEMPTS
+)
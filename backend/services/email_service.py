@@ -5,15 +5,99 @@ Priority order:
 1. SMTP (GoDaddy) - Sends to ANY email, no restrictions
 2. Brevo HTTP API - Sends over HTTPS (Port 443)
 3. Resend HTTP API - Fallback (test mode can only deliver to verified email)
+
+send_email() queues the message in the outbox (services/email_outbox.py) and
+returns immediately; outbox sender threads call deliver(), which reuses SMTP
+connections / HTTP sessions and skips providers that are currently failing.
 """
 import os
 import ssl
+import sys
+import time
 import smtplib
+import threading
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+
+SMTP_NOOP_AFTER_IDLE = 30       # seconds before a reused SMTP connection is re-checked with NOOP
+PROVIDER_FAILURE_THRESHOLD = 3  # consecutive failures before a provider is skipped
+PROVIDER_COOLDOWN_BASE = 30     # seconds, doubled per further failure
+PROVIDER_COOLDOWN_MAX = 600
+
+
+class ProviderState:
+    """Concurrency/rate limit and circuit breaker for one delivery provider"""
+
+    def __init__(self, name, max_concurrency=2, per_second=0):
+        self.name = name
+        self.min_interval = 1.0 / per_second if per_second else 0.0
+        self._semaphore = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.last_error = None
+
+    @property
+    def healthy(self):
+        return time.time() >= self.open_until
+
+    @contextmanager
+    def slot(self):
+        """Wait for a concurrency slot and the provider's next send time"""
+        with self._semaphore:
+            with self._lock:
+                now = time.time()
+                wait = max(0.0, self._next_slot - now)
+                self._next_slot = max(now, self._next_slot) + self.min_interval
+            if wait:
+                time.sleep(wait)
+            yield
+
+    def record(self, ok, error=None):
+        with self._lock:
+            if ok:
+                self.sent += 1
+                self.consecutive_failures = 0
+                self.open_until = 0.0
+                return
+            self.failed += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+            if self.consecutive_failures >= PROVIDER_FAILURE_THRESHOLD:
+                extra = self.consecutive_failures - PROVIDER_FAILURE_THRESHOLD
+                cooldown = min(PROVIDER_COOLDOWN_MAX, PROVIDER_COOLDOWN_BASE * (2 ** extra))
+                self.open_until = time.time() + cooldown
+                print(f"⚠️ Email provider {self.name} marked unhealthy for {cooldown}s")
+
+    def to_dict(self):
+        return {
+            'healthy': self.healthy,
+            'consecutive_failures': self.consecutive_failures,
+            'retry_at': datetime.utcfromtimestamp(self.open_until).isoformat() + 'Z' if self.open_until else None,
+            'sent': self.sent,
+            'failed': self.failed,
+            'last_error': self.last_error
+        }
+
+
+class IPv4HTTPAdapter(HTTPAdapter):
+    """Binding to an IPv4 source address forces IPv4 (Brevo blocks IPv6 addresses)"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['source_address'] = ('0.0.0.0', 0)
+        return super().init_poolmanager(*args, **kwargs)
+
 
 class EmailService:
     """Email Service with SMTP (primary) + HTTP API fallbacks"""
@@ -22,6 +106,7 @@ class EmailService:
     
     def __init__(self, app=None):
         self.api_key = None
+        self.resend_api_key = None
         self.default_sender = None
         self.sender_name = "C2C Journeys"
         # SMTP Configuration
@@ -31,9 +116,15 @@ class EmailService:
         self.smtp_password = None
         self.smtp_use_ssl = False
         self.smtp_use_tls = False
+        # Per-thread SMTP connection / HTTP sessions, reused across messages
+        self._local = threading.local()
+        self.providers = {
+            'smtp': ProviderState('smtp', Config.EMAIL_SMTP_CONCURRENCY, Config.EMAIL_SMTP_RATE),
+            'brevo': ProviderState('brevo', Config.EMAIL_BREVO_CONCURRENCY, Config.EMAIL_BREVO_RATE),
+            'resend': ProviderState('resend', Config.EMAIL_RESEND_CONCURRENCY, Config.EMAIL_RESEND_RATE)
+        }
         if app:
             self.init_app(app)
-
     def init_app(self, app):
         # SMTP Configuration (GoDaddy / any SMTP provider) — PRIMARY
         self.smtp_server = app.config.get('MAIL_SERVER') or os.getenv('MAIL_SERVER')
@@ -67,28 +158,128 @@ class EmailService:
         
         print(f"   📧 Sender: {self.default_sender}")
         
-    def send_email(self, to_email, subject, body, html_body=None, attachments=None):
-        """Send an email using SMTP (primary) → Brevo → Resend (fallback)"""
-        # 1. Try SMTP first — sends to ANY email address, no restrictions
+    def send_email(self, to_email, subject, body, html_body=None, attachments=None, key=None):
+        """
+        Queue an email for background delivery (SMTP → Brevo → Resend).
+        Returns True once the message is safely in the outbox; pass a key to
+        make queueing idempotent (e.g. one confirmation per booking).
+        """
+        from services.email_outbox import email_outbox
+        try:
+            email_outbox.enqueue(to_email, subject, body, html_body=html_body, attachments=attachments, key=key)
+            return True
+        except Exception as e:
+            # Outbox unavailable (disk/db error) - don't lose the email, send it inline
+            print(f"⚠️ Email outbox unavailable ({e}), sending inline")
+            return self.deliver(to_email, subject, body, html_body, attachments)['success']
+
+    def configured_providers(self):
+        providers = []
         if self.smtp_server and self.smtp_username and self.smtp_password:
-            success = self._send_via_smtp(to_email, subject, body, html_body, attachments)
-            if success:
-                return True
-            print("⚠️ SMTP failed. Trying API fallbacks...")
-        
-        # 2. Try Brevo API if configured
+            providers.append('smtp')
         if self.api_key:
-            success = self._send_via_brevo(to_email, subject, body, html_body, attachments)
-            if success:
-                return True
-            print("⚠️ Brevo failed. Attempting Resend fallback...")
-            
-        # 3. Try Resend as last resort (test mode may redirect to owner)
+            providers.append('brevo')
         if self.resend_api_key:
-            return self._send_via_resend(to_email, subject, body, html_body, attachments)
-            
-        print("⚠️ No working email provider configured. Skipping email.")
-        return False
+            providers.append('resend')
+        return providers
+
+    def deliver(self, to_email, subject, body, html_body=None, attachments=None):
+        """
+        Send one email now. Healthy providers are tried in priority order;
+        providers in cooldown are skipped unless none is healthy, in which case
+        the one due back soonest gets a trial send.
+        Returns {'success', 'provider', 'errors'}.
+        """
+        configured = self.configured_providers()
+        if not configured:
+            print("⚠️ No working email provider configured. Skipping email.")
+            return {'success': False, 'provider': None, 'errors': ['No email provider configured']}
+
+        candidates = [name for name in configured if self.providers[name].healthy]
+        if not candidates:
+            candidates = [min(configured, key=lambda name: self.providers[name].open_until)]
+
+        senders = {'smtp': self._send_via_smtp, 'brevo': self._send_via_brevo, 'resend': self._send_via_resend}
+        errors = []
+        for name in candidates:
+            state = self.providers[name]
+            with state.slot():
+                self._local.last_error = None
+                ok = senders[name](to_email, subject, body, html_body, attachments)
+            error = None if ok else (getattr(self._local, 'last_error', None) or f"{name} rejected the message")
+            state.record(ok, error)
+            if ok:
+                return {'success': True, 'provider': name, 'errors': errors}
+            errors.append(f"{name}: {error}")
+            print(f"⚠️ {name} failed for {to_email}, failing over...")
+        return {'success': False, 'provider': None, 'errors': errors}
+
+    def get_provider_stats(self):
+        configured = self.configured_providers()
+        return {name: {**state.to_dict(), 'configured': name in configured} for name, state in self.providers.items()}
+
+    def _smtp_context(self, permissive=False):
+        # GoDaddy's secureserver.net uses a certificate chain that strict
+        # verification may reject. Use a permissive context for known hosts.
+        context = ssl.create_default_context()
+        if permissive or 'secureserver.net' in (self.smtp_server or ''):
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        return context
+
+    def _open_smtp(self):
+        if self.smtp_use_ssl:
+            # SSL connection (port 465)
+            try:
+                server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, context=self._smtp_context(), timeout=15)
+            except ssl.SSLCertVerificationError:
+                # Retry with permissive SSL for any other servers with cert issues
+                print(f"⚠️ SSL cert issue, retrying with permissive context...")
+                server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, context=self._smtp_context(permissive=True), timeout=15)
+        else:
+            # STARTTLS connection (port 587)
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=15)
+            if self.smtp_use_tls:
+                server.starttls()
+        server.login(self.smtp_username, self.smtp_password)
+        return server
+
+    def _smtp_connection(self):
+        """This thread's logged-in SMTP connection, reconnecting if the server dropped it"""
+        server = getattr(self._local, 'smtp', None)
+        if server is not None:
+            if time.time() - self._local.smtp_used < SMTP_NOOP_AFTER_IDLE:
+                return server
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close_smtp()
+        self._local.smtp = self._open_smtp()
+        self._local.smtp_used = time.time()
+        return self._local.smtp
+
+    def _close_smtp(self):
+        server = getattr(self._local, 'smtp', None)
+        self._local.smtp = None
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+
+    def _http_session(self, name):
+        """Per-thread keep-alive session per HTTP provider"""
+        sessions = getattr(self._local, 'sessions', None)
+        if sessions is None:
+            sessions = self._local.sessions = {}
+        if name not in sessions:
+            session = requests.Session()
+            if name == 'brevo':
+                session.mount('https://', IPv4HTTPAdapter())
+            sessions[name] = session
+        return sessions[name]
 
     def _send_via_smtp(self, to_email, subject, body, html_body=None, attachments=None):
         """Send email via SMTP (GoDaddy or any SMTP provider).
@@ -116,41 +307,21 @@ class EmailService:
                     part['Content-Disposition'] = f'attachment; filename="{attachment["filename"]}"'
                     msg.attach(part)
             
-            # Connect and send
-            if self.smtp_use_ssl:
-                # SSL connection (port 465)
-                # GoDaddy's secureserver.net uses a certificate chain that strict
-                # verification may reject. Use a permissive context for known hosts.
-                context = ssl.create_default_context()
-                if 'secureserver.net' in (self.smtp_server or ''):
-                    context.check_hostname = False
-                    context.verify_mode = ssl.CERT_NONE
-                
-                try:
-                    with smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, context=context, timeout=15) as server:
-                        server.login(self.smtp_username, self.smtp_password)
-                        server.sendmail(self.default_sender, to_email, msg.as_string())
-                except ssl.SSLCertVerificationError:
-                    # Retry with permissive SSL for any other servers with cert issues
-                    print(f"⚠️ SSL cert issue, retrying with permissive context...")
-                    context = ssl.create_default_context()
-                    context.check_hostname = False
-                    context.verify_mode = ssl.CERT_NONE
-                    with smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, context=context, timeout=15) as server:
-                        server.login(self.smtp_username, self.smtp_password)
-                        server.sendmail(self.default_sender, to_email, msg.as_string())
-            else:
-                # STARTTLS connection (port 587)
-                with smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=15) as server:
-                    if self.smtp_use_tls:
-                        server.starttls()
-                    server.login(self.smtp_username, self.smtp_password)
-                    server.sendmail(self.default_sender, to_email, msg.as_string())
+            # Send on this thread's open connection; reconnect once if the server hung up
+            try:
+                self._smtp_connection().sendmail(self.default_sender, to_email, msg.as_string())
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self._close_smtp()
+                self._smtp_connection().sendmail(self.default_sender, to_email, msg.as_string())
+            self._local.smtp_used = time.time()
             
             print(f"✅ Email sent via SMTP to {to_email}")
             return True
         except Exception as e:
             print(f"❌ SMTP failure: {str(e)}")
+            self._local.last_error = str(e)
+            if not isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError)):
+                self._close_smtp()
             return False
 
     def _send_via_brevo(self, to_email, subject, body, html_body=None, attachments=None):
@@ -181,26 +352,17 @@ class EmailService:
                     })
                 payload["attachment"] = brevo_attachments
             
-            import socket
-            import requests.packages.urllib3.util.connection as urllib3_cn
-            
-            # Force IPv4 for Brevo because Brevo blocks IPv6 addresses
-            orig_gai_family = urllib3_cn.allowed_gai_family
-            def allowed_gai_family():
-                return socket.AF_INET
-            urllib3_cn.allowed_gai_family = allowed_gai_family
-            
-            try:
-                response = requests.post(self.BREVO_API_URL, json=payload, headers=headers, timeout=30)
-            finally:
-                urllib3_cn.allowed_gai_family = orig_gai_family
+            # IPv4-only keep-alive session (Brevo blocks IPv6 addresses)
+            response = self._http_session('brevo').post(self.BREVO_API_URL, json=payload, headers=headers, timeout=30)
             if response.status_code in [200, 201, 202]:
                 print(f"✅ Email sent via Brevo to {to_email}")
                 return True
             print(f"❌ Brevo error: {response.status_code} - {response.text}")
+            self._local.last_error = f"HTTP {response.status_code}: {response.text[:200]}"
             return False
         except Exception as e:
             print(f"❌ Brevo failure: {str(e)}")
+            self._local.last_error = str(e)
             return False
 
     def _get_verified_owner_email(self):
@@ -247,7 +409,7 @@ class EmailService:
                     })
                 payload["attachments"] = resend_attachments
 
-            response = requests.post(url, json=payload, headers=resend_headers, timeout=30)
+            response = self._http_session('resend').post(url, json=payload, headers=resend_headers, timeout=30)
 
             if response.status_code in [200, 201]:
                 print(f"✅ Email sent via Resend to {to_email}")
@@ -273,17 +435,20 @@ class EmailService:
                 if "html" in payload:
                     payload["html"] = redirect_html_banner + payload["html"]
 
-                r2 = requests.post(url, json=payload, headers=resend_headers, timeout=30)
+                r2 = self._http_session('resend').post(url, json=payload, headers=resend_headers, timeout=30)
                 if r2.status_code in [200, 201]:
                     print(f"✅ Redirected email delivered to {owner_email} (was for {to_email})")
                     return True
                 print(f"❌ Redirect also failed: {r2.status_code} - {r2.text}")
+                self._local.last_error = f"HTTP {r2.status_code}: {r2.text[:200]}"
                 return False
 
             print(f"❌ Resend error: {response.status_code} - {response.text}")
+            self._local.last_error = f"HTTP {response.status_code}: {response.text[:200]}"
             return False
         except Exception as e:
             print(f"❌ Resend failure: {str(e)}")
+            self._local.last_error = str(e)
             return False
 
     def send_flight_confirmation(self, to_email, booking_details):
@@ -548,8 +713,37 @@ This is an automated notification from C2C Journeys.
 </html>
 """
 
-    def send_booking_confirmation(self, to_email, booking_details):
-        """Send booking confirmation with professional invoice"""
+    def generate_booking_attachments(self, booking_details):
+        """Render the invoice and voucher PDFs for a hotel booking"""
+        from services.pdf_service import PDFService
+        import os
+        # Point to backend/templates where the beautiful PDF templates live
+        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        templates_dir = os.path.join(backend_dir, 'templates')
+        pdf_service = PDFService(templates_dir)
+
+        # Invoice and voucher share one render context and render side by side
+        documents = pdf_service.generate_documents(booking_details)
+        invoice_pdf = documents['invoice']
+        ticket_pdf = documents['voucher']
+        return [
+            {
+                'filename': f"Invoice_{booking_details.get('booking_id', 'Booking')}.pdf",
+                'content': invoice_pdf
+            },
+            {
+                'filename': f"Voucher_{booking_details.get('booking_id', 'Booking')}.pdf",
+                'content': ticket_pdf
+            }
+        ]
+
+    def send_booking_confirmation(self, to_email, booking_details, attachments=None, resend=False):
+        """
+        Send booking confirmation with professional invoice.
+        Pass pre-rendered attachments to skip PDF generation.
+        Both copies are keyed on the booking id, so retried jobs queue each
+        email once; resend=True always queues a new customer copy.
+        """
         hotel_name = booking_details.get('hotel_name', 'Hotel')
         subject = f"Booking Confirmed ✅ — {hotel_name} | C2C Journeys"
         
@@ -570,37 +764,25 @@ Thank you for choosing C2C Journeys!
         """
         
         invoice_html = None
-        attachments = []
         try:
-            from services.pdf_service import PDFService
-            import os
-            # Point to backend/templates where the beautiful PDF templates live
-            backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            templates_dir = os.path.join(backend_dir, 'templates')
-            pdf_service = PDFService(templates_dir)
-            
             # 1. Use the "Booking Confirmed" email body template for the actual email
             invoice_html = self._generate_invoice_html(booking_details)
             
             # 2. Generate PDF attachments
-            invoice_pdf = pdf_service.generate_invoice(booking_details)
-            attachments.append({
-                'filename': f"Invoice_{booking_details.get('booking_id', 'Booking')}.pdf",
-                'content': invoice_pdf
-            })
-            
-            ticket_pdf = pdf_service.generate_ticket(booking_details)
-            attachments.append({
-                'filename': f"Voucher_{booking_details.get('booking_id', 'Booking')}.pdf",
-                'content': ticket_pdf
-            })
+            if attachments is None:
+                attachments = []  # stays empty if PDF generation fails
+                attachments = self.generate_booking_attachments(booking_details)
         except Exception as e:
             print(f"⚠️ Failed to generate PDFs/HTML: {e}")
             if not invoice_html:
                 invoice_html = self._generate_invoice_html(booking_details)
 
+        booking_id = booking_details.get('booking_id')
+        key = f"booking_confirmation:{booking_id}" if booking_id and not resend else None
+
         # Send email to customer
-        customer_email_sent = self.send_email(to_email, subject, body, html_body=invoice_html, attachments=attachments)
+        customer_email_sent = self.send_email(to_email, subject, body, html_body=invoice_html,
+                                              attachments=attachments, key=key)
         
         # Send copy to owner
         self._send_owner_notification(to_email, booking_details, attachments)
@@ -630,8 +812,10 @@ Thank you for choosing C2C Journeys!
 
         print(f"📧 Sending owner notification to {owner_email}")
         
-        # Attach PDFs for owner too if they were generated
-        self.send_email(owner_email, subject, "New booking received. See HTML version for details.", html_body=invoice_html, attachments=attachments)
+        # Attach PDFs for owner too if they were generated (once per booking, even on a resend)
+        booking_id = booking_details.get('booking_id')
+        self.send_email(owner_email, subject, "New booking received. See HTML version for details.", html_body=invoice_html,
+                        attachments=attachments, key=f"booking_owner_copy:{booking_id}" if booking_id else None)
 
     def _format_date(self, date_str):
         """Format date string nicely"""
@@ -662,22 +846,9 @@ Thank you for choosing C2C Journeys!
 
     def _generate_invoice_html(self, booking):
         """Generate professional HTML invoice email"""
-        date_str = datetime.now().strftime("%d %B %Y")
-        booking_id = booking.get('booking_id', 'N/A')
-        customer_name = booking.get('customer_name', 'Valued Guest')
-        customer_email = booking.get('customer_email', '')
-        customer_phone = booking.get('customer_phone', '')
-        hotel_name = booking.get('hotel_name', 'Hotel')
-        room_name = booking.get('room_name', '')
-        meal_plan = booking.get('meal_plan', '') or booking.get('meal_info', '')
-        checkin = self._format_date(booking.get('checkin', ''))
-        checkout = self._format_date(booking.get('checkout', ''))
+        from services.document_templates import render_template
+
         nights = booking.get('nights', '')
-        guests_info = booking.get('guests_info', '')
-        amount = booking.get('amount', 0)
-        currency = booking.get('currency', 'USD')
-        formatted_amount = self._format_amount(amount, currency)
-        
         # Calculate nights if not provided
         if not nights:
             try:
@@ -686,206 +857,25 @@ Thank you for choosing C2C Journeys!
                 nights = (co - ci).days
             except (ValueError, TypeError):
                 nights = ''
-        
-        nights_text = f"{nights} Night{'s' if nights != 1 else ''}" if nights else ''
-        
-        # Room name row (only if available)
-        room_row = ''
-        if room_name:
-            room_row = f"""
-            <tr>
-                <td style="padding: 12px 0; color: #64748b; border-bottom: 1px solid #f1f5f9;">Room Type</td>
-                <td style="padding: 12px 0; color: #1e293b; font-weight: 500; text-align: right; border-bottom: 1px solid #f1f5f9;">{room_name}</td>
-            </tr>"""
 
-        # Meal plan row (only if not nomeal)
-        meal_row = ''
-        if meal_plan and meal_plan.lower() not in ('nomeal', 'room only', 'no meal', 'none', ''):
-            meal_row = f"""
-            <tr>
-                <td style="padding: 12px 0; color: #64748b; border-bottom: 1px solid #f1f5f9;">Meal Plan</td>
-                <td style="padding: 12px 0; color: #065f46; font-weight: 600; text-align: right; border-bottom: 1px solid #f1f5f9;">🍽️ {meal_plan}</td>
-            </tr>"""
-        
-        # Guests info row (only if available)
-        guests_row = ''
-        if guests_info:
-            guests_row = f"""
-            <tr>
-                <td style="padding: 12px 0; color: #64748b; border-bottom: 1px solid #f1f5f9;">Guests</td>
-                <td style="padding: 12px 0; color: #1e293b; font-weight: 500; text-align: right; border-bottom: 1px solid #f1f5f9;">{guests_info}</td>
-            </tr>"""
-            
-        # Phone row (only if available)
-        phone_row = ''
-        if customer_phone:
-            phone_row = f"""
-            <tr>
-                <td style="padding: 12px 0; color: #64748b; border-bottom: 1px solid #f1f5f9;">Contact Phone</td>
-                <td style="padding: 12px 0; color: #1e293b; font-weight: 500; text-align: right; border-bottom: 1px solid #f1f5f9;">{customer_phone}</td>
-            </tr>"""
-        
-        return f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-</head>
-<body style="margin: 0; padding: 0; background-color: #f1f5f9; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;">
-    
-    <!-- Wrapper -->
-    <table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f1f5f9; padding: 30px 0;">
-        <tr>
-            <td align="center">
-                <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 24px rgba(0, 0, 0, 0.08);">
-                    
-                    <!-- Header -->
-                    <tr>
-                        <td style="background: linear-gradient(135deg, #1e3a5f 0%, #2563eb 100%); padding: 32px 40px; text-align: center;">
-                            <h1 style="color: #ffffff; font-size: 24px; margin: 0 0 4px; font-weight: 700; letter-spacing: -0.5px;">C2C Journeys</h1>
-                            <p style="color: rgba(255, 255, 255, 0.8); font-size: 13px; margin: 0;">Your Travel Partner</p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Success Banner -->
-                    <tr>
-                        <td style="padding: 30px 40px 20px;">
-                            <table width="100%" cellpadding="0" cellspacing="0" style="background: linear-gradient(135deg, #ecfdf5 0%, #d1fae5 100%); border-radius: 12px; border: 1px solid #a7f3d0;">
-                                <tr>
-                                    <td style="padding: 20px 24px; text-align: center;">
-                                        <div style="font-size: 36px; margin-bottom: 8px;">✅</div>
-                                        <h2 style="color: #065f46; font-size: 18px; margin: 0 0 4px; font-weight: 700;">Booking Confirmed!</h2>
-                                        <p style="color: #047857; font-size: 13px; margin: 0;">Your reservation has been successfully confirmed</p>
-                                    </td>
-                                </tr>
-                            </table>
-                        </td>
-                    </tr>
-                    
-                    <!-- Greeting -->
-                    <tr>
-                        <td style="padding: 10px 40px 20px;">
-                            <p style="color: #334155; font-size: 15px; line-height: 1.6; margin: 0;">
-                                Dear <strong>{customer_name}</strong>,<br>
-                                Thank you for booking with C2C Journeys! Here are your reservation details:
-                            </p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Booking Reference -->
-                    <tr>
-                        <td style="padding: 0 40px 20px;">
-                            <table width="100%" cellpadding="0" cellspacing="0" style="background-color: #f8fafc; border-radius: 10px; border: 1px solid #e2e8f0;">
-                                <tr>
-                                    <td style="padding: 16px 20px;">
-                                        <table width="100%">
-                                            <tr>
-                                                <td style="color: #64748b; font-size: 12px; text-transform: uppercase; letter-spacing: 1px; font-weight: 600;">Booking Reference</td>
-                                                <td style="color: #1e293b; font-size: 15px; font-weight: 700; text-align: right; font-family: 'Courier New', monospace;">{booking_id}</td>
-                                            </tr>
-                                            <tr>
-                                                <td style="color: #64748b; font-size: 12px; text-transform: uppercase; letter-spacing: 1px; font-weight: 600; padding-top: 8px;">Booking Date</td>
-                                                <td style="color: #475569; font-size: 13px; text-align: right; padding-top: 8px;">{date_str}</td>
-                                            </tr>
-                                        </table>
-                                    </td>
-                                </tr>
-                            </table>
-                        </td>
-                    </tr>
-                    
-                    <!-- Hotel Details -->
-                    <tr>
-                        <td style="padding: 0 40px 20px;">
-                            <h3 style="color: #1e3a5f; font-size: 14px; text-transform: uppercase; letter-spacing: 1px; margin: 0 0 12px; border-bottom: 2px solid #2563eb; padding-bottom: 8px;">🏨 Hotel Details</h3>
-                            <table width="100%" cellpadding="0" cellspacing="0">
-                                <tr>
-                                    <td style="padding: 12px 0; color: #64748b; border-bottom: 1px solid #f1f5f9;">Hotel</td>
-                                    <td style="padding: 12px 0; color: #1e293b; font-weight: 600; text-align: right; border-bottom: 1px solid #f1f5f9; font-size: 15px;">{hotel_name}</td>
-                                </tr>{room_row}{meal_row}
-                                <tr>
-                                    <td style="padding: 12px 0; color: #64748b; border-bottom: 1px solid #f1f5f9;">Check-in</td>
-                                    <td style="padding: 12px 0; color: #1e293b; font-weight: 500; text-align: right; border-bottom: 1px solid #f1f5f9;">📅 {checkin}</td>
-                                </tr>
-                                <tr>
-                                    <td style="padding: 12px 0; color: #64748b; border-bottom: 1px solid #f1f5f9;">Check-out</td>
-                                    <td style="padding: 12px 0; color: #1e293b; font-weight: 500; text-align: right; border-bottom: 1px solid #f1f5f9;">📅 {checkout}</td>
-                                </tr>
-                                <tr>
-                                    <td style="padding: 12px 0; color: #64748b; border-bottom: 1px solid #f1f5f9;">Duration</td>
-                                    <td style="padding: 12px 0; color: #1e293b; font-weight: 500; text-align: right; border-bottom: 1px solid #f1f5f9;">🌙 {nights_text}</td>
-                                </tr>{guests_row}{phone_row}
-                            </table>
-                        </td>
-                    </tr>
-                    
-                    <!-- Amount -->
-                    <tr>
-                        <td style="padding: 0 40px 25px;">
-                            <table width="100%" cellpadding="0" cellspacing="0" style="background: linear-gradient(135deg, #1e3a5f 0%, #1e40af 100%); border-radius: 12px;">
-                                <tr>
-                                    <td style="padding: 20px 24px;">
-                                        <table width="100%">
-                                            <tr>
-                                                <td style="color: rgba(255, 255, 255, 0.8); font-size: 13px; text-transform: uppercase; letter-spacing: 1px;">Total Amount Paid</td>
-                                                <td style="color: #ffffff; font-size: 26px; font-weight: 700; text-align: right; letter-spacing: -0.5px;">{formatted_amount}</td>
-                                            </tr>
-                                        </table>
-                                    </td>
-                                </tr>
-                            </table>
-                        </td>
-                    </tr>
-                    
-                    <!-- Important Info -->
-                    <tr>
-                        <td style="padding: 0 40px 25px;">
-                            <table width="100%" cellpadding="0" cellspacing="0" style="background-color: #fffbeb; border-radius: 10px; border: 1px solid #fde68a;">
-                                <tr>
-                                    <td style="padding: 16px 20px;">
-                                        <h4 style="color: #92400e; font-size: 13px; margin: 0 0 8px; font-weight: 600;">⚠️ Important Information</h4>
-                                        <ul style="color: #78350f; font-size: 12px; line-height: 1.8; margin: 0; padding-left: 16px;">
-                                            <li>Please carry a valid government-issued photo ID at check-in</li>
-                                            <li>Standard check-in time is 2:00 PM and check-out is 12:00 PM</li>
-                                            <li>Any non-included taxes will be payable directly at the property</li>
-                                        </ul>
-                                    </td>
-                                </tr>
-                            </table>
-                        </td>
-                    </tr>
-                    
-                    <!-- Support -->
-                    <tr>
-                        <td style="padding: 0 40px 30px; text-align: center;">
-                            <p style="color: #64748b; font-size: 13px; line-height: 1.6; margin: 0;">
-                                Need help? Contact us at<br>
-                                <a href="mailto:info@coasttocoastjourneys.com" style="color: #2563eb; text-decoration: none; font-weight: 600;">info@coasttocoastjourneys.com</a>
-                            </p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Footer -->
-                    <tr>
-                        <td style="background-color: #f8fafc; padding: 20px 40px; text-align: center; border-top: 1px solid #e2e8f0;">
-                            <p style="color: #94a3b8; font-size: 11px; margin: 0 0 4px;">
-                                © 2026 Coast to Coast Journeys. All Rights Reserved.
-                            </p>
-                            <p style="color: #cbd5e1; font-size: 10px; margin: 0;">
-                                c2cjourneys.com
-                            </p>
-                        </td>
-                    </tr>
-                    
-                </table>
-            </td>
-        </tr>
-    </table>
-    
-</body>
-</html>
-"""
+        meal_plan = booking.get('meal_plan', '') or booking.get('meal_info', '')
+        if meal_plan and meal_plan.lower() in ('nomeal', 'room only', 'no meal', 'none'):
+            meal_plan = ''
+
+        return render_template('email/booking_confirmation.html', {
+            'date_str': datetime.now().strftime("%d %B %Y"),
+            'booking_id': booking.get('booking_id', 'N/A'),
+            'customer_name': booking.get('customer_name', 'Valued Guest'),
+            'customer_phone': booking.get('customer_phone', ''),
+            'hotel_name': booking.get('hotel_name', 'Hotel'),
+            'room_name': booking.get('room_name', ''),
+            'meal_plan': meal_plan,
+            'checkin': self._format_date(booking.get('checkin', '')),
+            'checkout': self._format_date(booking.get('checkout', '')),
+            'nights_text': f"{nights} Night{'s' if nights != 1 else ''}" if nights else '',
+            'guests_info': booking.get('guests_info', ''),
+            'formatted_amount': self._format_amount(booking.get('amount', 0), booking.get('currency', 'USD'))
+        })
 
 
     # ═══════════════════════════════════════════════════
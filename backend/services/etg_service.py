@@ -15,6 +15,8 @@ import os
 import json
 import logging
 import concurrent.futures
+import copy
+import threading
 from pathlib import Path
 
 # Add parent directory to path for imports
@@ -95,6 +97,11 @@ class ETGApiService:
             
         # Search result cache (10-minute TTL to reduce duplicate API calls)
         self.search_cache = TTLCache(maxsize=100, ttl=600)
+
+        # Prebook result cache keyed by (book_hash, price_increase_percent) so the
+        # guest-details page, payment page and /book don't each re-run /hotel/prebook/
+        self.prebook_cache = TTLCache(maxsize=500, ttl=Config.PREBOOK_CACHE_TTL)
+        self._prebook_lock = threading.Lock()
         
         # Local Static Data Cache (Persist to disk to survive restarts)
         self.static_cache_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'hotel_static_cache.json')
@@ -361,17 +368,32 @@ class ETGApiService:
         Enriches search results with names, images, and addresses.
         """
         all_hotel_data = {}
+        for hid, h_info in self.iter_hotels_static(hotel_ids, language):
+            if h_info:
+                all_hotel_data[hid] = h_info
+            
+        return {
+            'success': True,
+            'data': {'data': all_hotel_data}
+        }
+
+    def iter_hotels_static(self, hotel_ids: List[str], language: str = "en"):
+        """
+        Yield (hotel_id, static_info) pairs as they become available:
+        cached hotels first, then each live /hotel/info/ fetch as it completes.
+        static_info is None when a fetch failed.
+        """
         ids_to_fetch = []
         
         # 1. Check local cache first
         for hid in hotel_ids:
             if hid in self.static_cache:
-                all_hotel_data[hid] = self.static_cache[hid]
+                yield hid, self.static_cache[hid]
             else:
                 ids_to_fetch.append(hid)
         
         if not ids_to_fetch:
-            return {'success': True, 'data': {'data': all_hotel_data}}
+            return
             
         # Cap static fetching for missing/uncached hotels to 25 per request batch to ensure fast response times
         if len(ids_to_fetch) > 25:
@@ -410,22 +432,17 @@ class ETGApiService:
                 return hotel_id, None
 
         # 2. Fetch missing IDs in parallel (Max 20 workers for high throughput)
-        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-            future_to_id = {executor.submit(fetch_single_hotel, hid): hid for hid in ids_to_fetch}
-            for future in concurrent.futures.as_completed(future_to_id):
-                hid, h_info = future.result()
-                if h_info:
-                    all_hotel_data[hid] = h_info
-                    self.static_cache[hid] = h_info # Add to runtime cache
-
-        # 3. Save updated cache to disk
-        if ids_to_fetch:
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
+                future_to_id = {executor.submit(fetch_single_hotel, hid): hid for hid in ids_to_fetch}
+                for future in concurrent.futures.as_completed(future_to_id):
+                    hid, h_info = future.result()
+                    if h_info:
+                        self.static_cache[hid] = h_info # Add to runtime cache
+                    yield hid, h_info
+        finally:
+            # 3. Save updated cache to disk
             self._save_static_cache()
-            
-        return {
-            'success': True,
-            'data': {'data': all_hotel_data}
-        }
     
     # ==========================================
     # SEARCH ENDPOINTS (9-14)
@@ -580,16 +597,47 @@ class ETGApiService:
     # PREBOOK ENDPOINTS (15-17)
     # ==========================================
     
-    def prebook(self, book_hash: str, price_increase_percent: int = 5) -> dict:
+    def prebook(self, book_hash: str, price_increase_percent: int = 5, use_cache: bool = True) -> dict:
         """
         Prebook rate - check availability and final price
         POST /hotel/prebook/
-        """
+
+        Successful prebooks without a price change are cached for
+        PREBOOK_CACHE_TTL seconds, so every checkout step gets the same
+        validated price and hash. A price change or a booking attempt
+        (invalidate_prebook) drops the cached entry.
+        """
+        cache_key = (book_hash, int(price_increase_percent))
+        if use_cache:
+            with self._prebook_lock:
+                cached = self.prebook_cache.get(cache_key)
+            if cached is not None:
+                print(f"⚡ PREBOOK CACHE HIT for {book_hash[:30]}...")
+                result = copy.deepcopy(cached)
+                result['cached'] = True
+                return result
+
         data = {
             "hash": book_hash,
             "price_increase_percent": price_increase_percent
         }
-        return self._make_request("/hotel/prebook/", data)
+        result = self._make_request("/hotel/prebook/", data)
+
+        prebook_data = result.get('data') or {}
+        if isinstance(prebook_data, dict) and isinstance(prebook_data.get('data'), dict):
+            prebook_data = prebook_data['data']
+        if not result.get('success') or not isinstance(prebook_data, dict) or prebook_data.get('price_changed'):
+            self.invalidate_prebook(book_hash)
+        else:
+            with self._prebook_lock:
+                self.prebook_cache[cache_key] = copy.deepcopy(result)
+        return result
+
+    def invalidate_prebook(self, book_hash: str):
+        """Forget cached prebook results for a hash (any price_increase_percent)"""
+        with self._prebook_lock:
+            for key in [k for k in self.prebook_cache.keys() if k[0] == book_hash]:
+                self.prebook_cache.pop(key, None)
     
     def get_rate_info(self, book_hash: str) -> dict:
         """
@@ -0,0 +1,166 @@
+"""
+C2C Journeys - Flight Search Cache
+In-process cache of AIR iQ /search results so repeated searches for the same
+route and date don't each wait on a 30-second upstream call.
+
+- Keyed on the normalized (origin, destination, date, adults, cabin class).
+- Fresh for FLIGHT_CACHE_TTL seconds. For FLIGHT_CACHE_STALE_SECONDS after
+  that, the stale result is returned at once and refreshed in the background
+  (stale-while-revalidate).
+- Concurrent misses for the same key are coalesced: one caller fetches and
+  the others wait for its result.
+- Sized in bytes: entries are kept as serialized JSON (every reader gets its
+  own copy) and the least recently used are evicted past
+  FLIGHT_CACHE_MAX_BYTES.
+
+Only what the fetch function marks cacheable is stored - the flight service
+never caches mock fallbacks.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class FlightSearchCache:
+    """Byte-bounded LRU with TTL, stale-while-revalidate and request coalescing"""
+
+    def __init__(self, ttl: float = 300, stale_seconds: float = 600,
+                 max_bytes: int = 32 * 1024 * 1024, wait_timeout: float = 35):
+        self.ttl = ttl
+        self.stale_seconds = stale_seconds
+        self.max_bytes = max_bytes
+        self.wait_timeout = wait_timeout     # how long a coalesced caller waits for the leader
+        self._entries = OrderedDict()        # key -> (payload bytes, stored_at)
+        self._bytes = 0
+        self._inflight: Dict[Tuple, _InFlight] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0,
+                      'revalidations': 0, 'stored': 0, 'evictions': 0, 'uncacheable': 0}
+
+    @staticmethod
+    def make_key(origin: str, destination: str, date: str, adults, cabin: str) -> Tuple:
+        return (
+            (origin or '').strip().upper(),
+            (destination or '').strip().upper(),
+            (date or '').strip().replace('/', '-'),
+            int(adults or 1),
+            (cabin or 'economy').strip().lower(),
+        )
+
+    def get_or_fetch(self, key: Tuple, fetch: Callable[[], Tuple[Any, bool]]) -> Tuple[Any, str]:
+        """
+        The value for key and how it was served: 'hit', 'stale', 'miss' or
+        'coalesced'. fetch() returns (value, cacheable); errors it raises reach
+        the caller that ran it and every caller waiting on it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                payload, stored_at = entry
+                age = time.monotonic() - stored_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return json.loads(payload), 'hit'
+                if age < self.ttl + self.stale_seconds:
+                    self._entries.move_to_end(key)
+                    self.stats['stale_hits'] += 1
+                    if key not in self._inflight:
+                        self._inflight[key] = _InFlight()
+                        threading.Thread(target=self._revalidate, args=(key, fetch),
+                                         name='flight-cache-revalidate', daemon=True).start()
+                    return json.loads(payload), 'stale'
+                self._remove(key)
+
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[key] = _InFlight()
+                self.stats['misses'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            if not inflight.done.wait(self.wait_timeout):
+                raise TimeoutError('Timed out waiting for an identical flight search')
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.value, 'coalesced'
+
+        self._run(key, fetch, inflight)
+        if inflight.error is not None:
+            raise inflight.error
+        return inflight.value, 'miss'
+
+    def _revalidate(self, key: Tuple, fetch: Callable):
+        self.stats['revalidations'] += 1
+        with self._lock:
+            inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._run(key, fetch, inflight)
+            if inflight.error is not None:
+                print(f"⚠️ Flight cache revalidation failed for {key}: {inflight.error}")
+
+    def _run(self, key: Tuple, fetch: Callable, inflight: _InFlight):
+        try:
+            value, cacheable = fetch()
+            inflight.value = value
+            if cacheable:
+                self._store(key, value)
+            else:
+                self.stats['uncacheable'] += 1
+        except Exception as e:
+            inflight.error = e
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.done.set()
+
+    def _store(self, key: Tuple, value: Any):
+        payload = json.dumps(value, default=str).encode()
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (payload, time.monotonic())
+            self._bytes += len(payload)
+            self.stats['stored'] += 1
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats['evictions'] += 1
+
+    def _remove(self, key: Tuple):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self.stats, 'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+
+flight_search_cache = FlightSearchCache(
+    ttl=Config.FLIGHT_CACHE_TTL,
+    stale_seconds=Config.FLIGHT_CACHE_STALE_SECONDS,
+    max_bytes=Config.FLIGHT_CACHE_MAX_BYTES
+)
@@ -3,10 +3,21 @@ Flight Service with Duffel Integration
 Provides live flight data via Duffel API with a mock fallback.
 """
 import random
+import threading
+import time
 from datetime import datetime, timedelta
 import hashlib
+import jwt
 import requests
+from requests.adapters import HTTPAdapter
 from config import Config
+from services.flight_search_cache import flight_search_cache
+
+# AIR iQ doesn't document a token lifetime: JWT tokens carry their own exp,
+# anything else is assumed to last AIR_IQ_TOKEN_TTL seconds
+AUTH_REFRESH_MARGIN_SECONDS = 120   # refresh this long before the token expires
+AUTH_RETRY_SECONDS = 30             # after a failed login, don't try again (and block searches) sooner
+
 
 class FlightService:
     def __init__(self):
@@ -14,9 +25,16 @@ class FlightService:
         self.air_iq_login_id = Config.AIR_IQ_LOGIN_ID
         self.air_iq_password = Config.AIR_IQ_PASSWORD
         self.air_iq_api_key = Config.AIR_IQ_API_KEY
+        # Logged in lazily on the first search (see _get_token), not at import
         self.token = None
-        if self.air_iq_api_key:
-            self._authenticate()
+        self.token_expires_at = 0.0
+        self._auth_lock = threading.Lock()
+        self._auth_failed_at = 0.0
+        self._local = threading.local()
+        self.stats = {
+            'auth_logins': 0, 'auth_refreshes': 0, 'auth_failures': 0, 'auth_rejected': 0,
+            'searches': 0, 'search_failures': 0, 'mock_fallbacks': 0,
+        }
 
         self.airlines = [
             {'code': 'AI', 'name': 'Air India', 'logo': 'https://logos-world.net/wp-content/uploads/2023/01/Air-India-Logo.png'},
@@ -191,20 +209,89 @@ class FlightService:
         self.city_to_code['trivandrum'] = 'TRV'
         self.city_to_code['benares'] = 'VNS'
 
+    def _http_session(self):
+        """Per-thread keep-alive session for AIR iQ calls"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+            session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        return session
+
+    def _token_valid(self):
+        return bool(self.token) and time.monotonic() < self.token_expires_at - AUTH_REFRESH_MARGIN_SECONDS
+
+    def _get_token(self):
+        """A valid AIR iQ token, logging in (once, under the lock) when missing or about to expire"""
+        if self._token_valid():
+            return self.token
+        with self._auth_lock:
+            # Another thread may have refreshed it while we waited
+            if self._token_valid():
+                return self.token
+            if time.monotonic() - self._auth_failed_at < AUTH_RETRY_SECONDS:
+                # Keep using a token that hasn't actually expired yet
+                return self.token if self.token and time.monotonic() < self.token_expires_at else None
+            self._authenticate()
+            return self.token
+
+    def _invalidate_token(self, token):
+        """The API rejected `token` - make the next _get_token() log in again"""
+        with self._auth_lock:
+            if self.token == token:
+                self.token = None
+                self.token_expires_at = 0.0
+                self._auth_failed_at = 0.0
+
+    @staticmethod
+    def _token_lifetime(token, data):
+        """Seconds until the token expires: JWT exp, an expires_in field, or AIR_IQ_TOKEN_TTL"""
+        try:
+            exp = jwt.decode(token, options={'verify_signature': False}).get('exp')
+            if exp:
+                return max(0.0, exp - time.time())
+        except jwt.PyJWTError:
+            pass
+        for key in ('expires_in', 'expiresIn'):
+            try:
+                if data.get(key):
+                    return float(data[key])
+            except (TypeError, ValueError):
+                pass
+        return float(Config.AIR_IQ_TOKEN_TTL)
+
     def _authenticate(self):
+        """Log in to AIR iQ (caller holds _auth_lock)"""
         url = f"{self.air_iq_url}/login"
         payload = {"Username": self.air_iq_login_id, "Password": self.air_iq_password}
         headers = {"Content-Type": "application/json", "api-key": self.air_iq_api_key}
+        refresh = self.token is not None or self.stats['auth_logins'] > 0
         try:
-            res = requests.post(url, json=payload, headers=headers, timeout=15)
-            if res.ok:
-                data = res.json()
-                self.token = data.get("token")
-                print("✅ AIR iQ API client initialized")
-            else:
-                print(f"⚠️ Error initializing AIR iQ client: {res.text}")
+            res = self._http_session().post(url, json=payload, headers=headers, timeout=15)
+            data = res.json() if res.ok else {}
+            token = data.get("token")
+            if token:
+                lifetime = self._token_lifetime(token, data)
+                self.token = token
+                self.token_expires_at = time.monotonic() + lifetime
+                self._auth_failed_at = 0.0
+                self.stats['auth_refreshes' if refresh else 'auth_logins'] += 1
+                print(f"✅ AIR iQ {'token refreshed' if refresh else 'API client initialized'} (valid {lifetime / 60:.0f} min)")
+                return
+            print(f"⚠️ Error initializing AIR iQ client: {res.text}")
         except Exception as e:
             print(f"⚠️ Error initializing AIR iQ client: {e}")
+        self.stats['auth_failures'] += 1
+        self._auth_failed_at = time.monotonic()
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            'configured': bool(self.air_iq_api_key),
+            'authenticated': bool(self.token),
+            'token_expires_in': round(self.token_expires_at - time.monotonic()) if self.token else None,
+            'search_cache': flight_search_cache.get_stats(),
+        }
 
     def _resolve_airport_code(self, location):
         """Resolve city name or airport code to airport code"""
@@ -231,8 +318,8 @@ class FlightService:
         origin_code = self._resolve_airport_code(origin)
         dest_code = self._resolve_airport_code(destination)
 
-        # If AIR iQ is configured, try real search
-        if self.token:
+        # If AIR iQ is configured, try real search (served from the cache when possible)
+        if self.air_iq_api_key:
             try:
                 res = self._air_iq_search(origin_code, dest_code, depart_date, return_date, adults, flight_class)
                 if res and res.get('success'): 
@@ -241,6 +328,7 @@ class FlightService:
                     print("⚠️ AIR iQ search returned no results, falling back to mock.")
             except Exception as e:
                 print(f"⚠️ AIR iQ search failed, falling back to mock: {e}")
+        self.stats['mock_fallbacks'] += 1
 
         # Fallback to mock data
         results = {
@@ -258,13 +346,47 @@ class FlightService:
         }
 
     def _air_iq_search(self, origin, destination, depart_date, return_date, adults, flight_class):
-        """Perform real search using AIR iQ API"""
+        """Real search using AIR iQ, outbound results cached by route/date/passengers/cabin"""
+        key = flight_search_cache.make_key(origin, destination, depart_date, adults, flight_class)
+        formatted_outbound, cache_status = flight_search_cache.get_or_fetch(
+            key, lambda: self._fetch_air_iq_outbound(origin, destination, depart_date, adults)
+        )
+        if not formatted_outbound:
+            return {'success': False}
+
+        # Currently mock inbound due to missing AIR iQ dual slice format details
+        # (generated per request - only the real AIR iQ outbound is ever cached)
+        formatted_inbound = []
+        if return_date:
+             formatted_inbound = self._generate_flights(destination, origin, return_date, adults, flight_class)
+
+        return {
+            'success': True,
+            'data': {
+                'outbound': formatted_outbound,
+                'inbound': formatted_inbound,
+                'meta': {
+                    'provider': 'air_iq',
+                    'cache': cache_status,
+                }
+            }
+        }
+
+    def _fetch_air_iq_outbound(self, origin, destination, depart_date, adults):
+        """
+        One AIR iQ /search call -> (formatted outbound flights, cacheable).
+        Empty results aren't cached, since the caller falls back to mock data.
+        """
+        token = self._get_token()
+        if not token:
+            raise Exception("AIR iQ not authenticated")
+
         # AIR iQ date format is YYYY/MM/DD
         # Input date comes typically as YYYY-MM-DD
         formatted_date = depart_date.replace('-', '/')
         
         headers = {
-            "Authorization": self.token,
+            "Authorization": token,
             "Content-Type": "application/json",
             "api-key": self.air_iq_api_key
         }
@@ -281,13 +403,26 @@ class FlightService:
         # Flight classes might need mapping, default to Economy mostly.
         # AIR iQ doesn't strictly have this in the basic payload uncovered so leaving it default.
 
-        response = requests.post(f"{self.air_iq_url}/search", json=payload, headers=headers, timeout=30)
-        if not response.ok:
-            raise Exception(f"AIR iQ search failed: {response.text}")
-        
-        resp_json = response.json()
+        self.stats['searches'] += 1
+        try:
+            response = self._http_session().post(f"{self.air_iq_url}/search", json=payload, headers=headers, timeout=30)
+            if response.status_code in (401, 403):
+                # Expired or revoked early - log in again and retry once
+                self.stats['auth_rejected'] += 1
+                self._invalidate_token(token)
+                headers["Authorization"] = self._get_token()
+                if not headers["Authorization"]:
+                    raise Exception("AIR iQ token rejected and re-login failed")
+                response = self._http_session().post(f"{self.air_iq_url}/search", json=payload, headers=headers, timeout=30)
+            if not response.ok:
+                raise Exception(f"AIR iQ search failed: {response.text}")
+            resp_json = response.json()
+        except Exception:
+            self.stats['search_failures'] += 1
+            raise
+
         if resp_json.get('status') != 'success' or not resp_json.get('data'):
-            return {'success': False}
+            return [], False
             
         flights_data = resp_json.get('data', [])
         
@@ -300,21 +435,7 @@ class FlightService:
             except Exception as loop_e:
                 print(f"Skipping a flight due to parsing error: {loop_e}")
 
-        # Currently mock inbound due to missing AIR iQ dual slice format details
-        formatted_inbound = []
-        if return_date:
-             formatted_inbound = self._generate_flights(destination, origin, return_date, adults, flight_class)
-
-        return {
-            'success': True,
-            'data': {
-                'outbound': formatted_outbound,
-                'inbound': formatted_inbound,
-                'meta': {
-                    'provider': 'air_iq',
-                }
-            }
-        }
+        return formatted_outbound, bool(formatted_outbound)
 
     def _format_air_iq_flight(self, flight):
         """Format AIR iQ slice data to match frontend expectations"""
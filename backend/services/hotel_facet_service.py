@@ -0,0 +1,439 @@
+"""
+C2C Journeys - Hotel Facet Service
+Server-side snapshot of each hotel search with precomputed facets.
+
+Every search stores its transformed hotels under a search_id. Facet values
+(stars, meal plan, amenities, free cancellation, price bucket) are indexed
+as bitmaps (plain Python ints, bit i = hotel i) so any filter combination is
+a handful of AND/OR operations instead of a scan over every hotel.
+
+Snapshots are written to a local SQLite file (compressed JSON) so every
+gunicorn worker on the host can serve /search/<search_id>/results and
+/rates for a search another worker ran. Each worker keeps the snapshots it
+has recently used, with their built indexes, in a small in-memory cache.
+Both are bounded by bytes, not entry count - one snapshot carries the raw
+ETG hotels and can run to several MB.
+"""
+import bisect
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import zlib
+from typing import Dict, List, Optional
+
+from cachetools import TTLCache
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+
+# Snapshot lifetime - matches the ETG search cache in etg_service (10 minutes)
+SNAPSHOT_TTL_SECONDS = 600
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'search_snapshots.sqlite3')
+PURGE_INTERVAL_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_snapshots (
+    search_id TEXT PRIMARY KEY,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    raw_size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_search_snapshots_created ON search_snapshots(created_at);
+"""
+
+PRICE_BUCKET_COUNT = 8
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+SORT_KEYS = {
+    'price_low': (lambda h: h.get('price') or 0, False),
+    'price_high': (lambda h: h.get('price') or 0, True),
+    'rating': (lambda h: h.get('guest_rating') or 0, True),
+    'stars': (lambda h: h.get('star_rating') or 0, True),
+}
+
+
+def _popcount(bits: int) -> int:
+    """Count set bits (int.bit_count needs Python 3.10, Docker image runs 3.9)"""
+    return bin(bits).count('1')
+
+
+def _iter_bits(bits: int):
+    """Yield the index of every set bit in ascending order"""
+    idx = 0
+    while bits:
+        if bits & 1:
+            yield idx
+        bits >>= 1
+        idx += 1
+
+
+def _nice_step(raw_step: float) -> float:
+    """Round a bucket width up to 1/2/5 x 10^n so labels read naturally"""
+    if raw_step <= 0:
+        return 1
+    magnitude = 10 ** (len(str(int(raw_step))) - 1)
+    for factor in (1, 2, 5, 10):
+        if raw_step <= factor * magnitude:
+            return factor * magnitude
+    return 10 * magnitude
+
+
+class HotelFacetIndex:
+    """Bitmap index over a list of transformed hotel cards"""
+
+    def __init__(self, hotels: List[Dict], bucket_count: int = PRICE_BUCKET_COUNT):
+        self.hotels = hotels
+        self.size = len(hotels)
+        self.all_bits = (1 << self.size) - 1
+
+        self.bitmaps: Dict[str, Dict] = {
+            'stars': {},
+            'meal': {},
+            'amenity': {},
+            'free_cancellation': {},
+            'price': {},
+        }
+
+        for idx, hotel in enumerate(hotels):
+            bit = 1 << idx
+            self._add('stars', self._star_value(hotel), bit)
+            self._add('meal', (hotel.get('meal_plan') or 'nomeal').lower(), bit)
+            for amenity in hotel.get('amenities') or []:
+                self._add('amenity', str(amenity).lower(), bit)
+            free_cancel = bool((hotel.get('cancellation_info') or {}).get('is_free_cancellation'))
+            self._add('free_cancellation', free_cancel, bit)
+
+        # Price: sorted (price, idx) pairs for range filters + histogram buckets
+        self._price_sorted = sorted((float(h.get('price') or 0), idx) for idx, h in enumerate(hotels))
+        self._prices = [p for p, _ in self._price_sorted]
+        self.price_buckets = self._build_price_buckets(bucket_count)
+
+    def _add(self, facet: str, value, bit: int):
+        facet_map = self.bitmaps[facet]
+        facet_map[value] = facet_map.get(value, 0) | bit
+
+    @staticmethod
+    def _star_value(hotel: Dict) -> int:
+        try:
+            return int(round(float(hotel.get('star_rating') or 0)))
+        except (TypeError, ValueError):
+            return 0
+
+    def _build_price_buckets(self, bucket_count: int) -> List[Dict]:
+        """Split the observed price range into evenly sized, rounded buckets"""
+        priced = [p for p in self._prices if p > 0]
+        if not priced:
+            return []
+
+        low, high = priced[0], priced[-1]
+        step = _nice_step((high - low) / bucket_count) if high > low else _nice_step(high)
+        start = (low // step) * step
+
+        buckets = []
+        bucket_floor = start
+        while bucket_floor <= high:
+            bucket_ceil = bucket_floor + step
+            bits = self.price_range_bits(bucket_floor, bucket_ceil, upper_inclusive=False)
+            buckets.append({'min': bucket_floor, 'max': bucket_ceil})
+            self.bitmaps['price'][len(buckets) - 1] = bits
+            bucket_floor = bucket_ceil
+        return buckets
+
+    def price_range_bits(self, price_min: Optional[float] = None, price_max: Optional[float] = None,
+                         upper_inclusive: bool = True) -> int:
+        """Bitmap of hotels whose price falls in [price_min, price_max]"""
+        lo = bisect.bisect_left(self._prices, price_min) if price_min is not None else 0
+        if price_max is None:
+            hi = self.size
+        elif upper_inclusive:
+            hi = bisect.bisect_right(self._prices, price_max)
+        else:
+            hi = bisect.bisect_left(self._prices, price_max)
+
+        bits = 0
+        for _, idx in self._price_sorted[lo:hi]:
+            bits |= 1 << idx
+        return bits
+
+    def _union(self, facet: str, values) -> int:
+        bits = 0
+        for value in values:
+            bits |= self.bitmaps[facet].get(value, 0)
+        return bits
+
+    def _intersection(self, facet: str, values) -> int:
+        bits = self.all_bits
+        for value in values:
+            bits &= self.bitmaps[facet].get(value, 0)
+        return bits
+
+    def filter_masks(self, filters: Dict) -> Dict[str, int]:
+        """
+        Build one bitmap per active facet filter.
+
+        Stars, meals and price buckets are OR-ed within the facet; amenities
+        are AND-ed (a hotel must have every selected amenity), matching the
+        behaviour of the results page filters.
+        """
+        masks = {}
+        if filters.get('stars'):
+            masks['stars'] = self._union('stars', [int(s) for s in filters['stars']])
+        if filters.get('meals'):
+            masks['meal'] = self._union('meal', [str(m).lower() for m in filters['meals']])
+        if filters.get('amenities'):
+            masks['amenity'] = self._intersection('amenity', [str(a).lower() for a in filters['amenities']])
+        if filters.get('free_cancellation'):
+            masks['free_cancellation'] = self.bitmaps['free_cancellation'].get(True, 0)
+
+        price_bits = self.all_bits
+        if filters.get('price_buckets'):
+            price_bits &= self._union('price', [int(b) for b in filters['price_buckets']])
+        if filters.get('price_min') is not None or filters.get('price_max') is not None:
+            price_bits &= self.price_range_bits(filters.get('price_min'), filters.get('price_max'))
+        if price_bits != self.all_bits:
+            masks['price'] = price_bits
+        return masks
+
+    @staticmethod
+    def combine(masks: Dict[str, int], all_bits: int, exclude: Optional[str] = None) -> int:
+        bits = all_bits
+        for facet, mask in masks.items():
+            if facet != exclude:
+                bits &= mask
+        return bits
+
+    def facet_counts(self, masks: Dict[str, int]) -> Dict:
+        """
+        Counts per facet value under the current filters.
+
+        Each facet is counted against every *other* active filter, so
+        selecting "4 stars" still shows how many 3- or 5-star hotels
+        would match if the user widened the selection.
+        """
+        counts = {}
+        for facet in ('stars', 'meal', 'amenity', 'free_cancellation'):
+            base = self.combine(masks, self.all_bits, exclude=facet)
+            counts[facet] = {
+                str(value).lower() if isinstance(value, bool) else str(value): _popcount(bits & base)
+                for value, bits in self.bitmaps[facet].items()
+            }
+
+        price_base = self.combine(masks, self.all_bits, exclude='price')
+        counts['price'] = [
+            {**bucket, 'index': idx, 'count': _popcount(self.bitmaps['price'].get(idx, 0) & price_base)}
+            for idx, bucket in enumerate(self.price_buckets)
+        ]
+        return counts
+
+    def select(self, filters: Dict, sort: Optional[str] = None, page: int = 1,
+               page_size: int = DEFAULT_PAGE_SIZE) -> Dict:
+        """Apply filters, sort the matches and slice out the requested page"""
+        masks = self.filter_masks(filters)
+        matched_bits = self.combine(masks, self.all_bits)
+        matched = [self.hotels[idx] for idx in _iter_bits(matched_bits)]
+
+        if sort in SORT_KEYS:
+            key, reverse = SORT_KEYS[sort]
+            matched.sort(key=key, reverse=reverse)
+
+        page = max(1, int(page or 1))
+        page_size = max(1, min(int(page_size or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        offset = (page - 1) * page_size
+
+        return {
+            'hotels': matched[offset:offset + page_size],
+            'total': len(matched),
+            'page': page,
+            'page_size': page_size,
+            'has_more': offset + page_size < len(matched),
+            'facets': self.facet_counts(masks),
+        }
+
+
+class SearchSnapshot:
+    """Transformed results of one search plus the context they were built with"""
+
+    def __init__(self, search_id: str, hotels: List[Dict], context: Optional[Dict] = None,
+                 created_at: Optional[float] = None, size_bytes: int = 0):
+        self.search_id = search_id
+        self.hotels = hotels
+        self.context = context or {}
+        self.created_at = created_at or time.time()
+        self.size_bytes = size_bytes  # serialized size, what the memory cache is bounded by
+        self._index = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> HotelFacetIndex:
+        """Facet index is built on first filter request, then reused"""
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = HotelFacetIndex(self.hotels)
+        return self._index
+
+    def age_seconds(self) -> float:
+        return time.time() - self.created_at
+
+
+class SearchSnapshotStore:
+    """
+    Search snapshots keyed by search_id: a SQLite table shared by the workers
+    on this host, fronted by a per-process TTL cache
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, ttl: int = SNAPSHOT_TTL_SECONDS,
+                 max_bytes: int = 256 * 1024 * 1024, memory_max_bytes: int = 64 * 1024 * 1024):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._memory = TTLCache(maxsize=memory_max_bytes, ttl=ttl, getsizeof=lambda snap: max(1, snap.size_bytes))
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._schema_ready = False
+        self._last_purge = 0.0
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._schema_ready = True
+        return conn
+
+    def put(self, hotels: List[Dict], context: Optional[Dict] = None) -> SearchSnapshot:
+        raw = json.dumps({'hotels': hotels, 'context': context or {}}, default=str).encode()
+        snapshot = SearchSnapshot(uuid.uuid4().hex, hotels, context, size_bytes=len(raw))
+        self._remember(snapshot)
+
+        payload = zlib.compress(raw, 1)
+        if len(payload) > self.max_bytes:
+            print(f"⚠️ Search snapshot {snapshot.search_id} ({len(payload)} bytes) too large to share")
+            return snapshot
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO search_snapshots (search_id, payload, size, raw_size, created_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (snapshot.search_id, payload, len(payload), len(raw), snapshot.created_at, now + self.ttl)
+                )
+                self._evict(conn, now)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            # Still served by this worker from memory
+            print(f"⚠️ Could not store search snapshot {snapshot.search_id}: {e}")
+        return snapshot
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired snapshots, then the oldest until the table fits in max_bytes"""
+        if now - self._last_purge >= PURGE_INTERVAL_SECONDS:
+            self._last_purge = now
+            conn.execute("DELETE FROM search_snapshots WHERE expires_at <= ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM search_snapshots").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for search_id, size in conn.execute(
+            "SELECT search_id, size FROM search_snapshots ORDER BY created_at"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM search_snapshots WHERE search_id = ?", (search_id,))
+            total -= size
+
+    def _remember(self, snapshot: SearchSnapshot):
+        with self._lock:
+            try:
+                self._memory[snapshot.search_id] = snapshot
+            except ValueError:
+                pass  # bigger than the whole memory cache - SQLite only
+
+    def get(self, search_id: str) -> Optional[SearchSnapshot]:
+        with self._lock:
+            snapshot = self._memory.get(search_id)
+        if snapshot is not None:
+            return snapshot
+
+        try:
+            row = self._conn().execute(
+                "SELECT payload, raw_size, created_at FROM search_snapshots WHERE search_id = ? AND expires_at > ?",
+                (search_id, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not read search snapshot {search_id}: {e}")
+            return None
+        if row is None:
+            return None
+
+        data = json.loads(zlib.decompress(row[0]))
+        snapshot = SearchSnapshot(search_id, data['hotels'], data['context'], created_at=row[2], size_bytes=row[1])
+        self._remember(snapshot)
+        return snapshot
+
+
+def parse_facet_filters(args) -> Dict:
+    """
+    Read facet filters from request args (?stars=4,5&meals=breakfast&free_cancellation=true).
+    Raises ValueError for non-numeric stars / price_buckets.
+    """
+    def _list(name):
+        values = []
+        for raw in args.getlist(name) if hasattr(args, 'getlist') else [args.get(name)]:
+            if raw is None:
+                continue
+            if isinstance(raw, (list, tuple)):
+                values.extend(raw)
+            else:
+                values.extend(v.strip() for v in str(raw).split(',') if v.strip())
+        return values
+
+    def _int_list(name):
+        values = _list(name)
+        try:
+            return [int(v) for v in values]
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a comma-separated list of whole numbers")
+
+    def _float(name):
+        value = args.get(name)
+        try:
+            return float(value) if value not in (None, '') else None
+        except (TypeError, ValueError):
+            return None
+
+    return {
+        'stars': _int_list('stars'),
+        'meals': _list('meals'),
+        'amenities': _list('amenities'),
+        'price_buckets': _int_list('price_buckets'),
+        'free_cancellation': str(args.get('free_cancellation', '')).lower() in ('1', 'true', 'yes'),
+        'price_min': _float('price_min'),
+        'price_max': _float('price_max'),
+    }
+
+
+# Singleton instance
+search_snapshot_store = SearchSnapshotStore(
+    db_path=Config.SEARCH_SNAPSHOT_DB_PATH or DEFAULT_DB_PATH,
+    max_bytes=Config.SEARCH_SNAPSHOT_MAX_BYTES,
+    memory_max_bytes=Config.SEARCH_SNAPSHOT_MEMORY_BYTES
+)
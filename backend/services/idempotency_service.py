@@ -0,0 +1,242 @@
+"""
+C2C Journeys - Idempotency Keys
+Replays the first response for a repeated Idempotency-Key instead of
+re-running booking / payment side effects.
+
+Clients send `Idempotency-Key: <unique value>` on POSTs that must not run
+twice (create booking, finish booking, verify payment). The first request
+claims the key and its response is stored; duplicates that arrive while it is
+still running wait for it, later duplicates get the stored response back with
+`Idempotent-Replayed: true`. Keys are scoped to the caller (signed-in user,
+else the customer email on the request, else the client address), so two
+customers can never collide on the same client-chosen value. Keys live in a local SQLite file so every gunicorn
+worker on the host sees them, and expire after IDEMPOTENCY_TTL_SECONDS.
+
+Only successful (2xx) responses are stored: errors and exceptions release the
+key so a corrected or retried request can run again.
+"""
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from functools import wraps
+from typing import Dict, Optional
+
+from flask import request, jsonify, make_response
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from services.search_analytics_service import search_analytics_service
+
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'idempotency.sqlite3')
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+WAIT_POLL_SECONDS = 0.25
+PURGE_INTERVAL_SECONDS = 600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    status TEXT NOT NULL,
+    status_code INTEGER,
+    mimetype TEXT,
+    body BLOB,
+    locked_until REAL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency_keys(expires_at);
+"""
+
+
+class IdempotencyStore:
+    """SQLite table of claimed keys and their stored responses"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, ttl_seconds: int = 86400, lock_seconds: int = 300):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.lock_seconds = lock_seconds
+        self._local = threading.local()
+        self._schema_ready = False
+        self._last_purge = 0.0
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._schema_ready = True
+        return conn
+
+    def claim(self, key: str, fingerprint: str) -> Dict:
+        """
+        Try to take ownership of a key. Returns one of:
+            {'state': 'claimed'}                      caller runs the request
+            {'state': 'done', 'row': ...}             replay the stored response
+            {'state': 'in_progress'}                  another request is running it
+            {'state': 'mismatch'}                     key reused with a different body
+        """
+        now = time.time()
+        self._maybe_purge(now)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT * FROM idempotency_keys WHERE key = ?", (key,)).fetchone()
+            if row is not None and row['expires_at'] <= now:
+                conn.execute("DELETE FROM idempotency_keys WHERE key = ?", (key,))
+                row = None
+
+            if row is None or (row['status'] == 'in_progress' and (row['locked_until'] or 0) < now):
+                # New key, or the owner died mid-request (lock lease expired)
+                conn.execute(
+                    "INSERT OR REPLACE INTO idempotency_keys (key, fingerprint, status, locked_until, created_at, expires_at) "
+                    "VALUES (?, ?, 'in_progress', ?, ?, ?)",
+                    (key, fingerprint, now + self.lock_seconds, now, now + self.ttl_seconds)
+                )
+                result = {'state': 'claimed'}
+            elif row['fingerprint'] != fingerprint:
+                result = {'state': 'mismatch'}
+            elif row['status'] == 'done':
+                result = {'state': 'done', 'row': dict(row)}
+            else:
+                result = {'state': 'in_progress'}
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def complete(self, key: str, status_code: int, mimetype: str, body: bytes):
+        self._conn().execute(
+            "UPDATE idempotency_keys SET status = 'done', status_code = ?, mimetype = ?, body = ?, locked_until = NULL "
+            "WHERE key = ?",
+            (status_code, mimetype, body, key)
+        )
+
+    def release(self, key: str):
+        self._conn().execute("DELETE FROM idempotency_keys WHERE key = ? AND status = 'in_progress'", (key,))
+
+    def get(self, key: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT * FROM idempotency_keys WHERE key = ?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def _maybe_purge(self, now: float):
+        if now - self._last_purge < PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+        try:
+            self._conn().execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (now,))
+        except sqlite3.OperationalError:
+            pass
+
+
+def _request_fingerprint() -> str:
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.path.encode())
+    digest.update(request.get_data() or b'')
+    return digest.hexdigest()
+
+
+def _request_principal() -> str:
+    """Who the key belongs to: the signed-in user, else the body's user_id/email, else the client address"""
+    auth = request.headers.get('Authorization') or ''
+    if auth:
+        # The token's user (verified, cached), so a refreshed token keeps the same keys
+        identity = search_analytics_service.identity_resolver.resolve(auth.replace('Bearer ', '').strip())
+        if identity.get('user_id'):
+            return 'user-' + hashlib.sha256(str(identity['user_id']).encode()).hexdigest()[:32]
+        return 'auth-' + hashlib.sha256(auth.encode()).hexdigest()[:32]
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        for field in ('user_id', 'email'):
+            value = body.get(field)
+            if value:
+                return f"{field}-" + hashlib.sha256(str(value).strip().lower().encode()).hexdigest()[:32]
+    forwarded = (request.headers.get('X-Forwarded-For') or '').split(',')[0].strip()
+    return 'addr-' + (forwarded or request.remote_addr or 'unknown')
+
+
+def _replay(row: Dict):
+    response = make_response(row['body'] or b'', row['status_code'])
+    response.mimetype = row['mimetype'] or 'application/json'
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(scope: str):
+    """
+    Decorator for POST endpoints that must not run twice for the same
+    Idempotency-Key. Requests without the header run as before.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            client_key = (request.headers.get(IDEMPOTENCY_HEADER) or '').strip()
+            if not client_key:
+                return f(*args, **kwargs)
+            if len(client_key) > MAX_KEY_LENGTH:
+                return jsonify({'success': False, 'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+            store = idempotency_store
+            key = f"{scope}:{_request_principal()}:{client_key}"
+            fingerprint = _request_fingerprint()
+
+            deadline = time.monotonic() + Config.IDEMPOTENCY_WAIT_SECONDS
+            while True:
+                claim = store.claim(key, fingerprint)
+                if claim['state'] == 'claimed':
+                    break
+                if claim['state'] == 'done':
+                    print(f"🔁 Replaying stored response for {scope} ({client_key})")
+                    return _replay(claim['row'])
+                if claim['state'] == 'mismatch':
+                    return jsonify({
+                        'success': False,
+                        'error': f'{IDEMPOTENCY_HEADER} was already used for a different request',
+                        'error_code': 'IDEMPOTENCY_KEY_REUSED'
+                    }), 422
+                # Duplicate of a request that is still running - wait for its result
+                if time.monotonic() >= deadline:
+                    response = jsonify({
+                        'success': False,
+                        'error': 'A request with this Idempotency-Key is still being processed',
+                        'error_code': 'IDEMPOTENCY_IN_PROGRESS'
+                    })
+                    response.status_code = 409
+                    response.headers['Retry-After'] = '2'
+                    return response
+                time.sleep(WAIT_POLL_SECONDS)
+
+            try:
+                response = make_response(f(*args, **kwargs))
+            except Exception:
+                store.release(key)
+                raise
+
+            if not 200 <= response.status_code < 300 or response.is_streamed:
+                # Nothing to protect - let the client retry (or fix the request) with the same key
+                store.release(key)
+            else:
+                store.complete(key, response.status_code, response.mimetype, response.get_data())
+            return response
+        return decorated_function
+    return decorator
+
+
+# Singleton instance
+idempotency_store = IdempotencyStore(
+    db_path=Config.IDEMPOTENCY_DB_PATH or DEFAULT_DB_PATH,
+    ttl_seconds=Config.IDEMPOTENCY_TTL_SECONDS
+)
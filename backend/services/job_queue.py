@@ -0,0 +1,362 @@
+"""
+C2C Journeys - Durable Job Queue
+SQLite-backed background jobs for work that must survive a restart.
+
+Jobs are rows in a local SQLite file shared by every gunicorn worker on the
+host. Worker threads claim due jobs with a lease (so a crashed worker's job is
+picked up again once the lease expires), retry failures with exponential
+backoff and move jobs that keep failing to a dead-letter table.
+
+Usage:
+    @job_queue.handler('send_email', max_attempts=5)
+    def send_email(payload, job):
+        ...
+
+    job_queue.enqueue('send_email', {'booking_id': ...}, key='send_email:<booking_id>')
+
+Handlers raise RetryLater(delay) to be run again without counting a failure
+(e.g. "ETG is still processing, check again in 6 seconds").
+"""
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+
+DONE_RETENTION_SECONDS = 7 * 86400  # completed jobs are kept a week for idempotency/debugging
+PURGE_INTERVAL_SECONDS = 3600
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'job_queue.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    job_type TEXT NOT NULL,
+    job_key TEXT UNIQUE,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    runs INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    locked_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs(status, run_at);
+
+CREATE TABLE IF NOT EXISTS dead_jobs (
+    id TEXT PRIMARY KEY,
+    job_type TEXT NOT NULL,
+    job_key TEXT,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    failed_at REAL NOT NULL
+);
+"""
+
+
+class RetryLater(Exception):
+    """Raised by a handler to run the job again after `delay` seconds (not a failure)"""
+
+    def __init__(self, delay: float, reason: str = ''):
+        super().__init__(reason or f'retry in {delay}s')
+        self.delay = delay
+
+
+class Job:
+    """A claimed job as seen by its handler"""
+
+    def __init__(self, row: sqlite3.Row):
+        self.id = row['id']
+        self.job_type = row['job_type']
+        self.key = row['job_key']
+        self.payload = json.loads(row['payload'])
+        self.attempts = row['attempts']
+        self.runs = row['runs']
+        self.max_attempts = row['max_attempts']
+
+
+class JobQueue:
+    """SQLite job table + a pool of worker threads per process"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, workers: int = 2, poll_interval: float = 1.0,
+                 lease_seconds: int = 300, backoff_base: float = 5.0, backoff_max: float = 600.0):
+        self.db_path = db_path
+        self.worker_count = max(1, workers)
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._handlers: Dict[str, Dict] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._schema_ready = False
+        self._last_purge = 0.0
+
+    # ------------------------------------------------------------------
+    # Registration / enqueue
+    # ------------------------------------------------------------------
+
+    def handler(self, job_type: str, max_attempts: int = 5):
+        """Decorator registering fn(payload, job) as the handler for job_type"""
+        def decorator(fn: Callable):
+            self._handlers[job_type] = {'fn': fn, 'max_attempts': max_attempts}
+            return fn
+        return decorator
+
+    def enqueue(self, job_type: str, payload: Dict, key: Optional[str] = None, delay: float = 0) -> Dict:
+        """
+        Persist a job. With a key, enqueueing the same key again is a no-op
+        (idempotent) and returns the existing job instead.
+        """
+        if job_type not in self._handlers:
+            raise ValueError(f"No handler registered for job type '{job_type}'")
+
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._transaction() as conn:
+            if key is not None:
+                existing = conn.execute("SELECT id, status FROM jobs WHERE job_key = ?", (key,)).fetchone()
+                if existing is None:
+                    # A dead-lettered key stays taken until requeue_dead() is used
+                    existing = conn.execute("SELECT id, 'dead' AS status FROM dead_jobs WHERE job_key = ?", (key,)).fetchone()
+                if existing is not None:
+                    return {'id': existing['id'], 'status': existing['status'], 'created': False}
+            conn.execute(
+                "INSERT INTO jobs (id, job_type, job_key, payload, max_attempts, run_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, job_type, key, json.dumps(payload, default=str),
+                 self._handlers[job_type]['max_attempts'], now + delay, now, now)
+            )
+
+        self._ensure_started()
+        self._wakeup.set()
+        return {'id': job_id, 'status': 'queued', 'created': True}
+
+    # ------------------------------------------------------------------
+    # Inspection
+    # ------------------------------------------------------------------
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_dict(row) if row else None
+
+    def get_job_by_key(self, key: str) -> Optional[Dict]:
+        """The job holding a key, whether queued, running, done or dead-lettered"""
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM jobs WHERE job_key = ?", (key,)).fetchone()
+        if row is None:
+            row = conn.execute("SELECT *, 'dead' AS status FROM dead_jobs WHERE job_key = ?", (key,)).fetchone()
+        return self._row_dict(row) if row else None
+
+    def list_dead(self, limit: int = 50) -> list:
+        rows = self._conn().execute(
+            "SELECT * FROM dead_jobs ORDER BY failed_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [self._row_dict(r) for r in rows]
+
+    def requeue_dead(self, job_id: str) -> bool:
+        """Move a dead-lettered job back into the queue (manual retry from admin)"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT * FROM dead_jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row['job_type'] not in self._handlers:
+                return False
+            conn.execute("DELETE FROM dead_jobs WHERE id = ?", (job_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, job_type, job_key, payload, max_attempts, run_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (row['id'], row['job_type'], row['job_key'], row['payload'],
+                 self._handlers[row['job_type']]['max_attempts'], now, row['created_at'], now)
+            )
+        self._ensure_started()
+        self._wakeup.set()
+        return True
+
+    def get_stats(self) -> Dict:
+        conn = self._conn()
+        by_status = {r['status']: r['n'] for r in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+        dead = conn.execute("SELECT COUNT(*) AS n FROM dead_jobs").fetchone()['n']
+        return {'by_status': by_status, 'dead': dead, 'workers': self.worker_count, 'db_path': self.db_path}
+
+    def purge_done(self, older_than: float = DONE_RETENTION_SECONDS) -> int:
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "DELETE FROM jobs WHERE status = 'done' AND updated_at < ?", (time.time() - older_than,)
+            )
+        return cur.rowcount
+
+    @staticmethod
+    def _row_dict(row: sqlite3.Row) -> Dict:
+        data = dict(row)
+        try:
+            data['payload'] = json.loads(data['payload'])
+        except (TypeError, ValueError):
+            pass
+        return data
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._schema_ready = True
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE takes the write lock up front, serializing writers across processes"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Atomically lease the next due job"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE run_at <= ? AND "
+                "(status = 'queued' OR (status = 'running' AND locked_until < ?)) "
+                "ORDER BY run_at LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', locked_until = ?, runs = runs + 1, updated_at = ? WHERE id = ?",
+                    (now + self.lease_seconds, now, row['id'])
+                )
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone()
+        return row
+
+    def _complete(self, job: Job):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', locked_until = NULL, last_error = NULL, updated_at = ? WHERE id = ?",
+                (time.time(), job.id)
+            )
+
+    def _reschedule(self, job: Job, delay: float, error: Optional[str] = None, count_attempt: bool = False):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', locked_until = NULL, run_at = ?, last_error = ?, "
+                "attempts = attempts + ?, updated_at = ? WHERE id = ?",
+                (time.time() + delay, error, 1 if count_attempt else 0, time.time(), job.id)
+            )
+
+    def _dead_letter(self, job: Job, error: str):
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job.id,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO dead_jobs (id, job_type, job_key, payload, attempts, last_error, created_at, failed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.job_type, job.key, row['payload'], job.attempts + 1, error, row['created_at'], now)
+            )
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job.id,))
+
+    def backoff_delay(self, attempts: int) -> float:
+        """Exponential backoff with jitter: base * 2^(attempts-1), capped"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** max(0, attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def _ensure_started(self):
+        # gunicorn --preload forks after import; threads must be started per process
+        if self._pid == os.getpid() and any(t.is_alive() for t in self._threads):
+            return
+        with self._lock:
+            if self._pid == os.getpid() and any(t.is_alive() for t in self._threads):
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            for i in range(self.worker_count):
+                thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def start(self):
+        """Start workers now (picks up jobs left over from a previous run)"""
+        self._ensure_started()
+
+    def _run(self):
+        while True:
+            try:
+                row = self._claim()
+            except sqlite3.OperationalError as e:
+                print(f"⚠️ Job queue: claim failed ({e}), retrying")
+                row = None
+            if row is None:
+                if time.time() - self._last_purge > PURGE_INTERVAL_SECONDS:
+                    self._last_purge = time.time()
+                    try:
+                        self.purge_done()
+                    except sqlite3.OperationalError:
+                        pass
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._execute(Job(row))
+
+    def _execute(self, job: Job):
+        handler = self._handlers.get(job.job_type)
+        if handler is None:
+            self._dead_letter(job, f"No handler registered for '{job.job_type}'")
+            return
+        try:
+            handler['fn'](job.payload, job)
+            self._complete(job)
+        except RetryLater as retry:
+            self._reschedule(job, retry.delay, error=str(retry))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            attempts = job.attempts + 1
+            if attempts >= job.max_attempts:
+                print(f"❌ Job {job.job_type} ({job.key or job.id}) dead-lettered after {attempts} attempts: {error}")
+                traceback.print_exc()
+                self._dead_letter(job, error)
+            else:
+                delay = self.backoff_delay(attempts)
+                print(f"⚠️ Job {job.job_type} ({job.key or job.id}) failed (attempt {attempts}/{job.max_attempts}), retrying in {delay:.0f}s: {error}")
+                self._reschedule(job, delay, error=error, count_attempt=True)
+
+
+# Singleton instance
+job_queue = JobQueue(db_path=Config.JOB_QUEUE_DB_PATH or DEFAULT_DB_PATH, workers=Config.JOB_QUEUE_WORKERS)
@@ -0,0 +1,364 @@
+"""
+C2C Journeys - Newsletter Campaigns
+Bulk sends to active newsletter_subscribers.
+
+A campaign is compiled once (subject, HTML and text are Jinja templates;
+per-recipient variables: {{ email }}, {{ subscribed_at }}) and run as a
+job on the durable job queue. Each run works for CAMPAIGN_SLICE_SECONDS:
+it pages subscribers by email (keyset, so the list is never loaded whole),
+sends each page through EmailService.deliver() on a bounded thread pool
+(pooled connections + per-provider rate limits) one pool-sized batch at a
+time, recording every recipient in SQLite as it is sent and checkpointing
+the cursor after each batch. The slice deadline is checked between batches,
+so a run always ends well inside the job lease. After a crash
+or restart the job resumes at the last checkpoint and skips anyone already
+sent to, so nobody gets the newsletter twice.
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from jinja2 import Environment, TemplateSyntaxError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from services.document_templates import get_environment
+from services.job_queue import job_queue, RetryLater
+from services.supabase_service import supabase_service
+
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'newsletter.sqlite3')
+CAMPAIGN_SLICE_SECONDS = 120   # stays well inside the job queue's 300s lease
+PROVIDERS_DOWN_RETRY_SECONDS = 120
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS newsletter_campaigns (
+    id TEXT PRIMARY KEY,
+    subject TEXT NOT NULL,
+    html_body TEXT NOT NULL,
+    text_body TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    cursor TEXT NOT NULL DEFAULT '',
+    total INTEGER,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    active_seconds REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_by TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS newsletter_deliveries (
+    campaign_id TEXT NOT NULL,
+    email TEXT NOT NULL,
+    status TEXT NOT NULL,
+    provider TEXT,
+    error TEXT,
+    sent_at REAL NOT NULL,
+    PRIMARY KEY (campaign_id, email)
+);
+"""
+
+# Plain-text parts must not be HTML-escaped
+_text_env = Environment(autoescape=False)
+
+
+class CompiledCampaign:
+    """Subject/HTML/text templates parsed once per campaign run"""
+
+    def __init__(self, subject: str, html_body: str, text_body: Optional[str]):
+        self.subject = _text_env.from_string(subject)
+        self.html = get_environment().from_string(html_body)
+        self.text = _text_env.from_string(text_body) if text_body else None
+
+    def render(self, recipient: Dict) -> Dict:
+        context = {'email': recipient['email'], 'subscribed_at': recipient.get('subscribed_at')}
+        html_body = self.html.render(**context)
+        return {
+            'subject': self.subject.render(**context),
+            'html_body': html_body,
+            'body': self.text.render(**context) if self.text else 'View this email in an HTML-capable client.'
+        }
+
+
+class NewsletterService:
+    """Campaign records + checkpointed bulk sender"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, page_size: int = 200, concurrency: int = 4):
+        self.db_path = db_path
+        self.page_size = max(1, page_size)
+        self.concurrency = max(1, concurrency)
+        self._local = threading.local()
+        self._schema_ready = False
+
+    # ------------------------------------------------------------------
+    # Campaigns
+    # ------------------------------------------------------------------
+
+    def create_campaign(self, subject: str, html_body: str, text_body: Optional[str] = None,
+                        created_by: Optional[str] = None) -> Dict:
+        """Validate the templates, store the campaign and queue it for sending"""
+        if not subject or not html_body:
+            raise ValueError('subject and html_body are required')
+        try:
+            CompiledCampaign(subject, html_body, text_body)
+        except TemplateSyntaxError as e:
+            raise ValueError(f'Template error on line {e.lineno}: {e.message}')
+
+        now = time.time()
+        campaign_id = uuid.uuid4().hex
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO newsletter_campaigns (id, subject, html_body, text_body, created_by, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (campaign_id, subject, html_body, text_body, created_by, now, now)
+            )
+        job_queue.enqueue('newsletter_campaign', {'campaign_id': campaign_id}, key=f"newsletter_campaign:{campaign_id}")
+        print(f"📰 Newsletter campaign {campaign_id} queued: {subject}")
+        return self.get_campaign(campaign_id)
+
+    def get_campaign(self, campaign_id: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT * FROM newsletter_campaigns WHERE id = ?", (campaign_id,)).fetchone()
+        return self._with_throughput(row) if row else None
+
+    def list_campaigns(self, limit: int = 50) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT * FROM newsletter_campaigns ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [self._with_throughput(r) for r in rows]
+
+    def list_failures(self, campaign_id: str, limit: int = 100) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT email, error, sent_at FROM newsletter_deliveries WHERE campaign_id = ? AND status = 'failed' "
+            "ORDER BY sent_at DESC LIMIT ?",
+            (campaign_id, limit)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def cancel_campaign(self, campaign_id: str) -> bool:
+        """Stop a campaign at its next page boundary"""
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE newsletter_campaigns SET status = 'cancelled', updated_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'sending')",
+                (time.time(), campaign_id)
+            )
+        return bool(cur.rowcount)
+
+    @staticmethod
+    def _with_throughput(row: sqlite3.Row) -> Dict:
+        data = {k: row[k] for k in row.keys() if k not in ('html_body', 'text_body')}
+        processed = data['sent'] + data['failed']
+        rate = processed / data['active_seconds'] if data['active_seconds'] else 0
+        remaining = max(0, (data['total'] or 0) - processed)
+        data['throughput_per_second'] = round(rate, 2)
+        data['remaining'] = remaining
+        data['eta_seconds'] = round(remaining / rate) if rate and data['status'] == 'sending' else None
+        return data
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._schema_ready = True
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ------------------------------------------------------------------
+    # Sending
+    # ------------------------------------------------------------------
+
+    def _subscriber_query(self):
+        client = supabase_service.client
+        if client is None:
+            raise RuntimeError('Supabase client not initialized')
+        return client.table('newsletter_subscribers')
+
+    def _count_subscribers(self) -> int:
+        response = self._subscriber_query().select('id', count='exact').eq('is_active', True).limit(1).execute()
+        return response.count or 0
+
+    def _fetch_page(self, after_email: str) -> List[Dict]:
+        """Next page of active subscribers, keyed on the unique email column"""
+        response = self._subscriber_query().select('email, subscribed_at') \
+            .eq('is_active', True).gt('email', after_email) \
+            .order('email').limit(self.page_size).execute()
+        return response.data or []
+
+    def _already_sent(self, campaign_id: str, emails: List[str]) -> set:
+        if not emails:
+            return set()
+        placeholders = ','.join('?' * len(emails))
+        rows = self._conn().execute(
+            f"SELECT email FROM newsletter_deliveries WHERE campaign_id = ? AND status = 'sent' AND email IN ({placeholders})",
+            (campaign_id, *emails)
+        ).fetchall()
+        return {r['email'] for r in rows}
+
+    def _send_one(self, campaign_id: str, compiled: CompiledCampaign, recipient: Dict) -> Dict:
+        from services.email_service import email_service
+
+        try:
+            message = compiled.render(recipient)
+            result = email_service.deliver(recipient['email'], message['subject'], message['body'], message['html_body'])
+        except Exception as e:
+            result = {'success': False, 'provider': None, 'errors': [f"{type(e).__name__}: {e}"]}
+        result = {'email': recipient['email'], **result}
+        self._record(campaign_id, result)
+        return result
+
+    def _record(self, campaign_id: str, result: Dict):
+        """Checkpoint one recipient as soon as it's sent, so a crash never repeats it"""
+        error = None if result['success'] else '; '.join(result.get('errors') or []) or 'delivery failed'
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO newsletter_deliveries (campaign_id, email, status, provider, error, sent_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (campaign_id, result['email'], 'sent' if result['success'] else 'failed',
+                 result.get('provider'), error, time.time())
+            )
+            if result['success']:
+                conn.execute("UPDATE newsletter_campaigns SET sent = sent + 1 WHERE id = ?", (campaign_id,))
+            else:
+                conn.execute(
+                    "UPDATE newsletter_campaigns SET failed = failed + 1, last_error = ? WHERE id = ?",
+                    (error, campaign_id)
+                )
+
+    def run_slice(self, campaign_id: str):
+        """Send pages until the campaign finishes or the time slice runs out"""
+        from services.email_service import email_service
+
+        row = self._conn().execute("SELECT * FROM newsletter_campaigns WHERE id = ?", (campaign_id,)).fetchone()
+        if row is None or row['status'] not in ('queued', 'sending'):
+            return
+        if not email_service.configured_providers():
+            with self._transaction() as conn:
+                conn.execute(
+                    "UPDATE newsletter_campaigns SET status = 'failed', last_error = ?, updated_at = ? WHERE id = ?",
+                    ('No email provider configured', time.time(), campaign_id)
+                )
+            return
+
+        if row['status'] == 'queued':
+            with self._transaction() as conn:
+                conn.execute(
+                    "UPDATE newsletter_campaigns SET status = 'sending', total = ?, started_at = ?, updated_at = ? WHERE id = ?",
+                    (self._count_subscribers(), time.time(), time.time(), campaign_id)
+                )
+
+        compiled = CompiledCampaign(row['subject'], row['html_body'], row['text_body'])
+        cursor = row['cursor']
+        deadline = time.monotonic() + CAMPAIGN_SLICE_SECONDS
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='newsletter') as pool:
+            while time.monotonic() < deadline:
+                status = self._conn().execute(
+                    "SELECT status FROM newsletter_campaigns WHERE id = ?", (campaign_id,)
+                ).fetchone()['status']
+                if status != 'sending':
+                    print(f"🛑 Newsletter campaign {campaign_id} {status}")
+                    return
+
+                page_started = time.monotonic()
+                page = self._fetch_page(cursor)
+                if not page:
+                    with self._transaction() as conn:
+                        conn.execute(
+                            "UPDATE newsletter_campaigns SET status = 'completed', finished_at = ?, updated_at = ? WHERE id = ?",
+                            (time.time(), time.time(), campaign_id)
+                        )
+                    print(f"✅ Newsletter campaign {campaign_id} completed")
+                    return
+
+                done = self._already_sent(campaign_id, [r['email'] for r in page])
+                sent = failed = handled = 0
+                checkpoint_at = page_started
+                # One pool-sized batch at a time, so a slow page can't run the
+                # slice past its deadline (and the job past its lease)
+                for start in range(0, len(page), self.concurrency):
+                    batch = page[start:start + self.concurrency]
+                    pending = [r for r in batch if r['email'] not in done]
+                    results = list(pool.map(lambda r: self._send_one(campaign_id, compiled, r), pending))
+                    batch_sent = [r for r in results if r['success']]
+                    batch_failed = [r for r in results if not r['success']]
+
+                    if pending and not batch_sent and not any(p['healthy'] for p in email_service.get_provider_stats().values() if p['configured']):
+                        # Every provider is down - retry this batch later rather than burn through the list.
+                        # Drop the failures so the batch is attempted again instead of skipped.
+                        with self._transaction() as conn:
+                            conn.executemany(
+                                "DELETE FROM newsletter_deliveries WHERE campaign_id = ? AND email = ? AND status = 'failed'",
+                                [(campaign_id, r['email']) for r in batch_failed]
+                            )
+                            conn.execute(
+                                "UPDATE newsletter_campaigns SET failed = failed - ? WHERE id = ?", (len(batch_failed), campaign_id)
+                            )
+                        raise RetryLater(PROVIDERS_DOWN_RETRY_SECONDS, 'all email providers unhealthy')
+
+                    # Batch checkpoint: advance the cursor past everything handled above
+                    cursor = batch[-1]['email']
+                    now = time.monotonic()
+                    with self._transaction() as conn:
+                        conn.execute(
+                            "UPDATE newsletter_campaigns SET cursor = ?, skipped = skipped + ?, "
+                            "active_seconds = active_seconds + ?, updated_at = ? WHERE id = ?",
+                            (cursor, len(batch) - len(pending), now - checkpoint_at, time.time(), campaign_id)
+                        )
+                    checkpoint_at = now
+                    sent, failed, handled = sent + len(batch_sent), failed + len(batch_failed), handled + len(batch)
+                    if now >= deadline:
+                        break
+
+                elapsed = time.monotonic() - page_started
+                print(f"📰 Campaign {campaign_id}: {handled} of a page of {len(page)} → {sent} sent, {failed} failed, "
+                      f"{handled - sent - failed} skipped ({(sent + failed) / elapsed if elapsed else 0:.1f} msg/s)")
+
+        # Slice used up - hand the worker back and continue from the checkpoint
+        raise RetryLater(0, 'next slice')
+
+
+# Singleton instance
+newsletter_service = NewsletterService(
+    db_path=Config.NEWSLETTER_DB_PATH or DEFAULT_DB_PATH,
+    page_size=Config.NEWSLETTER_PAGE_SIZE,
+    concurrency=Config.NEWSLETTER_CONCURRENCY
+)
+
+
+@job_queue.handler('newsletter_campaign', max_attempts=5)
+def newsletter_campaign_job(payload: Dict, job):
+    newsletter_service.run_slice(payload['campaign_id'])
@@ -0,0 +1,272 @@
+"""
+C2C Journeys - Admin Notification Feed
+Recent bookings, contact enquiries and hotel enquiries for the admin bell.
+
+One in-process feed is shared by every open admin tab. It is refreshed at
+most every FEED_CACHE_SECONDS, and a refresh only asks each source table
+for rows changed since the newest one it has already seen (hotel bookings
+by updated_at, so status changes come through too), so a burst of polls
+costs at most three small indexed queries per worker.
+
+Clients keep the next_cursor of their last response and send it back as
+?since=... to get only the events that are new or changed after it. The
+cursor is the (changed_at, id) of the newest event, taken from the database
+rows, so it works on whichever worker the next poll lands on.
+"""
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.pagination import decode_cursor, encode_cursor
+
+
+FEED_WINDOW_DAYS = 7
+FEED_CACHE_SECONDS = 10
+# Re-read this much before each watermark so rows committed a little late aren't missed
+WATERMARK_OVERLAP_SECONDS = 30
+INCREMENTAL_LIMIT = 100
+
+EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def _parse_ts(value) -> datetime:
+    try:
+        ts = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        return EPOCH
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def booking_notification(b: Dict) -> Dict:
+    status = b.get('status') or 'unknown'
+    icon = 'fa-check-circle'
+    ntype = 'success'
+    if status == 'failed':
+        icon = 'fa-times-circle'
+        ntype = 'error'
+    elif status == 'created':
+        icon = 'fa-clock'
+        ntype = 'warning'
+    elif status == 'unknown':
+        icon = 'fa-question-circle'
+        ntype = 'warning'
+
+    amount = f"{b.get('currency') or 'USD'} {float(b.get('total_amount') or 0):,.0f}"
+    return {
+        'id': f"booking_{str(b['id'])[:8]}",
+        'type': ntype,
+        'icon': icon,
+        'category': 'booking',
+        'title': f"Hotel Booking {status.capitalize()}",
+        'message': f"{b.get('hotel_name') or 'Hotel'} — {amount}",
+        'link': f"booking-details.html?id={b['id']}",
+        'time': b['created_at'],
+        'read': False
+    }
+
+
+def contact_notification(c: Dict) -> Dict:
+    message = c.get('message') or ''
+    return {
+        'id': f"contact_{c['id']}",
+        'type': 'info',
+        'icon': 'fa-envelope',
+        'category': 'enquiry',
+        'title': 'New Contact Enquiry',
+        'message': f"From {c.get('name') or 'Unknown'} — {(message[:60] + '...') if len(message) > 60 else message}",
+        'link': 'contact-enquiry.html',
+        'time': c['created_at'],
+        'read': False
+    }
+
+
+def enquiry_notification(q: Dict) -> Dict:
+    return {
+        'id': f"enquiry_{q['id']}",
+        'type': 'info',
+        'icon': 'fa-bed',
+        'category': 'enquiry',
+        'title': 'New Hotel Enquiry',
+        'message': f"From {q.get('name') or 'Unknown'} for {q.get('destination') or 'N/A'}",
+        'link': 'hotel-enquiry.html',
+        'time': q['created_at'],
+        'read': False
+    }
+
+
+# source -> table, projection, the column that moves when a row changes,
+# extra filters, how many of the newest to keep, and the event builder
+SOURCES = {
+    'bookings': {
+        'table': 'hotel_bookings',
+        'columns': 'id, partner_order_id, hotel_name, status, total_amount, currency, customer_email, created_at, updated_at',
+        'changed': 'updated_at',
+        'filters': None,
+        'keep': 10,
+        'build': booking_notification,
+    },
+    'contacts': {
+        'table': 'contact_messages',
+        'columns': 'id, name, email, message, created_at',
+        'changed': 'created_at',
+        'filters': None,
+        'keep': 5,
+        'build': contact_notification,
+    },
+    'enquiries': {
+        'table': 'quote_requests',
+        'columns': 'id, name, destination, travel_date, created_at',
+        'changed': 'created_at',
+        'filters': lambda query: query.eq('travel_type', 'hotel'),
+        'keep': 5,
+        'build': enquiry_notification,
+    },
+}
+
+
+class NotificationFeed:
+    """Cached, incrementally refreshed notification events"""
+
+    def __init__(self, cache_seconds: float = FEED_CACHE_SECONDS):
+        self.cache_seconds = cache_seconds
+        self._events = {name: {} for name in SOURCES}    # source -> {notification id: event}
+        self._watermarks = {}                            # source -> newest changed_at seen
+        self._changed_column = {name: spec['changed'] for name, spec in SOURCES.items()}
+        self._refreshed_at = 0.0
+        self._refreshing = False
+        self._cond = threading.Condition()
+        self._stats = {'refreshes': 0, 'cache_hits': 0, 'rows_read': 0}
+
+    def refresh(self, supabase, force: bool = False) -> bool:
+        """
+        Bring the feed up to date unless it was refreshed within cache_seconds.
+        Concurrent callers wait for the refresh already in flight instead of
+        starting their own. Returns True if any event was added or changed.
+        """
+        with self._cond:
+            if not force and time.monotonic() - self._refreshed_at < self.cache_seconds:
+                self._stats['cache_hits'] += 1
+                return False
+            if self._refreshing:
+                self._cond.wait(timeout=self.cache_seconds)
+                self._stats['cache_hits'] += 1
+                return False
+            self._refreshing = True
+
+        changed = False
+        try:
+            window_start = datetime.now(timezone.utc) - timedelta(days=FEED_WINDOW_DAYS)
+            for name in SOURCES:
+                changed = self._refresh_source(supabase, name, window_start) or changed
+        finally:
+            with self._cond:
+                self._refreshing = False
+                self._refreshed_at = time.monotonic()
+                self._stats['refreshes'] += 1
+                self._cond.notify_all()
+        return changed
+
+    def _refresh_source(self, supabase, name: str, window_start: datetime) -> bool:
+        spec = SOURCES[name]
+        column = self._changed_column[name]
+        watermark = self._watermarks.get(name)
+        try:
+            try:
+                rows = self._query(supabase, spec, column, window_start, watermark)
+            except Exception as e:
+                if column == 'created_at' or 'column' not in str(e).lower():
+                    raise
+                # Older database without updated_at - only new bookings are picked up
+                print(f"⚠️ Notifications: {spec['table']}.{column} unavailable, using created_at: {e}")
+                column = self._changed_column[name] = 'created_at'
+                rows = self._query(supabase, spec, column, window_start, watermark)
+        except Exception as e:
+            print(f"Notification: {name} fetch error: {e}")
+            return False
+
+        self._stats['rows_read'] += len(rows)
+        changed = False
+        with self._cond:
+            events = self._events[name]
+            for row in rows:
+                event = spec['build'](row)
+                event['changed_at'] = row.get(column) or row['created_at']
+                if events.get(event['id']) != event:
+                    events[event['id']] = event
+                    changed = True
+                ts = _parse_ts(event['changed_at'])
+                if watermark is None or ts > watermark:
+                    watermark = ts
+            if watermark is not None:
+                self._watermarks[name] = watermark
+
+            # Keep only the newest few per source, inside the window
+            keep = sorted(
+                (e for e in events.values() if _parse_ts(e['time']) >= window_start),
+                key=lambda e: (_parse_ts(e['time']), e['id']), reverse=True
+            )[:spec['keep']]
+            self._events[name] = {e['id']: e for e in keep}
+        return changed
+
+    def _query(self, supabase, spec: Dict, column: str, window_start: datetime,
+               watermark: Optional[datetime]) -> List[Dict]:
+        query = supabase.table(spec['table']).select(spec['columns']).gte('created_at', window_start.isoformat())
+        if spec['filters']:
+            query = spec['filters'](query)
+        if watermark is None:
+            # First load: the newest rows, as the bell has always shown them
+            return query.order('created_at', desc=True).limit(spec['keep']).execute().data or []
+        since = watermark - timedelta(seconds=WATERMARK_OVERLAP_SECONDS)
+        return query.gte(column, since.isoformat()).order(column, desc=True) \
+            .limit(INCREMENTAL_LIMIT).execute().data or []
+
+    @staticmethod
+    def _key(event: Dict) -> Tuple[datetime, str]:
+        return _parse_ts(event['changed_at']), event['id']
+
+    def get_feed(self, supabase, since: Optional[str] = None, limit: int = 20) -> Dict:
+        """
+        The newest `limit` notifications, or with `since` (a previous
+        next_cursor) only those added or changed after it.
+        Raises ValueError for a malformed cursor.
+        """
+        after = decode_cursor(since)
+        after_key = (_parse_ts(after[0]), after[1]) if after else None
+
+        self.refresh(supabase)
+        with self._cond:
+            events = [e for source in self._events.values() for e in source.values()]
+
+        newest = max(events, key=self._key, default=None)
+        if after_key:
+            events = [e for e in events if self._key(e) > after_key]
+            if newest is None or self._key(newest) <= after_key:
+                newest = None
+        events.sort(key=lambda e: e.get('time', ''), reverse=True)
+        events = [{k: v for k, v in e.items() if k != 'changed_at'} for e in events[:limit]]
+
+        if newest:
+            cursor = encode_cursor(newest['changed_at'], newest['id'])
+        else:
+            cursor = since
+        return {'data': events, 'next_cursor': cursor}
+
+    def wait_for_change(self, timeout: float):
+        """Block until a refresh (by any thread) finishes, or timeout"""
+        with self._cond:
+            self._cond.wait(timeout=timeout)
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            return {
+                **self._stats,
+                'events': sum(len(source) for source in self._events.values()),
+                'age_seconds': round(time.monotonic() - self._refreshed_at, 1) if self._refreshed_at else None,
+            }
+
+
+notification_feed = NotificationFeed()
@@ -0,0 +1,127 @@
+"""
+C2C Journeys - Keyset Pagination
+Shared paging for the admin list endpoints.
+
+Pages are read newest first in (created_at, id) order. Passing a page's
+next_cursor back continues right after its last row with an indexed range
+condition, so a deep page costs the same as the first one - unlike OFFSET,
+where the database walks and discards every earlier row. A plain offset is
+still accepted for jumping straight to a page number.
+
+Listings select only the columns they show. If a projected column doesn't
+exist on an older database the query is retried with * (and that projection
+isn't tried again in this process).
+
+Totals are optional (?count=exact|planned|estimated|none) and only computed
+for the first page; planned/estimated come from the planner's statistics and
+don't scan the table.
+"""
+import base64
+import json
+from typing import Callable, Dict, Optional, Tuple
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 1000
+COUNT_MODES = ('exact', 'planned', 'estimated')
+
+# (table, columns) projections that failed - those tables are read with *
+_failed_projections = set()
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps([None if v is None else str(v) for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str], size: int = 2) -> Optional[Tuple]:
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return tuple(values)
+
+
+def filter_value(value: str) -> str:
+    """Strip characters that would break a PostgREST or=(...) / ilike expression"""
+    return ''.join(c for c in (value or '') if c not in ',()"\\*%').strip()
+
+
+def after_keyset(query, after: Tuple, column: str = 'created_at'):
+    """Rows strictly after (value, id) in descending (column, id) order"""
+    value, row_id = after
+    return query.or_(f'{column}.lt."{value}",and({column}.eq."{value}",id.lt.{row_id})')
+
+
+def page_params(args, default_limit: int = DEFAULT_LIMIT, default_count: Optional[str] = None) -> Dict:
+    """limit / cursor / offset / count from request args (page=N is accepted as an offset)"""
+    limit = max(1, min(args.get('limit', default_limit, type=int) or default_limit, MAX_LIMIT))
+    offset = args.get('offset', 0, type=int) or 0
+    page = args.get('page', type=int)
+    if page and not offset:
+        offset = (page - 1) * limit
+    count = args.get('count', default_count)
+    return {
+        'limit': limit,
+        'cursor': args.get('cursor') or None,
+        'offset': max(0, offset),
+        'count': count if count in COUNT_MODES else None
+    }
+
+
+def paginate(supabase, table: str, columns: str = '*', filters: Optional[Callable] = None,
+             limit: int = DEFAULT_LIMIT, cursor: Optional[str] = None, offset: int = 0,
+             count: Optional[str] = None, order_column: str = 'created_at') -> Dict:
+    """
+    One page of `table`, newest first.
+
+    filters: optional callable applied to the query builder (eq/ilike/...)
+    Returns data, limit, has_more, next_cursor and - when a count mode is
+    given and this is the first page - total.
+    """
+    after = decode_cursor(cursor)
+    count = count if count in COUNT_MODES and after is None else None
+
+    def run(cols):
+        query = supabase.table(table).select(cols, count=count)
+        if filters:
+            query = filters(query)
+        if after:
+            query = after_keyset(query, after, order_column)
+        query = query.order(order_column, desc=True).order('id', desc=True)
+        # One extra row tells us whether there is a next page
+        if after is None and offset:
+            query = query.range(offset, offset + limit)
+        else:
+            query = query.limit(limit + 1)
+        return query.execute()
+
+    if columns != '*' and (table, columns) not in _failed_projections:
+        try:
+            res = run(columns)
+        except Exception as e:
+            print(f"⚠️ {table} listing projection failed, using *: {e}")
+            if 'column' in str(e).lower():
+                _failed_projections.add((table, columns))
+            res = run('*')
+    else:
+        res = run('*')
+
+    rows = res.data or []
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last = rows[-1] if rows else None
+
+    result = {
+        'data': rows,
+        'limit': limit,
+        'has_more': has_more,
+        'next_cursor': encode_cursor(last.get(order_column), last.get('id')) if has_more and last else None
+    }
+    if count:
+        result['total'] = getattr(res, 'count', None) or 0
+    return result
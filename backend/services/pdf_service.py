@@ -1,29 +1,230 @@
 import os
+import sys
+import atexit
+import queue
+import threading
+import concurrent.futures
+import hashlib
+import re
 from playwright.sync_api import sync_playwright
-import tempfile
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from services.document_templates import render_template, get_logo_data_uri, inline_asset
+from jinja2 import TemplateNotFound
+
+
+class BrowserPool:
+    """
+    Long-lived headless Chromium for PDF rendering, one per worker process.
+
+    Playwright's sync API is bound to the thread that started it, so each
+    render thread owns its own browser and jobs reach it through a queue.
+    The number of render threads caps concurrent renders. Every job gets a
+    fresh browser context; the browser is relaunched when it disconnects,
+    after max_renders jobs (Chromium slowly leaks memory) or after sitting
+    idle for idle_seconds.
+    """
+
+    def __init__(self, workers=1, max_renders=200, render_timeout=60, idle_seconds=600):
+        self.worker_count = max(1, workers)
+        self.max_renders = max(1, max_renders)
+        self.render_timeout = render_timeout
+        self.idle_seconds = idle_seconds
+
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._stopping = threading.Event()
+        self.stats = {'renders': 0, 'launches': 0, 'failures': 0, 'timeouts': 0}
+        atexit.register(self.stop)
+
+    def submit(self, html_content):
+        """Queue a render and return its Future (use wait() to collect it)"""
+        self._ensure_started()
+        future = concurrent.futures.Future()
+        self._jobs.put((html_content, future))
+        return future
+
+    def wait(self, future):
+        try:
+            return future.result(timeout=self.render_timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            self.stats['timeouts'] += 1
+            raise
+
+    def render_pdf(self, html_content):
+        """Render HTML to A4 PDF bytes on a pooled browser"""
+        return self.wait(self.submit(html_content))
+
+    def _ensure_started(self):
+        # Threads (and browsers) don't survive gunicorn's --preload fork
+        if self._pid == os.getpid() and any(t.is_alive() for t in self._threads):
+            return
+        with self._lock:
+            if self._pid == os.getpid() and any(t.is_alive() for t in self._threads):
+                return
+            if self._pid != os.getpid():
+                self._jobs = queue.Queue()
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = []
+            for i in range(self.worker_count):
+                thread = threading.Thread(target=self._run, name=f"pdf-render-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _launch(self):
+        playwright = sync_playwright().start()
+        browser = playwright.chromium.launch(headless=True, args=['--disable-dev-shm-usage'])
+        self.stats['launches'] += 1
+        print(f"🖨️ Launched PDF browser ({threading.current_thread().name})")
+        return playwright, browser
+
+    @staticmethod
+    def _shutdown(playwright, browser):
+        try:
+            if browser is not None:
+                browser.close()
+        except Exception:
+            pass
+        try:
+            if playwright is not None:
+                playwright.stop()
+        except Exception:
+            pass
+
+    def _run(self):
+        playwright, browser, renders = None, None, 0
+        while not self._stopping.is_set():
+            try:
+                html_content, future = self._jobs.get(timeout=self.idle_seconds)
+            except queue.Empty:
+                # Idle - give the browser's memory back until the next render
+                self._shutdown(playwright, browser)
+                playwright, browser, renders = None, None, 0
+                continue
+            if html_content is None:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue  # caller already gave up waiting
+
+            try:
+                # Health check / recycling before every job
+                if browser is None or not browser.is_connected() or renders >= self.max_renders:
+                    self._shutdown(playwright, browser)
+                    playwright, browser = self._launch()
+                    renders = 0
+
+                context = browser.new_context()
+                try:
+                    page = context.new_page()
+                    page.set_content(html_content, wait_until='networkidle')
+                    pdf_bytes = page.pdf(format="A4", print_background=True)
+                finally:
+                    context.close()
+                renders += 1
+                self.stats['renders'] += 1
+                future.set_result(pdf_bytes)
+            except Exception as e:
+                # The browser may be wedged - drop it so the next job relaunches
+                self.stats['failures'] += 1
+                print(f"⚠️ PDF render failed, recycling browser: {e}")
+                self._shutdown(playwright, browser)
+                playwright, browser, renders = None, None, 0
+                future.set_exception(e)
+
+        self._shutdown(playwright, browser)
+
+    def stop(self):
+        self._stopping.set()
+        if self._pid == os.getpid():
+            for _ in self._threads:
+                self._jobs.put((None, None))
+
+    def get_stats(self):
+        return {**self.stats, 'queued': self._jobs.qsize(), 'workers': self.worker_count}
+
+
+# Singleton instance (threads and browsers start on first render)
+browser_pool = BrowserPool(
+    workers=Config.PDF_RENDER_WORKERS,
+    max_renders=Config.PDF_BROWSER_MAX_RENDERS,
+    render_timeout=Config.PDF_RENDER_TIMEOUT
+)
+
+
+class PDFCache:
+    """
+    Finished PDFs on disk, keyed by booking id + hash of the rendered HTML.
+    Resends and downloads of an unchanged document skip Chromium entirely;
+    any change to the booking data or template produces a new hash and the
+    stale file for that document is replaced.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def _dir(self, booking_id):
+        return os.path.join(self.cache_dir, re.sub(r'[^A-Za-z0-9_-]', '_', str(booking_id)))
+
+    def _path(self, booking_id, kind, html_content):
+        digest = hashlib.sha256(html_content.encode('utf-8')).hexdigest()[:24]
+        return os.path.join(self._dir(booking_id), f"{kind}-{digest}.pdf")
+
+    def get(self, booking_id, kind, html_content):
+        path = self._path(booking_id, kind, html_content)
+        try:
+            with open(path, 'rb') as f:
+                self.stats['hits'] += 1
+                return f.read()
+        except OSError:
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, booking_id, kind, html_content, pdf_bytes):
+        path = self._path(booking_id, kind, html_content)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(pdf_bytes)
+            os.replace(tmp_path, path)
+            for name in os.listdir(os.path.dirname(path)):
+                if name.startswith(f"{kind}-") and name.endswith('.pdf') and name != os.path.basename(path):
+                    os.remove(os.path.join(os.path.dirname(path), name))
+        except OSError as e:
+            print(f"⚠️ Could not cache {kind} PDF for {booking_id}: {e}")
+
+
+pdf_cache = PDFCache(Config.PDF_CACHE_DIR or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'pdf_cache'
+))
+
+
+# Template + fields that differ between documents rendered from the shared context
+DOCUMENTS = {
+    'invoice': {
+        'template': 'pdf/invoice.html',
+        'fields': {'payment_status': 'PAID', 'payment_method': 'Online Payment'}
+    },
+    'voucher': {
+        'template': 'pdf/ticket.html',
+        'fields': {'payment_status': 'CONFIRMED', 'payment_method': 'Online'}
+    }
+}
+
+
 class PDFService:
     def __init__(self, templates_dir):
         self.templates_dir = templates_dir
         
     def _generate_pdf_from_html(self, html_content):
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.set_content(html_content, wait_until='networkidle')
-            
-            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
-                temp_path = tmp.name
-                
-            page.pdf(path=temp_path, format="A4", print_background=True)
-            browser.close()
-            
-            with open(temp_path, 'rb') as f:
-                pdf_bytes = f.read()
-                
-            os.remove(temp_path)
-            return pdf_bytes
+        return browser_pool.render_pdf(html_content)
             
     def _calculate_nights(self, checkin, checkout):
         try:
@@ -35,140 +236,110 @@ class PDFService:
             return 1
 
     def _get_logo_uri(self):
-        logo_uri = ""
-        # templates_dir is backend/templates
-        # We need to go up twice: backend/templates -> backend -> root -> assets/images/logo.jpg
+        # templates_dir is backend/templates -> root/assets/images/logo.jpg (encoded once per process)
         logo_path = os.path.join(self.templates_dir, '..', '..', 'assets', 'images', 'logo.jpg')
-        if os.path.exists(logo_path):
-            import base64
-            with open(logo_path, 'rb') as lf:
-                b64 = base64.b64encode(lf.read()).decode()
-                logo_uri = f"data:image/jpeg;base64,{b64}"
-        return logo_uri
+        return inline_asset(logo_path) or get_logo_data_uri()
+
+    def build_context(self, booking_data):
+        """Fields for every booking document, computed once per booking"""
+        guest_name = str(booking_data.get('customer_name', booking_data.get('guest_name', 'Valued Customer')))
+        guest_email = str(booking_data.get('customer_email', booking_data.get('guest_email', '')))
+        booking_id = str(booking_data.get('booking_id', 'N/A'))
+        amount = str(booking_data.get('amount', '0.00'))
+        city = str(booking_data.get('destination', booking_data.get('city', 'Not Specified')))
+        checkin = str(booking_data.get('checkin', 'N/A'))
+        checkout = str(booking_data.get('checkout', 'N/A'))
+        # Prefer the booking's own date so re-rendering later yields the same document
+        issue_date = str(booking_data.get('issue_date') or datetime.now().strftime("%d %b %Y"))
+
+        return {
+            'logo_data_uri': self._get_logo_uri(),
+            'invoice_number': f"INV-{booking_id[-8:]}" if len(booking_id) > 8 else booking_id,
+            'voucher_number': f"VCH-{booking_id[-8:]}" if len(booking_id) > 8 else booking_id,
+            'issue_date': issue_date,
+            'due_date': issue_date,
+            'paid_date': issue_date,
+            'date': issue_date,
+            'booking_id': booking_id,
+            'transaction_id': booking_id,
+            'supplier_ref': "N/A",
+            'guest_name': guest_name,
+            'customer_name': guest_name,
+            'guest_email': guest_email,
+            'customer_email': guest_email,
+            'guest_phone': str(booking_data.get('phone', booking_data.get('customer_phone', 'Not Specified'))),
+            'additional_guests': "None",
+            'billing_address': city,
+            'city': city,
+            'hotel_name': str(booking_data.get('hotel_name', 'N/A')),
+            'hotel_address': str(booking_data.get('hotel_address', city)),
+            'hotel_phone': "Contact Hotel",
+            'hotel_email': "N/A",
+            'star_rating': "",
+            'checkin': checkin,
+            'checkout': checkout,
+            'checkin_time': "14:00",
+            'checkout_time': "12:00",
+            'nights': str(self._calculate_nights(checkin, checkout)),
+            'adults': str(booking_data.get('adults', '2')),
+            'children': "0",
+            'room_count': "1",
+            'room_type': str(booking_data.get('room_name', 'Standard Room')),
+            'meal_plan': "Room Only",
+            'rate_per_night': "See Total",
+            'room_charges': amount,
+            'taxes_fees': "0.00",
+            'service_fee': "0.00",
+            'discount': "0.00",
+            'total_amount': amount,
+            'amount': amount,
+            'amount_paid': amount,
+            'balance_due': "0.00",
+            'currency': str(booking_data.get('currency', 'USD')),
+            'card_type': "Credit/Debit/Netbanking",
+            'ein': "N/A",
+            'sales_tax': "Included",
+            'included_services': "Accommodation",
+            'not_included_services': "Personal Expenses",
+            'cancellation_policy': "As per hotel policy",
+            'city_tax_policy': "Payable at hotel if applicable",
+            'qr_code_html': ""
+        }
+
+    def render_html(self, kind, context):
+        document = DOCUMENTS[kind]
+        try:
+            return render_template(document['template'], {**context, **document['fields']}, self.templates_dir)
+        except TemplateNotFound:
+            return f"<html><body><h1>{kind.title()} not found</h1></body></html>"
+
+    def generate_documents(self, booking_data, kinds=('invoice', 'voucher')):
+        """
+        Render several documents for one booking from a single context.
+        Cached PDFs are reused; the rest are rendered concurrently on the pool.
+        Returns {kind: pdf_bytes}.
+        """
+        context = self.build_context(booking_data)
+        booking_id = context['booking_id']
+        cacheable = booking_id != 'N/A'
+
+        results, pending = {}, {}
+        for kind in kinds:
+            html_content = self.render_html(kind, context)
+            cached = pdf_cache.get(booking_id, kind, html_content) if cacheable else None
+            if cached is not None:
+                results[kind] = cached
+            else:
+                pending[kind] = (html_content, browser_pool.submit(html_content))
+
+        for kind, (html_content, future) in pending.items():
+            results[kind] = browser_pool.wait(future)
+            if cacheable:
+                pdf_cache.put(booking_id, kind, html_content, results[kind])
+        return results
 
     def generate_invoice(self, booking_data):
-        template_path = os.path.join(self.templates_dir, 'pdf', 'invoice.html')
-        logo_uri = self._get_logo_uri()
-
-        if os.path.exists(template_path):
-            with open(template_path, 'r') as f:
-                html_content = f.read()
-                
-                guest_name = str(booking_data.get('customer_name', booking_data.get('guest_name', 'Valued Customer')))
-                guest_email = str(booking_data.get('customer_email', booking_data.get('guest_email', '')))
-                booking_id = str(booking_data.get('booking_id', 'N/A'))
-                hotel_name = str(booking_data.get('hotel_name', 'N/A'))
-                amount = str(booking_data.get('amount', '0.00'))
-                currency = str(booking_data.get('currency', 'USD'))
-                city = str(booking_data.get('destination', booking_data.get('city', 'Not Specified')))
-                checkin = str(booking_data.get('checkin', 'N/A'))
-                checkout = str(booking_data.get('checkout', 'N/A'))
-                nights = str(self._calculate_nights(checkin, checkout))
-                room_name = str(booking_data.get('room_name', 'Standard Room'))
-                today = datetime.now().strftime("%d %b %Y")
-                
-                html_content = html_content.replace('{{logo_data_uri}}', logo_uri)
-                html_content = html_content.replace('{{invoice_number}}', f"INV-{booking_id[-8:]}" if len(booking_id)>8 else booking_id)
-                html_content = html_content.replace('{{issue_date}}', today)
-                html_content = html_content.replace('{{due_date}}', today)
-                html_content = html_content.replace('{{booking_id}}', booking_id)
-                html_content = html_content.replace('{{transaction_id}}', booking_id)
-                html_content = html_content.replace('{{payment_status}}', "PAID")
-                html_content = html_content.replace('{{guest_name}}', guest_name)
-                html_content = html_content.replace('{{customer_name}}', guest_name)
-                html_content = html_content.replace('{{guest_email}}', guest_email)
-                html_content = html_content.replace('{{customer_email}}', guest_email)
-                html_content = html_content.replace('{{billing_address}}', city)
-                html_content = html_content.replace('{{hotel_name}}', hotel_name)
-                html_content = html_content.replace('{{hotel_address}}', str(booking_data.get('hotel_address', city)))
-                html_content = html_content.replace('{{checkin}}', checkin)
-                html_content = html_content.replace('{{check-in}}', checkin)
-                html_content = html_content.replace('{{checkout}}', checkout)
-                html_content = html_content.replace('{{check-out}}', checkout)
-                html_content = html_content.replace('{{nights}}', nights)
-                html_content = html_content.replace('{{adults}}', str(booking_data.get('adults', '2')))
-                html_content = html_content.replace('{{children}}', "0")
-                html_content = html_content.replace('{{room_type}}', room_name)
-                html_content = html_content.replace('{{meal_plan}}', "Room Only")
-                html_content = html_content.replace('{{supplier_ref}}', "N/A")
-                html_content = html_content.replace('{{rate_per_night}}', "See Total")
-                html_content = html_content.replace('{{room_charges}}', amount)
-                html_content = html_content.replace('{{taxes_fees}}', "0.00")
-                html_content = html_content.replace('{{service_fee}}', "0.00")
-                html_content = html_content.replace('{{discount}}', "0.00")
-                html_content = html_content.replace('{{total_amount}}', amount)
-                html_content = html_content.replace('{{currency}}', currency)
-                html_content = html_content.replace('{{amount}}', amount)
-                html_content = html_content.replace('{{guest_phone}}', str(booking_data.get('phone', booking_data.get('customer_phone', 'Not Specified'))))
-                html_content = html_content.replace('{{payment_method}}', "Online Payment")
-                html_content = html_content.replace('{{card_type}}', "Credit/Debit/Netbanking")
-                html_content = html_content.replace('{{paid_date}}', today)
-                html_content = html_content.replace('{{ein}}', "N/A")
-                html_content = html_content.replace('{{sales_tax}}', "Included")
-                html_content = html_content.replace('{{qr_code_html}}', "")
-                html_content = html_content.replace('{{date}}', today)
-                html_content = html_content.replace('{{city}}', city)
-        else:
-            html_content = "<html><body><h1>Invoice not found</h1></body></html>"
-
-        return self._generate_pdf_from_html(html_content)
+        return self.generate_documents(booking_data, ('invoice',))['invoice']
 
     def generate_ticket(self, booking_data):
-        template_path = os.path.join(self.templates_dir, 'pdf', 'ticket.html')
-        logo_uri = self._get_logo_uri()
-
-        if os.path.exists(template_path):
-            with open(template_path, 'r') as f:
-                html_content = f.read()
-                
-                guest_name = str(booking_data.get('customer_name', booking_data.get('guest_name', 'Valued Customer')))
-                booking_id = str(booking_data.get('booking_id', 'N/A'))
-                amount = str(booking_data.get('amount', '0.00'))
-                currency = str(booking_data.get('currency', 'USD'))
-                city = str(booking_data.get('destination', booking_data.get('city', 'Not Specified')))
-                checkin = str(booking_data.get('checkin', 'N/A'))
-                checkout = str(booking_data.get('checkout', 'N/A'))
-                nights = str(self._calculate_nights(checkin, checkout))
-                room_name = str(booking_data.get('room_name', 'Standard Room'))
-                today = datetime.now().strftime("%d %b %Y")
-                
-                html_content = html_content.replace('{{logo_data_uri}}', logo_uri)
-                html_content = html_content.replace('{{voucher_number}}', f"VCH-{booking_id[-8:]}" if len(booking_id)>8 else booking_id)
-                html_content = html_content.replace('{{booking_id}}', booking_id)
-                html_content = html_content.replace('{{supplier_ref}}', "N/A")
-                html_content = html_content.replace('{{issue_date}}', today)
-                html_content = html_content.replace('{{amount_paid}}', amount)
-                html_content = html_content.replace('{{star_rating}}', "")
-                html_content = html_content.replace('{{hotel_address}}', city)
-                html_content = html_content.replace('{{hotel_phone}}', "Contact Hotel")
-                html_content = html_content.replace('{{hotel_email}}', "N/A")
-                html_content = html_content.replace('{{currency}}', currency)
-                html_content = html_content.replace('{{guest_name}}', guest_name)
-                html_content = html_content.replace('{{customer_name}}', guest_name)
-                html_content = html_content.replace('{{additional_guests}}', "None")
-                html_content = html_content.replace('{{adults}}', str(booking_data.get('adults', '2')))
-                html_content = html_content.replace('{{children}}', "0")
-                html_content = html_content.replace('{{room_count}}', "1")
-                html_content = html_content.replace('{{checkin}}', checkin)
-                html_content = html_content.replace('{{check-in}}', checkin)
-                html_content = html_content.replace('{{checkout}}', checkout)
-                html_content = html_content.replace('{{check-out}}', checkout)
-                html_content = html_content.replace('{{checkin_time}}', "14:00")
-                html_content = html_content.replace('{{checkout_time}}', "12:00")
-                html_content = html_content.replace('{{nights}}', nights)
-                html_content = html_content.replace('{{room_type}}', room_name)
-                html_content = html_content.replace('{{meal_plan}}', "Room Only")
-                html_content = html_content.replace('{{payment_status}}', "CONFIRMED")
-                html_content = html_content.replace('{{balance_due}}', "0.00")
-                html_content = html_content.replace('{{included_services}}', "Accommodation")
-                html_content = html_content.replace('{{not_included_services}}', "Personal Expenses")
-                html_content = html_content.replace('{{cancellation_policy}}', "As per hotel policy")
-                html_content = html_content.replace('{{city_tax_policy}}', "Payable at hotel if applicable")
-                html_content = html_content.replace('{{transaction_id}}', booking_id)
-                html_content = html_content.replace('{{payment_method}}', "Online")
-                html_content = html_content.replace('{{qr_code_html}}', "")
-                html_content = html_content.replace('{{hotel_name}}', str(booking_data.get('hotel_name', 'N/A')))
-        else:
-            html_content = "<html><body><h1>Ticket not found</h1></body></html>"
-
-        return self._generate_pdf_from_html(html_content)
+        return self.generate_documents(booking_data, ('voucher',))['voucher']
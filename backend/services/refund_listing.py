@@ -0,0 +1,202 @@
+"""
+C2C Journeys - Refund Management Listing
+Hotel and flight bookings as one refund-management list, newest first.
+
+Each table is queried on its own with the filters, search and a column
+projection pushed into PostgREST, reading at most one page in
+(created_at, id) order after the cursor. The two sorted streams are then
+k-way merged by booking date, so a page costs the same however much history
+the tables hold. The cursor is the (created_at, booking_type, id) of the last
+row returned.
+"""
+import heapq
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.pagination import after_keyset, decode_cursor, encode_cursor, filter_value
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+NOT_REQUESTED = ['Not Requested', 'null', '—', '']
+
+
+def _first_name(people) -> str:
+    """'First Last' of the first guest/passenger in a JSON list ('' if none)"""
+    if isinstance(people, str):
+        try:
+            people = json.loads(people)
+        except ValueError:
+            return ''
+    if isinstance(people, list) and people and isinstance(people[0], dict):
+        g = people[0]
+        return f"{g.get('first_name', '')} {g.get('last_name', '')}".strip() or g.get('name') or ''
+    return ''
+
+
+def normalize_hotel(h: Dict) -> Dict:
+    check_in_str = h.get('check_in') or ''
+    return {
+        'id': h['id'],
+        'booking_id': h.get('partner_order_id') or h.get('booking_id') or h['id'],
+        'booking_type': 'hotel',
+        'customer_name': _first_name(h.get('guests')) or h.get('customer_name') or '—',
+        'email': h.get('customer_email') or '—',
+        'phone': h.get('customer_phone') or '—',
+        'details': f"{h.get('hotel_name', 'Hotel')} ({check_in_str})",
+        'amount': float(h.get('total_amount') or 0),
+        'refund_amount': float(h.get('refund_amount') or 0) if h.get('refund_amount') else None,
+        'payment_method': h.get('payment_method') or '—',
+        'booking_date': h.get('created_at'),
+        'refund_status': h.get('refund_status') or 'Not Requested',
+        'refund_method': h.get('refund_method') or '—',
+        'status': h.get('status', 'unknown')
+    }
+
+
+def normalize_flight(f: Dict) -> Dict:
+    dep_date = (f.get('departure_datetime') or '').split('T')[0]
+    return {
+        'id': f['id'],
+        'booking_id': f.get('booking_id') or f['id'],
+        'booking_type': 'flight',
+        'customer_name': _first_name(f.get('passengers')) or f.get('passenger_name') or '—',
+        'email': f.get('passenger_email') or f.get('customer_email') or '—',
+        'phone': f.get('passenger_phone') or f.get('customer_phone') or '—',
+        'details': f"{f.get('airline_name', 'Airline')} {f.get('origin_code', '')}-{f.get('destination_code', '')} ({dep_date})",
+        'amount': float(f.get('total_amount') or 0),
+        'refund_amount': float(f.get('refund_amount') or 0) if f.get('refund_amount') else None,
+        'payment_method': f.get('payment_method') or '—',
+        'booking_date': f.get('created_at'),
+        'refund_status': f.get('refund_status') or 'Not Requested',
+        'refund_method': f.get('refund_method') or '—',
+        'status': f.get('status', 'unknown')
+    }
+
+
+# booking_type -> how to read it. Types are merged in this (descending) order on date ties.
+SOURCES = {
+    'hotel': {
+        'table': 'hotel_bookings',
+        'columns': 'id, booking_id, partner_order_id, guests, customer_name, customer_email, customer_phone, '
+                   'hotel_name, check_in, total_amount, refund_amount, payment_method, created_at, '
+                   'refund_status, refund_method, status',
+        'search': ['partner_order_id', 'booking_id', 'customer_name', 'customer_email',
+                   'guests->0->>first_name', 'guests->0->>last_name'],
+        'normalize': normalize_hotel,
+    },
+    'flight': {
+        'table': 'flight_bookings',
+        'columns': 'id, booking_id, passengers, passenger_name, passenger_email, passenger_phone, customer_email, '
+                   'customer_phone, airline_name, origin_code, destination_code, departure_datetime, total_amount, '
+                   'refund_amount, payment_method, created_at, refund_status, refund_method, status',
+        'search': ['booking_id', 'passenger_name', 'passenger_email', 'customer_email',
+                   'passengers->0->>first_name', 'passengers->0->>last_name', 'passengers->0->>name'],
+        'normalize': normalize_flight,
+    },
+}
+
+
+def _sort_key(row: Dict):
+    """Newest first; ties broken by booking_type then id, exactly as the per-table filters page"""
+    try:
+        ts = datetime.fromisoformat(str(row['booking_date']).replace('Z', '+00:00'))
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        ts = datetime.min.replace(tzinfo=timezone.utc)
+    return ts, row['booking_type'], str(row['id'])
+
+
+class RefundListing:
+    """One page of the merged hotel + flight refund-management list"""
+
+    def list_bookings(self, supabase, status: Optional[str] = None, payment_method: Optional[str] = None,
+                      search: Optional[str] = None, booking_type: Optional[str] = None,
+                      from_date: Optional[str] = None, to_date: Optional[str] = None,
+                      limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        after = decode_cursor(cursor, 3)
+        types = [booking_type] if booking_type in SOURCES else list(SOURCES)
+
+        streams = []
+        total = 0 if after is None else None
+        for btype in types:
+            rows, count = self._fetch(supabase, btype, status, payment_method, search,
+                                      from_date, to_date, limit, after)
+            streams.append([SOURCES[btype]['normalize'](r) for r in rows])
+            if total is not None:
+                total += count or 0
+
+        merged = heapq.merge(*streams, key=_sort_key, reverse=True)
+        page = [row for _, row in zip(range(limit + 1), merged)]
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        result = {
+            'data': page,
+            'count': len(page),
+            'limit': limit,
+            'has_more': has_more,
+            'next_cursor': encode_cursor(page[-1]['booking_date'], page[-1]['booking_type'], page[-1]['id']) if has_more and page else None
+        }
+        if total is not None:
+            result['total'] = total
+        return result
+
+    def _fetch(self, supabase, btype: str, status, payment_method, search, from_date, to_date,
+               limit: int, after) -> Tuple[List[Dict], Optional[int]]:
+        source = SOURCES[btype]
+        try:
+            return self._query(supabase, source, source['columns'], btype, status, payment_method,
+                               search, from_date, to_date, limit, after)
+        except Exception as e:
+            # Older databases may not have every projected column yet
+            print(f"⚠️ Refund listing projection failed for {source['table']}, retrying with *: {e}")
+            return self._query(supabase, source, '*', btype, status, payment_method,
+                               search, from_date, to_date, limit, after)
+
+    def _query(self, supabase, source: Dict, columns: str, btype: str, status, payment_method, search,
+               from_date, to_date, limit: int, after) -> Tuple[List[Dict], Optional[int]]:
+        query = supabase.table(source['table']).select(columns, count='exact' if after is None else None)
+
+        if status:
+            sf = status.lower().replace('_', ' ')
+            if sf == 'not requested':
+                values = ','.join(f'"{v}"' for v in NOT_REQUESTED)
+                query = query.or_(f'refund_status.is.null,refund_status.ilike.not requested,refund_status.in.({values})')
+            else:
+                query = query.ilike('refund_status', filter_value(sf))
+
+        if payment_method:
+            query = query.ilike('payment_method', f"%{filter_value(payment_method)}%")
+
+        term = filter_value(search or '')
+        if term:
+            query = query.or_(','.join(f'{col}.ilike.*{term}*' for col in source['search']))
+
+        if from_date:
+            query = query.gte('created_at', f"{from_date}T00:00:00")
+        if to_date:
+            query = query.lte('created_at', f"{to_date}T23:59:59.999999")
+
+        if after:
+            created_at, after_type, after_id = after
+            if btype == after_type:
+                query = after_keyset(query, (created_at, after_id))
+            elif btype < after_type:
+                # Sorts after the cursor's type on equal dates, so equal dates are still to come
+                query = query.lte('created_at', created_at)
+            else:
+                query = query.lt('created_at', created_at)
+
+        res = query.order('created_at', desc=True).order('id', desc=True).limit(limit + 1).execute()
+        return res.data or [], getattr(res, 'count', None)
+
+
+refund_listing = RefundListing()
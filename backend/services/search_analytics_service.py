@@ -0,0 +1,328 @@
+"""
+C2C Journeys - Search Analytics Service
+Builds hotel_search_logs rows and writes them off the request path.
+
+log_search() only captures what it needs from the request (headers, search
+params) and queues the row. Identity resolution and the insert happen on the
+BatchInsertWriter thread, so a search never waits on Supabase.
+
+Every written batch is also folded into per-day counters
+(search_analytics_daily) so the admin search report can be answered for any
+date range without scanning the logs. A batch whose counters fail to post is
+kept and added to the next one, so a Supabase blip does not lose searches.
+"""
+import atexit
+import os
+import sys
+import threading
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import jwt
+from cachetools import TTLCache
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from services.batch_writer import BatchInsertWriter
+from services.pagination import paginate
+from services.supabase_service import supabase_service
+
+
+# Counter keys held back after a failed bump_search_analytics call
+MAX_PENDING_COUNTERS = 20000
+# Report fallback (no search_analytics_report): rows scanned before the totals are marked approximate
+REPORT_SCAN_PAGE_SIZE = 1000
+REPORT_SCAN_MAX_ROWS = 50000
+
+GUEST_IDENTITY = {'user_id': None, 'email': None, 'user_type': 'Guest'}
+
+# Report dimension -> hotel_search_logs column it counts
+COUNTER_DIMENSIONS = {
+    'destination': 'destination',
+    'device': 'device_type',
+    'browser': 'browser',
+    'country': 'country',
+    'user_type': 'user_type',
+}
+COUNTER_COLUMNS = 'created_at, nights, ' + ', '.join(COUNTER_DIMENSIONS.values())
+
+
+@lru_cache(maxsize=1024)
+def parse_user_agent(ua_string: str) -> Tuple[str, str, str]:
+    """(device_type, operating_system, browser) for a User-Agent header"""
+    ua_lower = (ua_string or '').lower()
+
+    # Simple Device Inference
+    device_type = 'Desktop'
+    if any(keyword in ua_lower for keyword in ['mobi', 'android', 'iphone', 'ipad', 'ipod']):
+        device_type = 'Mobile'
+    if 'ipad' in ua_lower or 'tablet' in ua_lower:
+        device_type = 'Tablet'
+
+    # Parse OS
+    operating_system = 'Unknown'
+    if 'windows' in ua_lower: operating_system = 'Windows'
+    elif 'mac os' in ua_lower or 'macos' in ua_lower: operating_system = 'macOS'
+    elif 'android' in ua_lower: operating_system = 'Android'
+    elif 'iphone' in ua_lower or 'ipad' in ua_lower: operating_system = 'iOS'
+    elif 'linux' in ua_lower: operating_system = 'Linux'
+
+    # Parse Browser
+    browser = 'Unknown'
+    if 'edg/' in ua_lower: browser = 'Edge'
+    elif 'chrome/' in ua_lower and 'edg/' not in ua_lower: browser = 'Chrome'
+    elif 'safari/' in ua_lower and 'chrome/' not in ua_lower: browser = 'Safari'
+    elif 'firefox/' in ua_lower: browser = 'Firefox'
+
+    return device_type, operating_system, browser
+
+
+class UserIdentityResolver:
+    """
+    Resolve a Supabase access token to (user_id, email).
+
+    Tokens are verified locally with SUPABASE_JWT_SECRET when it is configured;
+    otherwise we fall back to supabase.auth.get_user(). Either way results are
+    cached for a short time so repeat searches by the same user cost nothing.
+    """
+
+    def __init__(self, jwt_secret: Optional[str] = None, ttl: int = 300, maxsize: int = 4096):
+        self.jwt_secret = jwt_secret
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def resolve(self, token: Optional[str]) -> Dict:
+        if not token:
+            return GUEST_IDENTITY
+        cached = self._cache.get(token)
+        if cached is not None:
+            return cached
+
+        identity = self._verify_locally(token) if self.jwt_secret else self._lookup_remote(token)
+        self._cache[token] = identity
+        return identity
+
+    def _verify_locally(self, token: str) -> Dict:
+        try:
+            claims = jwt.decode(token, self.jwt_secret, algorithms=['HS256'], audience='authenticated')
+            if claims.get('sub'):
+                return {'user_id': claims['sub'], 'email': claims.get('email'), 'user_type': 'Registered User'}
+        except jwt.InvalidTokenError:
+            pass
+        return GUEST_IDENTITY
+
+    def _lookup_remote(self, token: str) -> Dict:
+        try:
+            client = supabase_service.client
+            user_res = client.auth.get_user(token) if client else None
+            if user_res and user_res.user:
+                return {'user_id': user_res.user.id, 'email': user_res.user.email, 'user_type': 'Registered User'}
+        except Exception:
+            pass
+        return GUEST_IDENTITY
+
+
+def search_nights_between(checkin: Optional[str], checkout: Optional[str]) -> int:
+    if not checkin or not checkout:
+        return 0
+    try:
+        d1 = datetime.strptime(checkin, "%Y-%m-%d")
+        d2 = datetime.strptime(checkout, "%Y-%m-%d")
+        return (d2 - d1).days
+    except (TypeError, ValueError):
+        return 0
+
+
+def nights_bucket(nights) -> str:
+    try:
+        nights = int(nights or 0)
+    except (TypeError, ValueError):
+        nights = 0
+    if nights <= 3:
+        return str(max(nights, 0))
+    if nights <= 6:
+        return '4-6'
+    if nights <= 13:
+        return '7-13'
+    return '14+'
+
+
+def count_searches(rows: Iterable[Dict]) -> Dict[Tuple[str, str, str], int]:
+    """(day, dimension, value) -> searches for a batch of hotel_search_logs rows"""
+    counters = {}
+
+    def bump(key):
+        counters[key] = counters.get(key, 0) + 1
+
+    for row in rows:
+        day = str(row.get('created_at') or datetime.utcnow().isoformat())[:10]
+        bump((day, '', ''))
+        bump((day, 'nights', nights_bucket(row.get('nights'))))
+        for dimension, column in COUNTER_DIMENSIONS.items():
+            value = row.get(column)
+            if value:
+                bump((day, dimension, str(value)[:255]))
+    return counters
+
+
+def summarize_counters(counters: Dict[Tuple[str, str, str], int], top: int = 10) -> Dict:
+    """Same shape as the search_analytics_report() SQL function"""
+    totals = {}
+    daily = {}
+    for (day, dimension, value), searches in counters.items():
+        if dimension:
+            values = totals.setdefault(dimension, {})
+            values[value] = values.get(value, 0) + searches
+        else:
+            daily[day] = daily.get(day, 0) + searches
+    return {
+        'total': sum(daily.values()),
+        'breakdowns': {
+            dimension: [
+                {'value': value, 'count': count}
+                for value, count in sorted(values.items(), key=lambda x: (-x[1], x[0]))[:top]
+            ]
+            for dimension, values in totals.items()
+        },
+        'daily': [{'day': day, 'count': daily[day]} for day in sorted(daily)],
+    }
+
+
+class SearchAnalyticsService:
+    """Queues hotel_search_logs rows for the background writer"""
+
+    def __init__(self):
+        self.identity_resolver = UserIdentityResolver(Config.SUPABASE_JWT_SECRET)
+        self._pending_counters = {}
+        self._pending_lock = threading.Lock()
+        self.writer = BatchInsertWriter(
+            'hotel_search_logs',
+            client_getter=lambda: supabase_service.client,
+            batch_size=Config.SEARCH_LOG_BATCH_SIZE,
+            flush_interval_ms=Config.SEARCH_LOG_FLUSH_MS,
+            max_queue=Config.SEARCH_LOG_QUEUE_SIZE,
+            prepare=self._prepare_row,
+            on_flush=self.record_counters
+        )
+        atexit.register(self.flush_counters)
+
+    def log_search(self, search_type: str, headers, remote_addr: Optional[str], request_data: Optional[dict] = None) -> bool:
+        """Capture one search from request headers + body. Returns False if the row was dropped."""
+        # 1. Identity extraction (resolved later, on the writer thread)
+        token = (headers.get('Authorization') or '').replace('Bearer ', '')
+
+        # 2. Network & Location
+        ip_address = headers.get('X-Forwarded-For', remote_addr)
+        if ip_address and ',' in ip_address:
+            ip_address = ip_address.split(',')[0].strip()
+        country = headers.get('CF-IPCountry', 'Unknown')
+
+        # 3. Device & Browser
+        device_type, operating_system, browser = parse_user_agent(headers.get('User-Agent', ''))
+
+        # 4. Search Data Extraction
+        req = request_data or {}
+        destination = req.get('destination') or str(req.get('region_id')) or str(req.get('latitude')) or 'Unknown'
+        checkin = req.get('checkin')
+        checkout = req.get('checkout')
+        children_ages = req.get('children_ages', [])
+
+        return self.writer.submit({
+            '_token': token or None,
+            'destination': destination,
+            'checkin': checkin,
+            'checkout': checkout,
+            'nights': search_nights_between(checkin, checkout),
+            'rooms': len(req.get('rooms', [])) if req.get('rooms') else 1,
+            'adults': req.get('adults', 0),
+            'children': len(children_ages),
+            'child_ages': children_ages,
+            'device_type': device_type,
+            'browser': browser,
+            'operating_system': operating_system,
+            'ip_address': ip_address,
+            'country': country,
+            'search_type': search_type,
+            # Stamped here so the row and its daily counter agree on the day
+            'created_at': datetime.utcnow().isoformat()
+        })
+
+    def _prepare_row(self, row: Dict) -> Dict:
+        row = dict(row)
+        identity = self.identity_resolver.resolve(row.pop('_token', None))
+        row['user_id'] = identity['user_id']
+        row['email'] = identity['email']
+        row['user_type'] = identity['user_type']
+        return row
+
+    def record_counters(self, rows: List[Dict]):
+        """
+        BatchInsertWriter on_flush hook: add an inserted batch to the daily counters.
+        If the RPC fails the counters are carried over and sent with the next batch.
+        """
+        with self._pending_lock:
+            counters = self._pending_counters
+            self._pending_counters = {}
+            for key, searches in count_searches(rows).items():
+                counters[key] = counters.get(key, 0) + searches
+            if not counters:
+                return
+            try:
+                client = supabase_service.client
+                if client is None:
+                    raise RuntimeError('Supabase client not initialized')
+                client.rpc('bump_search_analytics', {'p_counters': [
+                    {'day': day, 'dimension': dimension, 'value': value, 'searches': searches}
+                    for (day, dimension, value), searches in counters.items()
+                ]}).execute()
+            except Exception as e:
+                if len(counters) > MAX_PENDING_COUNTERS:
+                    print(f"⚠️ search counters: dropping {len(counters)} pending keys after repeated failures: {e}")
+                    return
+                self._pending_counters = counters
+                print(f"⚠️ search counters: bump failed, retrying {len(counters)} keys with the next batch: {e}")
+
+    def flush_counters(self):
+        """Retry any counters held back by a failed bump (called on shutdown)"""
+        self.record_counters([])
+
+    def get_report(self, supabase, from_date: date, to_date: date, top: int = 10) -> Dict:
+        """
+        Totals, top values per dimension and the daily series for a date range.
+        'approximate' is True only when the log-scan fallback hit REPORT_SCAN_MAX_ROWS.
+        """
+        try:
+            result = supabase.rpc('search_analytics_report', {
+                'p_from': from_date.isoformat(), 'p_to': to_date.isoformat(), 'p_top': top
+            }).execute()
+            return {**result.data, 'approximate': False}
+        except Exception as e:
+            print(f"⚠️ search_analytics_report unavailable, scanning hotel_search_logs: {e}")
+
+        # PostgREST caps a single select (1000 rows by default), so walk the range by keyset page
+        def in_range(query):
+            return query.gte('created_at', f"{from_date.isoformat()}T00:00:00") \
+                .lte('created_at', f"{to_date.isoformat()}T23:59:59.999999")
+
+        counters, scanned, cursor = {}, 0, None
+        while True:
+            page = paginate(supabase, 'hotel_search_logs', 'id, ' + COUNTER_COLUMNS, filters=in_range,
+                            limit=REPORT_SCAN_PAGE_SIZE, cursor=cursor)
+            for key, searches in count_searches(page['data']).items():
+                counters[key] = counters.get(key, 0) + searches
+            scanned += len(page['data'])
+            cursor = page['next_cursor']
+            if not cursor or scanned >= REPORT_SCAN_MAX_ROWS:
+                break
+
+        approximate = cursor is not None
+        if approximate:
+            print(f"⚠️ Search report scan stopped at {scanned} rows; totals are a lower bound")
+        return {**summarize_counters(counters, top), 'approximate': approximate}
+
+    def get_stats(self) -> Dict:
+        return {**self.writer.get_stats(), 'pending_counters': len(self._pending_counters)}
+
+
+# Singleton instance
+search_analytics_service = SearchAnalyticsService()
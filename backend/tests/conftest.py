@@ -0,0 +1,98 @@
+"""
+Shared setup for the offline unit tests in backend/tests.
+
+These cover pure functions and in-process services only - nothing here talks
+to Supabase, ETG or AIR iQ. Run from backend/:
+    python -m pytest tests -q
+"""
+import os
+import re
+import sys
+
+# Config reads these at import time; the values are never used to connect
+os.environ.setdefault('SUPABASE_URL', 'http://localhost:54321')
+os.environ.setdefault('SUPABASE_ANON_KEY', 'test-anon-key')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+_KEYSET = re.compile(r'^(\w+)\.lt\."([^"]*)",and\(\1\.eq\."([^"]*)",id\.lt\.(.+)\)$')
+
+
+class FakeResult:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """
+    Just enough of the PostgREST query builder for keyset paging: the
+    comparison filters, after_keyset()'s or_() and order/limit/range.
+    Values are compared as strings, like the ISO timestamps and text ids
+    the fixtures use.
+    """
+
+    def __init__(self, rows):
+        self._rows = list(rows)
+        self._filters = []
+        self._order = []
+        self._slice = None
+        self._count = None
+
+    def select(self, columns='*', count=None):
+        self._count = count
+        return self
+
+    def _where(self, predicate):
+        self._filters.append(predicate)
+        return self
+
+    def eq(self, column, value):
+        return self._where(lambda r: str(r.get(column)) == str(value))
+
+    def lt(self, column, value):
+        return self._where(lambda r: str(r.get(column)) < str(value))
+
+    def lte(self, column, value):
+        return self._where(lambda r: str(r.get(column)) <= str(value))
+
+    def gte(self, column, value):
+        return self._where(lambda r: str(r.get(column)) >= str(value))
+
+    def or_(self, expression):
+        match = _KEYSET.match(expression)
+        if not match:
+            raise NotImplementedError(f'FakeQuery.or_ only understands keyset filters: {expression}')
+        column, value, _, row_id = match.groups()
+        return self._where(lambda r: str(r.get(column)) < value
+                           or (str(r.get(column)) == value and str(r.get('id')) < row_id))
+
+    def order(self, column, desc=False):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self._slice = (0, n)
+        return self
+
+    def range(self, start, end):
+        self._slice = (start, end + 1)
+        return self
+
+    def execute(self):
+        rows = [r for r in self._rows if all(f(r) for f in self._filters)]
+        for column, desc in reversed(self._order):
+            rows.sort(key=lambda r: str(r.get(column)), reverse=desc)
+        count = len(rows) if self._count else None
+        if self._slice:
+            rows = rows[self._slice[0]:self._slice[1]]
+        return FakeResult([dict(r) for r in rows], count)
+
+
+class FakeSupabase:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def table(self, name):
+        return FakeQuery(self.tables.get(name, []))
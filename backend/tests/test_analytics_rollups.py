@@ -0,0 +1,124 @@
+"""booking_fact() / build_rollups(), the Python mirror of the rollup triggers"""
+import pytest
+
+from services.analytics_rollups import AnalyticsRollups, booking_fact, build_rollups
+
+
+def test_hotel_fact():
+    fact = booking_fact('hotel_bookings', {
+        'status': 'confirmed', 'currency': 'EUR', 'total_amount': '450.50', 'rooms': 2,
+        'check_in': '2026-02-10', 'check_out': '2026-02-13', 'created_at': '2026-02-01T08:00:00+00:00',
+        'hotel_city': 'Paris', 'booking_source': 'admin_manual',
+    })
+    assert fact == {
+        'product': 'hotel', 'created_at': '2026-02-01T08:00:00+00:00', 'status': 'confirmed',
+        'currency': 'EUR', 'revenue': 450.5, 'room_nights': 6, 'roundtrips': 0,
+        'dims': {'destination': 'Paris', 'supplier': 'manual'},
+    }
+
+
+def test_hotel_fact_defaults():
+    fact = booking_fact('hotel_bookings', {
+        'status': '', 'currency': '', 'rooms': 0, 'check_in': '2026-02-10', 'check_out': '2026-02-10',
+        'created_at': '2026-02-01', 'hotel_city': '', 'hotel_name': 'Grand',
+    })
+    assert fact['status'] == 'unknown'
+    assert fact['currency'] == 'USD'
+    assert fact['revenue'] == 0.0
+    assert fact['room_nights'] == 1  # same-day and zero rooms both count as one
+    assert fact['dims'] == {'destination': 'Grand', 'supplier': 'ratehawk'}
+
+    missing_dates = booking_fact('hotel_bookings', {'rooms': 3, 'created_at': '2026-02-01'})
+    assert missing_dates['room_nights'] == 3
+    assert missing_dates['dims']['destination'] == 'Unknown'
+
+
+def test_long_hotel_name_fits_the_rollup_column():
+    fact = booking_fact('hotel_bookings', {'created_at': '2026-02-01', 'hotel_city': '', 'hotel_name': 'H' * 500})
+    assert fact['dims']['destination'] == 'H' * 255
+
+
+def test_flight_fact():
+    fact = booking_fact('flight_bookings', {
+        'status': 'confirmed', 'total_amount': 12000, 'created_at': '2026-02-05T00:00:00',
+        'destination_city': 'Dubai', 'supplier_name': 'airiq', 'trip_type': 'international',
+        'return_flight_number': 'EK-501',
+    })
+    assert fact['product'] == 'flight'
+    assert fact['currency'] == 'INR'
+    assert fact['roundtrips'] == 1 and fact['room_nights'] == 0
+    assert fact['dims'] == {'destination': 'Dubai', 'supplier': 'airiq', 'trip_type': 'international'}
+
+    one_way = booking_fact('flight_bookings', {'created_at': '2026-02-05', 'return_flight_number': ''})
+    assert one_way['roundtrips'] == 0
+    assert one_way['dims'] == {'destination': 'Unknown', 'supplier': 'unknown', 'trip_type': 'domestic'}
+
+
+def test_enquiry_fact_and_unknown_table():
+    fact = booking_fact('flight_enquiries', {'status': 'New Lead', 'created_at': '2026-02-05'})
+    assert fact['product'] == 'flight_enquiry'
+    assert fact['currency'] == '' and fact['dims'] == {}
+    assert booking_fact('payments', {'status': 'paid'}) is None
+
+
+FACTS = [
+    booking_fact('hotel_bookings', {'status': 'confirmed', 'currency': 'USD', 'total_amount': 100, 'rooms': 1,
+                                    'check_in': '2026-01-10', 'check_out': '2026-01-12',
+                                    'created_at': '2026-01-05T10:00:00', 'hotel_city': 'Goa'}),
+    booking_fact('hotel_bookings', {'status': 'confirmed', 'currency': 'USD', 'total_amount': 50, 'rooms': 2,
+                                    'check_in': '2026-01-20', 'check_out': '2026-01-21',
+                                    'created_at': '2026-01-28T23:59:59', 'hotel_city': 'Goa'}),
+    booking_fact('hotel_bookings', {'status': 'cancelled', 'currency': 'USD', 'total_amount': 80,
+                                    'created_at': '2026-02-01T00:00:00', 'hotel_city': 'Delhi'}),
+    None,
+]
+
+
+def rollup(rows, bucket, status, dimension='', value=''):
+    matches = [r for r in rows if (r['bucket'], r['status'], r['dimension'], r['dimension_value']) ==
+               (bucket, status, dimension, value)]
+    assert len(matches) == 1
+    return matches[0]
+
+
+def test_build_rollups_by_month():
+    rows = build_rollups(FACTS, 'month')
+    total = rollup(rows, '2026-01-01', 'confirmed')
+    assert (total['bookings'], total['revenue'], total['room_nights']) == (2, 150.0, 4)
+    goa = rollup(rows, '2026-01-01', 'confirmed', 'destination', 'Goa')
+    assert goa['bookings'] == 2
+    assert rollup(rows, '2026-02-01', 'cancelled')['revenue'] == 80.0
+    # one total row + destination + supplier per (bucket, status, currency)
+    assert len(rows) == 6
+
+
+def test_build_rollups_by_day():
+    rows = build_rollups(FACTS, 'day')
+    assert {r['bucket'] for r in rows} == {'2026-01-05', '2026-01-28', '2026-02-01'}
+    assert rollup(rows, '2026-01-28', 'confirmed')['room_nights'] == 2
+
+
+def test_summarize_matches_the_facts():
+    summary = AnalyticsRollups().summarize(build_rollups(FACTS, 'month'))
+    assert summary['total'] == 3
+    assert summary['by_status'] == {'confirmed': 2, 'cancelled': 1}
+    # Revenue and room nights only count confirmed bookings
+    assert summary['revenue'] == 150.0
+    assert summary['revenue_by_currency'] == {'USD': 150.0}
+    assert summary['room_nights'] == 4
+
+
+def test_build_rollups_ignores_empty_input():
+    assert build_rollups([]) == []
+    assert build_rollups([None, None]) == []
+
+
+@pytest.mark.parametrize('period', ['day', 'month'])
+def test_dimension_rows_add_up_to_the_total(period):
+    rows = build_rollups(FACTS, period)
+    for dimension in ('destination', 'supplier'):
+        for key in {(r['bucket'], r['status'], r['currency']) for r in rows}:
+            total = [r for r in rows if (r['bucket'], r['status'], r['currency']) == key and r['dimension'] == '']
+            parts = [r for r in rows if (r['bucket'], r['status'], r['currency']) == key and r['dimension'] == dimension]
+            assert sum(p['bookings'] for p in parts) == total[0]['bookings']
+            assert sum(p['revenue'] for p in parts) == pytest.approx(total[0]['revenue'])
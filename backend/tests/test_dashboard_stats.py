@@ -0,0 +1,82 @@
+"""
+aggregate_hotel_bookings() must agree with the admin_dashboard_stats() SQL
+function, which the dashboard uses when it is installed. The expected values
+below are worked out from the SQL (database/complete-schema.sql) by hand.
+"""
+from services.admin_service import aggregate_hotel_bookings
+
+
+BOOKINGS = [
+    {'status': 'confirmed', 'total_amount': 200.10, 'currency': 'USD', 'rooms': 2,
+     'check_in': '2026-01-10', 'check_out': '2026-01-13', 'created_at': '2026-01-02T10:00:00+00:00',
+     'hotel_city': 'Goa', 'hotel_name': 'Sea View', 'hotel_star_rating': 4},
+    {'status': 'confirmed', 'total_amount': 100, 'currency': 'EUR', 'rooms': None,
+     'check_in': '2026-02-01', 'check_out': '2026-02-02', 'created_at': '2026-02-01T00:00:00+00:00',
+     'hotel_city': '', 'hotel_name': 'Louvre Inn', 'hotel_star_rating': 3},
+    {'status': 'cancelled', 'total_amount': 50, 'currency': 'USD', 'rooms': 0,
+     'check_in': '2026-02-05', 'check_out': '2026-02-05', 'created_at': '2026-02-03T00:00:00+00:00',
+     'hotel_city': 'Goa', 'hotel_star_rating': 0},
+    {'status': None, 'total_amount': None, 'currency': None, 'rooms': 1,
+     'check_in': None, 'check_out': '2026-03-01', 'created_at': '2026-02-20T00:00:00+00:00',
+     'hotel_city': None, 'hotel_name': None, 'hotel_star_rating': None},
+    {'status': '', 'total_amount': 30, 'currency': '', 'rooms': 1,
+     'check_in': '2026-03-01', 'check_out': '2026-03-05', 'created_at': '2026-03-01T00:00:00+00:00',
+     'hotel_city': 'Goa', 'hotel_star_rating': 4},
+]
+
+
+def test_totals():
+    stats = aggregate_hotel_bookings(BOOKINGS)
+    assert stats['total_bookings'] == 5
+    assert stats['confirmed_bookings'] == 2
+    assert stats['total_revenue'] == 300.1           # confirmed only
+    assert stats['total_revenue_all'] == 380.1
+    assert stats['avg_booking_value'] == 150.05
+    # nights > 0 only: 3, 1 and 4
+    assert stats['avg_nights'] == 2.7
+    # GREATEST(nights, 1) * COALESCE(NULLIF(rooms, 0), 1) where both dates are set: 6 + 1 + 1 + 4
+    assert stats['total_room_nights'] == 12
+
+
+def test_status_and_currency_blanks_fall_back_like_the_sql():
+    stats = aggregate_hotel_bookings(BOOKINGS)
+    assert stats['status_breakdown'] == {'confirmed': 2, 'cancelled': 1, 'unknown': 2}
+    assert stats['currency_breakdown'] == {
+        'USD': {'count': 4, 'revenue': 280.1},
+        'EUR': {'count': 1, 'revenue': 100.0},
+    }
+
+
+def test_monthly_revenue_is_ordered_by_month():
+    assert aggregate_hotel_bookings(BOOKINGS)['monthly_revenue'] == [
+        {'month': '2026-01', 'bookings': 1, 'revenue': 200.1},
+        {'month': '2026-02', 'bookings': 3, 'revenue': 150.0},
+        {'month': '2026-03', 'bookings': 1, 'revenue': 30.0},
+    ]
+
+
+def test_destinations_fall_back_to_hotel_name_and_sort_like_the_sql():
+    assert aggregate_hotel_bookings(BOOKINGS)['top_destinations'] == [
+        {'name': 'Goa', 'bookings': 3, 'revenue': 280.1},
+        {'name': 'Louvre Inn', 'bookings': 1, 'revenue': 100.0},
+        {'name': 'Unknown', 'bookings': 1, 'revenue': 0.0},
+    ]
+
+
+def test_top_destinations_keep_ten():
+    bookings = [{'status': 'confirmed', 'total_amount': i, 'hotel_city': f'City {i:02d}'} for i in range(12)]
+    top = aggregate_hotel_bookings(bookings)['top_destinations']
+    assert len(top) == 10
+    assert top[0]['name'] == 'City 11' and top[-1]['name'] == 'City 02'
+
+
+def test_star_ratings_skip_zero_and_missing():
+    assert aggregate_hotel_bookings(BOOKINGS)['star_rating_distribution'] == {'4 Star': 2, '3 Star': 1}
+
+
+def test_no_bookings():
+    stats = aggregate_hotel_bookings([])
+    assert stats['total_bookings'] == 0
+    assert stats['avg_booking_value'] == 0 and stats['avg_nights'] == 0
+    assert stats['monthly_revenue'] == [] and stats['top_destinations'] == []
+    assert stats['status_breakdown'] == {} and stats['currency_breakdown'] == {}
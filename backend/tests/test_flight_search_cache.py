@@ -0,0 +1,157 @@
+"""FlightSearchCache: request coalescing, stale-while-revalidate and byte-bounded eviction"""
+import threading
+import time
+
+import pytest
+
+from services.flight_search_cache import FlightSearchCache
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not met in time')
+        time.sleep(0.005)
+
+
+def test_make_key_normalizes():
+    assert FlightSearchCache.make_key(' del', 'Bom ', '2026/05/01', '2', None) == \
+        FlightSearchCache.make_key('DEL', 'BOM', '2026-05-01', 2, 'Economy')
+
+
+def test_hit_after_miss_returns_a_copy():
+    cache = FlightSearchCache()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return {'flights': [1, 2]}, True
+
+    value, how = cache.get_or_fetch(('k',), fetch)
+    assert how == 'miss'
+    value['flights'].append(3)
+
+    again, how = cache.get_or_fetch(('k',), fetch)
+    assert how == 'hit' and again == {'flights': [1, 2]}
+    assert len(calls) == 1
+
+
+def test_uncacheable_results_are_not_stored():
+    cache = FlightSearchCache()
+    assert cache.get_or_fetch(('k',), lambda: ({'mock': True}, False)) == ({'mock': True}, 'miss')
+    assert cache.get_or_fetch(('k',), lambda: ({'live': True}, True)) == ({'live': True}, 'miss')
+    assert cache.get_stats()['uncacheable'] == 1
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = FlightSearchCache()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(2)
+        return {'flights': ['AI-101']}, True
+
+    results = []
+
+    def search():
+        results.append(cache.get_or_fetch(('DEL', 'BOM'), fetch))
+
+    leader = threading.Thread(target=search)
+    leader.start()
+    wait_for(lambda: cache._inflight)
+    followers = [threading.Thread(target=search) for _ in range(3)]
+    for t in followers:
+        t.start()
+    wait_for(lambda: cache.get_stats()['coalesced'] == 3)
+    release.set()
+    for t in [leader] + followers:
+        t.join(2)
+
+    assert len(calls) == 1
+    assert sorted(how for _, how in results) == ['coalesced', 'coalesced', 'coalesced', 'miss']
+    assert all(value == {'flights': ['AI-101']} for value, _ in results)
+    assert cache._inflight == {}
+
+
+def test_fetch_errors_reach_waiting_callers():
+    cache = FlightSearchCache()
+    release = threading.Event()
+
+    def fetch():
+        release.wait(2)
+        raise RuntimeError('upstream down')
+
+    errors = []
+
+    def search():
+        try:
+            cache.get_or_fetch(('k',), fetch)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=search)]
+    threads[0].start()
+    wait_for(lambda: cache._inflight)
+    threads.append(threading.Thread(target=search))
+    threads[1].start()
+    wait_for(lambda: cache.get_stats()['coalesced'] == 1)
+    release.set()
+    for t in threads:
+        t.join(2)
+
+    assert errors == ['upstream down', 'upstream down']
+    assert cache.get_stats()['entries'] == 0
+
+
+def test_waiter_times_out():
+    cache = FlightSearchCache(wait_timeout=0.05)
+    release = threading.Event()
+    leader = threading.Thread(target=cache.get_or_fetch, args=(('k',), lambda: (release.wait(2), True)))
+    leader.start()
+    wait_for(lambda: cache._inflight)
+    with pytest.raises(TimeoutError):
+        cache.get_or_fetch(('k',), lambda: ({}, True))
+    release.set()
+    leader.join(2)
+
+
+def test_stale_entry_is_served_and_refreshed_in_the_background():
+    cache = FlightSearchCache(ttl=0, stale_seconds=60)
+    cache.get_or_fetch(('k',), lambda: ({'v': 1}, True))
+
+    value, how = cache.get_or_fetch(('k',), lambda: ({'v': 2}, True))
+    assert (value, how) == ({'v': 1}, 'stale')
+    wait_for(lambda: not cache._inflight)
+    assert cache.get_or_fetch(('k',), lambda: ({'v': 3}, True)) == ({'v': 2}, 'stale')
+
+
+def test_expired_entry_is_refetched():
+    cache = FlightSearchCache(ttl=0, stale_seconds=0)
+    cache.get_or_fetch(('k',), lambda: ({'v': 1}, True))
+    assert cache.get_or_fetch(('k',), lambda: ({'v': 2}, True)) == ({'v': 2}, 'miss')
+
+
+def test_least_recently_used_is_evicted_past_max_bytes():
+    value = {'payload': 'x' * 100}
+    entry_size = len('{"payload": "' + 'x' * 100 + '"}')
+    cache = FlightSearchCache(max_bytes=entry_size * 2)
+
+    cache.get_or_fetch(('a',), lambda: (value, True))
+    cache.get_or_fetch(('b',), lambda: (value, True))
+    cache.get_or_fetch(('a',), lambda: (value, True))   # touch a, so b is now the oldest
+    cache.get_or_fetch(('c',), lambda: (value, True))
+
+    stats = cache.get_stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 1
+    assert stats['bytes'] == entry_size * 2
+    assert cache.get_or_fetch(('a',), lambda: (value, True))[1] == 'hit'
+    assert cache.get_or_fetch(('b',), lambda: (value, True))[1] == 'miss'
+
+
+def test_value_larger_than_the_cache_is_not_stored():
+    cache = FlightSearchCache(max_bytes=10)
+    cache.get_or_fetch(('k',), lambda: ({'payload': 'x' * 100}, True))
+    assert cache.get_stats()['entries'] == 0 and cache.get_stats()['bytes'] == 0
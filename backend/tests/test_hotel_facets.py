@@ -0,0 +1,143 @@
+"""HotelFacetIndex bitmaps, facet counts and request filter parsing"""
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from services.hotel_facet_service import HotelFacetIndex, _iter_bits, _nice_step, parse_facet_filters
+
+
+def hotel(hid, stars, price, meal='nomeal', amenities=(), free_cancel=False, rating=0):
+    return {
+        'id': hid,
+        'star_rating': stars,
+        'price': price,
+        'meal_plan': meal,
+        'amenities': list(amenities),
+        'cancellation_info': {'is_free_cancellation': free_cancel},
+        'guest_rating': rating,
+    }
+
+
+HOTELS = [
+    hotel('a', 3, 1000, 'breakfast', ['wifi'], rating=7.5),
+    hotel('b', 4, 2500, 'nomeal', ['wifi', 'pool'], free_cancel=True, rating=8.1),
+    hotel('c', 5, 9000, 'breakfast', ['wifi', 'pool', 'spa'], free_cancel=True, rating=9.2),
+    hotel('d', 4, 4000, 'halfboard', ['pool'], rating=6.0),
+    hotel('e', 4.4, 3000, 'Breakfast', [], free_cancel=True, rating=8.8),
+    hotel('f', None, 0, None, ['WiFi']),
+]
+
+
+def ids(index, bits):
+    return [index.hotels[i]['id'] for i in _iter_bits(bits)]
+
+
+@pytest.fixture
+def index():
+    return HotelFacetIndex(HOTELS)
+
+
+def test_stars_are_ored_and_rounded(index):
+    masks = index.filter_masks({'stars': [4, 5]})
+    assert ids(index, masks['stars']) == ['b', 'c', 'd', 'e']
+
+
+def test_amenities_are_anded_case_insensitively(index):
+    masks = index.filter_masks({'amenities': ['WIFI', 'pool']})
+    assert ids(index, masks['amenity']) == ['b', 'c']
+    assert ids(index, index.filter_masks({'amenities': ['wifi']})['amenity']) == ['a', 'b', 'c', 'f']
+
+
+def test_meal_defaults_to_nomeal_and_ignores_case(index):
+    masks = index.filter_masks({'meals': ['breakfast', 'NOMEAL']})
+    assert ids(index, masks['meal']) == ['a', 'b', 'c', 'e', 'f']
+
+
+def test_price_range_is_inclusive(index):
+    masks = index.filter_masks({'price_min': 2500, 'price_max': 4000})
+    assert ids(index, masks['price']) == ['b', 'd', 'e']
+
+
+def test_no_filters_means_no_masks(index):
+    assert index.filter_masks({}) == {}
+    assert index.filter_masks({'price_min': None, 'price_max': None}) == {}
+
+
+def test_price_buckets_cover_every_priced_hotel_once(index):
+    buckets = index.price_buckets
+    assert buckets[0]['min'] <= 1000 and buckets[-1]['max'] > 9000
+    covered = 0
+    for idx in range(len(buckets)):
+        bits = index.bitmaps['price'][idx]
+        assert covered & bits == 0
+        covered |= bits
+    assert ids(index, covered) == ['a', 'b', 'c', 'd', 'e']  # the unpriced hotel is in no bucket
+
+
+def test_price_bucket_filter_matches_its_range(index):
+    first = index.price_buckets[0]
+    masks = index.filter_masks({'price_buckets': [0]})
+    expected = [h['id'] for h in HOTELS if first['min'] <= (h['price'] or 0) < first['max'] and h['price']]
+    assert ids(index, masks['price']) == expected
+
+
+def test_facet_counts_ignore_their_own_filter(index):
+    masks = index.filter_masks({'stars': [4], 'free_cancellation': True})
+    counts = index.facet_counts(masks)
+
+    # Stars are counted under the free-cancellation filter only
+    assert counts['stars'] == {'0': 0, '3': 0, '4': 2, '5': 1}
+    # Free cancellation is counted under the 4-star filter only
+    assert counts['free_cancellation'] == {'false': 1, 'true': 2}
+    # Other facets see both filters (b and e)
+    assert counts['meal'] == {'breakfast': 1, 'nomeal': 1, 'halfboard': 0}
+    assert sum(bucket['count'] for bucket in counts['price']) == 2
+
+
+def test_select_sorts_and_pages(index):
+    result = index.select({'stars': [4, 5]}, sort='price_high', page=1, page_size=3)
+    assert [h['id'] for h in result['hotels']] == ['c', 'd', 'e']
+    assert result['total'] == 4 and result['has_more'] is True
+
+    result = index.select({'stars': [4, 5]}, sort='price_high', page=2, page_size=3)
+    assert [h['id'] for h in result['hotels']] == ['b']
+    assert result['has_more'] is False
+
+
+def test_select_clamps_page_size(index):
+    result = index.select({}, page=0, page_size=10_000)
+    assert result['page'] == 1 and result['page_size'] == 100
+    assert result['total'] == len(HOTELS)
+
+
+def test_empty_index():
+    index = HotelFacetIndex([])
+    result = index.select({'stars': [5]})
+    assert result['hotels'] == [] and result['total'] == 0
+    assert result['facets']['price'] == []
+
+
+def test_nice_step():
+    assert _nice_step(0) == 1
+    assert _nice_step(130) == 200
+    assert _nice_step(1000) == 1000
+    assert _nice_step(4200) == 5000
+
+
+def test_parse_facet_filters_reads_lists_and_flags():
+    filters = parse_facet_filters(MultiDict([
+        ('stars', '4,5'), ('stars', '3'), ('meals', 'breakfast, nomeal'),
+        ('price_buckets', '0'), ('free_cancellation', 'true'), ('price_min', '100'), ('price_max', 'abc'),
+    ]))
+    assert filters['stars'] == [4, 5, 3]
+    assert filters['meals'] == ['breakfast', 'nomeal']
+    assert filters['amenities'] == []
+    assert filters['price_buckets'] == [0]
+    assert filters['free_cancellation'] is True
+    assert filters['price_min'] == 100.0
+    assert filters['price_max'] is None
+
+
+@pytest.mark.parametrize('name', ['stars', 'price_buckets'])
+def test_parse_facet_filters_rejects_non_numeric_lists(name):
+    with pytest.raises(ValueError, match=name):
+        parse_facet_filters(MultiDict([(name, '4,abc')]))
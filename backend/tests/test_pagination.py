@@ -0,0 +1,81 @@
+"""Keyset cursors and paginate() over a fake PostgREST table"""
+import pytest
+
+from conftest import FakeQuery, FakeSupabase
+from services.pagination import after_keyset, decode_cursor, encode_cursor, filter_value, paginate
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor('2026-01-31T10:00:00+00:00', 42)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == ('2026-01-31T10:00:00+00:00', '42')
+
+
+def test_cursor_keeps_none_and_size():
+    cursor = encode_cursor('2026-01-31T10:00:00+00:00', 'hotel', None)
+    assert decode_cursor(cursor, 3) == ('2026-01-31T10:00:00+00:00', 'hotel', None)
+
+
+def test_empty_cursor_is_first_page():
+    assert decode_cursor(None) is None
+    assert decode_cursor('') is None
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor!', encode_cursor('only-one'), 'e30'])  # e30 = "{}"
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(cursor)
+
+
+def test_after_keyset_builds_row_comparison():
+    calls = []
+
+    class Recorder:
+        def or_(self, expression):
+            calls.append(expression)
+            return self
+
+    after_keyset(Recorder(), ('2026-01-31T10:00:00+00:00', 'b7'), column='updated_at')
+    assert calls == ['updated_at.lt."2026-01-31T10:00:00+00:00",and(updated_at.eq."2026-01-31T10:00:00+00:00",id.lt.b7)']
+
+
+def test_after_keyset_skips_rows_up_to_the_cursor():
+    rows = [{'id': i, 'created_at': ts} for i, ts in
+            [('a', '2026-01-02'), ('b', '2026-01-02'), ('c', '2026-01-02'), ('d', '2026-01-01'), ('e', '2026-01-03')]]
+    query = after_keyset(FakeQuery(rows), ('2026-01-02', 'b'))
+    assert sorted(r['id'] for r in query.execute().data) == ['a', 'd']
+
+
+def test_filter_value_strips_postgrest_syntax():
+    assert filter_value(' a,b(c)"d\\e*f%g ') == 'abcdefg'
+    assert filter_value(None) == ''
+
+
+def test_paginate_walks_every_row_once_across_timestamp_ties():
+    rows = [{'id': f'r{i:02d}', 'created_at': f'2026-01-{1 + i // 3:02d}T00:00:00+00:00'} for i in range(10)]
+    supabase = FakeSupabase({'things': rows})
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        page = paginate(supabase, 'things', limit=4, cursor=cursor, count='exact' if cursor is None else None)
+        if pages == 0:
+            assert page['total'] == 10
+        else:
+            assert 'total' not in page
+        seen.extend(r['id'] for r in page['data'])
+        pages += 1
+        if not page['has_more']:
+            assert page['next_cursor'] is None
+            break
+        cursor = page['next_cursor']
+
+    expected = [r['id'] for r in sorted(rows, key=lambda r: (r['created_at'], r['id']), reverse=True)]
+    assert seen == expected
+    assert pages == 3
+
+
+def test_paginate_offset_page():
+    rows = [{'id': f'r{i}', 'created_at': f'2026-01-0{i + 1}'} for i in range(5)]
+    page = paginate(FakeSupabase({'things': rows}), 'things', limit=2, offset=2)
+    assert [r['id'] for r in page['data']] == ['r2', 'r1']
+    assert page['has_more'] is True
@@ -0,0 +1,102 @@
+"""Merged hotel + flight refund list: k-way merge order and cursor tie-breaks"""
+import pytest
+
+from conftest import FakeSupabase
+from services.refund_listing import RefundListing, _sort_key
+
+
+def ts(day, hour=0):
+    return f'2026-03-{day:02d}T{hour:02d}:00:00+00:00'
+
+
+HOTELS = [
+    {'id': 'h1', 'partner_order_id': 'P-1', 'created_at': ts(1), 'total_amount': 100, 'guests': [{'first_name': 'Ann', 'last_name': 'Lee'}]},
+    {'id': 'h2', 'partner_order_id': 'P-2', 'created_at': ts(2), 'total_amount': 200},
+    {'id': 'h3', 'partner_order_id': 'P-3', 'created_at': ts(2), 'total_amount': 300},
+    {'id': 'h4', 'partner_order_id': 'P-4', 'created_at': ts(4), 'total_amount': 400},
+]
+FLIGHTS = [
+    {'id': 'f1', 'booking_id': 'F-1', 'created_at': ts(2), 'total_amount': 50, 'passengers': '[{"name": "Raj"}]'},
+    {'id': 'f2', 'booking_id': 'F-2', 'created_at': ts(3), 'total_amount': 60},
+    {'id': 'f3', 'booking_id': 'F-3', 'created_at': ts(2), 'total_amount': 70},
+]
+
+
+@pytest.fixture
+def supabase():
+    return FakeSupabase({'hotel_bookings': HOTELS, 'flight_bookings': FLIGHTS})
+
+
+def walk(supabase, limit, **filters):
+    listing = RefundListing()
+    seen, cursor, pages = [], None, []
+    while True:
+        page = listing.list_bookings(supabase, limit=limit, cursor=cursor, **filters)
+        pages.append(page)
+        seen.extend((r['booking_type'], r['id']) for r in page['data'])
+        if not page['has_more']:
+            return seen, pages
+        cursor = page['next_cursor']
+
+
+# Newest first; on equal dates hotels before flights, then id descending
+EXPECTED = [
+    ('hotel', 'h4'), ('flight', 'f2'),
+    ('hotel', 'h3'), ('hotel', 'h2'), ('flight', 'f3'), ('flight', 'f1'),
+    ('hotel', 'h1'),
+]
+
+
+def test_first_page_merges_both_tables(supabase):
+    page = RefundListing().list_bookings(supabase, limit=50)
+    assert [(r['booking_type'], r['id']) for r in page['data']] == EXPECTED
+    assert page['total'] == 7
+    assert page['has_more'] is False and page['next_cursor'] is None
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 4])
+def test_cursor_pages_cover_every_row_once(supabase, limit):
+    seen, pages = walk(supabase, limit)
+    assert seen == EXPECTED
+    assert 'total' in pages[0] and all('total' not in p for p in pages[1:])
+
+
+def test_cursor_landing_inside_a_cross_table_tie(supabase):
+    # Page boundary after h3: h2 (same table) and f3/f1 (other table, same date) are still to come
+    first = RefundListing().list_bookings(supabase, limit=3)
+    assert [r['id'] for r in first['data']] == ['h4', 'f2', 'h3']
+    rest = RefundListing().list_bookings(supabase, limit=10, cursor=first['next_cursor'])
+    assert [r['id'] for r in rest['data']] == ['h2', 'f3', 'f1', 'h1']
+
+    # Boundary on a flight at the tied date: the hotels at that date were already returned
+    first = RefundListing().list_bookings(supabase, limit=5)
+    assert first['data'][-1]['id'] == 'f3'
+    rest = RefundListing().list_bookings(supabase, limit=10, cursor=first['next_cursor'])
+    assert [r['id'] for r in rest['data']] == ['f1', 'h1']
+
+
+def test_single_type(supabase):
+    seen, _ = walk(supabase, 2, booking_type='flight')
+    assert seen == [('flight', 'f2'), ('flight', 'f3'), ('flight', 'f1')]
+
+
+def test_invalid_cursor(supabase):
+    with pytest.raises(ValueError):
+        RefundListing().list_bookings(supabase, cursor='garbage')
+
+
+def test_rows_are_normalized(supabase):
+    rows = {r['id']: r for r in RefundListing().list_bookings(supabase, limit=50)['data']}
+    assert rows['h1']['customer_name'] == 'Ann Lee'
+    assert rows['h1']['booking_id'] == 'P-1'
+    assert rows['h1']['refund_status'] == 'Not Requested'
+    assert rows['f1']['customer_name'] == 'Raj'
+    assert rows['f2']['customer_name'] == '—'
+
+
+def test_sort_key_treats_naive_and_bad_dates_consistently():
+    naive = {'booking_date': '2026-03-02T00:00:00', 'booking_type': 'hotel', 'id': 1}
+    aware = {'booking_date': '2026-03-02T00:00:00Z', 'booking_type': 'hotel', 'id': 1}
+    broken = {'booking_date': None, 'booking_type': 'flight', 'id': 2}
+    assert _sort_key(naive) == _sort_key(aware)
+    assert _sort_key(broken) < _sort_key(naive)
@@ -540,6 +540,434 @@ SELECT
     (SELECT COUNT(*) FROM hotel_bookings WHERE status = 'cancelled') as cancelled_hotel_bookings,
     (SELECT COUNT(*) FROM flight_bookings WHERE status = 'cancelled') as cancelled_flight_bookings;
 
+-- =====================================================
+-- Function: Admin dashboard aggregates
+-- Everything the admin dashboard charts need in one small JSON result,
+-- so the backend never pulls whole booking rows (guest JSONB included).
+-- Mirrors aggregate_hotel_bookings() in backend/services/admin_service.py.
+-- =====================================================
+CREATE OR REPLACE FUNCTION admin_dashboard_stats(p_since TIMESTAMPTZ DEFAULT NULL)
+RETURNS JSONB AS $$
+    WITH b AS (
+        SELECT
+            COALESCE(NULLIF(status, ''), 'unknown') AS status,
+            COALESCE(total_amount, 0) AS amount,
+            COALESCE(NULLIF(currency, ''), 'USD') AS currency,
+            COALESCE(NULLIF(rooms, 0), 1) AS rooms,
+            hotel_star_rating,
+            COALESCE(NULLIF(hotel_city, ''), NULLIF(hotel_name, ''), 'Unknown') AS destination,
+            to_char(created_at AT TIME ZONE 'UTC', 'YYYY-MM') AS month,
+            (check_out - check_in) AS nights
+        FROM hotel_bookings
+        WHERE p_since IS NULL OR created_at >= p_since
+    ),
+    totals AS (
+        SELECT
+            COUNT(*) AS total_bookings,
+            COUNT(*) FILTER (WHERE status = 'confirmed') AS confirmed_bookings,
+            COALESCE(SUM(amount) FILTER (WHERE status = 'confirmed'), 0) AS total_revenue,
+            COALESCE(SUM(amount), 0) AS total_revenue_all,
+            AVG(nights) FILTER (WHERE nights > 0) AS avg_nights,
+            COALESCE(SUM(GREATEST(nights, 1) * rooms) FILTER (WHERE nights IS NOT NULL), 0) AS total_room_nights
+        FROM b
+    )
+    SELECT jsonb_build_object(
+        'total_bookings', t.total_bookings,
+        'confirmed_bookings', t.confirmed_bookings,
+        'total_revenue', ROUND(t.total_revenue, 2),
+        'total_revenue_all', ROUND(t.total_revenue_all, 2),
+        'avg_booking_value', CASE WHEN t.confirmed_bookings > 0 THEN ROUND(t.total_revenue / t.confirmed_bookings, 2) ELSE 0 END,
+        'avg_nights', COALESCE(ROUND(t.avg_nights, 1), 0),
+        'total_room_nights', t.total_room_nights,
+        'status_breakdown', (
+            SELECT COALESCE(jsonb_object_agg(status, n), '{}'::jsonb)
+            FROM (SELECT status, COUNT(*) AS n FROM b GROUP BY status) s
+        ),
+        'monthly_revenue', (
+            SELECT COALESCE(jsonb_agg(jsonb_build_object('month', month, 'bookings', n, 'revenue', revenue) ORDER BY month), '[]'::jsonb)
+            FROM (SELECT month, COUNT(*) AS n, ROUND(SUM(amount), 2) AS revenue FROM b WHERE month IS NOT NULL GROUP BY month) m
+        ),
+        'top_destinations', (
+            SELECT COALESCE(jsonb_agg(jsonb_build_object('name', destination, 'bookings', n, 'revenue', revenue)
+                                      ORDER BY n DESC, revenue DESC, destination), '[]'::jsonb)
+            FROM (
+                SELECT destination, COUNT(*) AS n, ROUND(SUM(amount), 2) AS revenue
+                FROM b GROUP BY destination
+                ORDER BY n DESC, revenue DESC, destination
+                LIMIT 10
+            ) d
+        ),
+        'star_rating_distribution', (
+            SELECT COALESCE(jsonb_object_agg(hotel_star_rating || ' Star', n), '{}'::jsonb)
+            FROM (SELECT hotel_star_rating, COUNT(*) AS n FROM b WHERE COALESCE(hotel_star_rating, 0) <> 0 GROUP BY hotel_star_rating) r
+        ),
+        'currency_breakdown', (
+            SELECT COALESCE(jsonb_object_agg(currency, jsonb_build_object('count', n, 'revenue', revenue)), '{}'::jsonb)
+            FROM (SELECT currency, COUNT(*) AS n, ROUND(SUM(amount), 2) AS revenue FROM b GROUP BY currency) c
+        )
+    )
+    FROM totals t;
+$$ LANGUAGE sql STABLE;
+
+-- =====================================================
+-- Table: analytics_rollups
+-- Daily and monthly counters for the admin stats endpoints, kept current by
+-- triggers on hotel_bookings / flight_bookings / flight_enquiries so stats
+-- never rescan the raw tables. One row per
+-- (product, period, bucket, status, currency, dimension, dimension_value);
+-- dimension '' is the overall total, others break it down by destination,
+-- supplier or trip_type. Backfill / repair with SELECT rebuild_analytics_rollups();
+-- Mirrored in backend/services/analytics_rollups.py (booking_fact).
+-- =====================================================
+CREATE TABLE IF NOT EXISTS analytics_rollups (
+    product VARCHAR(20) NOT NULL,             -- hotel, flight, flight_enquiry
+    period VARCHAR(5) NOT NULL,               -- day, month
+    bucket DATE NOT NULL,                     -- the day, or first day of the month (UTC, by created_at)
+    status VARCHAR(50) NOT NULL,
+    currency VARCHAR(10) NOT NULL DEFAULT '',
+    dimension VARCHAR(20) NOT NULL DEFAULT '',
+    dimension_value VARCHAR(255) NOT NULL DEFAULT '',
+    bookings BIGINT NOT NULL DEFAULT 0,
+    revenue NUMERIC(14,2) NOT NULL DEFAULT 0,
+    room_nights BIGINT NOT NULL DEFAULT 0,
+    roundtrips BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (product, period, bucket, status, currency, dimension, dimension_value)
+);
+
+CREATE INDEX IF NOT EXISTS idx_analytics_rollups_lookup ON analytics_rollups(product, period, dimension, bucket);
+
+-- Company revenue: backend (service_role) only, no anon/authenticated policies
+ALTER TABLE analytics_rollups ENABLE ROW LEVEL SECURITY;
+
+-- What one source row contributes to the rollups (NULL = nothing).
+-- Dimension values are cut to dimension_value's 255 characters (hotel_name can be longer).
+CREATE OR REPLACE FUNCTION analytics_rollup_fact(p_table TEXT, j JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_nights INTEGER;
+BEGIN
+    IF j IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    IF p_table = 'hotel_bookings' THEN
+        v_nights := GREATEST(COALESCE((j->>'check_out')::date - (j->>'check_in')::date, 1), 1);
+        RETURN jsonb_build_object(
+            'product', 'hotel',
+            'created_at', COALESCE(j->>'created_at', NOW()::text),
+            'status', COALESCE(NULLIF(j->>'status', ''), 'unknown'),
+            'currency', COALESCE(NULLIF(j->>'currency', ''), 'USD'),
+            'revenue', COALESCE((j->>'total_amount')::numeric, 0),
+            'room_nights', v_nights * COALESCE(NULLIF((j->>'rooms')::integer, 0), 1),
+            'roundtrips', 0,
+            'dims', jsonb_build_object(
+                'destination', LEFT(COALESCE(NULLIF(j->>'hotel_city', ''), NULLIF(j->>'hotel_name', ''), 'Unknown'), 255),
+                'supplier', LEFT(COALESCE(NULLIF(j->>'supplier_name', ''), NULLIF(j->>'supplier', ''),
+                                          CASE WHEN j->>'booking_source' = 'admin_manual' THEN 'manual' ELSE 'ratehawk' END), 255)
+            )
+        );
+    ELSIF p_table = 'flight_bookings' THEN
+        RETURN jsonb_build_object(
+            'product', 'flight',
+            'created_at', COALESCE(j->>'created_at', NOW()::text),
+            'status', COALESCE(NULLIF(j->>'status', ''), 'unknown'),
+            'currency', COALESCE(NULLIF(j->>'currency', ''), 'INR'),
+            'revenue', COALESCE((j->>'total_amount')::numeric, 0),
+            'room_nights', 0,
+            'roundtrips', CASE WHEN COALESCE(j->>'return_flight_number', '') <> '' THEN 1 ELSE 0 END,
+            'dims', jsonb_build_object(
+                'destination', LEFT(COALESCE(NULLIF(j->>'destination_city', ''), 'Unknown'), 255),
+                'supplier', LEFT(COALESCE(NULLIF(j->>'supplier_name', ''), 'unknown'), 255),
+                'trip_type', LEFT(COALESCE(NULLIF(j->>'trip_type', ''), 'domestic'), 255)
+            )
+        );
+    ELSIF p_table = 'flight_enquiries' THEN
+        RETURN jsonb_build_object(
+            'product', 'flight_enquiry',
+            'created_at', COALESCE(j->>'created_at', NOW()::text),
+            'status', COALESCE(NULLIF(j->>'status', ''), 'unknown'),
+            'currency', '',
+            'revenue', 0,
+            'room_nights', 0,
+            'roundtrips', 0,
+            'dims', '{}'::jsonb
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql STABLE;  -- NOW() fallback for a missing created_at
+
+-- Add (p_sign = 1) or remove (p_sign = -1) one fact from every rollup row it belongs to
+CREATE OR REPLACE FUNCTION apply_analytics_rollup_fact(f JSONB, p_sign INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    v_created TIMESTAMP := ((f->>'created_at')::timestamptz AT TIME ZONE 'UTC');
+    v_period TEXT;
+    v_dim TEXT;
+    v_value TEXT;
+BEGIN
+    IF f IS NULL THEN
+        RETURN;
+    END IF;
+    FOREACH v_period IN ARRAY ARRAY['day', 'month'] LOOP
+        FOR v_dim, v_value IN
+            SELECT '', '' UNION ALL SELECT key, value FROM jsonb_each_text(f->'dims')
+        LOOP
+            INSERT INTO analytics_rollups AS r
+                (product, period, bucket, status, currency, dimension, dimension_value, bookings, revenue, room_nights, roundtrips)
+            VALUES (
+                f->>'product', v_period,
+                CASE WHEN v_period = 'day' THEN v_created::date ELSE date_trunc('month', v_created)::date END,
+                f->>'status', f->>'currency', v_dim, v_value,
+                p_sign, p_sign * (f->>'revenue')::numeric,
+                p_sign * (f->>'room_nights')::bigint, p_sign * (f->>'roundtrips')::bigint
+            )
+            ON CONFLICT (product, period, bucket, status, currency, dimension, dimension_value) DO UPDATE SET
+                bookings = r.bookings + EXCLUDED.bookings,
+                revenue = r.revenue + EXCLUDED.revenue,
+                room_nights = r.room_nights + EXCLUDED.room_nights,
+                roundtrips = r.roundtrips + EXCLUDED.roundtrips,
+                updated_at = NOW();
+        END LOOP;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION analytics_rollup_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_old JSONB;
+    v_new JSONB;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        v_old := analytics_rollup_fact(TG_TABLE_NAME, to_jsonb(OLD));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        v_new := analytics_rollup_fact(TG_TABLE_NAME, to_jsonb(NEW));
+    END IF;
+    -- Most updates (payment ids, booking_response, ...) don't touch anything rolled up
+    IF v_old IS NOT DISTINCT FROM v_new THEN
+        RETURN NULL;
+    END IF;
+    -- Runs inside the booking's transaction: a rollup failure must never undo the
+    -- booking write, so log it and move on (rebuild_analytics_rollups() repairs drift)
+    BEGIN
+        PERFORM apply_analytics_rollup_fact(v_old, -1);
+        PERFORM apply_analytics_rollup_fact(v_new, 1);
+    EXCEPTION WHEN OTHERS THEN
+        RAISE WARNING 'analytics rollup skipped for % on %: %', TG_OP, TG_TABLE_NAME, SQLERRM;
+    END;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Recompute every rollup from the source tables (backfill, or repair after manual SQL edits)
+CREATE OR REPLACE FUNCTION rebuild_analytics_rollups()
+RETURNS JSONB AS $$
+DECLARE
+    v_table TEXT;
+    v_counts JSONB := '{}'::jsonb;
+    v_rows BIGINT;
+BEGIN
+    -- Block writers first so no trigger delta lands between the wipe and the rescan
+    FOREACH v_table IN ARRAY ARRAY['hotel_bookings', 'flight_bookings', 'flight_enquiries'] LOOP
+        IF to_regclass('public.' || v_table) IS NOT NULL THEN
+            EXECUTE format('LOCK TABLE %I IN SHARE MODE', v_table);
+        END IF;
+    END LOOP;
+
+    DELETE FROM analytics_rollups;
+    FOREACH v_table IN ARRAY ARRAY['hotel_bookings', 'flight_bookings', 'flight_enquiries'] LOOP
+        IF to_regclass('public.' || v_table) IS NULL THEN
+            CONTINUE;
+        END IF;
+        EXECUTE format($q$
+            INSERT INTO analytics_rollups
+                (product, period, bucket, status, currency, dimension, dimension_value, bookings, revenue, room_nights, roundtrips)
+            SELECT f->>'product', p.period,
+                   CASE WHEN p.period = 'day' THEN ((f->>'created_at')::timestamptz AT TIME ZONE 'UTC')::date
+                        ELSE date_trunc('month', (f->>'created_at')::timestamptz AT TIME ZONE 'UTC')::date END,
+                   f->>'status', f->>'currency', d.dim, d.val,
+                   COUNT(*), SUM((f->>'revenue')::numeric), SUM((f->>'room_nights')::bigint), SUM((f->>'roundtrips')::bigint)
+            FROM (SELECT analytics_rollup_fact(%L, to_jsonb(t)) AS f FROM %I t) facts
+            CROSS JOIN (VALUES ('day'), ('month')) AS p(period)
+            CROSS JOIN LATERAL (
+                SELECT '' AS dim, '' AS val UNION ALL SELECT key, value FROM jsonb_each_text(f->'dims')
+            ) d
+            WHERE f IS NOT NULL
+            GROUP BY 1, 2, 3, 4, 5, 6, 7
+        $q$, v_table, v_table);
+        EXECUTE format('SELECT COUNT(*) FROM %I', v_table) INTO v_rows;
+        v_counts := v_counts || jsonb_build_object(v_table, v_rows);
+    END LOOP;
+    RETURN v_counts;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['hotel_bookings', 'flight_bookings', 'flight_enquiries'] LOOP
+        IF to_regclass('public.' || t) IS NOT NULL THEN
+            EXECUTE format('
+                DROP TRIGGER IF EXISTS analytics_rollup_%I ON %I;
+                CREATE TRIGGER analytics_rollup_%I
+                    AFTER INSERT OR UPDATE OR DELETE ON %I
+                    FOR EACH ROW
+                    EXECUTE FUNCTION analytics_rollup_trigger();
+            ', t, t, t, t);
+        END IF;
+    END LOOP;
+END $$;
+
+-- =====================================================
+-- Table: search_analytics_daily
+-- Per-day hotel search counters, fed by the search log writer
+-- (SearchAnalyticsService.record_counters) one batch at a time, so the
+-- search report never scans hotel_search_logs. dimension '' / value '' is
+-- the day's total; the rest break it down by destination, device, browser,
+-- country, user_type and nights.
+-- =====================================================
+CREATE TABLE IF NOT EXISTS search_analytics_daily (
+    day DATE NOT NULL,
+    dimension VARCHAR(20) NOT NULL DEFAULT '',
+    value VARCHAR(255) NOT NULL DEFAULT '',
+    searches BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (day, dimension, value)
+);
+
+-- Visitor analytics: backend (service_role) only, no anon/authenticated policies
+ALTER TABLE search_analytics_daily ENABLE ROW LEVEL SECURITY;
+
+-- p_counters: [{"day": "2026-01-31", "dimension": "device", "value": "Mobile", "searches": 3}, ...]
+-- (one entry per key - the writer aggregates each batch before calling this)
+CREATE OR REPLACE FUNCTION bump_search_analytics(p_counters JSONB)
+RETURNS VOID AS $$
+    INSERT INTO search_analytics_daily AS s (day, dimension, value, searches)
+    SELECT (c->>'day')::date, c->>'dimension', c->>'value', (c->>'searches')::bigint
+    FROM jsonb_array_elements(p_counters) c
+    ON CONFLICT (day, dimension, value) DO UPDATE SET
+        searches = s.searches + EXCLUDED.searches,
+        updated_at = NOW();
+$$ LANGUAGE sql;
+
+-- Totals, top-N per dimension and the daily series for a date range
+CREATE OR REPLACE FUNCTION search_analytics_report(p_from DATE, p_to DATE, p_top INTEGER DEFAULT 10)
+RETURNS JSONB AS $$
+    WITH totals AS (
+        SELECT dimension, value, SUM(searches)::bigint AS searches
+        FROM search_analytics_daily
+        WHERE day BETWEEN p_from AND p_to
+        GROUP BY dimension, value
+    ),
+    ranked AS (
+        SELECT dimension, value, searches,
+               ROW_NUMBER() OVER (PARTITION BY dimension ORDER BY searches DESC, value) AS rn
+        FROM totals
+        WHERE dimension <> ''
+    )
+    SELECT jsonb_build_object(
+        'total', COALESCE((SELECT searches FROM totals WHERE dimension = ''), 0),
+        'breakdowns', COALESCE((
+            SELECT jsonb_object_agg(dimension, items)
+            FROM (
+                SELECT dimension, jsonb_agg(jsonb_build_object('value', value, 'count', searches)
+                                            ORDER BY searches DESC, value) AS items
+                FROM ranked WHERE rn <= p_top
+                GROUP BY dimension
+            ) d
+        ), '{}'::jsonb),
+        'daily', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('day', day, 'count', searches) ORDER BY day)
+            FROM search_analytics_daily
+            WHERE dimension = '' AND day BETWEEN p_from AND p_to
+        ), '[]'::jsonb)
+    );
+$$ LANGUAGE sql STABLE;
+
+-- One-time backfill from the existing logs (mirrors count_searches())
+DO $$
+BEGIN
+    IF to_regclass('public.hotel_search_logs') IS NOT NULL
+       AND NOT EXISTS (SELECT 1 FROM search_analytics_daily) THEN
+        INSERT INTO search_analytics_daily (day, dimension, value, searches)
+        SELECT (l.created_at AT TIME ZONE 'UTC')::date, d.dimension, LEFT(d.value, 255), COUNT(*)
+        FROM hotel_search_logs l
+        CROSS JOIN LATERAL (VALUES
+            ('', ''),
+            ('nights', CASE WHEN COALESCE(l.nights, 0) <= 3 THEN GREATEST(COALESCE(l.nights, 0), 0)::text
+                            WHEN l.nights <= 6 THEN '4-6' WHEN l.nights <= 13 THEN '7-13' ELSE '14+' END),
+            ('destination', NULLIF(l.destination, '')),
+            ('device', NULLIF(l.device_type, '')),
+            ('browser', NULLIF(l.browser, '')),
+            ('country', NULLIF(l.country, '')),
+            ('user_type', NULLIF(l.user_type, ''))
+        ) AS d(dimension, value)
+        WHERE d.value IS NOT NULL
+        GROUP BY 1, 2, 3;
+    END IF;
+END $$;
+
+-- Exchange rate refresh (services/currency_rates.py): p_rates is {"USD": 83.1, ...}
+-- in INR per unit. Only conversion_rate/updated_at change, so admin edits to
+-- the rest of a currencies row survive the refresh. plpgsql so the function
+-- can be created before the currencies table exists.
+CREATE OR REPLACE FUNCTION set_currency_rates(p_rates JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    v_updated INTEGER;
+BEGIN
+    UPDATE currencies c
+    SET conversion_rate = r.value::numeric
+    FROM jsonb_each_text(p_rates) r
+    WHERE c.currency_code = r.key;
+    GET DIAGNOSTICS v_updated = ROW_COUNT;
+
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = 'public' AND table_name = 'currencies' AND column_name = 'updated_at') THEN
+        EXECUTE 'UPDATE currencies SET updated_at = NOW() WHERE currency_code IN (SELECT jsonb_object_keys($1))'
+        USING p_rates;
+    END IF;
+    RETURN v_updated;
+END;
+$$ LANGUAGE plpgsql SET search_path = public;
+
+-- Keyset paging (created_at, id) for the admin listings (services/pagination.py)
+CREATE INDEX IF NOT EXISTS idx_hotel_bookings_created_id ON hotel_bookings(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_flight_bookings_created_id ON flight_bookings(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_customers_created_id ON customers(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_activity_logs_created_id ON activity_logs(created_at DESC, id DESC);
+-- Audit trail filters, each still read in keyset order
+CREATE INDEX IF NOT EXISTS idx_activity_logs_admin_created ON activity_logs(admin_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_activity_logs_action_created ON activity_logs(action, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_activity_logs_entity_created ON activity_logs(entity_type, entity_id, created_at DESC, id DESC);
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    -- Tables created outside this file
+    FOREACH t IN ARRAY ARRAY['hotel_search_logs', 'flight_enquiries'] LOOP
+        IF to_regclass('public.' || t) IS NOT NULL THEN
+            EXECUTE format('CREATE INDEX IF NOT EXISTS idx_%s_created_id ON %I(created_at DESC, id DESC)', t, t);
+        END IF;
+    END LOOP;
+END $$;
+
+-- Incremental notification feed (services/notification_feed.py): bookings changed since a watermark
+CREATE INDEX IF NOT EXISTS idx_hotel_bookings_updated ON hotel_bookings(updated_at DESC);
+
+DO $$
+BEGIN
+    -- quote_requests lives in supabase-schema.sql
+    IF to_regclass('public.quote_requests') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS idx_quote_requests_created ON quote_requests(created_at DESC);
+    END IF;
+END $$;
+
 -- =====================================================
 -- Grant permissions
 -- =====================================================
@@ -549,6 +977,19 @@ GRANT SELECT ON ALL TABLES IN SCHEMA public TO anon;
 GRANT ALL ON ALL SEQUENCES IN SCHEMA public TO authenticated, service_role;
 GRANT EXECUTE ON ALL FUNCTIONS IN SCHEMA public TO authenticated, service_role;
 
+-- Admin stats and rollup maintenance are for the backend (service_role) only.
+-- Revoked after the blanket grant above, which would otherwise re-open them.
+REVOKE EXECUTE ON FUNCTION admin_dashboard_stats(TIMESTAMPTZ) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION bump_search_analytics(JSONB) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION search_analytics_report(DATE, DATE, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON search_analytics_daily FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION analytics_rollup_fact(TEXT, JSONB) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION apply_analytics_rollup_fact(JSONB, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION analytics_rollup_trigger() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION rebuild_analytics_rollups() FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON analytics_rollups FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION set_currency_rates(JSONB) FROM PUBLIC, anon, authenticated;
+
 -- =====================================================
 -- Success message
 -- =====================================================
@@ -54,6 +54,23 @@ CREATE INDEX IF NOT EXISTS idx_hotel_bookings_status ON hotel_bookings(status);
 CREATE INDEX IF NOT EXISTS idx_hotel_bookings_partner_order ON hotel_bookings(partner_order_id);
 CREATE INDEX IF NOT EXISTS idx_hotel_bookings_created ON hotel_bookings(created_at DESC);
 
+-- =====================================================
+-- Table: booking_status_events
+-- Audit trail of booking status transitions recorded by the
+-- background status poller (processing -> confirmed/failed/pending)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS booking_status_events (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    partner_order_id VARCHAR(100) NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    error_code VARCHAR(100),
+    attempts INTEGER,
+    source VARCHAR(50) DEFAULT 'poller',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_booking_status_events_order ON booking_status_events(partner_order_id, created_at);
+
 -- =====================================================
 -- Table: hotel_cache
 -- Caches hotel static data from ETG
@@ -182,6 +199,7 @@ ON CONFLICT (id) DO NOTHING;
 -- =====================================================
 GRANT USAGE ON SCHEMA public TO anon, authenticated, service_role;
 GRANT ALL ON hotel_bookings TO anon, authenticated, service_role;
+GRANT ALL ON booking_status_events TO service_role;
 GRANT ALL ON hotel_cache TO anon, authenticated, service_role;
 GRANT ALL ON hotel_search_history TO anon, authenticated, service_role;
 GRANT ALL ON regions TO anon, authenticated, service_role;
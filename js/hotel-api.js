@@ -264,6 +264,19 @@ const HotelAPI = {
         });
     },
 
+    /**
+     * Idempotency-Key for this checkout attempt (new per book_hash, kept in sessionStorage)
+     */
+    checkoutIdempotencyKey(bookHash) {
+        const stored = JSON.parse(sessionStorage.getItem('ctc_book_idempotency') || 'null');
+        if (stored && stored.book_hash === bookHash) return stored.key;
+        const key = 'book-' + (window.crypto && crypto.randomUUID
+            ? crypto.randomUUID()
+            : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`);
+        sessionStorage.setItem('ctc_book_idempotency', JSON.stringify({ book_hash: bookHash, key: key }));
+        return key;
+    },
+
     /**
      * Create booking
      * @param {Object} params - Booking parameters
@@ -278,6 +291,8 @@ const HotelAPI = {
     async createBooking(params) {
         return this.request('/hotels/book', {
             method: 'POST',
+            // One key per checkout attempt: retries/double-clicks replay the first result
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': this.checkoutIdempotencyKey(params.book_hash) },
             body: JSON.stringify(params)
         });
     },
@@ -288,22 +303,78 @@ const HotelAPI = {
     async finishBooking(partnerOrderId) {
         return this.request('/hotels/book/finish', {
             method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': `finish-${partnerOrderId}` },
             body: JSON.stringify({
                 partner_order_id: partnerOrderId
             })
         });
     },
 
+    /**
+     * Wait for the final booking status over server-sent events
+     * Resolves with the same shape as pollBookingStatus; rejects if the
+     * browser cannot keep an event stream open (caller falls back to polling).
+     */
+    watchBookingStatus(partnerOrderId) {
+        return new Promise((resolve, reject) => {
+            if (typeof EventSource === 'undefined') {
+                reject(new Error('EventSource not supported'));
+                return;
+            }
+            const source = new EventSource(`${API_CONFIG.BASE_URL}/hotels/book/events/${encodeURIComponent(partnerOrderId)}`);
+            source.addEventListener('status', (event) => {
+                const state = JSON.parse(event.data);
+                if (state.status === 'processing') {
+                    return;
+                }
+                source.close();
+                if (state.status === 'confirmed') {
+                    resolve({ success: true, status: 'confirmed', data: state.data });
+                } else {
+                    resolve({ success: false, status: state.status, error: state.error, error_code: state.error_code });
+                }
+            });
+            source.onerror = () => {
+                // Streams end every ~30s and EventSource reconnects by itself;
+                // only a closed source means the channel is unusable.
+                if (source.readyState === EventSource.CLOSED) {
+                    reject(new Error('Booking status stream closed'));
+                }
+            };
+        });
+    },
+
     /**
      * Poll booking status until final
+     * Uses the live event stream when available; otherwise the server
+     * long-polls for a few seconds per call and answers "processing"
+     * until the background poller reaches a final state.
      */
     async pollBookingStatus(partnerOrderId) {
-        return this.request('/hotels/book/poll', {
-            method: 'POST',
-            body: JSON.stringify({
-                partner_order_id: partnerOrderId
-            })
-        });
+        try {
+            return await this.watchBookingStatus(partnerOrderId);
+        } catch (e) {
+            console.warn('Live booking status unavailable, polling instead:', e.message);
+        }
+
+        let sinceVersion = -1;
+        let delay = 1000;
+        while (true) {
+            const result = await this.request('/hotels/book/poll', {
+                method: 'POST',
+                body: JSON.stringify({
+                    partner_order_id: partnerOrderId,
+                    since_version: sinceVersion
+                })
+            });
+            if (result.status !== 'processing') {
+                return result;
+            }
+            sinceVersion = result.version;
+            // Back off between calls so a slow booking does not keep a server thread busy
+            await new Promise(resolve => setTimeout(resolve, delay));
+            delay = Math.min(delay * 2, 8000);
+        }
     },
 
     /**